@@ -0,0 +1,335 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import importlib
+import json
+import os.path
+import sqlite3
+import threading
+
+from .dataset import DatasetJob
+from .model import ModelJob
+from .pretrained_model import PretrainedModelJob
+from .status import Status
+
+
+def job_summary(job, model_output_fields):
+    """
+    Returns the dict shown for a job in the home page tables
+    Adds the names of the model output columns to model_output_fields
+
+    The summary is kept with the job until its summary_key() changes,
+    only the elapsed time of running jobs is recomputed every time
+    """
+    key = job.summary_key()
+    cached = getattr(job, '_summary', None)
+    if cached is None or cached[0] != key:
+        fields = set()
+        cached = job._summary = (key, _job_summary(job, fields), fields)
+    _, summary, fields = cached
+    model_output_fields.update(fields)
+    summary = dict(summary)
+    if job.status.is_running():
+        summary['elapsed'] = job.runtime_of_tasks()
+    return summary
+
+
+def _job_summary(job, model_output_fields):
+    d = {
+        'id': job.id(),
+        'name': job.name(),
+        'group': job.group,
+        'status': job.status_of_tasks().name,
+        'status_css': job.status_of_tasks().css,
+        'submitted': job.status_history[0][1],
+        'elapsed': job.runtime_of_tasks(),
+    }
+
+    if 'train_db_task' in dir(job):
+        d.update({
+            'backend': job.train_db_task().backend,
+        })
+
+    if 'train_task' in dir(job):
+        d.update({
+            'framework': job.train_task().get_framework_id(),
+        })
+
+        train_task = job.train_task()
+        stats = train_task.output_stats()
+        for prefix, outputs in (('train', train_task.train_outputs),
+                                ('val', train_task.val_outputs)):
+            for name, output in outputs.iteritems():
+                if len(output.data) > 0:
+                    key = '%s (%s) ' % (name, prefix)
+                    model_output_fields.add(key + 'last')
+                    model_output_fields.add(key + 'min')
+                    model_output_fields.add(key + 'max')
+                    d.update({key + 'last': output.data[-1]})
+                    d.update({key + 'min': stats[(prefix, name)].min})
+                    d.update({key + 'max': stats[(prefix, name)].max})
+
+        sparkline = train_task.sparkline()
+        if sparkline is not None:
+            d.update({
+                'sparkline': sparkline,
+            })
+
+    if 'get_progress' in dir(job):
+        d.update({
+            'progress': int(round(100 * job.get_progress())),
+        })
+
+    if hasattr(job, 'dataset_id'):
+        d.update({
+            'dataset_id': job.dataset_id,
+        })
+
+    if hasattr(job, 'extension_id'):
+        d.update({
+            'extension': job.extension_id,
+        })
+    else:
+        ds = getattr(job, 'dataset', None)
+        if ds and hasattr(ds, 'extension_id'):
+            d.update({
+                'extension': ds.extension_id,
+            })
+
+    if isinstance(job, DatasetJob):
+        d.update({'type': 'dataset'})
+
+    if isinstance(job, ModelJob):
+        d.update({'type': 'model'})
+
+    if isinstance(job, PretrainedModelJob):
+        model_output_fields.add("has_labels")
+        model_output_fields.add("username")
+        d.update({
+            'type': 'pretrained_model',
+            'framework': job.framework,
+            'username': job.username,
+            'has_labels': job.has_labels_file()
+        })
+    return d
+
+
+def job_details(job):
+    """
+    Returns what the forms which use a job (e.g. as a dataset or as a
+    previous network) need to know about it
+    """
+    d = {}
+    if hasattr(job, 'extension_id'):
+        d['extension_id'] = job.extension_id
+    if isinstance(job, ModelJob):
+        train_task = job.train_task()
+        d.update({
+            'framework': train_task.get_framework_id(),
+            'snapshots': [epoch for _, epoch in train_task.snapshots],
+            'pretrained_model': bool(train_task.pretrained_model),
+        })
+    if isinstance(job, PretrainedModelJob):
+        d['framework'] = job.framework
+    return d
+
+
+def _to_json(obj):
+    # numpy scalars and arrays
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+class CatalogEntry(object):
+    """
+    What the catalog knows about a job, without unpickling it
+    """
+
+    def __init__(self, job_id, class_name, status, submitted, dataset_id, mtime,
+                 info, summary, output_fields, details):
+        self._id = job_id
+        self.class_name = class_name
+        self.status = Status(str(status))
+        self.submitted = submitted
+        self.dataset_id = dataset_id
+        self.mtime = mtime
+        self.info = info
+        self.summary = summary
+        self.output_fields = output_fields
+        # see job_details()
+        self.details = details
+
+    def id(self):
+        return self._id
+
+    def name(self):
+        return self.info['name']
+
+    def job_class(self):
+        """
+        Returns the class of the job or None if it cannot be imported
+        """
+        module_name, _, class_name = self.class_name.rpartition('.')
+        try:
+            return getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError, ValueError):
+            return None
+
+    def is_instance(self, cls):
+        """
+        Returns True if the job is an instance of cls
+        """
+        job_class = self.job_class()
+        return job_class is not None and issubclass(job_class, cls)
+
+    def json_dict(self):
+        """
+        Returns Job.json_dict() as of the last time the job was saved
+        """
+        return dict(self.info)
+
+    def table_dict(self, model_output_fields):
+        """
+        Returns job_summary() as of the last time the job was saved
+        """
+        model_output_fields.update(self.output_fields)
+        return dict(self.summary)
+
+
+class JobCatalog(object):
+    """
+    Index of the jobs in the jobs directory, stored in an SQLite database
+
+    Holds enough about each job to list it without unpickling its
+    status.pickle. An entry is current if the modification time of the
+    status.pickle file matches the one recorded with the entry
+    """
+    FILENAME = 'jobs.sqlite'
+    # the catalog is built again from the jobs when its version changes
+    VERSION = 2
+    COLUMNS = ('id', 'class', 'status', 'submitted', 'dataset_id', 'mtime',
+               'info', 'summary', 'output_fields', 'details')
+
+    def __init__(self, jobs_dir):
+        self.jobs_dir = jobs_dir
+        self.path = os.path.join(jobs_dir, self.FILENAME)
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            if self._db.execute('PRAGMA user_version').fetchone()[0] != self.VERSION:
+                self._db.execute('DROP TABLE IF EXISTS jobs')
+                self._db.execute('PRAGMA user_version = %d' % self.VERSION)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, class TEXT, status TEXT, submitted REAL, dataset_id TEXT, '
+                'mtime REAL, info TEXT, summary TEXT, output_fields TEXT, details TEXT)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS jobs_dataset_id ON jobs (dataset_id)')
+            self._db.commit()
+        return self._db
+
+    def _entry(self, row):
+        values = dict(zip(self.COLUMNS, row))
+        return CatalogEntry(
+            str(values['id']),
+            values['class'],
+            values['status'],
+            values['submitted'],
+            values['dataset_id'],
+            values['mtime'],
+            json.loads(values['info']),
+            json.loads(values['summary']),
+            json.loads(values['output_fields']),
+            json.loads(values['details']),
+        )
+
+    def _query(self, where='', args=()):
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT %s FROM jobs %s ORDER BY submitted DESC' % (', '.join(self.COLUMNS), where),
+                args).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def get(self, job_id):
+        """
+        Returns the CatalogEntry for a job or None
+        """
+        entries = self._query('WHERE id = ?', (job_id,))
+        return entries[0] if entries else None
+
+    def entries(self, cls=None, dataset_id=None):
+        """
+        Returns CatalogEntries, most recently submitted first
+
+        Keyword arguments:
+        cls -- only jobs of this class
+        dataset_id -- only jobs using this dataset
+        """
+        if dataset_id is not None:
+            entries = self._query('WHERE dataset_id = ?', (dataset_id,))
+        else:
+            entries = self._query()
+        if cls is not None:
+            entries = [e for e in entries if e.is_instance(cls)]
+        return entries
+
+    def mtimes(self):
+        """
+        Returns a dict mapping job ids to (mtime, status)
+        """
+        with self._lock:
+            rows = self._connect().execute('SELECT id, mtime, status FROM jobs').fetchall()
+        return {job_id: (mtime, Status(str(status))) for job_id, mtime, status in rows}
+
+    def entry(self, job):
+        """
+        Returns a CatalogEntry for the current state of a job (without recording it)
+        """
+        return self._entry(self._values(job))
+
+    def update(self, job):
+        """
+        Record the current state of a job which has just been saved
+        """
+        values = self._values(job)
+        with self._lock:
+            db = self._connect()
+            db.execute('INSERT OR REPLACE INTO jobs (%s) VALUES (%s)' % (
+                ', '.join(self.COLUMNS), ', '.join('?' * len(self.COLUMNS))), values)
+            db.commit()
+
+    def _values(self, job):
+        """
+        Returns the row of a job
+        """
+        model_output_fields = set()
+        summary = job_summary(job, model_output_fields)
+        try:
+            mtime = os.path.getmtime(job.path(job.SAVE_FILE))
+        except OSError:
+            mtime = None
+        cls = type(job)
+        return (
+            job.id(),
+            '%s.%s' % (cls.__module__, cls.__name__),
+            job.status.val,
+            job.status_history[0][1] if job.status_history else None,
+            getattr(job, 'dataset_id', None),
+            mtime,
+            json.dumps(job.json_dict(), default=_to_json),
+            json.dumps(summary, default=_to_json),
+            json.dumps(sorted(model_output_fields)),
+            json.dumps(job_details(job), default=_to_json),
+        )
+
+    def remove(self, job_id):
+        """
+        Forget a job
+        """
+        with self._lock:
+            db = self._connect()
+            db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            db.commit()
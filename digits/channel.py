@@ -0,0 +1,141 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+"""
+Structured results sent by task subprocesses to the server
+
+A message is a pickled dict with a "type" key, framed by its length.
+Task.run() creates a FIFO for each task subprocess and passes its path in
+the DIGITS_RESULT_CHANNEL environment variable; the subprocess sends
+metrics, snapshots and tensors through it and logs for humans on stdout.
+
+This module is imported by tool processes and must stay free of
+dependencies on the rest of DIGITS
+"""
+from __future__ import absolute_import
+
+import errno
+import os
+import shutil
+import struct
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# header of a message: length of the pickled payload
+HEADER = struct.Struct('>Q')
+
+ENV_VAR = 'DIGITS_RESULT_CHANNEL'
+
+
+def write_message(f, message):
+    """
+    Write a length-prefixed pickled message to a file object
+    """
+    payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    f.write(HEADER.pack(len(payload)))
+    f.write(payload)
+    f.flush()
+
+
+def read_message(f):
+    """
+    Read a message written by write_message()
+    Raises EOFError if the other end has closed the channel
+    """
+    header = _read_exactly(f, HEADER.size)
+    (size,) = HEADER.unpack(header)
+    return pickle.loads(_read_exactly(f, size))
+
+
+def _read_exactly(f, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(remaining)
+        if not chunk:
+            raise EOFError('channel closed after %d/%d bytes' % (size - remaining, size))
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def is_supported():
+    """
+    Returns True if result channels can be created on this platform
+    """
+    return hasattr(os, 'mkfifo')
+
+
+class MessageReader(object):
+    """
+    The server end of a result channel
+
+    Messages are read without blocking, so the channel can be polled
+    along with the stdout of the subprocess
+    """
+
+    def __init__(self):
+        self._dir = tempfile.mkdtemp(prefix='digits-channel-')
+        self.path = os.path.join(self._dir, 'results')
+        os.mkfifo(self.path, 0o600)
+        self._fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        # keep a writer open, so that the channel does not read as
+        # closed before the subprocess opens it or after it exits
+        self._keepalive = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        self._buf = bytearray()
+
+    def fileno(self):
+        return self._fd
+
+    def read_messages(self):
+        """
+        Returns the complete messages received so far
+        """
+        while True:
+            try:
+                block = os.read(self._fd, 1 << 16)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not block:
+                break
+            self._buf.extend(block)
+
+        messages = []
+        while len(self._buf) >= HEADER.size:
+            (size,) = HEADER.unpack_from(bytes(self._buf[:HEADER.size]))
+            if len(self._buf) < HEADER.size + size:
+                break
+            messages.append(pickle.loads(bytes(self._buf[HEADER.size:HEADER.size + size])))
+            del self._buf[:HEADER.size + size]
+        return messages
+
+    def close(self):
+        os.close(self._keepalive)
+        os.close(self._fd)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+# the client end of the channel of this process
+# (None until opened, False if there is none)
+_writer = None
+
+
+def send(message_type, **fields):
+    """
+    Send a message to the server through the result channel of this process
+
+    Returns False if the process was not started with a result channel
+    """
+    global _writer
+    if _writer is None:
+        path = os.environ.get(ENV_VAR)
+        _writer = open(path, 'wb') if path else False
+    if _writer is False:
+        return False
+    fields['type'] = message_type
+    write_message(_writer, fields)
+    return True
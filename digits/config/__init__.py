@@ -7,8 +7,13 @@ option_list = {}
 from . import (  # noqa
     caffe,
     gpu_list,
+    image_store,
+    job_priority,
     jobs_dir,
+    listing_manifests,
     log_file,
+    model_server,
+    resources,
     torch,
     server_name,
     store_option,
@@ -2,7 +2,10 @@
 from __future__ import absolute_import
 
 from . import option_list
+from . import model_server  # noqa
 import digits.device_query
 
 
-option_list['gpu_list'] = ','.join([str(x) for x in xrange(len(digits.device_query.get_devices()))])
+# the GPUs of the model server keep networks loaded, they are not available to jobs
+option_list['gpu_list'] = ','.join([str(x) for x in xrange(len(digits.device_query.get_devices()))
+                                    if x not in option_list['model_server']['gpus']])
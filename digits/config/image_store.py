@@ -0,0 +1,26 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import tempfile
+
+from . import option_list
+from .model_server import load_int
+
+
+if 'DIGITS_MODE_TEST' in os.environ:
+    value = tempfile.mkdtemp()
+elif 'DIGITS_IMAGE_STORE_DIR' in os.environ:
+    value = os.environ['DIGITS_IMAGE_STORE_DIR']
+else:
+    value = os.path.join(tempfile.gettempdir(), 'digits-images')
+
+
+option_list['image_store'] = {
+    # where the images shown in result pages are saved
+    'dir': os.path.abspath(value),
+    # size limit of the directory, in megabytes
+    'size': load_int('DIGITS_IMAGE_STORE_SIZE', 1024),
+    # size limit of the images waiting to be encoded, in megabytes
+    'pending_size': load_int('DIGITS_IMAGE_STORE_PENDING_SIZE', 64),
+}
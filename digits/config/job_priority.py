@@ -0,0 +1,15 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+
+from . import option_list
+from .model_server import load_int
+
+
+option_list['job_priority'] = {
+    # priorities are clamped to [-max, max]
+    'max': load_int('DIGITS_MAX_JOB_PRIORITY', 100),
+    # the users who can raise a job above the default priority of its type
+    'admins': [name.strip() for name in os.environ.get('DIGITS_ADMINS', '').split(',') if name.strip()],
+}
@@ -0,0 +1,25 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import tempfile
+
+from . import option_list
+from .model_server import load_int
+
+
+if 'DIGITS_MODE_TEST' in os.environ:
+    value = tempfile.mkdtemp()
+elif 'DIGITS_LISTING_MANIFEST_DIR' in os.environ:
+    value = os.environ['DIGITS_LISTING_MANIFEST_DIR']
+else:
+    # hidden, so that it is not loaded as a job
+    value = os.path.join(option_list['jobs_dir'], '.listings')
+
+
+option_list['listing_manifests'] = {
+    # where the listings of the folders (and S3 paths) parsed into datasets are saved
+    'dir': os.path.abspath(value),
+    # how many seconds a listing of an S3 path is reused (S3 paths have no mtime)
+    's3_max_age': load_int('DIGITS_LISTING_MANIFEST_S3_MAX_AGE', 3600),
+}
@@ -0,0 +1,51 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+
+from . import option_list
+
+
+def load_int(envvar, default):
+    """
+    Read a non-negative integer from an environment variable
+    """
+    value = os.environ.get(envvar, default)
+    try:
+        value = int(value)
+        if value < 0:
+            raise ValueError
+    except ValueError:
+        print '"%s" is not a valid value for %s.' % (value, envvar)
+        raise
+    return value
+
+
+def load_gpus(envvar):
+    """
+    Read a comma-separated list of GPU indices from an environment variable
+    """
+    value = os.environ.get(envvar, '')
+    try:
+        gpus = [int(gpu) for gpu in value.split(',') if gpu.strip()]
+        if any(gpu < 0 for gpu in gpus):
+            raise ValueError
+    except ValueError:
+        print '"%s" is not a valid value for %s.' % (value, envvar)
+        raise
+    return gpus
+
+
+option_list['model_server'] = {
+    # number of resident inference worker processes (0 disables the model server)
+    'workers': load_int('DIGITS_MODEL_SERVER_WORKERS', 1),
+    # how many networks each worker keeps loaded
+    'models_per_worker': load_int('DIGITS_MODEL_SERVER_MODELS_PER_WORKER', 2),
+    # the GPUs dedicated to the workers (none runs them on the CPU), which
+    # are left out of gpu_list so that no job is scheduled on them
+    'gpus': load_gpus('DIGITS_MODEL_SERVER_GPUS'),
+    # how long (in milliseconds) to collect concurrent requests for a network into one batch
+    'batch_window': load_int('DIGITS_MODEL_SERVER_BATCH_WINDOW', 5),
+    # how many megabytes of Tensorflow weights each worker keeps loaded
+    'session_memory': load_int('DIGITS_MODEL_SERVER_SESSION_MEMORY', 2048),
+}
@@ -0,0 +1,29 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import multiprocessing
+import os
+
+from . import option_list
+from .model_server import load_int
+
+
+def physical_memory():
+    """
+    Returns the physical memory of the host in megabytes (0 if unknown)
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') >> 20
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+
+option_list['resources'] = {
+    # CPU cores shared by the dataset and inference tasks
+    'cpus': load_int('DIGITS_CPU_BUDGET', multiprocessing.cpu_count()),
+    # megabytes of memory shared by the dataset and inference tasks
+    # (defaults to 3/4 of the physical memory, 0 for no limit)
+    'memory': load_int('DIGITS_MEMORY_BUDGET', physical_memory() * 3 // 4),
+    # how many tasks can read or write datasets at the same time
+    'io': load_int('DIGITS_IO_SLOTS', 4),
+}
@@ -1,6 +1,7 @@
 # Copyright (c) 2016-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+import itertools
 import os
 # Find the best implementation available
 try:
@@ -17,10 +18,10 @@ import PIL.Image
 
 from .forms import GenericDatasetForm
 from .job import GenericDatasetJob
-from digits import extensions, utils
+from digits import extensions, image_store, utils
 from digits.utils.constants import COLOR_PALETTE_ATTRIBUTE
 from digits.utils.routing import request_wants_json, job_from_request
-from digits.utils.lmdbreader import DbReader
+from digits.utils.lmdbreader import DbReader, get_index
 from digits.webapp import scheduler
 
 blueprint = flask.Blueprint(__name__, __name__)
@@ -166,35 +167,33 @@ def explore():
     size = int(flask.request.args.get('size', 25))
 
     reader = DbReader(db_path)
-    count = 0
+    index = get_index(reader)
     imgs = []
 
     min_page = max(0, page - 5)
-    total_entries = reader.total_entries
+    total_entries = index.count()
 
     max_page = min((total_entries - 1) / size, page + 5)
     pages = range(min_page, max_page + 1)
-    for key, value in reader.entries():
-        if count >= page * size:
-            datum = caffe_pb2.Datum()
-            datum.ParseFromString(value)
-            if not datum.encoded:
-                raise RuntimeError("Expected encoded database")
-            s = StringIO()
-            s.write(datum.data)
-            s.seek(0)
-            img = PIL.Image.open(s)
-            if cmap and img.mode in ['L', '1']:
-                data = np.array(img)
-                data = cmap.to_rgba(data) * 255
-                data = data.astype('uint8')
-                # keep RGB values only, remove alpha channel
-                data = data[:, :, 0:3]
-                img = PIL.Image.fromarray(data)
-            imgs.append({"label": None, "b64": utils.image.embed_image_html(img)})
-        count += 1
-        if len(imgs) >= size:
-            break
+    keys = index.page_keys(page, size)
+    entries = itertools.islice(reader.entries(start_key=keys[0]), len(keys)) if keys else []
+    for key, value in entries:
+        datum = caffe_pb2.Datum()
+        datum.ParseFromString(value)
+        if not datum.encoded:
+            raise RuntimeError("Expected encoded database")
+        s = StringIO()
+        s.write(datum.data)
+        s.seek(0)
+        img = PIL.Image.open(s)
+        if cmap and img.mode in ['L', '1']:
+            data = np.array(img)
+            data = cmap.to_rgba(data) * 255
+            data = data.astype('uint8')
+            # keep RGB values only, remove alpha channel
+            data = data[:, :, 0:3]
+            img = PIL.Image.fromarray(data)
+        imgs.append({"label": None, "b64": image_store.image_url(img)})
 
     return flask.render_template(
         'datasets/images/explore.html',
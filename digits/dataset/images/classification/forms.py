@@ -20,7 +20,8 @@ class ImageClassificationDatasetForm(ImageDatasetForm):
     backend = wtforms.SelectField('DB backend',
                                   choices=[
                                       ('lmdb', 'LMDB'),
-                                      ('hdf5', 'HDF5')
+                                      ('hdf5', 'HDF5'),
+                                      ('raw', 'Raw (memory-mapped)'),
                                   ],
                                   default='lmdb',
                                   )
@@ -32,6 +33,9 @@ class ImageClassificationDatasetForm(ImageDatasetForm):
             form.compression.data = 'none'
         elif field.data == 'hdf5':
             form.encoding.data = 'none'
+        elif field.data == 'raw':
+            form.encoding.data = 'none'
+            form.compression.data = 'none'
 
     compression = utils.forms.SelectField(
         'DB compression',
@@ -504,6 +504,15 @@ class TestCreated(BaseViewsTestWithDataset, test_utils.DatasetMixin):
         for task in content['CreateDbTasks']:
             assert task['backend'] == self.BACKEND
 
+    def test_show(self):
+        rv = self.app.get('/datasets/%s' % self.dataset_id)
+        assert rv.status_code == 200, 'page load failed with %s' % rv.status_code
+        if self.BACKEND != 'hdf5':
+            assert '/datasets/images/classification/explore?' in rv.data, 'explore link not found'
+        rv = self.app.get('/datasets/images/classification/explore?job_id=%s&db=train' % self.dataset_id)
+        assert rv.status_code == (500 if self.BACKEND == 'hdf5' else 200), \
+            'page load failed with %s' % rv.status_code
+
     def test_explore_train(self):
         rv = self.app.get('/datasets/images/classification/explore?job_id=%s&db=train' % self.dataset_id)
         if self.BACKEND == 'hdf5':
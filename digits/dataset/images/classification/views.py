@@ -1,7 +1,9 @@
 # Copyright (c) 2014-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+import itertools
 import os
+import re
 import shutil
 
 # Find the best implementation available
@@ -12,14 +14,16 @@ except ImportError:
 
 import caffe_pb2
 import flask
+import numpy as np
 import PIL.Image
 
 from .forms import ImageClassificationDatasetForm
 from .job import ImageClassificationDatasetJob
-from digits import utils
+from digits import image_store, utils
 from digits.dataset import tasks
+from digits.rawdb import RawDbReader
 from digits.utils.forms import fill_form_if_cloned, save_form_to_job
-from digits.utils.lmdbreader import DbReader
+from digits.utils.lmdbreader import DbReader, get_index
 from digits.utils.routing import request_wants_json, job_from_request
 from digits.webapp import scheduler
 
@@ -449,6 +453,19 @@ def summary(job):
                                  dataset=job)
 
 
+def _entry_label(key, reader):
+    """
+    Returns the label of an entry in a classification DB
+    Read from the key when possible (see tools/create_db.py)
+    """
+    match = re.match(r'\d+_(\d+)$', key)
+    if match:
+        return int(match.group(1))
+    datum = caffe_pb2.Datum()
+    datum.ParseFromString(reader.entry(key))
+    return datum.label
+
+
 @blueprint.route('/explore', methods=['GET'])
 def explore():
     """
@@ -467,8 +484,8 @@ def explore():
         raise ValueError('No create_db task for {0}'.format(db))
     if task.status != 'D':
         raise ValueError("This create_db task's status should be 'D' but is '{0}'".format(task.status))
-    if task.backend != 'lmdb':
-        raise ValueError("Backend is {0} while expected backend is lmdb".format(task.backend))
+    if task.backend not in ('lmdb', 'raw'):
+        raise ValueError("Backend is {0} while expected backend is lmdb or raw".format(task.backend))
     db_path = job.path(task.db_name)
     labels = task.get_labels()
 
@@ -482,59 +499,77 @@ def explore():
         except ValueError:
             label = None
 
-    reader = DbReader(db_path)
-    count = 0
-    imgs = []
-
-    min_page = max(0, page - 5)
-    if label is None:
-        total_entries = reader.total_entries
+    if task.backend == 'raw':
+        total_entries, imgs = _explore_raw(db_path, labels, page, size, label)
     else:
-        # After PR#1500, task.distribution[str(label)] is a dictionary
-        # with keys = 'count' and 'error_count'
-        label_entries = task.distribution[str(label)]
-        if isinstance(label_entries, dict):
-            total_entries = label_entries['count']
-        else:
-            total_entries = label_entries
+        total_entries, imgs = _explore_lmdb(db_path, labels, page, size, label)
 
+    min_page = max(0, page - 5)
     max_page = min((total_entries - 1) / size, page + 5)
     pages = range(min_page, max_page + 1)
-    for key, value in reader.entries():
-        if count >= page * size:
-            datum = caffe_pb2.Datum()
-            datum.ParseFromString(value)
-            if label is None or datum.label == label:
-                if datum.encoded:
-                    s = StringIO()
-                    s.write(datum.data)
-                    s.seek(0)
-                    img = PIL.Image.open(s)
-                else:
-                    import caffe.io
-                    arr = caffe.io.datum_to_array(datum)
-                    # CHW -> HWC
-                    arr = arr.transpose((1, 2, 0))
-                    if arr.shape[2] == 1:
-                        # HWC -> HW
-                        arr = arr[:, :, 0]
-                    elif arr.shape[2] == 3:
-                        # BGR -> RGB
-                        # XXX see issue #59
-                        arr = arr[:, :, [2, 1, 0]]
-                    img = PIL.Image.fromarray(arr)
-                imgs.append({"label": labels[datum.label], "b64": utils.image.embed_image_html(img)})
-        if label is None:
-            count += 1
-        else:
-            datum = caffe_pb2.Datum()
-            datum.ParseFromString(value)
-            if datum.label == int(label):
-                count += 1
-        if len(imgs) >= size:
-            break
 
     return flask.render_template(
         'datasets/images/explore.html',
         page=page, size=size, job=job, imgs=imgs, labels=labels,
         pages=pages, label=label, total_entries=total_entries, db=db)
+
+
+def _explore_lmdb(db_path, labels, page, size, label):
+    """
+    Returns the number of entries with the given label (all entries if
+    None) and the images of one page of an LMDB database
+    """
+    reader = DbReader(db_path)
+    index = get_index(reader, label_fn=_entry_label)
+    imgs = []
+
+    total_entries = index.count(label)
+    keys = index.page_keys(page, size, label)
+    if label is None and keys:
+        # the page is contiguous - seek to it and read it sequentially
+        entries = itertools.islice(reader.entries(start_key=keys[0]), len(keys))
+    else:
+        entries = ((key, reader.entry(key)) for key in keys)
+    for key, value in entries:
+        datum = caffe_pb2.Datum()
+        datum.ParseFromString(value)
+        if datum.encoded:
+            s = StringIO()
+            s.write(datum.data)
+            s.seek(0)
+            img = PIL.Image.open(s)
+        else:
+            import caffe.io
+            arr = caffe.io.datum_to_array(datum)
+            # CHW -> HWC
+            arr = arr.transpose((1, 2, 0))
+            if arr.shape[2] == 1:
+                # HWC -> HW
+                arr = arr[:, :, 0]
+            elif arr.shape[2] == 3:
+                # BGR -> RGB
+                # XXX see issue #59
+                arr = arr[:, :, [2, 1, 0]]
+            img = PIL.Image.fromarray(arr)
+        imgs.append({"label": labels[datum.label], "b64": image_store.image_url(img, lossless=False)})
+    return total_entries, imgs
+
+
+def _explore_raw(db_path, labels, page, size, label):
+    """
+    Returns the number of entries with the given label (all entries if
+    None) and the images of one page of a raw database
+    """
+    reader = RawDbReader(db_path)
+    if label is None:
+        indices = np.arange(page * size, min((page + 1) * size, reader.count))
+        total_entries = reader.count
+    else:
+        matches = np.flatnonzero(reader.labels == label)
+        indices = matches[page * size:(page + 1) * size]
+        total_entries = len(matches)
+    imgs = []
+    for i in indices:
+        img = PIL.Image.fromarray(reader.get_image(i))
+        imgs.append({"label": labels[reader.labels[i]], "b64": image_store.image_url(img, lossless=False)})
+    return total_entries, imgs
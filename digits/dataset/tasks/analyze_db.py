@@ -1,6 +1,7 @@
 # Copyright (c) 2015-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+import multiprocessing
 import os.path
 import re
 import sys
@@ -8,6 +9,7 @@ import sys
 import digits
 from digits.task import Task
 from digits.utils import subclass, override
+from digits.utils.lmdbreader import DbStats
 
 # NOTE: Increment this every time the pickled object
 PICKLE_VERSION = 1
@@ -66,13 +68,20 @@ class AnalyzeDbTask(Task):
 
     @override
     def offer_resources(self, resources):
-        key = 'analyze_db_task_pool'
-        if key not in resources:
-            return None
-        for resource in resources[key]:
-            if resource.remaining() >= 1:
-                return {key: [(resource.identifier, 1)]}
-        return None
+        # the scan workers get the CPU cores of the task
+        return self.offer_host_resources(resources, 'analyze_db_task_pool',
+                                         max_cpus=multiprocessing.cpu_count() if self.scans_db() else 1,
+                                         memory=128, memory_per_cpu=64, io=1)
+
+    def scans_db(self):
+        """
+        Returns True if the analysis reads every entry of the database
+
+        It reads one entry when it only counts the entries or when create_db
+        saved the stats of the database (if they turn out to be out of date,
+        the database is scanned by a single worker)
+        """
+        return self.force_same_shape and not DbStats.exists(self.database)
 
     @override
     def task_arguments(self, resources, env):
@@ -80,11 +89,15 @@ class AnalyzeDbTask(Task):
             os.path.dirname(os.path.abspath(digits.__file__)),
             'tools', 'analyze_db.py'),
             self.database,
+            # skip the scan of databases created by DIGITS
+            '--use-writer-stats',
         ]
         if self.force_same_shape:
             args.append('--force-same-shape')
         else:
             args.append('--only-count')
+        if self.allocated_cpus(resources):
+            args.append('--workers=%d' % self.allocated_cpus(resources))
 
         return args
 
@@ -1,6 +1,7 @@
 # Copyright (c) 2014-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+import multiprocessing
 import os.path
 import re
 import sys
@@ -23,7 +24,7 @@ class CreateDbTask(Task):
         Arguments:
         input_file -- read images and labels from this file
         db_name -- save database to this location
-        backend -- database backend (lmdb/hdf5)
+        backend -- database backend (lmdb/hdf5/tfrecords/raw)
         image_dims -- (height, width, channels)
 
         Keyword Arguments:
@@ -137,13 +138,10 @@ class CreateDbTask(Task):
 
     @override
     def offer_resources(self, resources):
-        key = 'create_db_task_pool'
-        if key not in resources:
-            return None
-        for resource in resources[key]:
-            if resource.remaining() >= 1:
-                return {key: [(resource.identifier, 1)]}
-        return None
+        # the load workers get the CPU cores of the task
+        return self.offer_host_resources(resources, 'create_db_task_pool',
+                                         max_cpus=multiprocessing.cpu_count(),
+                                         memory=256, memory_per_cpu=256, io=1)
 
     @override
     def task_arguments(self, resources, env):
@@ -175,6 +173,8 @@ class CreateDbTask(Task):
             args.append('--hdf5_dset_limit=%d' % 2**31)
         if self.delete_files:
             args.append('--delete_files')
+        if self.allocated_cpus(resources):
+            args.append('--workers=%d' % self.allocated_cpus(resources))
 
         return args
 
@@ -242,7 +242,7 @@ class CreateDbTask(Task):
         super(CreateDbTask, self).after_run()
         self.create_db_log.close()
 
-        if self.backend == 'lmdb':
+        if self.backend in ('lmdb', 'raw'):
             socketio.emit('task update',
                           {
                               'task': self.html_id(),
@@ -146,16 +146,8 @@ class CreateGenericDbTask(Task):
 
     @override
     def offer_resources(self, resources):
-        reserved_resources = {}
-        # we need one CPU resource from create_db_task_pool
-        cpu_key = 'create_db_task_pool'
-        if cpu_key not in resources:
-            return None
-        for resource in resources[cpu_key]:
-            if resource.remaining() >= 1:
-                reserved_resources[cpu_key] = [(resource.identifier, 1)]
-                return reserved_resources
-        return None
+        # the extension may load whole datasets in memory
+        return self.offer_host_resources(resources, 'create_db_task_pool', memory=1024, io=1)
 
     @override
     def task_arguments(self, resources, env):
@@ -9,6 +9,7 @@ import digits
 from digits import utils
 from digits.task import Task
 from digits.utils import subclass, override
+from digits.utils.listing import manifest_path
 
 # NOTE: Increment this every time the pickled object
 PICKLE_VERSION = 1
@@ -107,13 +108,7 @@ class ParseFolderTask(Task):
 
     @override
     def offer_resources(self, resources):
-        key = 'parse_folder_task_pool'
-        if key not in resources:
-            return None
-        for resource in resources[key]:
-            if resource.remaining() >= 1:
-                return {key: [(resource.identifier, 1)]}
-        return None
+        return self.offer_host_resources(resources, 'parse_folder_task_pool', memory=256, io=1)
 
     @override
     def task_arguments(self, resources, env):
@@ -135,6 +130,9 @@ class ParseFolderTask(Task):
             args.append('--percent_test=%s' % self.percent_test)
         if self.max_per_category is not None:
             args.append('--max=%s' % self.max_per_category)
+        if not utils.is_url(self.folder):
+            args.append('--manifest=%s' % manifest_path(
+                digits.config.config_value('listing_manifests')['dir'], os.path.abspath(self.folder)))
 
         return args
 
@@ -9,6 +9,7 @@ import digits
 from digits import utils
 from digits.task import Task
 from digits.utils import subclass, override
+from digits.utils.listing import manifest_path
 
 # NOTE: Increment this every time the pickled object
 PICKLE_VERSION = 1
@@ -115,13 +116,7 @@ class ParseS3Task(Task):
 
     @override
     def offer_resources(self, resources):
-        key = 'parse_folder_task_pool'
-        if key not in resources:
-            return None
-        for resource in resources[key]:
-            if resource.remaining() >= 1:
-                return {key: [(resource.identifier, 1)]}
-        return None
+        return self.offer_host_resources(resources, 'parse_folder_task_pool', memory=256)
 
     @override
     def task_arguments(self, resources, env):
@@ -147,6 +142,10 @@ class ParseS3Task(Task):
             args.append('--percent_test=%s' % self.percent_test)
         if self.max_per_category is not None:
             args.append('--max=%s' % self.max_per_category)
+        manifests = digits.config.config_value('listing_manifests')
+        args.append('--manifest=%s' % manifest_path(
+            manifests['dir'], '%s/%s/%s' % (self.s3_endpoint_url, self.s3_bucket, self.s3_path)))
+        args.append('--manifest_max_age=%d' % manifests['s3_max_age'])
 
         return args
 
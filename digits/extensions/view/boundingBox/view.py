@@ -4,7 +4,7 @@ from __future__ import absolute_import
 import os
 import PIL.Image
 
-import digits
+from digits import image_store
 from digits.utils import subclass, override
 from .forms import ConfigForm
 from ..interface import VisualizationInterface
@@ -119,7 +119,7 @@ class Visualization(VisualizationInterface):
             # last number is confidence
             bboxes[key] = [list(o) for o in outputs if o[-1] > 0]
             self.bbox_count += len(bboxes[key])
-        image_html = digits.utils.image.embed_image_html(image)
+        image_html = image_store.image_url(image, lossless=False)
 
         return {
             'image': image_html,
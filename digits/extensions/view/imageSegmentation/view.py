@@ -10,7 +10,7 @@ import numpy as np
 import PIL.Image
 import skfmm
 
-import digits
+from digits import image_store
 from digits.utils import subclass, override
 from digits.utils.constants import COLOR_PALETTE_ATTRIBUTE
 from .forms import ConfigForm
@@ -163,11 +163,11 @@ class Visualization(VisualizationInterface):
         """
         return self.view_template, {
             'input_id': data['input_id'],
-            'input_image': digits.utils.image.embed_image_html(data['input_image']),
-            'fill_image': digits.utils.image.embed_image_html(data['fill_image']),
-            'line_image': digits.utils.image.embed_image_html(data['line_image']),
-            'seg_image': digits.utils.image.embed_image_html(data['seg_image']),
-            'mask_image': digits.utils.image.embed_image_html(data['mask_image']),
+            'input_image': image_store.image_url(data['input_image']),
+            'fill_image': image_store.image_url(data['fill_image']),
+            'line_image': image_store.image_url(data['line_image']),
+            'seg_image': image_store.image_url(data['seg_image']),
+            'mask_image': image_store.image_url(data['mask_image']),
             'legend': data['legend'],
             'is_binary': data['is_binary'],
             'class_data': json.dumps(data['class_data'].tolist()),
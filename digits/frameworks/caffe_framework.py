@@ -36,6 +36,7 @@ class CaffeFramework(Framework):
     CAN_SHUFFLE_DATA = False
     SUPPORTS_PYTHON_LAYERS_FILE = True
     SUPPORTS_TIMELINE_TRACING = False
+    SUPPORTS_MODEL_SERVER = True
 
     if config_value('caffe')['flavor'] == 'NVIDIA':
         if parse_version(config_value('caffe')['version']) > parse_version('0.14.0-alpha'):
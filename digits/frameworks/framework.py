@@ -38,6 +38,12 @@ class Framework(object):
         """
         return self.SUPPORTS_TIMELINE_TRACING
 
+    def supports_model_server(self):
+        """
+        return whether inference can be served by the resident model server
+        """
+        return self.SUPPORTS_MODEL_SERVER
+
     def supports_solver_type(self, solver_type):
         """
         return whether framework supports this solver_type
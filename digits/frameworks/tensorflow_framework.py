@@ -31,6 +31,7 @@ class TensorflowFramework(Framework):
     CAN_SHUFFLE_DATA = True
     SUPPORTS_PYTHON_LAYERS_FILE = False
     SUPPORTS_TIMELINE_TRACING = True
+    SUPPORTS_MODEL_SERVER = True
 
     SUPPORTED_SOLVER_TYPES = ['SGD', 'ADADELTA', 'ADAGRAD', 'ADAGRADDA', 'MOMENTUM', 'ADAM', 'FTRL', 'RMSPROP']
 
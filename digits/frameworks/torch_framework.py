@@ -35,6 +35,7 @@ class TorchFramework(Framework):
     CAN_SHUFFLE_DATA = True
     SUPPORTS_PYTHON_LAYERS_FILE = False
     SUPPORTS_TIMELINE_TRACING = False
+    SUPPORTS_MODEL_SERVER = False
 
     SUPPORTED_SOLVER_TYPES = ['SGD', 'NESTEROV', 'ADAGRAD',
                               'RMSPROP', 'ADADELTA', 'ADAM']
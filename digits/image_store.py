@@ -0,0 +1,242 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+"""
+Content-addressed store for the images shown in result pages
+
+Pages reference images by URL (see image_url()) instead of inlining them
+as base64 data URIs. An image is only encoded when a browser first
+requests it, in the threadpool of the gevent hub so that concurrent
+requests are encoded in parallel, and then kept on disk. As the name of an
+image is the hash of its pixels, responses can be cached forever. When the
+images waiting for a request take too much memory, the oldest ones are
+encoded in the threadpool without waiting for a request
+"""
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from cStringIO import StringIO
+
+import gevent
+import numpy as np
+import PIL.Image
+
+from digits.config import config_value
+from digits.log import logger
+
+# name of a stored image: <sha1>.<format>
+NAME_RE = re.compile(r'^[0-9a-f]{40}\.(png|jpeg)$')
+
+MIMETYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+}
+
+# quality of lossy images
+JPEG_QUALITY = 90
+
+
+def _encode(mode, size, data, fmt):
+    """
+    Returns an image encoded in the given format
+    (runs in a thread: only uses its arguments)
+    """
+    image = PIL.Image.frombytes(mode, size, data)
+    s = StringIO()
+    if fmt == 'jpeg':
+        image.save(s, format='JPEG', quality=JPEG_QUALITY)
+    else:
+        image.save(s, format='PNG')
+    return s.getvalue()
+
+
+class ImageStore(object):
+    """
+    Images added to the store are kept in memory until they are requested,
+    then encoded and written to the store directory
+
+    The oldest files are removed when the directory grows over max_bytes
+    """
+
+    def __init__(self, directory, max_bytes, max_pending_bytes=64 << 20):
+        """
+        Arguments:
+        directory -- where to save encoded images
+        max_bytes -- size limit of the directory
+
+        Keyword arguments:
+        max_pending_bytes -- how many bytes of pixels to keep in memory
+            before images are encoded without waiting for a request
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_pending_bytes = max_pending_bytes
+        # name -> (mode, size, pixels, format), oldest first
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+        # the images encoded in the background, name -> (mode, size, pixels, format)
+        self._encoding = {}
+        self._bytes = None
+        self._lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def add(self, image, lossless=True):
+        """
+        Add an image and return its name
+
+        Arguments:
+        image -- a PIL.Image or np.ndarray
+
+        Keyword arguments:
+        lossless -- if False, RGB and grayscale images are saved as JPEG
+        """
+        if isinstance(image, np.ndarray):
+            image = PIL.Image.fromarray(image)
+        elif not isinstance(image, PIL.Image.Image):
+            raise ValueError('image must be a PIL.Image or a np.ndarray')
+        if image.mode == 'P':
+            # tobytes() does not include the palette
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        fmt = 'jpeg' if not lossless and image.mode in ('RGB', 'L') else 'png'
+
+        # a copy of the pixels, in case the array is modified later
+        data = image.tobytes()
+        h = hashlib.sha1('%s %s %s ' % (image.mode, image.size, fmt))
+        h.update(data)
+        name = '%s.%s' % (h.hexdigest(), fmt)
+
+        with self._lock:
+            if name in self._pending or name in self._encoding or os.path.exists(self.path(name)):
+                return name
+            self._pending[name] = (image.mode, image.size, data, fmt)
+            self._pending_bytes += len(data)
+            overflow = []
+            while self._pending_bytes > self.max_pending_bytes:
+                pending_name, args = self._pending.popitem(last=False)
+                self._pending_bytes -= len(args[2])
+                self._encoding[pending_name] = args
+                overflow.append(pending_name)
+        if overflow:
+            # not in the calling greenlet, which is serving a request
+            gevent.get_hub().threadpool.spawn(self._encode_overflow, overflow)
+        return name
+
+    def get(self, name):
+        """
+        Returns the encoded image or None if there is no such image
+        """
+        if not NAME_RE.match(name):
+            return None
+        with self._lock:
+            args = self._pending.get(name) or self._encoding.get(name)
+        if args is not None:
+            data = gevent.get_hub().threadpool.apply(_encode, args)
+            with self._lock:
+                if self._pending.pop(name, None) is not None:
+                    self._pending_bytes -= len(args[2])
+            self._save(name, data)
+            return data
+        try:
+            with open(self.path(name), 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _encode_overflow(self, names):
+        """
+        Encode and save images which were pushed out of the pending images
+        (runs in the threadpool)
+        """
+        for name in names:
+            with self._lock:
+                args = self._encoding.get(name)
+            self._save(name, _encode(*args))
+            with self._lock:
+                del self._encoding[name]
+
+    def _save(self, name, data):
+        """
+        Write an encoded image to the store directory
+        """
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(temp_path, self.path(name))
+        except (IOError, OSError) as e:
+            logger.warning('Could not save image %s: %s' % (name, e))
+            return
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._files())
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._prune()
+
+    def _files(self):
+        """
+        Returns (mtime, size, path) of the stored images
+        """
+        files = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _prune(self):
+        """
+        Remove the oldest images until the store is down to 3/4 of max_bytes
+        """
+        files = sorted(self._files())
+        self._bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self._bytes <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+                self._bytes -= size
+            except OSError:
+                pass
+
+
+_store = None
+
+
+def get_store():
+    """
+    Returns the ImageStore of the server
+    """
+    global _store
+    if _store is None:
+        _store = ImageStore(config_value('image_store')['dir'],
+                            config_value('image_store')['size'] << 20,
+                            config_value('image_store')['pending_size'] << 20)
+    return _store
+
+
+def image_url(image, lossless=True):
+    """
+    Returns the URL of an image added to the image store
+    (can be used wherever utils.image.embed_image_html() is)
+
+    Arguments:
+    image -- a PIL.Image or np.ndarray (None returns None)
+
+    Keyword arguments:
+    lossless -- if False, the image may be served as JPEG
+    """
+    if image is None:
+        return None
+    return '%s/images/%s' % (config_value('url_prefix'), get_store().add(image, lossless))
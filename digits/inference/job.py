@@ -13,6 +13,9 @@ class InferenceJob(Job):
     A Job that exercises the forward pass of a neural network
     """
 
+    # someone is waiting for the results
+    DEFAULT_PRIORITY = 10
+
     def __init__(self, model, images, epoch, layers, resize=True, **kwargs):
         """
         Arguments:
@@ -0,0 +1,271 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import os
+import platform
+import sys
+import threading
+
+import gevent.event
+import gevent.subprocess
+
+import digits
+from digits.channel import read_message, write_message
+from digits.config import config_value
+from digits.inference.errors import InferenceError
+
+
+class ModelWorker(object):
+    """
+    A resident inference process (tools/inference_worker.py)
+    which keeps up to `capacity` networks loaded
+
+    Requests are served one at a time
+    """
+
+    def __init__(self, gpu=None, capacity=2):
+        """
+        Keyword arguments:
+        gpu -- which GPU the process runs on (None for CPU)
+        capacity -- how many networks the process keeps loaded
+        """
+        self.gpu = gpu
+        self.capacity = capacity
+        # mirror of the LRU cache in the process, least recently used first
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.p = None
+
+    def is_busy(self):
+        return self.lock.locked()
+
+    def is_alive(self):
+        return self.p is not None and self.p.poll() is None
+
+    def start(self):
+        """
+        Start the process
+        """
+        args = [sys.executable,
+                os.path.join(os.path.dirname(os.path.abspath(digits.__file__)), 'tools', 'inference_worker.py'),
+                '--jobs_dir=%s' % config_value('jobs_dir'),
+                '--capacity=%d' % self.capacity,
+                ]
+        if self.gpu is not None:
+            args.append('--gpu=%d' % self.gpu)
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(['.', env.get('PYTHONPATH', '')] + sys.path)
+        self.p = gevent.subprocess.Popen(args,
+                                         stdin=gevent.subprocess.PIPE,
+                                         stdout=gevent.subprocess.PIPE,
+                                         close_fds=False if platform.system() == 'Windows' else True,
+                                         env=env,
+                                         )
+        self.models.clear()
+
+    def stop(self):
+        """
+        Stop the process
+        """
+        if self.is_alive():
+            self.p.kill()
+            self.p.wait()
+        self.p = None
+        self.models.clear()
+
+    def request(self, key, message):
+        """
+        Send a request for the network identified by key and wait for the response
+        Restarts the process if it died
+
+        Raises InferenceError on failure
+        """
+        with self.lock:
+            if not self.is_alive():
+                self.start()
+            try:
+                write_message(self.p.stdin, message)
+                response = read_message(self.p.stdout)
+            except (IOError, EOFError) as e:
+                self.stop()
+                raise InferenceError('Inference worker stopped unexpectedly: %s' % e)
+            self.models.pop(key, None)
+            self.models[key] = True
+            while len(self.models) > self.capacity:
+                self.models.popitem(last=False)
+        if 'error' in response:
+            error = InferenceError(response['error'])
+            error.traceback = response.get('traceback')
+            raise error
+        return response
+
+
+class Batch(object):
+    """
+    Concurrent requests for the same network, sent to a worker as one request
+    """
+
+    def __init__(self, message):
+        """
+        Arguments:
+        message -- the request, without paths
+        """
+        self.message = message
+        self.paths = []
+        self.full = gevent.event.Event()
+        self.response = gevent.event.AsyncResult()
+
+    def add(self, paths):
+        """
+        Returns the (start, stop) range of the paths within the batch
+        """
+        start = len(self.paths)
+        self.paths.extend(paths)
+        return start, len(self.paths)
+
+
+def split_response(response, start, stop):
+    """
+    Returns the part of the response to a Batch for the paths in [start, stop)
+    """
+    indices = [i for i, input_id in enumerate(response['ids']) if start <= input_id < stop]
+    if not indices:
+        raise InferenceError('Unable to load any image')
+    count = len(response['ids'])
+    outputs = OrderedDict()
+    for name, output in response['outputs'].iteritems():
+        if output.ndim > 0 and output.shape[0] == count:
+            outputs[name] = output[indices]
+        else:
+            # not one row per image
+            outputs[name] = output
+    return {
+        'ids': [response['ids'][i] - start for i in indices],
+        'data': [response['data'][i] for i in indices],
+        'outputs': outputs,
+        'visualizations': None,
+    }
+
+
+class ModelServer(object):
+    """
+    Routes inference requests to a pool of ModelWorkers
+
+    A network is identified by (model id, snapshot epoch) and requests are
+    sent to the worker which already has it loaded whenever possible
+
+    Requests for the same network which arrive within batch_window seconds
+    of each other are run as one batch
+    """
+
+    def __init__(self, num_workers, models_per_worker, gpus=None, batch_window=0):
+        """
+        Arguments:
+        num_workers -- how many worker processes to run
+        models_per_worker -- how many networks each worker keeps loaded
+
+        Keyword arguments:
+        gpus -- list of GPU ids to spread the workers over
+        batch_window -- how long to wait for more requests (0 to disable batching)
+        """
+        self.batch_window = batch_window
+        # pending batches by (model id, epoch, resize)
+        self.batches = {}
+        self.workers = []
+        for i in xrange(num_workers):
+            gpu = gpus[i % len(gpus)] if gpus else None
+            self.workers.append(ModelWorker(gpu, models_per_worker))
+
+    def pick_worker(self, key):
+        """
+        Returns the worker to use for the network identified by key
+        """
+        for worker in self.workers:
+            if key in worker.models:
+                return worker
+        # otherwise prefer idle workers and workers with room for another network
+        return min(self.workers, key=lambda w: (w.is_busy(), len(w.models) >= w.capacity, len(w.models)))
+
+    def infer(self, model_id, epoch, images, layers='none', resize=True, batch_size=None):
+        """
+        Perform inference
+
+        Arguments:
+        model_id -- the model job id
+        epoch -- the snapshot epoch
+        images -- list of image paths, or path to a database
+
+        Keyword arguments:
+        layers -- which layers to visualize ("none" or "all")
+        resize -- whether to resize images
+        batch_size -- the batch size of the network, if requests can be batched
+
+        Returns a dict with keys "ids", "data", "outputs" and "visualizations"
+        """
+        key = (model_id, float(epoch))
+        message = {
+            'model_id': model_id,
+            'epoch': float(epoch),
+            'layers': layers,
+            'resize': resize,
+        }
+        if not isinstance(images, list):
+            message['db'] = images
+        elif self.batch_window and batch_size and layers == 'none':
+            return self.infer_batched(key, message, images, batch_size)
+        else:
+            message['paths'] = images
+        return self.pick_worker(key).request(key, message)
+
+    def infer_batched(self, key, message, paths, batch_size):
+        """
+        Add the paths to the pending batch for the network and wait for the results
+
+        The first request of a batch waits for batch_window seconds, or until
+        batch_size images are queued, and then sends the batch to a worker
+        """
+        # no greenlet switch can happen until the paths are added
+        batch_key = key + (message['resize'],)
+        batch = self.batches.get(batch_key)
+        leader = batch is None
+        if leader:
+            batch = self.batches[batch_key] = Batch(message)
+        start, stop = batch.add(paths)
+        if len(batch.paths) >= batch_size:
+            del self.batches[batch_key]
+            batch.full.set()
+
+        if leader:
+            batch.full.wait(self.batch_window)
+            if self.batches.get(batch_key) is batch:
+                del self.batches[batch_key]
+            request = dict(batch.message, paths=batch.paths)
+            try:
+                batch.response.set(self.pick_worker(key).request(key, request))
+            except Exception as e:
+                # the other requests of the batch are waiting for the response
+                batch.response.set_exception(e)
+                raise
+        return split_response(batch.response.get(), start, stop)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+_server = None
+
+
+def get_model_server():
+    """
+    Returns the ModelServer or None if it is disabled
+    """
+    global _server
+    if _server is None:
+        options = config_value('model_server')
+        if options['workers'] == 0:
+            return None
+        _server = ModelServer(options['workers'], options['models_per_worker'], options['gpus'],
+                              batch_window=options['batch_window'] / 1000.0)
+    return _server
@@ -9,10 +9,44 @@ import tempfile
 import re
 import sys
 
+import numpy as np
+
 import digits
+from digits.inference.errors import InferenceError
+from digits.inference.server import get_model_server
+from digits.status import Status
 from digits.task import Task
-from digits.utils import subclass, override
-from digits.utils.image import embed_image_html
+from digits.utils import subclass, override, constants
+from digits.image_store import image_url
+
+
+def format_layer(layer):
+    """
+    Returns the visualization of a layer for the templates
+
+    Arguments:
+    layer -- dict with keys "name", "vis_type", "vis", "data_stats"
+        and optionally "param_count" and "layer_type"
+    """
+    stats = layer['data_stats']
+    visualization = {
+        'name': layer['name'],
+        'vis_type': layer['vis_type'],
+        'data_stats': {
+            'shape': stats['shape'],
+            'mean': stats['mean'],
+            'stddev': stats['stddev'],
+            'histogram': [np.asarray(h).tolist() for h in stats['histogram']],
+        }
+    }
+    if 'param_count' in layer:
+        visualization['param_count'] = layer['param_count']
+    if 'layer_type' in layer:
+        visualization['layer_type'] = layer['layer_type']
+    vis = layer['vis']
+    if vis is not None and vis.shape[0] > 0:
+        visualization['image_html'] = image_url(vis)
+    return visualization
 
 
 @subclass
@@ -133,28 +167,26 @@ class InferenceTask(Task):
             # collect layer data, if applicable
             if 'layers' in db.keys():
                 for layer_id, layer in db['layers'].items():
-                    visualization = {
-                        'id': int(layer_id),
+                    data = {
                         'name': layer.attrs['name'],
                         'vis_type': layer.attrs['vis_type'],
+                        'vis': layer[...],
                         'data_stats': {
                             'shape': layer.attrs['shape'],
                             'mean': layer.attrs['mean'],
                             'stddev': layer.attrs['stddev'],
                             'histogram': [
-                                layer.attrs['histogram_y'].tolist(),
-                                layer.attrs['histogram_x'].tolist(),
-                                layer.attrs['histogram_ticks'].tolist(),
+                                layer.attrs['histogram_y'],
+                                layer.attrs['histogram_x'],
+                                layer.attrs['histogram_ticks'],
                             ]
                         }
                     }
-                    if 'param_count' in layer.attrs:
-                        visualization['param_count'] = layer.attrs['param_count']
-                    if 'layer_type' in layer.attrs:
-                        visualization['layer_type'] = layer.attrs['layer_type']
-                    vis = layer[...]
-                    if vis.shape[0] > 0:
-                        visualization['image_html'] = embed_image_html(vis)
+                    for attr in 'param_count', 'layer_type':
+                        if attr in layer.attrs:
+                            data[attr] = layer.attrs[attr]
+                    visualization = format_layer(data)
+                    visualization['id'] = int(layer_id)
                     visualizations.append(visualization)
                 # sort by layer ID (as HDF5 ASCII sorts)
                 visualizations = sorted(visualizations, key=lambda x: x['id'])
@@ -165,26 +197,87 @@ class InferenceTask(Task):
             self.inference_layers = visualizations
         self.inference_log.close()
 
+    def model_server(self):
+        """
+        Returns the ModelServer if it can serve this task, otherwise None
+        """
+        if not self.model.train_task().snapshots:
+            return None
+        from digits import frameworks
+        fw = frameworks.get_framework_by_id(self.model.train_task().framework_id)
+        if fw is None or not fw.supports_model_server():
+            return None
+        return get_model_server()
+
+    def snapshot_epoch(self):
+        """
+        Returns the epoch of the snapshot to use
+        """
+        if self.epoch is None or self.epoch == -1:
+            return self.model.train_task().snapshots[-1][1]
+        return self.epoch
+
+    @override
+    def run(self, resources):
+        server = self.model_server()
+        if server is None:
+            return super(InferenceTask, self).run(resources)
+
+        # the resident model server skips the subprocess and the HDF5 file
+        self.before_run()
+        self.logger.info('%s task started (model server).' % self.name())
+        self.status = Status.RUN
+        try:
+            result = server.infer(
+                self.model.id(),
+                self.snapshot_epoch(),
+                self.images,
+                layers='all' if self.layers == 'all' else 'none',
+                resize=self.resize,
+                batch_size=self.model.train_task().batch_size or constants.DEFAULT_BATCH_SIZE)
+        except InferenceError as e:
+            self.logger.error('%s task failed: %s' % (self.name(), e.message))
+            self.exception = e.message
+            self.traceback = getattr(e, 'traceback', None)
+            self.after_run()
+            self.status = Status.ERROR
+            return False
+        self.after_run()
+
+        self.inference_inputs = {'ids': np.array(result['ids']), 'data': np.array(result['data'])}
+        self.inference_outputs = result['outputs']
+        self.inference_layers = []
+        for layer_id, layer in enumerate(result['visualizations'] or []):
+            visualization = format_layer(layer)
+            visualization['id'] = layer_id
+            self.inference_layers.append(visualization)
+
+        self.logger.info('%s task completed.' % self.name())
+        self.status = Status.DONE
+        return True
+
     @override
     def offer_resources(self, resources):
-        reserved_resources = {}
-        # we need one CPU resource from inference_task_pool
-        cpu_key = 'inference_task_pool'
-        if cpu_key not in resources:
+        if self.model_server() is not None:
+            # the model server has its own processes and GPUs (which are not
+            # in gpu_list, so the scheduler never hands them out to jobs), and
+            # concurrent requests must be allowed to run so that they can be batched
+            return {}
+        # the image loaders get the CPU cores of the task (as many as
+        # tools/inference.py starts by default) and the network the memory
+        reserved_resources = self.offer_host_resources(resources, 'inference_task_pool',
+                                                       max_cpus=4, memory=2048)
+        if reserved_resources is None:
             return None
-        for resource in resources[cpu_key]:
-            if resource.remaining() >= 1:
-                reserved_resources[cpu_key] = [(resource.identifier, 1)]
-                # we reserve the first available GPU, if there are any
-                gpu_key = 'gpus'
-                if resources[gpu_key]:
-                    for resource in resources[gpu_key]:
-                        if resource.remaining() >= 1:
-                            self.gpu = int(resource.identifier)
-                            reserved_resources[gpu_key] = [(resource.identifier, 1)]
-                            break
-                return reserved_resources
-        return None
+        # we reserve the first available GPU, if there are any
+        gpu_key = 'gpus'
+        if resources[gpu_key]:
+            for resource in resources[gpu_key]:
+                if resource.remaining() >= 1:
+                    self.gpu = int(resource.identifier)
+                    reserved_resources[gpu_key] = [(resource.identifier, 1)]
+                    break
+        return reserved_resources
 
     @override
     def task_arguments(self, resources, env):
@@ -214,4 +307,7 @@ class InferenceTask(Task):
         if not self.resize:
             args.append('--no-resize')
 
+        if self.allocated_cpus(resources):
+            args.append('--workers=%d' % self.allocated_cpus(resources))
+
         return args
@@ -0,0 +1,140 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+from collections import OrderedDict
+from cStringIO import StringIO
+
+import gevent
+import numpy as np
+
+from . import server
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestMessages():
+
+    def test_round_trip(self):
+        f = StringIO()
+        messages = [{'outputs': {'softmax': np.arange(6, dtype=np.float32).reshape((2, 3))}}, 'hello', None]
+        for message in messages:
+            server.write_message(f, message)
+        f.seek(0)
+        assert server.read_message(f) is not None
+        assert server.read_message(f) == 'hello'
+        assert server.read_message(f) is None
+
+    def test_arrays(self):
+        f = StringIO()
+        data = np.random.rand(4, 5).astype(np.float32)
+        server.write_message(f, {'data': data})
+        f.seek(0)
+        assert np.array_equal(server.read_message(f)['data'], data)
+
+    def test_eof(self):
+        f = StringIO()
+        server.write_message(f, 'truncated')
+        f = StringIO(f.getvalue()[:-1])
+        for f in StringIO(''), f:
+            yield self.check_eof, f
+
+    def check_eof(self, f):
+        try:
+            server.read_message(f)
+        except EOFError:
+            pass
+        else:
+            raise AssertionError('expected EOFError')
+
+
+class TestModelServer():
+
+    def test_gpus(self):
+        s = server.ModelServer(3, 2, gpus=[0, 1])
+        assert [w.gpu for w in s.workers] == [0, 1, 0]
+        s = server.ModelServer(2, 2)
+        assert [w.gpu for w in s.workers] == [None, None]
+
+    def test_affinity(self):
+        s = server.ModelServer(2, 2)
+        s.workers[1].models[('model', 1.0)] = True
+        assert s.pick_worker(('model', 1.0)) is s.workers[1]
+        # new networks go to the worker with the most room
+        assert s.pick_worker(('other', 1.0)) is s.workers[0]
+
+    def test_idle(self):
+        s = server.ModelServer(2, 2)
+        with s.workers[0].lock:
+            assert s.pick_worker(('model', 1.0)) is s.workers[1]
+
+
+class FakeWorker(object):
+    """
+    Returns one output row per loaded path (paths named "bad" fail to load)
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def request(self, key, message):
+        self.requests.append(message)
+        ids = [i for i, path in enumerate(message['paths']) if path != 'bad']
+        return {
+            'ids': ids,
+            'data': [np.zeros((2, 2)) for _ in ids],
+            'outputs': OrderedDict([('prob', np.array(ids, dtype=np.float32).reshape((-1, 1))),
+                                    ('loss', np.float32(0.5))]),
+            'visualizations': None,
+        }
+
+
+class TestBatching():
+
+    def setUp(self):
+        self.server = server.ModelServer(1, 2, batch_window=0.05)
+        self.worker = FakeWorker()
+        self.server.pick_worker = lambda key: self.worker
+
+    def infer_all(self, requests, batch_size=64):
+        greenlets = [gevent.spawn(self.server.infer, model_id, 1, paths, batch_size=batch_size)
+                     for model_id, paths in requests]
+        gevent.joinall(greenlets, timeout=5)
+        return greenlets
+
+    def test_merged(self):
+        greenlets = self.infer_all([('a', ['x']), ('a', ['y', 'z']), ('a', ['w'])])
+        assert len(self.worker.requests) == 1
+        assert self.worker.requests[0]['paths'] == ['x', 'y', 'z', 'w']
+        results = [g.value for g in greenlets]
+        assert [r['ids'] for r in results] == [[0], [0, 1], [0]]
+        assert [r['outputs']['prob'].flatten().tolist() for r in results] == [[0], [1, 2], [3]]
+        assert results[0]['outputs']['loss'] == np.float32(0.5)
+
+    def test_models(self):
+        self.infer_all([('a', ['x']), ('b', ['y']), ('a', ['z'])])
+        assert sorted(r['paths'] for r in self.worker.requests) == [['x', 'z'], ['y']]
+
+    def test_batch_size(self):
+        self.infer_all([('a', ['x']), ('a', ['y']), ('a', ['z'])], batch_size=2)
+        assert [r['paths'] for r in self.worker.requests] == [['x', 'y'], ['z']]
+
+    def test_load_error(self):
+        greenlets = self.infer_all([('a', ['bad']), ('a', ['bad', 'y'])])
+        assert isinstance(greenlets[0].exception, server.InferenceError)
+        assert greenlets[1].value['ids'] == [1]
+        assert greenlets[1].value['outputs']['prob'].tolist() == [[2]]
+
+    def test_worker_error(self):
+        def request(key, message):
+            raise OSError('could not start the worker')
+        self.worker.request = request
+        greenlets = self.infer_all([('a', ['x']), ('a', ['y']), ('a', ['z'])])
+        # none of them is left waiting
+        assert all(isinstance(g.exception, OSError) for g in greenlets)
+
+    def test_unbatched(self):
+        self.server.infer('a', 1, ['x'], layers='all', batch_size=64)
+        self.server.infer('a', 1, ['x'])
+        assert [r['paths'] for r in self.worker.requests] == [['x'], ['x']]
@@ -44,13 +44,20 @@ class Job(StatusCls):
                     # can't call this until the job_dir is set
                     task.detect_snapshots()
                     task.detect_timeline_traces()
+                    task.load_outputs()
             return job
 
-    def __init__(self, name, username, group='', persistent=True):
+    # tasks of jobs with a higher priority start first (see Scheduler.schedule_tasks)
+    DEFAULT_PRIORITY = 0
+
+    def __init__(self, name, username, group='', persistent=True, priority=None):
         """
         Arguments:
         name -- name of this job
         username -- creator of this job
+
+        Keyword arguments:
+        priority -- defaults to DEFAULT_PRIORITY
         """
         super(Job, self).__init__()
 
@@ -66,6 +73,7 @@ class Job(StatusCls):
         self._notes = None
         self.event = threading.Event()
         self.persistent = persistent
+        self.priority = self.DEFAULT_PRIORITY if priority is None else priority
 
         os.mkdir(self._dir)
 
@@ -79,6 +87,10 @@ class Job(StatusCls):
             del d['_dir']
         if 'event' in d:
             del d['event']
+        if '_dirty' in d:
+            del d['_dirty']
+        if '_summary' in d:
+            del d['_summary']
 
         return d
 
@@ -90,6 +102,8 @@ class Job(StatusCls):
             state['username'] = None
         if 'group' not in state:
             state['group'] = ''
+        if 'priority' not in state:
+            state['priority'] = self.DEFAULT_PRIORITY
         self.__dict__ = state
         self.persistent = True
 
@@ -105,6 +119,7 @@ class Job(StatusCls):
         if detailed:
             d.update({
                 'directory': self.dir(),
+                'priority': self.priority,
             })
         return d
 
@@ -218,6 +233,14 @@ class Job(StatusCls):
         else:
             return 0
 
+    def summary_key(self):
+        """
+        Returns a value which changes whenever the home page summary of the
+        job may change, other than its elapsed time (see catalog.job_summary)
+        """
+        return (self._name, self.group, len(self.status_history),
+                tuple(task.summary_key() for task in self.tasks))
+
     def on_status_update(self):
         """
         Called when StatusCls.status.setter is used
@@ -252,6 +275,10 @@ class Job(StatusCls):
                 # release threads that are waiting for job to complete
                 self.event.set()
 
+        # let the scheduler act on the change right away
+        from digits.webapp import scheduler
+        scheduler.job_changed(self)
+
     def abort(self):
         """
         Abort a job and stop all running tasks
@@ -261,6 +288,12 @@ class Job(StatusCls):
         for task in self.tasks:
             task.abort()
 
+    def is_dirty(self):
+        """
+        Returns True if the job or one of its tasks changed since the last save
+        """
+        return super(Job, self).is_dirty() or any(task.is_dirty() for task in self.tasks)
+
     def save(self):
         """
         Saves the job to disk as a pickle file
@@ -270,8 +303,11 @@ class Job(StatusCls):
             # use tmpfile so we don't abort during pickle dump (leading to EOFErrors)
             tmpfile_path = self.path(self.SAVE_FILE + '.tmp')
             with open(tmpfile_path, 'wb') as tmpfile:
-                pickle.dump(self, tmpfile)
+                pickle.dump(self, tmpfile, pickle.HIGHEST_PROTOCOL)
             shutil.move(tmpfile_path, self.path(self.SAVE_FILE))
+            self.mark_clean()
+            for task in self.tasks:
+                task.mark_clean()
             return True
         except KeyboardInterrupt:
             pass
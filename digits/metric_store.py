@@ -0,0 +1,286 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+"""
+Append-only storage of the metrics of a training run
+
+A metric store is a directory with:
+    index.json -- the phase, name, kind and file prefix of each series
+    <prefix>.raw -- the (x, y) points of a series, in the order they were added
+    <prefix>.<level> -- the buckets of level 1, 2, ... of the series
+
+A bucket of level L summarizes FACTOR**L consecutive points with the x of
+its first point and the minimum, maximum and mean of their y values (NaN
+values are left out). Bucket i of level L covers points
+[i * FACTOR**L, (i + 1) * FACTOR**L), so any range of a series is read at
+the resolution which gives at most the requested number of points without
+going through the other points.
+
+This module is imported by tool processes and must stay free of
+dependencies on the rest of DIGITS
+"""
+from __future__ import absolute_import
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+VERSION = 1
+
+# how many buckets (or points) of a level are summarized by a bucket of the next one
+FACTOR = 8
+
+INDEX_FILENAME = 'index.json'
+
+POINT = np.dtype([('x', '<f8'), ('y', '<f8')])
+# count -- how many of the summarized y values are not NaN
+BUCKET = np.dtype([('x', '<f8'), ('min', '<f8'), ('max', '<f8'), ('mean', '<f8'), ('count', '<u8')])
+
+
+def _summarize(records, is_points):
+    """
+    Returns a BUCKET record summarizing points or buckets
+    """
+    bucket = np.zeros(1, dtype=BUCKET)[0]
+    bucket['x'] = records['x'][0]
+    if is_points:
+        y = records['y'][~np.isnan(records['y'])]
+        count = len(y)
+        if count:
+            bucket['min'], bucket['max'], bucket['mean'] = y.min(), y.max(), y.mean()
+    else:
+        valid = records[records['count'] > 0]
+        count = int(valid['count'].sum())
+        if count:
+            bucket['min'] = valid['min'].min()
+            bucket['max'] = valid['max'].max()
+            bucket['mean'] = np.dot(valid['mean'], valid['count']) / count
+    if not count:
+        bucket['min'] = bucket['max'] = bucket['mean'] = np.nan
+    bucket['count'] = count
+    return bucket
+
+
+class Series(object):
+    """
+    The points of one metric and their pyramid of buckets
+
+    Only complete buckets are saved, the last bucket of each level is
+    computed from the end of the level below when it is read
+    """
+
+    def __init__(self, directory, prefix, phase, name, kind):
+        self.directory = directory
+        self.prefix = prefix
+        self.phase = phase
+        self.name = name
+        self.kind = kind
+        self._checked = False
+
+    def path(self, level):
+        return os.path.join(self.directory, '%s.%s' % (self.prefix, 'raw' if level == 0 else level))
+
+    def _count(self, level):
+        """
+        Returns the number of complete records in the file of a level
+        """
+        dtype = POINT if level == 0 else BUCKET
+        try:
+            return os.path.getsize(self.path(level)) // dtype.itemsize
+        except OSError:
+            return 0
+
+    def _map(self, level, start=0):
+        """
+        Returns the records of a level from start on, as a read-only memory map
+        """
+        dtype = POINT if level == 0 else BUCKET
+        count = self._count(level)
+        if count <= start:
+            # empty files cannot be mapped
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path(level), dtype=dtype, mode='r', shape=(count,))[start:]
+
+    def __len__(self):
+        return self._count(0)
+
+    def levels(self):
+        """
+        Returns how many levels have complete buckets
+        """
+        level = 0
+        while self._count(level + 1):
+            level += 1
+        return level
+
+    def append(self, x, y):
+        """
+        Add a point
+        """
+        if not self._checked:
+            self._check()
+        with open(self.path(0), 'ab') as f:
+            np.array([(x, y)], dtype=POINT).tofile(f)
+        level = 0
+        count = len(self)
+        while count % FACTOR == 0:
+            # the last records of the level complete a bucket of the next one
+            bucket = _summarize(self._map(level, count - FACTOR), level == 0)
+            level += 1
+            with open(self.path(level), 'ab') as f:
+                np.array([bucket], dtype=BUCKET).tofile(f)
+            count = self._count(level)
+
+    def _check(self):
+        """
+        Repair the files after an interrupted write: truncated records are
+        dropped, and the buckets are computed again if they do not match
+        the points
+        """
+        level = 0
+        while os.path.exists(self.path(level)):
+            dtype = POINT if level == 0 else BUCKET
+            size = os.path.getsize(self.path(level))
+            if size % dtype.itemsize:
+                with open(self.path(level), 'r+b') as f:
+                    f.truncate(size - size % dtype.itemsize)
+            level += 1
+        if any(self._count(level) // FACTOR != self._count(level + 1) for level in xrange(level)):
+            for level in xrange(1, level):
+                os.remove(self.path(level))
+            points = np.array(self._map(0))
+            buckets = [points]
+            level = 0
+            while len(buckets[-1]) >= FACTOR:
+                complete = len(buckets[-1]) // FACTOR * FACTOR
+                buckets.append(np.array([
+                    _summarize(buckets[-1][start:start + FACTOR], level == 0)
+                    for start in xrange(0, complete, FACTOR)], dtype=BUCKET))
+                level += 1
+                with open(self.path(level), 'wb') as f:
+                    buckets[-1].tofile(f)
+        self._checked = True
+
+    def _partial(self, level):
+        """
+        Returns the incomplete last bucket of a level or None
+        """
+        if level == 0:
+            return None
+        records = self._map(level - 1, self._count(level) * FACTOR)
+        lower = self._partial(level - 1)
+        if lower is not None:
+            records = np.concatenate([records, np.array([lower], dtype=BUCKET)])
+        if len(records) == 0:
+            return None
+        return _summarize(records, level == 1)
+
+    def read(self, start=None, stop=None, max_points=None):
+        """
+        Returns a dict of arrays x, min, max and mean for the points with
+        start <= x <= stop, summarized by buckets if there are more than
+        max_points of them (min, max and mean are the y values otherwise)
+
+        Reads O(number of points returned) records
+        """
+        points = self._map(0)
+        first = np.searchsorted(points['x'], start, 'left') if start is not None else 0
+        last = np.searchsorted(points['x'], stop, 'right') if stop is not None else len(points)
+        count = max(last - first, 0)
+
+        level = 0
+        if max_points is not None and count > max_points:
+            level = min(int(np.ceil(np.log(float(count) / max(max_points, 1)) / np.log(FACTOR))),
+                        self.levels() + 1)
+        if level == 0:
+            selected = np.array(points[first:last])
+            return {
+                'x': selected['x'],
+                'min': selected['y'],
+                'max': selected['y'],
+                'mean': selected['y'],
+            }
+
+        size = FACTOR ** level
+        first_bucket = first // size
+        last_bucket = (last + size - 1) // size
+        buckets = np.array(self._map(level, first_bucket)[:last_bucket - first_bucket])
+        if first_bucket + len(buckets) < last_bucket:
+            partial = self._partial(level)
+            if partial is not None:
+                buckets = np.concatenate([buckets, np.array([partial], dtype=BUCKET)])
+        return {
+            'x': buckets['x'],
+            'min': buckets['min'],
+            'max': buckets['max'],
+            'mean': buckets['mean'],
+        }
+
+
+class MetricStore(object):
+    """
+    The series of metrics of a training run, in the order they were added
+    """
+
+    def __init__(self, directory):
+        """
+        Arguments:
+        directory -- where the series are saved (created with the first point)
+        """
+        self.directory = directory
+        self._series = []
+        path = os.path.join(directory, INDEX_FILENAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                index = json.load(f)
+            if index.get('version') != VERSION:
+                raise ValueError('Unsupported metric store version %s' % index.get('version'))
+            for s in index['series']:
+                self._series.append(Series(directory, s['prefix'], s['phase'], s['name'], s['kind']))
+
+    def series(self, phase=None):
+        """
+        Returns the Series (of a phase), in the order they were added
+        """
+        return [s for s in self._series if phase is None or s.phase == phase]
+
+    def get(self, phase, name):
+        """
+        Returns a Series or None
+        """
+        for s in self._series:
+            if s.phase == phase and s.name == name:
+                return s
+        return None
+
+    def append(self, phase, name, kind, x, y):
+        """
+        Add a point to a series, which is created if needed
+
+        Arguments:
+        phase -- e.g. "train" or "val"
+        name -- name of the metric (e.g. "loss")
+        kind -- the type of metric (e.g. "SoftmaxWithLoss")
+        x -- e.g. the epoch
+        y -- the value (None is saved as NaN)
+        """
+        series = self.get(phase, name)
+        if series is None:
+            series = Series(self.directory, 's%d' % len(self._series), phase, name, kind)
+            self._series.append(series)
+            self._save_index()
+        series.append(x, np.nan if y is None else y)
+
+    def _save_index(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        index = {
+            'version': VERSION,
+            'factor': FACTOR,
+            'series': [{'prefix': s.prefix, 'phase': s.phase, 'name': s.name, 'kind': s.kind}
+                       for s in self._series],
+        }
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.rename(temp_path, os.path.join(self.directory, INDEX_FILENAME))
@@ -12,6 +12,7 @@ import werkzeug.exceptions
 from .forms import ImageClassificationModelForm
 from .job import ImageClassificationModelJob
 from digits import frameworks
+from digits import image_store
 from digits import utils
 from digits.config import config_value
 from digits.dataset import ImageClassificationDatasetJob
@@ -431,7 +432,7 @@ def classify_one():
     image = None
     predictions = []
     if inputs is not None and len(inputs['data']) == 1:
-        image = utils.image.embed_image_html(inputs['data'][0])
+        image = image_store.image_url(inputs['data'][0], lossless=False)
         # convert to class probabilities for viewing
         last_output_name, last_output_data = outputs.items()[-1]
 
@@ -695,9 +696,10 @@ def top_n():
                 result_images.append(images[indices[j][i]])
             results.append((
                 labels[i],
-                utils.image.embed_image_html(
+                image_store.image_url(
                     utils.image.vis_square(np.array(result_images),
-                                           colormap='white')
+                                           colormap='white'),
+                    lossless=False,
                 )
             ))
 
@@ -709,9 +711,9 @@ def top_n():
 
 
 def get_datasets():
-    return [(j.id(), j.name()) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, ImageClassificationDatasetJob) and
-         (j.status.is_running() or j.status == Status.DONE)],
+    return [(e.id(), e.name()) for e in sorted(
+        [e for e in scheduler.get_job_entries(ImageClassificationDatasetJob)
+         if e.status.is_running() or e.status == Status.DONE],
         cmp=lambda x, y: cmp(y.id(), x.id())
     )
     ]
@@ -730,44 +732,33 @@ def get_default_standard_network():
 
 
 def get_previous_networks():
-    return [(j.id(), j.name()) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, ImageClassificationModelJob)],
-        cmp=lambda x, y: cmp(y.id(), x.id())
-    )
-    ]
+    return [(e.id(), e.name()) for e in get_previous_networks_fulldetails()]
 
 
 def get_previous_networks_fulldetails():
-    return [(j) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, ImageClassificationModelJob)],
+    return sorted(
+        scheduler.get_job_entries(ImageClassificationModelJob),
         cmp=lambda x, y: cmp(y.id(), x.id())
     )
-    ]
 
 
 def get_previous_network_snapshots():
     prev_network_snapshots = []
-    for job_id, _ in get_previous_networks():
-        job = scheduler.get_job(job_id)
+    for entry in get_previous_networks_fulldetails():
         e = [(0, 'None')] + [(epoch, 'Epoch #%s' % epoch)
-                             for _, epoch in reversed(job.train_task().snapshots)]
-        if job.train_task().pretrained_model:
+                             for epoch in reversed(entry.details['snapshots'])]
+        if entry.details['pretrained_model']:
             e.insert(0, (-1, 'Previous pretrained model'))
         prev_network_snapshots.append(e)
     return prev_network_snapshots
 
 
 def get_pretrained_networks():
-    return [(j.id(), j.name()) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, PretrainedModelJob)],
-        cmp=lambda x, y: cmp(y.id(), x.id())
-    )
-    ]
+    return [(e.id(), e.name()) for e in get_pretrained_networks_fulldetails()]
 
 
 def get_pretrained_networks_fulldetails():
-    return [(j) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, PretrainedModelJob)],
+    return sorted(
+        scheduler.get_job_entries(PretrainedModelJob),
         cmp=lambda x, y: cmp(y.id(), x.id())
     )
-    ]
@@ -11,7 +11,7 @@ import werkzeug.exceptions
 from .forms import GenericImageModelForm
 from .job import GenericImageModelJob
 from digits.pretrained_model.job import PretrainedModelJob
-from digits import extensions, frameworks, utils
+from digits import extensions, frameworks, image_store, utils
 from digits.config import config_value
 from digits.dataset import GenericDatasetJob, GenericImageDatasetJob
 from digits.inference import ImageInferenceJob
@@ -394,7 +394,7 @@ def infer_one():
         os.remove(image_path)
 
     if inputs is not None and len(inputs['data']) == 1:
-        image = utils.image.embed_image_html(inputs['data'][0])
+        image = image_store.image_url(inputs['data'][0])
         visualizations, header_html, app_begin_html, app_end_html = get_inference_visualizations(
             model_job.dataset,
             inputs,
@@ -776,15 +776,14 @@ def create_inference_db(model_job, data_extension_id):
 
 def get_datasets(extension_id):
     if extension_id:
-        jobs = [j for j in scheduler.jobs.values()
-                if isinstance(j, GenericDatasetJob) and
-                j.extension_id == extension_id and (j.status.is_running() or j.status == Status.DONE)]
+        entries = [e for e in scheduler.get_job_entries(GenericDatasetJob)
+                   if e.details.get('extension_id') == extension_id and
+                   (e.status.is_running() or e.status == Status.DONE)]
     else:
-        jobs = [j for j in scheduler.jobs.values()
-                if (isinstance(j, GenericImageDatasetJob) or isinstance(j, GenericDatasetJob)) and
-                (j.status.is_running() or j.status == Status.DONE)]
-    return [(j.id(), j.name())
-            for j in sorted(jobs, cmp=lambda x, y: cmp(y.id(), x.id()))]
+        entries = [e for e in scheduler.get_job_entries((GenericImageDatasetJob, GenericDatasetJob))
+                   if e.status.is_running() or e.status == Status.DONE]
+    return [(e.id(), e.name())
+            for e in sorted(entries, cmp=lambda x, y: cmp(y.id(), x.id()))]
 
 
 def get_inference_visualizations(dataset, inputs, outputs):
@@ -829,47 +828,36 @@ def get_inference_visualizations(dataset, inputs, outputs):
 
 
 def get_previous_networks():
-    return [(j.id(), j.name()) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, GenericImageModelJob)],
-        cmp=lambda x, y: cmp(y.id(), x.id())
-    )
-    ]
+    return [(e.id(), e.name()) for e in get_previous_networks_fulldetails()]
 
 
 def get_previous_networks_fulldetails():
-    return [(j) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, GenericImageModelJob)],
+    return sorted(
+        scheduler.get_job_entries(GenericImageModelJob),
         cmp=lambda x, y: cmp(y.id(), x.id())
     )
-    ]
 
 
 def get_previous_network_snapshots():
     prev_network_snapshots = []
-    for job_id, _ in get_previous_networks():
-        job = scheduler.get_job(job_id)
+    for entry in get_previous_networks_fulldetails():
         e = [(0, 'None')] + [(epoch, 'Epoch #%s' % epoch)
-                             for _, epoch in reversed(job.train_task().snapshots)]
-        if job.train_task().pretrained_model:
+                             for epoch in reversed(entry.details['snapshots'])]
+        if entry.details['pretrained_model']:
             e.insert(0, (-1, 'Previous pretrained model'))
         prev_network_snapshots.append(e)
     return prev_network_snapshots
 
 
 def get_pretrained_networks():
-    return [(j.id(), j.name()) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, PretrainedModelJob)],
-        cmp=lambda x, y: cmp(y.id(), x.id())
-    )
-    ]
+    return [(e.id(), e.name()) for e in get_pretrained_networks_fulldetails()]
 
 
 def get_pretrained_networks_fulldetails():
-    return [(j) for j in sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, PretrainedModelJob)],
+    return sorted(
+        scheduler.get_job_entries(PretrainedModelJob),
         cmp=lambda x, y: cmp(y.id(), x.id())
     )
-    ]
 
 
 def get_data_extensions():
@@ -2,8 +2,9 @@
 from __future__ import absolute_import
 
 from collections import OrderedDict
-import copy
+import cPickle as pickle
 import math
+from multiprocessing.pool import ThreadPool
 import operator
 import os
 import re
@@ -22,6 +23,7 @@ from digits.config import config_value
 from digits.status import Status
 from digits.utils import subclass, override, constants
 from digits.utils.filesystem import tail
+from digits.utils.stats import layer_statistics
 
 # Must import after importing digit.config
 import caffe
@@ -60,29 +62,68 @@ class DigitsTransformer(caffe.io.Transformer):
         See parent class for details
         """
         if not self.resize:
-            # update target input dimension such that no resize occurs
-            self.inputs[in_] = self.inputs[in_][:2] + data.shape[:2]
-            # do we have a mean?
-            if in_ in self.mean:
-                # resize mean if necessary
-                if self.mean[in_].size > 1:
-                    # we are doing mean image subtraction
-                    if self.mean[in_].size != data.size:
-                        # mean image size is different from data size
-                        # => we need to resize the mean image
-                        transpose = self.transpose.get(in_)
-                        if transpose is not None:
-                            # detranspose
-                            self.mean[in_] = self.mean[in_].transpose(
-                                np.argsort(transpose))
-                        self.mean[in_] = caffe.io.resize_image(
-                            self.mean[in_],
-                            data.shape[:2])
-                        if transpose is not None:
-                            # retranspose
-                            self.mean[in_] = self.mean[in_].transpose(transpose)
+            self.fit_input(in_, data.shape)
         return caffe.io.Transformer.preprocess(self, in_, data)
 
+    def preprocess_batch(self, in_, images):
+        """
+        Preprocess a list of images
+        Same-shaped images which need no resizing are processed as one array
+
+        Returns an np.array of shape (N, C, H, W)
+        """
+        shape = images[0].shape
+        if not self.resize:
+            self.fit_input(in_, shape)
+        if (any(image.shape != shape for image in images) or
+                tuple(shape[:2]) != tuple(self.inputs[in_][2:])):
+            return np.array([self.preprocess(in_, image) for image in images])
+
+        # same steps as caffe.io.Transformer.preprocess(), with a batch axis
+        batch = np.array(images, dtype=np.float32)
+        transpose = self.transpose.get(in_)
+        if transpose is not None:
+            batch = batch.transpose((0,) + tuple(axis + 1 for axis in transpose))
+        channel_swap = self.channel_swap.get(in_)
+        if channel_swap is not None:
+            batch = batch[:, channel_swap, :, :]
+        raw_scale = self.raw_scale.get(in_)
+        if raw_scale is not None:
+            batch *= raw_scale
+        mean = self.mean.get(in_)
+        if mean is not None:
+            batch -= mean
+        input_scale = self.input_scale.get(in_)
+        if input_scale is not None:
+            batch *= input_scale
+        return batch
+
+    def fit_input(self, in_, shape):
+        """
+        Update the target input dimension (and mean image) such that
+        images of this shape are not resized
+        """
+        self.inputs[in_] = self.inputs[in_][:2] + shape[:2]
+        # do we have a mean?
+        if in_ in self.mean:
+            # resize mean if necessary
+            if self.mean[in_].size > 1:
+                # we are doing mean image subtraction
+                if self.mean[in_].size != np.prod(shape):
+                    # mean image size is different from data size
+                    # => we need to resize the mean image
+                    transpose = self.transpose.get(in_)
+                    if transpose is not None:
+                        # detranspose
+                        self.mean[in_] = self.mean[in_].transpose(
+                            np.argsort(transpose))
+                    self.mean[in_] = caffe.io.resize_image(
+                        self.mean[in_],
+                        shape[:2])
+                    if transpose is not None:
+                        # retranspose
+                        self.mean[in_] = self.mean[in_].transpose(transpose)
+
 
 @subclass
 class Error(Exception):
@@ -102,6 +143,8 @@ class CaffeTrainTask(TrainTask):
     """
 
     CAFFE_LOG = 'caffe_output.log'
+    # how many activations are visualized at a time
+    VISUALIZATION_THREADS = 4
 
     @staticmethod
     def upgrade_network(network):
@@ -152,6 +195,8 @@ class CaffeTrainTask(TrainTask):
             del state['_transformer']
         if '_caffe_net' in state:
             del state['_caffe_net']
+        if '_weight_visualizations' in state:
+            del state['_weight_visualizations']
 
         return state
 
@@ -340,6 +385,7 @@ class CaffeTrainTask(TrainTask):
             assert val_data_layer is None, 'cannot specify a test data layer without a train data layer'
 
         dataset_backend = self.dataset.get_backend()
+        assert dataset_backend in ('lmdb', 'hdf5'), 'Caffe does not support %s datasets' % dataset_backend
         has_val_set = self.dataset.get_entry_count(constants.VAL_DB) > 0
 
         if train_data_layer is not None:
@@ -1305,98 +1351,113 @@ class CaffeTrainTask(TrainTask):
     def get_layer_visualizations(self, net, layers='all'):
         """
         Returns visualizations of various layers in the network
+
+        Activations are visualized in a thread pool; weights come from
+        get_weight_visualizations()
         """
         # add visualizations
         visualizations = []
         if layers and layers != 'none':
             if layers == 'all':
+                weights = self.get_weight_visualizations(net)
                 added_activations = []
+                activations = []
                 for layer in self.network.layer:
                     for bottom in layer.bottom:
                         if bottom in net.blobs and bottom not in added_activations:
-                            data = net.blobs[bottom].data[0]
-                            vis = utils.image.get_layer_vis_square(data,
-                                                                   allow_heatmap=bool(bottom != 'data'),
-                                                                   channel_order='BGR')
-                            mean, std, hist = self.get_layer_statistics(data)
-                            visualizations.append(
-                                {
-                                    'name': str(bottom),
-                                    'vis_type': 'Activation',
-                                    'vis': vis,
-                                    'data_stats': {
-                                        'shape': data.shape,
-                                        'mean': mean,
-                                        'stddev': std,
-                                        'histogram': hist,
-                                    },
-                                }
-                            )
+                            activations.append((len(visualizations), bottom, net.blobs[bottom].data[0], {}))
+                            visualizations.append(None)
                             added_activations.append(bottom)
-                    if layer.name in net.params:
-                        data = net.params[layer.name][0].data
-                        if layer.type not in ['InnerProduct']:
-                            vis = utils.image.get_layer_vis_square(data, channel_order='BGR')
-                        else:
-                            vis = None
-                        mean, std, hist = self.get_layer_statistics(data)
-                        params = net.params[layer.name]
-                        weight_count = reduce(operator.mul, params[0].data.shape, 1)
-                        if len(params) > 1:
-                            bias_count = reduce(operator.mul, params[1].data.shape, 1)
-                        else:
-                            bias_count = 0
-                        parameter_count = weight_count + bias_count
-                        visualizations.append(
-                            {
-                                'name': str(layer.name),
-                                'vis_type': 'Weights',
-                                'layer_type': layer.type,
-                                'param_count': parameter_count,
-                                'vis': vis,
-                                'data_stats': {
-                                    'shape': data.shape,
-                                    'mean': mean,
-                                    'stddev': std,
-                                    'histogram': hist,
-                                },
-                            }
-                        )
+                    if layer.name in weights:
+                        visualizations.append(weights[layer.name])
                     for top in layer.top:
                         if top in net.blobs and top not in added_activations:
                             data = net.blobs[top].data[0]
-                            normalize = True
                             # don't normalize softmax layers but scale by 255 to fill image range
                             if layer.type == 'Softmax':
-                                vis = utils.image.get_layer_vis_square(data * 255,
-                                                                       normalize=False,
-                                                                       allow_heatmap=bool(top != 'data'),
-                                                                       channel_order='BGR')
+                                activations.append((len(visualizations), top, data * 255, {'normalize': False}))
                             else:
-                                vis = utils.image.get_layer_vis_square(data,
-                                                                       normalize=normalize,
-                                                                       allow_heatmap=bool(top != 'data'),
-                                                                       channel_order='BGR')
-                            mean, std, hist = self.get_layer_statistics(data)
-                            visualizations.append(
-                                {
-                                    'name': str(top),
-                                    'vis_type': 'Activation',
-                                    'vis': vis,
-                                    'data_stats': {
-                                        'shape': data.shape,
-                                        'mean': mean,
-                                        'stddev': std,
-                                        'histogram': hist,
-                                    },
-                                }
-                            )
+                                activations.append((len(visualizations), top, data, {}))
+                            visualizations.append(None)
                             added_activations.append(top)
+
+                pool = ThreadPool(max(1, min(len(activations), self.VISUALIZATION_THREADS)))
+                try:
+                    for index, visualization in pool.imap_unordered(_activation_visualization, activations):
+                        visualizations[index] = visualization
+                    pool.close()
+                finally:
+                    # stops the threads right away if a visualization failed
+                    pool.terminate()
+                    pool.join()
             else:
                 raise NotImplementedError
 
         return visualizations
 
+    def get_weight_visualizations(self, net):
+        """
+        Returns a dict of the weight visualizations of the loaded snapshot
+        by layer name
+
+        Weights do not change for a snapshot: the visualizations are kept
+        in memory and saved next to the snapshot
+        """
+        snapshot = self.loaded_snapshot_file
+        cached = getattr(self, '_weight_visualizations', None)
+        if cached is not None and cached[0] == snapshot:
+            return cached[1]
+
+        weights = None
+        cache_file = os.path.splitext(snapshot)[0] + '.weights.pickle' if snapshot else None
+        if cache_file and os.path.exists(cache_file) and \
+                os.path.getmtime(cache_file) >= os.path.getmtime(snapshot):
+            try:
+                with open(cache_file, 'rb') as f:
+                    weights = pickle.load(f)
+            except Exception as e:
+                self.logger.warning('Ignoring weight visualizations in %s: %s' % (cache_file, e))
+
+        if weights is None:
+            weights = {}
+            for layer in self.network.layer:
+                if layer.name in net.params:
+                    params = net.params[layer.name]
+                    data = params[0].data
+                    if layer.type not in ['InnerProduct']:
+                        vis = utils.image.get_layer_vis_square(data, channel_order='BGR')
+                    else:
+                        vis = None
+                    mean, std, hist = self.get_layer_statistics(data)
+                    weight_count = reduce(operator.mul, params[0].data.shape, 1)
+                    if len(params) > 1:
+                        bias_count = reduce(operator.mul, params[1].data.shape, 1)
+                    else:
+                        bias_count = 0
+                    parameter_count = weight_count + bias_count
+                    weights[layer.name] = {
+                        'name': str(layer.name),
+                        'vis_type': 'Weights',
+                        'layer_type': layer.type,
+                        'param_count': parameter_count,
+                        'vis': vis,
+                        'data_stats': {
+                            'shape': data.shape,
+                            'mean': mean,
+                            'stddev': std,
+                            'histogram': hist,
+                        },
+                    }
+            if cache_file:
+                try:
+                    with open(cache_file, 'wb') as f:
+                        pickle.dump(weights, f, pickle.HIGHEST_PROTOCOL)
+                except (IOError, OSError) as e:
+                    self.logger.warning('Could not save weight visualizations to %s: %s' % (cache_file, e))
+
+        self._weight_visualizations = (snapshot, weights)
+        return weights
+
     def get_layer_statistics(self, data):
         """
         Returns statistics for the given layer data:
@@ -1406,15 +1467,7 @@ class CaffeTrainTask(TrainTask):
         Arguments:
         data -- a np.ndarray
         """
-        # XXX These calculations can be super slow
-        mean = np.mean(data).astype(np.float32)
-        std = np.std(data).astype(np.float32)
-        y, x = np.histogram(data, bins=20)
-        y = list(y.astype(np.float32))
-        ticks = x[[0, len(x) / 2, -1]]
-        x = [((x[i] + x[i + 1]) / 2.0).astype(np.float32) for i in xrange(len(x) - 1)]
-        ticks = list(ticks.astype(np.float32))
-        return (mean, std, [y, x, ticks])
+        return _float32_statistics(data)
 
     @override
     def infer_many(self,
@@ -1442,45 +1495,44 @@ class CaffeTrainTask(TrainTask):
         snapshot_epoch -- which snapshot to use
         """
         net = self.get_net(snapshot_epoch, gpu=gpu)
+        transformer = self.get_transformer(resize)
 
-        caffe_images = []
-        for image in images:
-            if image.ndim == 2:
-                caffe_images.append(image[:, :, np.newaxis])
-            else:
-                caffe_images.append(image)
-
-        data_shape = tuple(self.get_transformer(resize).inputs['data'])[1:]
-
-        if self.batch_size:
-            data_shape = (self.batch_size,) + data_shape
         # TODO: grab batch_size from the TEST phase in train_val network
-        else:
-            data_shape = (constants.DEFAULT_BATCH_SIZE,) + data_shape
+        batch_size = self.batch_size or constants.DEFAULT_BATCH_SIZE
 
         outputs = None
-        for chunk in [caffe_images[x:x + data_shape[0]] for x in xrange(0, len(caffe_images), data_shape[0])]:
-            new_shape = (len(chunk),) + data_shape[1:]
-            if net.blobs['data'].data.shape != new_shape:
-                net.blobs['data'].reshape(*new_shape)
-            for index, image in enumerate(chunk):
-                net.blobs['data'].data[index] = self.get_transformer(resize).preprocess(
-                    'data', image)
+        # outputs which do not have one row per image, stacked at the end
+        unbatched = OrderedDict()
+        for start in xrange(0, len(images), batch_size):
+            chunk = [image[:, :, np.newaxis] if image.ndim == 2 else image
+                     for image in images[start:start + batch_size]]
+            data = transformer.preprocess_batch('data', chunk)
+            if net.blobs['data'].data.shape != data.shape:
+                net.blobs['data'].reshape(*data.shape)
+            if outputs is None:
+                batched = batched_outputs(net)
+            net.blobs['data'].data[...] = data
             o = net.forward()
 
-            # order output in prototxt order
-            output = OrderedDict()
-            for blob in net.blobs.keys():
-                if blob in o:
-                    output[blob] = o[blob]
-
             if outputs is None:
-                outputs = copy.deepcopy(output)
-            else:
-                for name, blob in output.iteritems():
-                    outputs[name] = np.vstack((outputs[name], blob))
-            print 'Processed %s/%s images' % (len(outputs[outputs.keys()[0]]), len(caffe_images))
+                # order output in prototxt order
+                outputs = OrderedDict()
+                for blob in net.blobs.keys():
+                    if blob in o:
+                        if blob in batched:
+                            outputs[blob] = np.empty((len(images),) + o[blob].shape[1:], dtype=o[blob].dtype)
+                        else:
+                            outputs[blob] = None
+                            unbatched[blob] = []
+            for name in outputs:
+                if name in unbatched:
+                    unbatched[name].append(o[name].copy())
+                else:
+                    outputs[name][start:start + len(chunk)] = o[name]
+            print 'Processed %s/%s images' % (start + len(chunk), len(images))
 
+        for name, blobs in unbatched.iteritems():
+            outputs[name] = np.vstack(blobs)
         return outputs
 
     def has_model(self):
@@ -1660,6 +1712,24 @@ class CaffeTrainTask(TrainTask):
                     )
 
 
+def batched_outputs(net):
+    """
+    Returns the set of the outputs of a caffe.Net which have one row per
+    image, i.e. whose first dimension follows the batch dimension of the
+    data blob (the net is reshaped to find them, then reshaped back)
+    """
+    data_shape = net.blobs['data'].data.shape
+    output_shapes = []
+    for batch_size in data_shape[0] + 1, data_shape[0]:
+        net.blobs['data'].reshape(batch_size, *data_shape[1:])
+        net.reshape()
+        output_shapes.append(dict((name, net.blobs[name].data.shape) for name in net.outputs))
+    return set(name for name in net.outputs
+               if len(output_shapes[1][name]) > 0 and
+               output_shapes[0][name][0] == data_shape[0] + 1 and
+               output_shapes[1][name][0] == data_shape[0])
+
+
 def cleanedUpClassificationNetwork(original_network, num_categories):
     """
     Perform a few cleanup routines on a classification network
@@ -1839,3 +1909,39 @@ def _setLayerRule(layer, rule=None):
     layer.ClearField('exclude')
     if rule is not None:
         layer.include.add().CopyFrom(rule)
+
+
+def _float32_statistics(data):
+    """
+    Returns layer_statistics() as float32 values
+    """
+    mean, std, (y, x, ticks) = layer_statistics(data)
+    return (np.float32(mean), np.float32(std),
+            [list(np.float32(y)), list(np.float32(x)), list(np.float32(ticks))])
+
+
+def _activation_visualization(args):
+    """
+    Returns (index, visualization) for an activation
+    (numpy releases the GIL, so activations can be visualized in threads)
+
+    Arguments:
+    args -- (index, blob name, data, keyword arguments of get_layer_vis_square())
+    """
+    index, name, data, vis_args = args
+    vis = utils.image.get_layer_vis_square(data,
+                                           allow_heatmap=bool(name != 'data'),
+                                           channel_order='BGR',
+                                           **vis_args)
+    mean, std, hist = _float32_statistics(data)
+    return (index, {
+        'name': str(name),
+        'vis_type': 'Activation',
+        'vis': vis,
+        'data_stats': {
+            'shape': data.shape,
+            'mean': mean,
+            'stddev': std,
+            'histogram': hist,
+        },
+    })
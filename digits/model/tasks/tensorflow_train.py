@@ -1,22 +1,28 @@
 # Copyright (c) 2016, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+from collections import OrderedDict
+import math
+import importlib
 import operator
 import os
 import re
-import shutil
 import subprocess
 import tempfile
 import time
 import sys
+import types
 
 import h5py
 import numpy as np
 
 from .train import TrainTask
 import digits
-from digits import utils
+from digits import channel, utils
+from digits.config import config_value
+from digits.utils.session_cache import SessionCache
 from digits.utils import subclass, override, constants
+from digits.utils.stats import layer_statistics
 import tensorflow as tf
 
 # NOTE: Increment this everytime the pickled object changes
@@ -40,6 +46,35 @@ def _float_array_feature(value):
     return tf.train.Feature(float_list=tf.train.FloatList(value=value))
 
 
+def import_tool(name):
+    """
+    Returns the module name of tools/tensorflow (shared with main.py),
+    imported as digits.tools.tensorflow.<name>
+
+    tools/tensorflow has no __init__.py (the package would shadow tensorflow
+    in the scripts of tools/), so its package module is created here
+    """
+    package = 'digits.tools.tensorflow'
+    if package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = [os.path.join(os.path.dirname(os.path.abspath(digits.__file__)), 'tools', 'tensorflow')]
+        sys.modules[package] = module
+    return importlib.import_module('%s.%s' % (package, name))
+
+
+_session_cache = None
+
+
+def get_session_cache():
+    """
+    Returns the cache of inference sessions of this process
+    """
+    global _session_cache
+    if _session_cache is None:
+        _session_cache = SessionCache(config_value('model_server')['session_memory'] << 20)
+    return _session_cache
+
+
 def subprocess_visible_devices(gpus):
     """
     Calculates CUDA_VISIBLE_DEVICES for a subprocess
@@ -334,25 +369,36 @@ class TensorflowTrainTask(TrainTask):
                 self.displaying_network = False
             return True
 
+        if self.result_channel is None:
+            # metrics and snapshots are only parsed from the logs
+            # when they are not sent on the result channel
+            if self.process_output_results(message):
+                return True
+
+        # network display starting
+        if message.startswith('Network definition:'):
+            self.displaying_network = True
+            return True
+
+        if level in ['error', 'critical']:
+            self.logger.error('%s: %s' % (self.name(), message))
+            self.exception = message
+            return True
+
+        # skip remaining info and warn messages
+        return True
+
+    def process_output_results(self, message):
+        """
+        Parse metrics and snapshots from a log message
+        Returns True if the message was recognized
+        """
         # Distinguish between a Validation and Training stage epoch
         pattern_stage_epoch = re.compile(r'(Validation|Training)\ \(\w+\ ([^\ ]+)\)\:\ (.*)')
         for (stage, epoch, kvlist) in re.findall(pattern_stage_epoch, message):
-            epoch = float(epoch)
-            self.send_progress_update(epoch)
             pattern_key_val = re.compile(r'([\w\-_]+)\ =\ ([^,^\ ]+)')
-            # Now iterate through the keys and values on this line dynamically
-            for (key, value) in re.findall(pattern_key_val, kvlist):
-                assert not('Inf' in value or 'NaN' in value), 'Network reported %s for %s.' % (value, key)
-                value = float(value)
-                if key == 'lr':
-                    key = 'learning_rate'  # Convert to special DIGITS key for learning rate
-                if stage == 'Training':
-                    self.save_train_output(key, key, value)
-                elif stage == 'Validation':
-                    self.save_val_output(key, key, value)
-                    self.logger.debug('Network validation %s #%s: %s' % (key, epoch, value))
-                else:
-                    self.logger.error('Unknown stage found other than training or validation: %s' % (stage))
+            values = OrderedDict((key, float(value)) for key, value in re.findall(pattern_key_val, kvlist))
+            self.save_stage_outputs(stage.lower(), float(epoch), values)
             self.logger.debug(message)
             return True
 
@@ -377,18 +423,54 @@ class TensorflowTrainTask(TrainTask):
             self.saving_snapshot = True
             return True
 
-        # network display starting
-        if message.startswith('Network definition:'):
-            self.displaying_network = True
+        return False
+
+    @override
+    def process_message(self, message):
+        if message['type'] == 'metrics':
+            values = OrderedDict()
+            for tag, value in message['values']:
+                # keep the last part of summary tags (as parsed from the logs)
+                match = re.search(r'[\w\-]+$', tag)
+                if match:
+                    values[match.group(0)] = value
+            self.save_stage_outputs(message['stage'], message['epoch'], values)
             return True
 
-        if level in ['error', 'critical']:
-            self.logger.error('%s: %s' % (self.name(), message))
-            self.exception = message
+        if message['type'] == 'timeline':
+            self.logger.info('Timeline trace written to %s' % message['path'])
+            self.detect_timeline_traces()
             return True
 
-        # skip remaining info and warn messages
-        return True
+        if message['type'] == 'snapshot':
+            self.logger.info('Snapshot saved to %s' % message['path'])
+            self.detect_snapshots()
+            self.send_snapshot_update()
+            return True
+
+        return False
+
+    def save_stage_outputs(self, stage, epoch, values):
+        """
+        Save the metrics of a training or validation pass
+
+        Arguments:
+        stage -- "training" or "validation"
+        epoch -- the epoch of the pass
+        values -- an OrderedDict of metric name -> value
+        """
+        self.send_progress_update(epoch)
+        for key, value in values.iteritems():
+            assert not(math.isinf(value) or math.isnan(value)), 'Network reported %s for %s.' % (value, key)
+            if key == 'lr':
+                key = 'learning_rate'  # Convert to special DIGITS key for learning rate
+            if stage == 'training':
+                self.save_train_output(key, key, value)
+            elif stage == 'validation':
+                self.save_val_output(key, key, value)
+                self.logger.debug('Network validation %s #%s: %s' % (key, epoch, value))
+            else:
+                self.logger.error('Unknown stage found other than training or validation: %s' % (stage))
 
     @staticmethod
     def preprocess_output_tensorflow(line):
@@ -525,6 +607,10 @@ class TensorflowTrainTask(TrainTask):
         snapshot_epoch -- which snapshot to use
         layers -- which layer activation[s] and weight[s] to visualize
         """
+        if layers != 'all':
+            # no visualizations: use the resident session
+            return self.infer_many_images([image], snapshot_epoch=snapshot_epoch, gpu=gpu), []
+
         temp_image_handle, temp_image_path = tempfile.mkstemp(suffix='.tfrecords')
         os.close(temp_image_handle)
         if image.ndim < 3:
@@ -590,6 +676,11 @@ class TensorflowTrainTask(TrainTask):
             # make only the selected GPU visible
             env['CUDA_VISIBLE_DEVICES'] = subprocess_visible_devices([gpu])
 
+        # predictions are sent on the result channel
+        result_channel = channel.MessageReader() if channel.is_supported() else None
+        if result_channel is not None:
+            env[channel.ENV_VAR] = result_channel.path
+
         p = subprocess.Popen(args,
                              stdout=subprocess.PIPE,
                              stderr=subprocess.STDOUT,
@@ -604,6 +695,8 @@ class TensorflowTrainTask(TrainTask):
                         p.terminate()
                         raise digits.inference.errors.InferenceError('%s classify one task got aborted. error code - %d' % (self.get_framework_id(), p.returncode))  # noqa
 
+                    self.read_predictions(result_channel, predictions)
+
                     if line is not None and len(line) > 1:
                         if not self.process_test_output(line, predictions, 'one'):
                             self.logger.warning('%s classify one task unrecognized input: %s' % (
@@ -611,6 +704,7 @@ class TensorflowTrainTask(TrainTask):
                             unrecognized_output.append(line)
                     else:
                         time.sleep(0.05)
+            self.read_predictions(result_channel, predictions)
         except Exception as e:
             if p.poll() is None:
                 p.terminate()
@@ -627,6 +721,8 @@ class TensorflowTrainTask(TrainTask):
             raise digits.inference.errors.InferenceError(error_message)
 
         finally:
+            if result_channel is not None:
+                result_channel.close()
             self.after_test_run(temp_image_path)
 
         if p.returncode != 0:
@@ -726,15 +822,7 @@ class TensorflowTrainTask(TrainTask):
         Arguments:
         data -- a np.ndarray
         """
-        # These calculations can be super slow
-        mean = np.mean(data)
-        std = np.std(data)
-        y, x = np.histogram(data, bins=20)
-        y = list(y)
-        ticks = x[[0, len(x)/2, -1]]
-        x = [(x[i]+x[i+1])/2.0 for i in xrange(len(x)-1)]
-        ticks = list(ticks)
-        return (mean, std, [y, x, ticks])
+        return layer_statistics(data)
 
     def after_test_run(self, temp_image_path):
         try:
@@ -742,6 +830,16 @@ class TensorflowTrainTask(TrainTask):
         except OSError:
             pass
 
+    def read_predictions(self, result_channel, predictions):
+        """
+        Add the predictions received on a result channel to predictions
+        """
+        if result_channel is None:
+            return
+        for message in result_channel.read_messages():
+            if message['type'] == 'predictions':
+                predictions.extend(message['predictions'])
+
     def process_test_output(self, line, predictions, test_category):
         # parse torch output
         timestamp, level, message = self.preprocess_output_tensorflow(line)
@@ -801,9 +899,7 @@ class TensorflowTrainTask(TrainTask):
 
     def infer_many_images(self, images, snapshot_epoch=None, gpu=None):
         """
-        Returns (labels, results):
-        labels -- an array of strings
-        results -- a 2D np array:
+        Returns a dict with one key "output" and a np array, with one row for each image:
             [
                 [image0_label0_confidence, image0_label1_confidence, ...],
                 [image1_label0_confidence, image1_label1_confidence, ...],
@@ -816,124 +912,51 @@ class TensorflowTrainTask(TrainTask):
         Keyword arguments:
         snapshot_epoch -- which snapshot to use
         """
+        batch_size = self.batch_size or constants.DEFAULT_BATCH_SIZE
+
+        outputs = None
+        with self.get_session(snapshot_epoch, gpu=gpu) as session:
+            for start in xrange(0, len(images), batch_size):
+                batch = np.array([image[..., np.newaxis] if image.ndim < 3 else image
+                                  for image in images[start:start + batch_size]], dtype=np.float32)
+                output = session.run(batch)
+                if outputs is None:
+                    outputs = np.empty((len(images),) + output.shape[1:], dtype=output.dtype)
+                outputs[start:start + len(batch)] = output
 
-        # create a temporary folder to store images and a temporary file
-        # to store a list of paths to the images
-        temp_dir_path = tempfile.mkdtemp(suffix='.tfrecords')
-        try:  # this try...finally clause is used to clean up the temp directory in any case
-            with open(os.path.join(temp_dir_path, 'list.txt'), 'w') as imglist_file:
-                for image in images:
-                    if image.ndim < 3:
-                        image = image[..., np.newaxis]
-                    image = image.astype('float')
-                    temp_image_handle, temp_image_path = tempfile.mkstemp(dir=temp_dir_path, suffix='.tfrecords')
-                    writer = tf.python_io.TFRecordWriter(temp_image_path)
-                    record = tf.train.Example(features=tf.train.Features(feature={
-                        'height': _int64_feature(image.shape[0]),
-                        'width': _int64_feature(image.shape[1]),
-                        'depth': _int64_feature(image.shape[2]),
-                        'image_raw': _float_array_feature(image.flatten()),
-                        'label': _int64_feature(0),
-                        'encoding': _int64_feature(0)}))
-                    writer.write(record.SerializeToString())
-                    writer.close()
-                    imglist_file.write("%s\n" % temp_image_path)
-                    os.close(temp_image_handle)
-
-            file_to_load = self.get_snapshot(snapshot_epoch)
-
-            args = [sys.executable,
-                    os.path.join(os.path.dirname(os.path.abspath(digits.__file__)), 'tools', 'tensorflow', 'main.py'),
-                    '--testMany=1',
-                    '--allPredictions=1',  # all predictions are grabbed and formatted as required by DIGITS
-                    '--inference_db=%s' % str(temp_dir_path),
-                    '--network=%s' % self.model_file,
-                    '--networkDirectory=%s' % self.job_dir,
-                    '--weights=%s' % file_to_load,
-                    ]
+        # task.infer_one() expects dictionary in return value
+        return {'output': outputs}
 
-            if hasattr(self.dataset, 'labels_file'):
-                args.append('--labels_list=%s' % self.dataset.path(self.dataset.labels_file))
+    def get_session(self, epoch=None, gpu=None):
+        """
+        Context manager which returns the InferenceSession for a snapshot,
+        from the session cache of this process (the session is not closed
+        until the block exits, even if it is evicted meanwhile)
 
+        Keyword Arguments:
+        epoch -- which snapshot to load (default is -1 to load the most recently generated snapshot)
+        """
+        weights_path = self.get_snapshot(epoch)
+
+        def create_session():
+            kwargs = {
+                'croplen': self.crop_size,
+                'subtract_mean': self.use_mean,
+                'gpu': gpu,
+            }
+            if hasattr(self.dataset, 'labels_file'):
+                kwargs['nclasses'] = len(self.get_labels())
             if self.use_mean != 'none':
                 mean_file = self.dataset.get_mean_file()
                 assert mean_file is not None, 'Failed to retrieve mean file.'
-                args.append('--mean=%s' % self.dataset.path(mean_file))
-
-            if self.use_mean == 'pixel':
-                args.append('--subtractMean=pixel')
-            elif self.use_mean == 'image':
-                args.append('--subtractMean=image')
-            else:
-                args.append('--subtractMean=none')
-            if self.crop_size:
-                args.append('--croplen=%d' % self.crop_size)
-
-            # Convert them all to strings
-            args = [str(x) for x in args]
-
-            self.logger.info('%s classify many task started.' % self.name())
-
-            env = os.environ.copy()
-            if gpu is not None:
-                # make only the selected GPU visible
-                env['CUDA_VISIBLE_DEVICES'] = subprocess_visible_devices([gpu])
-
-            unrecognized_output = []
-            predictions = []
-            p = subprocess.Popen(args,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT,
-                                 cwd=self.job_dir,
-                                 close_fds=True,
-                                 env=env)
-
-            try:
-                while p.poll() is None:
-                    for line in utils.nonblocking_readlines(p.stdout):
-                        if self.aborted.is_set():
-                            p.terminate()
-                            raise digits.inference.errors.InferenceError('%s classify many task got aborted.'
-                                                                         'error code - %d' % (self.get_framework_id(),
-                                                                                              p.returncode))
-
-                        if line is not None and len(line) > 1:
-                            if not self.process_test_output(line, predictions, 'many'):
-                                self.logger.warning('%s classify many task unrecognized input: %s' % (
-                                    self.get_framework_id(), line.strip()))
-                                unrecognized_output.append(line)
-                        else:
-                            time.sleep(0.05)
-            except Exception as e:
-                if p.poll() is None:
-                    p.terminate()
-                error_message = ''
-                if type(e) == digits.inference.errors.InferenceError:
-                    error_message = e.__str__()
-                else:
-                    error_message = '%s classify many task failed with error code %d \n %s' % (
-                        self.get_framework_id(), p.returncode, str(e))
-                self.logger.error(error_message)
-                if unrecognized_output:
-                    unrecognized_output = '\n'.join(unrecognized_output)
-                    error_message = error_message + unrecognized_output
-                raise digits.inference.errors.InferenceError(error_message)
-
-            if p.returncode != 0:
-                error_message = '%s classify many task failed with error code %d' % (self.get_framework_id(),
-                                                                                     p.returncode)
-                self.logger.error(error_message)
-                if unrecognized_output:
-                    unrecognized_output = '\n'.join(unrecognized_output)
-                    error_message = error_message + unrecognized_output
-                raise digits.inference.errors.InferenceError(error_message)
-            else:
-                self.logger.info('%s classify many task completed.' % self.get_framework_id())
-        finally:
-            shutil.rmtree(temp_dir_path)
-
-        # task.infer_one() expects dictionary in return value
-        return {'output': np.array(predictions)}
+                kwargs['mean_file'] = self.dataset.path(mean_file)
+            return import_tool('inference_session').InferenceSession(
+                os.path.join(self.job_dir, self.model_file),
+                weights_path,
+                self.dataset.get_feature_dims(),
+                **kwargs)
+
+        return get_session_cache().use((weights_path, gpu), create_session)
 
     def has_model(self):
         """
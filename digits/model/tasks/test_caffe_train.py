@@ -1,6 +1,8 @@
 # Copyright (c) 2014-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+import numpy as np
+
 from digits import test_utils
 
 
@@ -9,3 +11,41 @@ def test_caffe_imports():
 
     import numpy  # noqa
     import google.protobuf  # noqa
+
+
+class FakeBlob(object):
+
+    def __init__(self, shape):
+        self.data = np.zeros(shape)
+
+    def reshape(self, *shape):
+        self.data = np.zeros(shape)
+
+
+class FakeNet(object):
+    """
+    A net with an output per image and an output with as many rows as
+    there are images in the first batch
+    """
+
+    outputs = ['prob', 'summary', 'loss']
+
+    def __init__(self, batch_size):
+        self.blobs = {'data': FakeBlob((batch_size, 3, 4, 4))}
+        self.reshape()
+
+    def reshape(self):
+        self.blobs['prob'] = FakeBlob((self.blobs['data'].data.shape[0], 10))
+        self.blobs['summary'] = FakeBlob((8, 10))
+        self.blobs['loss'] = FakeBlob(())
+
+
+def test_batched_outputs():
+    test_utils.skipIfNotFramework('caffe')
+
+    from . import caffe_train
+
+    net = FakeNet(8)
+    assert caffe_train.batched_outputs(net) == set(['prob'])
+    assert net.blobs['data'].data.shape == (8, 3, 4, 4)
+    assert net.blobs['prob'].data.shape == (8, 10)
@@ -0,0 +1,100 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import shutil
+
+from . import train
+from digits import test_utils
+from digits.job import Job
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestOutputsLog():
+
+    def setUp(self):
+        self.job = Job(name='testsuite-job', username='digits-testsuite')
+        self.task = self.create_task()
+        self.job.tasks.append(self.task)
+        self.save_outputs(self.task)
+
+    def create_task(self):
+        return train.TrainTask(
+            job=self.job,
+            dataset=None,
+            train_epochs=2,
+            snapshot_interval=1,
+            learning_rate=0.1,
+            lr_policy={'policy': 'fixed'},
+        )
+
+    def save_outputs(self, task):
+        for epoch, loss in (1, 0.9), (1, 0.8), (2, 0.5):
+            task.current_epoch = epoch
+            task.save_output(task.train_outputs, 'loss', 'SoftmaxWithLoss', loss)
+        task.save_output(task.val_outputs, 'accuracy', 'Accuracy', 0.75)
+
+    def tearDown(self):
+        shutil.rmtree(self.job.dir())
+
+    def test_not_pickled(self):
+        assert self.job.save()
+        with open(self.job.path(Job.SAVE_FILE), 'rb') as infile:
+            assert 'SoftmaxWithLoss' not in infile.read()
+
+    def test_load(self):
+        assert self.job.save()
+        task = Job.load(self.job.id()).tasks[0]
+        assert task.train_outputs == self.task.train_outputs
+        assert task.train_outputs['loss'].data == [[0.9, 0.8], 0.5]
+        assert task.val_outputs['accuracy'].data == [0.75]
+
+    def test_incomplete_line(self):
+        # jobs created before the metric store log their outputs as JSON
+        task = self.create_task()
+        task.metrics_dir = None
+        task.outputs_log_file = 'network_outputs.log'
+        self.save_outputs(task)
+        with open(task.path(task.outputs_log_file), 'a') as outfile:
+            outfile.write('["train", 3, "lo')
+        task.load_outputs()
+        assert task.train_outputs['epoch'].data == [1, 2]
+        assert task.train_outputs == self.task.train_outputs
+
+    def test_load_missing_values(self):
+        self.task.current_epoch = 4
+        self.task.save_output(self.task.train_outputs, 'loss', 'SoftmaxWithLoss', None)
+        self.task.save_output(self.task.train_outputs, 'accuracy', 'Accuracy', 0.5)
+        outputs = self.task.train_outputs
+        self.task.load_outputs()
+        assert self.task.train_outputs == outputs
+        assert self.task.train_outputs['accuracy'].data == [None, None, 0.5]
+
+    def test_graph_data(self):
+        data = self.task.combined_graph_data()
+        assert data['columns'][0] == ['loss-train', 0.9, 0.8, 0.5]
+        assert data['columns'][2] == ['loss-train_epochs', 1, 1, 2]
+        assert data['columns'][1] == ['accuracy-val', 75]
+        assert data['xs']['loss-train'] == 'loss-train_epochs'
+        assert data['axes'] == {'accuracy-val': 'y2'}
+        data = self.task.combined_graph_data(start=2)
+        assert data['columns'][0] == ['loss-train', 0.5]
+
+    def test_output_stats(self):
+        stats = self.task.output_stats()
+        assert (stats[('train', 'loss')].min, stats[('train', 'loss')].max) == (0.5, 0.9)
+        self.task.current_epoch = 3
+        self.task.save_output(self.task.train_outputs, 'loss', 'SoftmaxWithLoss', 0.25)
+        assert stats[('train', 'loss')].min == 0.25
+        assert stats[('train', 'epoch')].max == 3
+
+    def test_sparkline(self):
+        sparkline = self.task.sparkline()
+        assert sparkline == self.task.combined_graph_data()['columns'][0][1:]
+        assert self.task.sparkline() is sparkline
+        key = self.job.summary_key()
+        self.task.current_epoch = 3
+        self.task.save_output(self.task.train_outputs, 'loss', 'SoftmaxWithLoss', 0.25)
+        assert self.job.summary_key() != key
+        assert self.task.sparkline()[-1] == 0.25
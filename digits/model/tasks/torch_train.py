@@ -18,6 +18,7 @@ import digits
 from digits import utils
 from digits.config import config_value
 from digits.utils import subclass, override, constants
+from digits.utils.stats import layer_statistics
 
 # Must import after importing digit.config
 import caffe_pb2
@@ -747,15 +748,7 @@ class TorchTrainTask(TrainTask):
         Arguments:
         data -- a np.ndarray
         """
-        # XXX These calculations can be super slow
-        mean = np.mean(data)
-        std = np.std(data)
-        y, x = np.histogram(data, bins=20)
-        y = list(y)
-        ticks = x[[0, len(x) / 2, -1]]
-        x = [(x[i] + x[i + 1]) / 2.0 for i in xrange(len(x) - 1)]
-        ticks = list(ticks)
-        return (mean, std, [y, x, ticks])
+        return layer_statistics(data)
 
     def after_test_run(self, temp_image_path):
         try:
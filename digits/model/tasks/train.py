@@ -2,24 +2,51 @@
 from __future__ import absolute_import
 
 from collections import OrderedDict, namedtuple
+import json
 import os.path
 import time
 
 import flask
 import gevent
+import numpy as np
 import psutil
 
 from digits import device_query
+from digits.metric_store import MetricStore
 from digits.task import Task
 from digits.utils import subclass, override
 
 # NOTE: Increment this every time the picked object changes
-PICKLE_VERSION = 2
+PICKLE_VERSION = 4
+
+# how many points of each output are shown in graphs, unless zoomed in
+GRAPH_POINTS = 200
 
 # Used to store network outputs
 NetworkOutput = namedtuple('NetworkOutput', ['kind', 'data'])
 
 
+class OutputStats(object):
+    """
+    Running minimum and maximum of the values of a NetworkOutput
+    (missing values are ignored)
+    """
+
+    def __init__(self):
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if isinstance(value, list):
+            for v in value:
+                self.add(v)
+        elif value is not None:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+
 @subclass
 class TrainTask(Task):
     """
@@ -80,20 +107,30 @@ class TrainTask(Task):
         self.snapshots = []
         self.timeline_traces = []
 
-        # data gets stored as dicts of lists (for graphing)
+        # data gets stored as dicts of lists
         self.train_outputs = OrderedDict()
         self.val_outputs = OrderedDict()
+        # the outputs are saved in this metric store instead of being pickled
+        self.metrics_dir = 'metrics'
+        self.outputs_log_file = None
+        self._metric_store = None
+        self.reset_output_caches()
 
     def __getstate__(self):
         state = super(TrainTask, self).__getstate__()
         if 'dataset' in state:
             del state['dataset']
+        if state.get('metrics_dir') or state.get('outputs_log_file'):
+            del state['train_outputs']
+            del state['val_outputs']
         if 'snapshots' in state:
             del state['snapshots']
         if '_labels' in state:
             del state['_labels']
         if '_hw_socketio_thread' in state:
             del state['_hw_socketio_thread']
+        for key in ('_metric_store', '_outputs_version', '_output_stats', '_sparkline'):
+            state.pop(key, None)
         return state
 
     def __setstate__(self, state):
@@ -115,6 +152,18 @@ class TrainTask(Task):
                     state['val_outputs']['accuracy'] = NetworkOutput('Accuracy', [x[1] / 100 for x in va])
                 state['val_outputs']['loss'] = NetworkOutput('SoftmaxWithLoss', [x[1] for x in vl])
 
+        if state['pickver_task_train'] < 3:
+            # outputs are still pickled for older jobs
+            state['outputs_log_file'] = None
+        else:
+            # see load_outputs()
+            state['train_outputs'] = OrderedDict()
+            state['val_outputs'] = OrderedDict()
+
+        if state['pickver_task_train'] < 4:
+            # outputs are still logged as JSON for older jobs
+            state['metrics_dir'] = None
+
         if state['use_mean'] is True:
             state['use_mean'] = 'pixel'
         elif state['use_mean'] is False:
@@ -126,6 +175,24 @@ class TrainTask(Task):
         self.snapshots = []
         self.timeline_traces = []
         self.dataset = None
+        self._metric_store = None
+        self.reset_output_caches()
+
+    def reset_output_caches(self):
+        """
+        Forget what was computed from the outputs (see output_stats() and sparkline())
+        """
+        # incremented whenever an output is saved
+        self._outputs_version = getattr(self, '_outputs_version', 0) + 1
+        # (phase, name) -> OutputStats
+        self._output_stats = None
+        # (version, sparkline)
+        self._sparkline = None
+
+    @override
+    def expected_duration(self, history):
+        # depends on the network, the dataset and the epochs of each job
+        return None
 
     @override
     def offer_resources(self, resources):
@@ -325,6 +392,43 @@ class TrainTask(Task):
                           room=self.job_id,
                           )
 
+    def metric_store(self):
+        """
+        Returns the MetricStore of the outputs, or None for older jobs
+        """
+        if not self.metrics_dir:
+            return None
+        if self._metric_store is None:
+            self._metric_store = MetricStore(self.path(self.metrics_dir))
+        return self._metric_store
+
+    def load_outputs(self):
+        """
+        Read self.train_outputs and self.val_outputs back from the metric
+        store or the outputs log
+        Must be called once the job_dir is set
+        """
+        self._metric_store = None
+        if self.metric_store() is not None:
+            self.train_outputs = self.outputs_from_store(self.metric_store(), 'train')
+            self.val_outputs = self.outputs_from_store(self.metric_store(), 'val')
+            self.reset_output_caches()
+            return
+        if not self.outputs_log_file or not os.path.exists(self.path(self.outputs_log_file)):
+            return
+        outputs = {'train': OrderedDict(), 'val': OrderedDict()}
+        with open(self.path(self.outputs_log_file)) as infile:
+            for line in infile:
+                try:
+                    phase, epoch, name, kind, value = json.loads(line)
+                except ValueError:
+                    # the last line can be incomplete after a crash
+                    continue
+                self.add_output(outputs[phase], epoch, str(name), str(kind), value)
+        self.train_outputs = outputs['train']
+        self.val_outputs = outputs['val']
+        self.reset_output_caches()
+
     def save_output(self, d, name, kind, value):
         """
         Save output to self.train_outputs or self.val_outputs
@@ -340,11 +444,100 @@ class TrainTask(Task):
         name = str(name)
         kind = str(kind)
 
+        phase = 'train' if d is self.train_outputs else 'val'
+        if self.metric_store() is not None:
+            self.metric_store().append(phase, name, kind, self.current_epoch, value)
+        elif self.outputs_log_file:
+            with open(self.path(self.outputs_log_file), 'a') as outfile:
+                outfile.write(json.dumps([phase, self.current_epoch, name, kind, value], default=float) + '\n')
+        else:
+            self.mark_dirty()
+
+        complete = self.add_output(d, self.current_epoch, name, kind, value)
+        self._outputs_version += 1
+        if self._output_stats is not None:
+            self._output_stats.setdefault((phase, name), OutputStats()).add(value)
+            self._output_stats.setdefault((phase, 'epoch'), OutputStats()).add(self.current_epoch)
+        return complete
+
+    def output_stats(self):
+        """
+        Returns a dict mapping (phase, name) to the OutputStats of the
+        train and val outputs, kept up to date as outputs are saved
+        """
+        if self._output_stats is None:
+            self._output_stats = {}
+            for phase, outputs in (('train', self.train_outputs), ('val', self.val_outputs)):
+                for name, output in outputs.iteritems():
+                    stats = self._output_stats[(phase, name)] = OutputStats()
+                    for value in output.data:
+                        stats.add(value)
+        return self._output_stats
+
+    def sparkline(self):
+        """
+        Returns the data of the first column of combined_graph_data()
+        (cached until the next output is saved) or None
+        """
+        if self._sparkline is None or self._sparkline[0] != self._outputs_version:
+            data = self.combined_graph_data()
+            self._sparkline = (self._outputs_version, data['columns'][0][1:] if data else None)
+        return self._sparkline[1]
+
+    @override
+    def summary_key(self):
+        return super(TrainTask, self).summary_key() + (self._outputs_version,)
+
+    @staticmethod
+    def outputs_from_store(store, phase):
+        """
+        Returns the outputs of a phase as add_output() would have stored them
+
+        Arguments:
+        store -- a MetricStore
+        phase -- "train" or "val"
+        """
+        d = OrderedDict()
+        points = [(series, series.read()) for series in store.series(phase)]
+        if not points:
+            return d
+        # the epochs only go forward
+        epochs = np.unique(np.concatenate([p['x'] for _, p in points]))
+        d['epoch'] = NetworkOutput('Epoch', epochs.tolist())
+        for series, p in points:
+            data = [None] * (np.searchsorted(epochs, p['x'][-1]) + 1) if len(p['x']) else []
+            indices = np.searchsorted(epochs, p['x'])
+            for index, value in zip(indices.tolist(), p['mean'].tolist()):
+                if value != value:
+                    # saved as NaN
+                    value = None
+                if data[index] is None:
+                    data[index] = value
+                elif isinstance(data[index], list):
+                    data[index].append(value)
+                else:
+                    data[index] = [data[index], value]
+            d[series.name] = NetworkOutput(series.kind, data)
+        return d
+
+    @staticmethod
+    def add_output(d, epoch, name, kind, value):
+        """
+        Add output to d (see save_output())
+        Returns true if all outputs for this epoch have been added
+
+        Arguments:
+        d -- the dictionary where the output should be stored
+        epoch -- the current epoch
+        name -- name of the output
+        kind -- the type of outputs
+        value -- value for this output
+        """
         # update d['epoch']
         if 'epoch' not in d:
-            d['epoch'] = NetworkOutput('Epoch', [self.current_epoch])
-        elif d['epoch'].data[-1] != self.current_epoch:
-            d['epoch'].data.append(self.current_epoch)
+            d['epoch'] = NetworkOutput('Epoch', [epoch])
+        elif d['epoch'].data[-1] != epoch:
+            d['epoch'].data.append(epoch)
 
         if name not in d:
             d[name] = NetworkOutput(kind, [])
@@ -546,13 +739,19 @@ class TrainTask(Task):
         """
         return [[s[1], 'Trace #%s' % s[1]] for s in reversed(self.timeline_traces)]
 
-    def combined_graph_data(self, cull=True):
+    def combined_graph_data(self, cull=True, start=None, stop=None):
         """
         Returns all train/val outputs in data for one C3.js graph
 
         Keyword arguments:
         cull -- if True, cut down the number of data points returned to a reasonable size
+        start -- the first epoch to show (jobs with a metric store only)
+        stop -- the last epoch to show (jobs with a metric store only)
         """
+        store = self.metric_store()
+        if store is not None:
+            return self.store_graph_data(store, GRAPH_POINTS if cull else None, start, stop)
+
         data = {
             'columns': [],
             'xs': {},
@@ -620,6 +819,50 @@ class TrainTask(Task):
             # helps with ordering of columns in graph
             return None
 
+    @staticmethod
+    def store_graph_data(store, max_points, start=None, stop=None):
+        """
+        Returns combined_graph_data() read from a MetricStore
+
+        Each output has its own x column, with at most max_points points
+        in the [start, stop] range (the mean of the values of each bucket
+        when they are summarized). Only the points shown are read
+
+        Arguments:
+        store -- a MetricStore
+        max_points -- None for all the points
+        """
+        data = {
+            'columns': [],
+            'xs': {},
+            'axes': {},
+            'names': {},
+        }
+        x_columns = []
+        for phase, hidden in (('train', ['epoch', 'learning_rate']), ('val', ['epoch'])):
+            for series in store.series(phase):
+                if series.name in hidden:
+                    continue
+                points = series.read(start, stop, max_points)
+                col_id = '%s-%s' % (series.name, phase)
+                x_id = '%s-%s_epochs' % (series.name, phase)
+                data['xs'][col_id] = x_id
+                data['names'][col_id] = '%s (%s)' % (series.name, phase)
+                scale = 1
+                if 'accuracy' in series.kind.lower() or 'accuracy' in series.name.lower():
+                    scale = 100
+                    data['axes'][col_id] = 'y2'
+                data['columns'].append([col_id] + [
+                    (scale * y if y == y else 'none')
+                    for y in points['mean'].tolist()])
+                x_columns.append([x_id] + points['x'].tolist())
+            if phase == 'train' and not data['columns']:
+                # return None if only validation data exists
+                # helps with ordering of columns in graph
+                return None
+        data['columns'].extend(x_columns)
+        return data
+
     # return id of framework used for training
     def get_framework_id(self):
         """
@@ -15,6 +15,7 @@ import werkzeug.exceptions
 
 from . import images as model_images
 from . import ModelJob
+from .tasks.train import GRAPH_POINTS, TrainTask
 from digits.pretrained_model.job import PretrainedModelJob
 from digits import frameworks, extensions
 from digits.utils import auth
@@ -114,6 +115,35 @@ def timeline_trace_data():
     return job.train_task().timeline_trace(int(step))
 
 
+@blueprint.route('/<job_id>/graph_data/json', methods=['GET'])
+def graph_data(job_id):
+    """
+    Returns the data of the combined graph of a model for a range of epochs
+
+    Arguments (all optional):
+    start -- the first epoch
+    stop -- the last epoch
+    points -- the maximum number of points of each output
+        (all the points of the range if 0)
+    """
+    job = scheduler.get_job(job_id)
+    if job is None or not isinstance(job, ModelJob):
+        raise werkzeug.exceptions.NotFound('Job not found')
+    try:
+        start, stop, points = [float(get_request_arg(arg)) if get_request_arg(arg) is not None else None
+                               for arg in ('start', 'stop', 'points')]
+    except ValueError:
+        raise werkzeug.exceptions.BadRequest('start, stop and points must be numbers')
+
+    store = job.train_task().metric_store()
+    if store is None:
+        # older jobs: all of it
+        return flask.jsonify({'data': job.train_task().combined_graph_data(cull=False)})
+    if points is None:
+        points = GRAPH_POINTS
+    return flask.jsonify({'data': TrainTask.store_graph_data(store, int(points) or None, start, stop)})
+
+
 @blueprint.route('/view-config/<extension_id>', methods=['GET'])
 def view_config(extension_id):
     """
@@ -406,10 +436,3 @@ class ColumnType(object):
             return '{} {}'.format(attr, self.name)
         else:
             return attr
-
-
-def get_column_attrs():
-    job_outs = [set(j.train_task().train_outputs.keys() + j.train_task().val_outputs.keys())
-                for j in scheduler.jobs.values() if isinstance(j, ModelJob)]
-
-    return reduce(lambda acc, j: acc.union(j), job_outs, set())
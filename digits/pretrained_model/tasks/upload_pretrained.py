@@ -46,16 +46,7 @@ class UploadPretrainedModelTask(Task):
 
     @override
     def offer_resources(self, resources):
-        reserved_resources = {}
-        # we need one CPU resource from inference_task_pool
-        cpu_key = 'inference_task_pool'
-        if cpu_key not in resources:
-            return None
-        for resource in resources[cpu_key]:
-            if resource.remaining() >= 1:
-                reserved_resources[cpu_key] = [(resource.identifier, 1)]
-                return reserved_resources
-        return None
+        return self.offer_host_resources(resources, 'inference_task_pool', memory=128, io=1)
 
     def move_file(self, input_file, output):
         shutil.copy(input_file, os.path.join(self.job_dir, output))
@@ -0,0 +1,162 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+"""
+Raw database of fixed-shape tensors
+
+A raw database is a directory with:
+    header.json -- format, version, count, shape and dtype of the entries
+    data.bin -- the entries, one after the other, in C order
+    labels.npy -- one int64 label per entry
+
+Images are stored as (height, width, channels) in RGB order, so readers
+get np.memmap slices without any decoding or transposing. The header is
+written last: a directory without one is an incomplete database.
+
+This module is imported by tool processes and must stay free of
+dependencies on the rest of DIGITS
+"""
+from __future__ import absolute_import
+
+import json
+import os
+
+import numpy as np
+
+FORMAT = 'raw'
+VERSION = 1
+
+HEADER_FILENAME = 'header.json'
+DATA_FILENAME = 'data.bin'
+LABELS_FILENAME = 'labels.npy'
+
+# the types of entries a raw database can hold
+DTYPES = ('uint8', 'float32')
+
+
+def is_raw_db(path):
+    """
+    Returns True if path is a raw database
+    """
+    return os.path.isfile(os.path.join(path, HEADER_FILENAME))
+
+
+def _entry_shape(shape):
+    """
+    Returns the shape of an entry as saved in the header
+    (grayscale images get a channel axis)
+    """
+    shape = tuple(int(d) for d in shape)
+    if len(shape) == 2:
+        shape += (1,)
+    return shape
+
+
+class RawDbWriter(object):
+    """
+    Appends entries to a new raw database
+    """
+
+    def __init__(self, location, shape, dtype='uint8'):
+        """
+        Arguments:
+        location -- the directory to create
+        shape -- the shape of an entry, (height, width[, channels])
+
+        Keyword arguments:
+        dtype -- the type of the entries (see DTYPES)
+        """
+        if np.dtype(dtype).name not in DTYPES:
+            raise ValueError('unsupported dtype %s' % dtype)
+        self.location = location
+        self.shape = _entry_shape(shape)
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._labels = []
+        os.makedirs(location)
+        self._data = open(os.path.join(location, DATA_FILENAME), 'wb')
+
+    def write_batch(self, images, labels):
+        """
+        Append a batch of entries
+
+        Arguments:
+        images -- an np.array of shape (N,) + shape, or a list of entries
+        labels -- N integer labels
+        """
+        if len(images) != len(labels):
+            raise ValueError('%d images but %d labels' % (len(images), len(labels)))
+        if len(images) == 0:
+            return
+        batch = np.ascontiguousarray(images, dtype=self.dtype)
+        if batch.ndim == len(self.shape):
+            # add channel axis for grayscale images
+            batch = batch[..., np.newaxis]
+        if batch.shape[1:] != self.shape:
+            raise ValueError('Entry shape mismatch (got:%s, expected:%s)'
+                             % (repr(batch.shape[1:]), repr(self.shape)))
+        batch.tofile(self._data)
+        self._labels.extend(int(label) for label in labels)
+        self.count += len(batch)
+
+    def close(self):
+        """
+        Save the labels and the header
+        """
+        self._data.close()
+        np.save(os.path.join(self.location, LABELS_FILENAME), np.array(self._labels, dtype=np.int64))
+        header = {
+            'format': FORMAT,
+            'version': VERSION,
+            'count': self.count,
+            'shape': list(self.shape),
+            'dtype': self.dtype.name,
+        }
+        with open(os.path.join(self.location, HEADER_FILENAME), 'w') as f:
+            json.dump(header, f)
+
+
+class RawDbReader(object):
+    """
+    Reads a raw database through memory maps
+
+    Slices of .data and .labels are views of the files: nothing is read
+    until the values are used
+    """
+
+    def __init__(self, location):
+        """
+        Arguments:
+        location -- the database directory
+        """
+        self.location = location
+        with open(os.path.join(location, HEADER_FILENAME)) as f:
+            header = json.load(f)
+        if header.get('format') != FORMAT:
+            raise ValueError('%s is not a raw database' % location)
+        if header.get('version') != VERSION:
+            raise ValueError('Unsupported raw database version %s' % header.get('version'))
+        self.count = int(header['count'])
+        self.shape = tuple(header['shape'])
+        self.dtype = np.dtype(header['dtype'])
+
+        data_path = os.path.join(location, DATA_FILENAME)
+        if self.count:
+            self.data = np.memmap(data_path, dtype=self.dtype, mode='r',
+                                  shape=(self.count,) + self.shape)
+            self.labels = np.load(os.path.join(location, LABELS_FILENAME), mmap_mode='r')
+        else:
+            # empty files cannot be mapped
+            self.data = np.zeros((0,) + self.shape, dtype=self.dtype)
+            self.labels = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return self.count
+
+    def get_image(self, index):
+        """
+        Returns entry index as an image: (height, width) for grayscale
+        images and (height, width, channels) otherwise
+        """
+        image = self.data[index]
+        if image.ndim == 3 and image.shape[2] == 1:
+            image = image[:, :, 0]
+        return image
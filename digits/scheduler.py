@@ -1,7 +1,7 @@
 # Copyright (c) 2014-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
-from collections import OrderedDict
+from collections import deque, OrderedDict
 import os
 import shutil
 import signal
@@ -12,7 +12,7 @@ import gevent
 import gevent.event
 import gevent.queue
 
-from . import utils
+from .catalog import JobCatalog
 from .config import config_value
 from .dataset import DatasetJob
 from .job import Job
@@ -20,7 +20,7 @@ from .log import logger
 from .model import ModelJob
 from .pretrained_model import PretrainedModelJob
 from .status import Status
-from digits.utils import errors
+from digits.utils import errors, sizeof_fmt
 
 """
 This constant configures how long to wait before automatically
@@ -28,6 +28,27 @@ deleting completed non-persistent jobs
 """
 NON_PERSISTENT_JOB_DELETE_TIMEOUT_SECONDS = 3600
 
+"""
+How often (in seconds) changed jobs are saved
+"""
+SAVE_INTERVAL = 15
+
+"""
+How long (in seconds) the main loop sleeps when it is not woken up
+"""
+WAKEUP_INTERVAL = 5
+
+"""
+How long (in seconds) it takes for the resource usage of a user to count
+half as much against their tasks (see FairShare)
+"""
+FAIR_SHARE_HALF_LIFE = 3600
+
+"""
+How many run times of each class of task are kept to estimate the next ones
+"""
+DURATION_HISTORY = 20
+
 
 class Resource(object):
     """
@@ -89,6 +110,133 @@ class Resource(object):
         return False
 
 
+class FairShare(object):
+    """
+    Recent resource usage of each user, decayed exponentially
+
+    A running task charges its user one unit per second for each GPU it
+    holds, or one unit for tasks without GPUs
+    """
+
+    def __init__(self, half_life=FAIR_SHARE_HALF_LIFE):
+        """
+        Keyword arguments:
+        half_life -- how long (in seconds) it takes for usage to be halved
+        """
+        self.half_life = half_life
+        self.usage = {}
+        self.updated = None
+
+    def update(self, now, charges):
+        """
+        Decay the usage and charge the running tasks since the last update
+
+        Arguments:
+        now -- the current time
+        charges -- a list of (username, units) for the running tasks
+        """
+        if self.updated is not None and now > self.updated:
+            elapsed = now - self.updated
+            decay = 0.5 ** (elapsed / float(self.half_life))
+            for username in self.usage:
+                self.usage[username] *= decay
+            for username, units in charges:
+                self.usage[username] = self.usage.get(username, 0) + units * elapsed
+        self.updated = now
+
+    def get(self, username):
+        """
+        Returns the usage of a user
+        """
+        return self.usage.get(username, 0)
+
+
+class Reservation(object):
+    """
+    When the first task of the queue is expected to be able to start
+    """
+
+    def __init__(self, task, start, resources):
+        """
+        Arguments:
+        task -- the task which is waiting
+        start -- when it is expected to start
+        resources -- the expected resources at that time
+            (with the allocations of the tasks still running then)
+        """
+        self.task = task
+        self.start = start
+        self.resources = resources
+
+
+class SchedulerMetrics(object):
+    """
+    How long tasks wait in the queue and how much of each resource is used
+    """
+
+    def __init__(self, max_waits=1000):
+        """
+        Keyword arguments:
+        max_waits -- how many queue waits are kept
+        """
+        self.since = time.time()
+        self.updated = self.since
+        # how long the last started tasks waited
+        self.waits = deque(maxlen=max_waits)
+        # resource type -> used fraction of the resource integrated over time
+        self.busy = {}
+
+    def task_started(self, wait):
+        self.waits.append(wait)
+
+    def update(self, resources, now):
+        """
+        Account for the resource usage since the last update
+        (call before allocations change)
+        """
+        elapsed = now - self.updated
+        if elapsed <= 0:
+            return
+        for resource_type, pool in resources.iteritems():
+            capacity = sum(r.max_value for r in pool)
+            if capacity:
+                used = capacity - sum(r.remaining() for r in pool)
+                self.busy[resource_type] = self.busy.get(resource_type, 0) + elapsed * used / float(capacity)
+        self.updated = now
+
+    def json_dict(self, resources, queued_since, now):
+        """
+        Returns a dict used for a JSON representation
+
+        Arguments:
+        resources -- the resources of the scheduler
+        queued_since -- when each of the waiting tasks was queued
+        now -- the current time
+        """
+        self.update(resources, now)
+        waits = sorted(self.waits)
+        utilization = {}
+        for resource_type, pool in resources.iteritems():
+            capacity = sum(r.max_value for r in pool)
+            if capacity:
+                utilization[resource_type] = {
+                    'current': (capacity - sum(r.remaining() for r in pool)) / float(capacity),
+                    'average': self.busy.get(resource_type, 0) / max(now - self.since, 1e-6),
+                }
+        return {
+            'since': self.since,
+            'queued_tasks': len(queued_since),
+            'longest_queued': now - min(queued_since) if queued_since else 0,
+            'queue_wait': {
+                'count': len(waits),
+                'mean': sum(waits) / len(waits) if waits else 0,
+                'p95': waits[int(0.95 * (len(waits) - 1))] if waits else 0,
+                'max': waits[-1] if waits else 0,
+            },
+            'utilization': utilization,
+        }
+
+
 class Scheduler:
     """
     Coordinates execution of Jobs
@@ -100,35 +248,80 @@ class Scheduler:
         gpu_list -- a comma-separated string which is a list of GPU id's
         verbose -- if True, print more errors
         """
+        # jobs which have been loaded, including all running jobs
         self.jobs = OrderedDict()
+        # all the jobs in jobs_dir
+        self.catalog = JobCatalog(config_value('jobs_dir'))
         self.verbose = verbose
 
         # Keeps track of resource usage
+        budget = config_value('resources')
         self.resources = {
-            # TODO: break this into CPU cores, memory usage, IO usage, etc.
+            # how many tasks of each kind can run at the same time
             'parse_folder_task_pool': [Resource()],
             'create_db_task_pool': [Resource(max_value=4)],
             'analyze_db_task_pool': [Resource(max_value=4)],
             'inference_task_pool': [Resource(max_value=4)],
             'gpus': [Resource(identifier=index)
                      for index in gpu_list.split(',')] if gpu_list else [],
+            # shared by the tasks of the pools (see Task.offer_host_resources)
+            # an empty list is no limit
+            'cpus': [Resource(identifier='cpus', max_value=budget['cpus'])] if budget['cpus'] else [],
+            'memory': [Resource(identifier='memory', max_value=budget['memory'])] if budget['memory'] else [],
+            'io': [Resource(identifier='io', max_value=budget['io'])] if budget['io'] else [],
         }
 
+        # jobs which are not done yet, in the order they were added
+        self.active_jobs = OrderedDict()
+        # jobs which changed since the last save cycle
+        self.changed_jobs = OrderedDict()
+        # completed non-persistent jobs, until they are garbage collected
+        self.finished_jobs = OrderedDict()
+
+        # id(task) -> when the ready tasks which could not start were queued
+        self.queued_since = {}
+        # id(task) -> (task, start time, username, fair share units) of the running tasks
+        self.started = {}
+        # task class -> run times of its last successful tasks
+        self.durations = {}
+        self.fair_share = FairShare()
+        self.metrics = SchedulerMetrics()
+
         self.running = False
         self.shutdown = gevent.event.Event()
+        # set whenever the main loop has work to do
+        self.wakeup = gevent.event.Event()
 
     def load_past_jobs(self):
         """
         Look in the jobs directory and load all valid jobs
+
+        Jobs with a current entry in the catalog are not unpickled
+        until they are needed (see get_job)
         """
         loaded_jobs = []
         failed_jobs = []
+        catalog_mtimes = self.catalog.mtimes()
+        catalogued = set()
         for dir_name in sorted(os.listdir(config_value('jobs_dir'))):
-            if os.path.isdir(os.path.join(config_value('jobs_dir'), dir_name)):
+            # hidden directories are not jobs (e.g. the listing manifests)
+            if not dir_name.startswith('.') and os.path.isdir(os.path.join(config_value('jobs_dir'), dir_name)):
                 # Make sure it hasn't already been loaded
                 if dir_name in self.jobs:
                     continue
 
+                if dir_name in catalog_mtimes:
+                    mtime, status = catalog_mtimes[dir_name]
+                    try:
+                        current = mtime == os.path.getmtime(
+                            os.path.join(config_value('jobs_dir'), dir_name, Job.SAVE_FILE))
+                    except OSError:
+                        current = False
+                    # The server might have crashed while the job was running
+                    if current and not status.is_running():
+                        catalogued.add(dir_name)
+                        continue
+
                 try:
                     job = Job.load(dir_name)
                     # The server might have crashed
@@ -144,10 +337,16 @@ class Scheduler:
                 except Exception as e:
                     failed_jobs.append((dir_name, e))
 
+        # forget about jobs which are gone
+        for job_id in catalog_mtimes:
+            if job_id not in catalogued and job_id not in self.jobs:
+                self.catalog.remove(job_id)
+
         # add DatasetJobs or PretrainedModelJobs
         for job in loaded_jobs:
             if isinstance(job, DatasetJob) or isinstance(job, PretrainedModelJob):
                 self.jobs[job.id()] = job
+                self.update_catalog(job)
 
         # add ModelJobs
         for job in loaded_jobs:
@@ -156,10 +355,11 @@ class Scheduler:
                     # load the DatasetJob
                     job.load_dataset()
                     self.jobs[job.id()] = job
+                    self.update_catalog(job)
                 except Exception as e:
-                    failed_jobs.append((dir_name, e))
+                    failed_jobs.append((job.id(), e))
 
-        logger.info('Loaded %d jobs.' % len(self.jobs))
+        logger.info('Loaded %d jobs.' % (len(self.jobs) + len(catalogued)))
 
         if len(failed_jobs):
             logger.warning('Failed to load %d jobs.' % len(failed_jobs))
@@ -167,6 +367,63 @@ class Scheduler:
                 for job_id, e in failed_jobs:
                     logger.debug('%s - %s: %s' % (job_id, type(e).__name__, str(e)))
 
+    def load_job(self, job_id):
+        """
+        Unpickle a job which is in the catalog but hasn't been loaded yet
+        Returns None if it cannot be loaded
+        """
+        try:
+            job = Job.load(job_id)
+            if isinstance(job, ModelJob):
+                job.load_dataset()
+        except Exception as e:
+            logger.warning('Failed to load job %s - %s: %s' % (job_id, type(e).__name__, str(e)))
+            return None
+        self.jobs[job.id()] = job
+        if job.status.is_running():
+            self.active_jobs[job.id()] = job
+        return job
+
+    def update_catalog(self, job):
+        """
+        Record a job which has just been saved in the catalog
+        """
+        if not job.is_persistent():
+            return
+        try:
+            self.catalog.update(job)
+        except Exception as e:
+            logger.warning('Failed to update the job catalog - %s: %s' % (type(e).__name__, str(e)),
+                           job_id=job.id())
+
+    def save_job(self, job):
+        """
+        Save a job and update the catalog
+        Returns True on success
+        """
+        if job.save():
+            self.update_catalog(job)
+            return True
+        return False
+
+    def wake(self):
+        """
+        Have the main loop look at the active jobs right away
+        """
+        self.wakeup.set()
+
+    def job_changed(self, job):
+        """
+        Called when the status or the attributes of a job change
+        The job is saved during the next save cycle
+        """
+        job.mark_dirty()
+        if job.id() in self.jobs:
+            self.changed_jobs[job.id()] = job
+            if job.status.is_running():
+                self.active_jobs[job.id()] = job
+        self.wake()
+
     def add_job(self, job):
         """
         Add a job to self.jobs
@@ -176,6 +433,8 @@ class Scheduler:
             return False
         else:
             self.jobs[job.id()] = job
+            self.active_jobs[job.id()] = job
+            self.wake()
 
             # Need to fix this properly
             # if True or flask._app_ctx_stack.top is not None:
@@ -192,19 +451,53 @@ class Scheduler:
                               room='job_management',
                               )
 
-            if 'DIGITS_MODE_TEST' not in os.environ:
-                # Let the scheduler do a little work before returning
-                time.sleep(utils.wait_time())
+            # Let the scheduler do a little work before returning
+            time.sleep(0)
             return True
 
     def get_job(self, job_id):
         """
         Look through self.jobs to try to find the Job
+        Loads the Job if it is only in the catalog
         Returns None if not found
         """
         if job_id is None:
             return None
-        return self.jobs.get(job_id, None)
+        job = self.jobs.get(job_id, None)
+        if job is None and self.catalog.get(job_id) is not None:
+            job = self.load_job(job_id)
+        return job
+
+    def get_jobs(self, cls, dataset_id=None):
+        """
+        Returns all Jobs of this class, loading them from the catalog if needed
+
+        Keyword arguments:
+        dataset_id -- only return jobs using this dataset
+        """
+        for entry in self.catalog.entries(cls, dataset_id=dataset_id):
+            if entry.id() not in self.jobs:
+                self.load_job(entry.id())
+        return [j for j in self.jobs.values()
+                if isinstance(j, cls) and (dataset_id is None or getattr(j, 'dataset_id', None) == dataset_id)]
+
+    def get_job_entries(self, cls):
+        """
+        Returns the CatalogEntries of the Jobs of this class, most recently
+        submitted first, without loading the jobs
+
+        The entries of the active jobs (whose status changes) and of the
+        jobs which have not been saved yet are built from the jobs
+
+        Arguments:
+        cls -- a Job class or a tuple of classes
+        """
+        entries = {e.id(): e for e in self.catalog.entries(cls)}
+        for job in self.jobs.values():
+            if isinstance(job, cls) and job.is_persistent() and (
+                    job.id() in self.active_jobs or job.id() not in entries):
+                entries[job.id()] = self.catalog.entry(job)
+        return sorted(entries.values(), key=lambda e: e.submitted, reverse=True)
 
     def get_related_jobs(self, job):
         """
@@ -221,11 +514,10 @@ class Scheduler:
         else:
             raise ValueError("Unhandled job type %s" % job.job_type())
 
-        for j in self.jobs.values():
+        for j in self.get_jobs(ModelJob, dataset_id=datajob.id()):
             # Any model that shares (this/the same) dataset should be added too:
-            if isinstance(j, ModelJob):
-                if datajob == j.train_task().dataset and j.id() != job.id():
-                    related_jobs.append(j)
+            if datajob == j.train_task().dataset and j.id() != job.id():
+                related_jobs.append(j)
 
         return related_jobs
 
@@ -242,6 +534,13 @@ class Scheduler:
         logger.info('Job aborted.', job_id=job_id)
         return True
 
+    def forget_job(self, job_id):
+        """
+        Drop a job from all the collections of the scheduler
+        """
+        for jobs in self.jobs, self.active_jobs, self.changed_jobs, self.finished_jobs:
+            jobs.pop(job_id, None)
+
     def delete_job(self, job):
         """
         Deletes an entire job folder from disk
@@ -255,15 +554,14 @@ class Scheduler:
             raise ValueError('called delete_job with a %s' % type(job))
         dependent_jobs = []
         # try to find the job
-        job = self.jobs.get(job_id, None)
+        job = self.get_job(job_id)
         if job:
             if isinstance(job, DatasetJob):
                 # check for dependencies
-                for j in self.jobs.values():
-                    if isinstance(j, ModelJob) and j.dataset_id == job.id():
-                        logger.error('Cannot delete "%s" (%s) because "%s" (%s) depends on it.' %
-                                     (job.name(), job.id(), j.name(), j.id()))
-                        dependent_jobs.append(j.name())
+                for j in self.get_jobs(ModelJob, dataset_id=job.id()):
+                    logger.error('Cannot delete "%s" (%s) because "%s" (%s) depends on it.' %
+                                 (job.name(), job.id(), j.name(), j.id()))
+                    dependent_jobs.append(j.name())
             if len(dependent_jobs) > 0:
                 error_message = 'Cannot delete "%s" because %d model%s depend%s on it: %s' % (
                     job.name(),
@@ -272,7 +570,8 @@ class Scheduler:
                     ('s' if len(dependent_jobs) == 1 else ''),
                     ', '.join(['"%s"' % j for j in dependent_jobs]))
                 raise errors.DeleteError(error_message)
-            self.jobs.pop(job_id, None)
+            self.forget_job(job_id)
+            self.catalog.remove(job_id)
             job.abort()
             if os.path.exists(job.dir()):
                 shutil.rmtree(job.dir())
@@ -293,6 +592,7 @@ class Scheduler:
         path = os.path.normpath(path)
         if os.path.dirname(path) == config_value('jobs_dir') and os.path.exists(path):
             shutil.rmtree(path)
+            self.catalog.remove(job_id)
             return True
 
         return False
@@ -304,13 +604,6 @@ class Scheduler:
             cmp=lambda x, y: cmp(y.id(), x.id())
         )
 
-    def completed_dataset_jobs(self):
-        """a query utility"""
-        return sorted(
-            [j for j in self.jobs.values() if isinstance(j, DatasetJob) and not j.status.is_running()],
-            cmp=lambda x, y: cmp(y.id(), x.id())
-        )
-
     def running_model_jobs(self):
         """a query utility"""
         return sorted(
@@ -318,13 +611,6 @@ class Scheduler:
             cmp=lambda x, y: cmp(y.id(), x.id())
         )
 
-    def completed_model_jobs(self):
-        """a query utility"""
-        return sorted(
-            [j for j in self.jobs.values() if isinstance(j, ModelJob) and not j.status.is_running()],
-            cmp=lambda x, y: cmp(y.id(), x.id())
-        )
-
     def start(self):
         """
         Start the Scheduler
@@ -344,6 +630,7 @@ class Scheduler:
         Returns True if the shutdown was graceful
         """
         self.shutdown.set()
+        self.wake()
         wait_limit = 5
         start = time.time()
         while self.running:
@@ -354,103 +641,297 @@ class Scheduler:
 
     def main_thread(self):
         """
-        Monitors the jobs in current_jobs, updates their statuses,
+        Monitors the jobs in active_jobs, updates their statuses,
         and puts their tasks in queues to be processed by other threads
+
+        Runs whenever it is woken up (see wake) by a new job, a status
+        change or released resources, and at least every few seconds
         """
         signal.signal(signal.SIGTERM, self.sigterm_handler)
         try:
-            last_saved = None
+            last_saved = time.time()
             while not self.shutdown.is_set():
-                # Iterate backwards so we can delete jobs
-                for job in self.jobs.values():
-                    if job.status == Status.INIT:
-                        def start_this_job(job):
-                            if isinstance(job, ModelJob):
-                                if job.dataset.status == Status.DONE:
-                                    job.status = Status.RUN
-                                elif job.dataset.status in [Status.ABORT, Status.ERROR]:
-                                    job.abort()
-                                else:
-                                    job.status = Status.WAIT
-                            else:
-                                job.status = Status.RUN
-                        if 'DIGITS_MODE_TEST' in os.environ:
-                            start_this_job(job)
-                        else:
-                            # Delay start by one second for initial page load
-                            gevent.spawn_later(1, start_this_job, job)
-
-                    if job.status == Status.WAIT:
-                        if isinstance(job, ModelJob):
-                            if job.dataset.status == Status.DONE:
-                                job.status = Status.RUN
-                            elif job.dataset.status in [Status.ABORT, Status.ERROR]:
-                                job.abort()
-                        else:
-                            job.status = Status.RUN
-
-                    if job.status == Status.RUN:
-                        alldone = True
-                        for task in job.tasks:
-                            if task.status in [Status.INIT, Status.WAIT]:
-                                alldone = False
-                                # try to start the task
-                                if task.ready_to_queue():
-                                    requested_resources = task.offer_resources(self.resources)
-                                    if requested_resources is None:
-                                        task.status = Status.WAIT
-                                    else:
-                                        if self.reserve_resources(task, requested_resources):
-                                            gevent.spawn(self.run_task,
-                                                         task, requested_resources)
-                            elif task.status == Status.RUN:
-                                # job is not done
-                                alldone = False
-                            elif task.status in [Status.DONE, Status.ABORT]:
-                                # job is done
-                                pass
-                            elif task.status == Status.ERROR:
-                                # propagate error status up to job
-                                job.status = Status.ERROR
-                                alldone = False
-                                break
-                            else:
-                                logger.warning('Unrecognized task status: "%s"', task.status, job_id=job.id())
-                        if alldone:
-                            job.status = Status.DONE
-                            logger.info('Job complete.', job_id=job.id())
-                            job.save()
-
-                # save running jobs every 15 seconds
-                if not last_saved or time.time() - last_saved > 15:
-                    for job in self.jobs.values():
-                        if job.status.is_running():
-                            if job.is_persistent():
-                                job.save()
-                        elif (not job.is_persistent() and
-                              (time.time() - job.status_history[-1][1] >
-                               NON_PERSISTENT_JOB_DELETE_TIMEOUT_SECONDS)):
-                            # job has been unclaimed for far too long => proceed to garbage collection
-                            self.delete_job(job)
+                self.wakeup.clear()
+                ready = []
+                for job in self.active_jobs.values():
+                    ready.extend((job, task) for task in self.update_job(job))
+                    if not job.status.is_running():
+                        del self.active_jobs[job.id()]
+                        if not job.is_persistent():
+                            self.finished_jobs[job.id()] = job
+                self.schedule_tasks(ready)
+
+                # save changed jobs every SAVE_INTERVAL seconds
+                if time.time() - last_saved > SAVE_INTERVAL:
+                    self.save_changed_jobs()
+                    self.collect_finished_jobs()
                     last_saved = time.time()
-                if 'DIGITS_MODE_TEST' not in os.environ:
-                    time.sleep(utils.wait_time())
-                else:
-                    time.sleep(0.05)
+
+                self.wakeup.wait(min(WAKEUP_INTERVAL, max(0, last_saved + SAVE_INTERVAL - time.time())))
         except KeyboardInterrupt:
             pass
 
         # Shutdown
         for job in self.jobs.values():
             job.abort()
-            job.save()
+            self.save_job(job)
         self.running = False
 
+    def update_job(self, job):
+        """
+        Move a job through its states
+        Returns the tasks of the job which are ready to start (see schedule_tasks)
+        """
+        ready = []
+        if job.status == Status.INIT:
+            def start_this_job(job):
+                if isinstance(job, ModelJob):
+                    if job.dataset.status == Status.DONE:
+                        job.status = Status.RUN
+                    elif job.dataset.status in [Status.ABORT, Status.ERROR]:
+                        job.abort()
+                    else:
+                        job.status = Status.WAIT
+                else:
+                    job.status = Status.RUN
+                self.wake()
+            if 'DIGITS_MODE_TEST' in os.environ or not job.is_persistent():
+                start_this_job(job)
+            else:
+                # Delay start by one second for initial page load
+                gevent.spawn_later(1, start_this_job, job)
+
+        if job.status == Status.WAIT:
+            if isinstance(job, ModelJob):
+                if job.dataset.status == Status.DONE:
+                    job.status = Status.RUN
+                elif job.dataset.status in [Status.ABORT, Status.ERROR]:
+                    job.abort()
+            else:
+                job.status = Status.RUN
+
+        if job.status == Status.RUN:
+            alldone = True
+            for task in job.tasks:
+                if task.status in [Status.INIT, Status.WAIT]:
+                    alldone = False
+                    if task.ready_to_queue():
+                        ready.append(task)
+                elif task.status == Status.RUN:
+                    # job is not done
+                    alldone = False
+                elif task.status in [Status.DONE, Status.ABORT]:
+                    # job is done
+                    pass
+                elif task.status == Status.ERROR:
+                    # propagate error status up to job
+                    job.status = Status.ERROR
+                    alldone = False
+                    break
+                else:
+                    logger.warning('Unrecognized task status: "%s"', task.status, job_id=job.id())
+            if alldone:
+                job.status = Status.DONE
+                logger.info('Job complete.', job_id=job.id())
+                self.save_job(job)
+        return ready
+
+    def schedule_tasks(self, ready, now=None):
+        """
+        Start the ready tasks which can run now
+
+        The tasks are queued by the priority of their job, then by the
+        recent resource usage of their user (see FairShare), then by how
+        long they have waited. When the first task of the queue cannot
+        start, it gets a Reservation for when the running tasks expected to
+        finish first will have released enough resources. The tasks behind
+        it only start ahead of it (backfill) if they are expected to be
+        done by then or leave enough resources for it anyway
+
+        Arguments:
+        ready -- a list of (job, task) tuples
+
+        Keyword arguments:
+        now -- the current time
+
+        Returns the started tasks
+        """
+        if now is None:
+            now = time.time()
+        self.update_fair_share(now)
+
+        self.queued_since = dict((id(task), self.queued_since.get(id(task), now)) for _, task in ready)
+
+        def queue_order(item):
+            job, task = item
+            return (-job.priority, self.fair_share.get(job.username), self.queued_since[id(task)])
+
+        started = []
+        reservation = None
+        for job, task in sorted(ready, key=queue_order):
+            requested = task.offer_resources(self.resources)
+            if requested is not None and reservation is not None:
+                requested = self.backfill(reservation, task, requested, now)
+            if requested is None:
+                task.status = Status.WAIT
+                if reservation is None:
+                    reservation = self.reserve_start(task, now)
+                continue
+            if self.reserve_resources(task, requested):
+                self.metrics.task_started(now - self.queued_since.pop(id(task)))
+                units = len(requested.get('gpus', [])) or 1
+                self.started[id(task)] = (task, now, job.username, units)
+                self.start_task(task, requested)
+                started.append(task)
+        return started
+
+    def update_fair_share(self, now):
+        """
+        Charge the users of the running tasks (see FairShare)
+        """
+        self.fair_share.update(now, [(username, units) for _, _, username, units in self.started.values()])
+
+    def reserve_start(self, task, now):
+        """
+        Returns a Reservation for a task which cannot start now,
+        or None if it cannot start even once the running tasks are done
+        """
+        resources = self.copy_resources()
+        for end, running_task in self.expected_ends(now):
+            for pool in resources.values():
+                for resource in pool:
+                    resource.deallocate(running_task)
+            if task.offer_resources(resources) is not None:
+                return Reservation(task, end, resources)
+        return None
+
+    def backfill(self, reservation, task, requested, now):
+        """
+        Returns the resources requested by a task if it can start ahead of
+        the reserved task without delaying it, None otherwise
+        """
+        duration = self.expected_duration(task)
+        # (the reserved time is infinite when the reserved task waits for
+        # tasks with no estimate, which must not starve it)
+        if duration is not None and now + duration <= reservation.start < float('inf'):
+            return requested
+        # the task would still be running at the reserved time
+        resources = self.copy_resources(reservation.resources)
+        try:
+            for resource_type, requests in requested.iteritems():
+                for identifier, value in requests:
+                    for resource in resources[resource_type]:
+                        if resource.identifier == identifier:
+                            resource.allocate(task, value)
+        except RuntimeError:
+            return None
+        if reservation.task.offer_resources(resources) is None:
+            return None
+        reservation.resources = resources
+        return requested
+
+    def copy_resources(self, resources=None):
+        """
+        Returns a copy of the resources (default: those of the scheduler)
+        which can be allocated without changing the original ones
+        """
+        if resources is None:
+            resources = self.resources
+        copy = {}
+        for resource_type, pool in resources.iteritems():
+            copy[resource_type] = []
+            for resource in pool:
+                r = Resource(identifier=resource.identifier, max_value=resource.max_value)
+                r.allocations = list(resource.allocations)
+                copy[resource_type].append(r)
+        return copy
+
+    def expected_duration(self, task):
+        """
+        Returns how long a task is expected to run, or None if unknown
+        """
+        return task.expected_duration(list(self.durations.get(type(task), [])))
+
+    def expected_ends(self, now):
+        """
+        Returns (end time, task) for the running tasks, the first to end
+        first (those with no estimate come last)
+        """
+        ends = []
+        for task, start, _, _ in self.started.values():
+            remaining = task.est_done()
+            if remaining is None:
+                duration = self.expected_duration(task)
+                if duration is not None:
+                    remaining = max(0, start + duration - now)
+            ends.append((now + remaining if remaining is not None else float('inf'), task))
+        return sorted(ends, key=lambda end: end[0])
+
+    def start_task(self, task, resources):
+        """
+        Run a task whose resources have been reserved
+        """
+        gevent.spawn(self.run_task, task, resources)
+
+    def task_finished(self, task, now=None):
+        """
+        Forget about a task which is not running anymore
+        """
+        if now is None:
+            now = time.time()
+        if id(task) not in self.started:
+            return
+        self.update_fair_share(now)
+        _, start, _, _ = self.started.pop(id(task))
+        if task.status == Status.DONE:
+            self.durations.setdefault(type(task), deque(maxlen=DURATION_HISTORY)).append(now - start)
+
+    def get_metrics(self):
+        """
+        Returns a dict with the queue wait and resource utilization
+        of the scheduler and the fair share usage of each user
+        """
+        now = time.time()
+        self.update_fair_share(now)
+        metrics = self.metrics.json_dict(self.resources, self.queued_since.values(), now)
+        metrics['running_tasks'] = len(self.started)
+        metrics['fair_share'] = dict(self.fair_share.usage)
+        return metrics
+
+    def save_changed_jobs(self):
+        """
+        Save the active jobs and the changed jobs which need it
+        """
+        save_start = time.time()
+        saved_jobs = 0
+        saved_bytes = 0
+        jobs = OrderedDict(self.active_jobs)
+        jobs.update(self.changed_jobs)
+        self.changed_jobs.clear()
+        for job in jobs.values():
+            if job.is_persistent() and job.is_dirty() and self.save_job(job):
+                saved_jobs += 1
+                saved_bytes += os.path.getsize(job.path(Job.SAVE_FILE))
+        if saved_jobs:
+            logger.debug('Saved %d jobs (%s) in %.3f seconds.' % (
+                saved_jobs, sizeof_fmt(saved_bytes), time.time() - save_start))
+
+    def collect_finished_jobs(self):
+        """
+        Delete the completed non-persistent jobs which have been unclaimed for far too long
+        """
+        for job in self.finished_jobs.values():
+            if time.time() - job.status_history[-1][1] <= NON_PERSISTENT_JOB_DELETE_TIMEOUT_SECONDS:
+                # the others finished later
+                break
+            self.delete_job(job)
+
     def sigterm_handler(self, signal, frame):
         """
         Catch SIGTERM in addition to SIGINT
         """
         self.shutdown.set()
+        self.wake()
 
     def task_error(self, task, error):
         """
@@ -465,6 +946,7 @@ class Scheduler:
         """
         Reserve resources for a task
         """
+        self.metrics.update(self.resources, time.time())
         try:
             # reserve resources
             for resource_type, requests in resources.iteritems():
@@ -490,6 +972,7 @@ class Scheduler:
         """
         Release resources previously reserved for a task
         """
+        self.metrics.update(self.resources, time.time())
         # release resources
         for resource_type, requests in resources.iteritems():
             for identifier, value in requests:
@@ -514,6 +997,9 @@ class Scheduler:
             self.task_error(task, e)
         finally:
             self.release_resources(task, resources)
+            self.task_finished(task)
+            # other tasks may be waiting for these resources
+            self.wake()
 
     def emit_gpus_available(self):
         """
@@ -85,12 +85,31 @@ class StatusCls(object):
     """
     A class that stores a history of Status updates
     Child classes can declare the on_status_update() callback
+
+    Also keeps track of whether anything changed since the last save
     """
 
     def __init__(self):
         self.progress = 0
         self.status_history = []
         self.status = Status.INIT
+        self._dirty = True
+
+    def mark_dirty(self):
+        """
+        Something changed which needs to be saved
+        """
+        self._dirty = True
+
+    def mark_clean(self):
+        """
+        All changes have been saved
+        """
+        self._dirty = False
+
+    def is_dirty(self):
+        # objects loaded from disk are clean until something changes
+        return getattr(self, '_dirty', False)
 
     @property
     def status(self):
@@ -109,6 +128,7 @@ class StatusCls(object):
             return
 
         self.status_history.append((value, time.time()))
+        self.mark_dirty()
 
         # Remove WAIT status if waited for less than 1 second
         if value == Status.RUN and len(self.status_history) >= 2:
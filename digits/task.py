@@ -11,8 +11,9 @@ import time
 
 import flask
 import gevent.event
+import gevent.select
 
-from . import utils
+from . import channel, utils
 from .config import config_value
 from .status import Status, StatusCls
 import digits.log
@@ -26,6 +27,7 @@ class Task(StatusCls):
     Base class for Tasks
     A Task is a compute-heavy operation that runs in a separate executable
     Communication is done by processing the stdout of the executable
+    and the messages it sends on its result channel (see digits.channel)
     """
 
     def __init__(self, job_dir, parents=None):
@@ -49,6 +51,7 @@ class Task(StatusCls):
         self.aborted = gevent.event.Event()
         self.set_logger()
         self.p = None  # Subprocess object for training
+        self.result_channel = None  # channel.MessageReader while running
 
     def __getstate__(self):
         d = self.__dict__.copy()
@@ -60,6 +63,10 @@ class Task(StatusCls):
         if 'p' in d:
             # Subprocess object for training is not pickleable
             del d['p']
+        if 'result_channel' in d:
+            del d['result_channel']
+        if '_dirty' in d:
+            del d['_dirty']
 
         return d
 
@@ -67,6 +74,7 @@ class Task(StatusCls):
         self.__dict__ = state
 
         self.aborted = gevent.event.Event()
+        self.result_channel = None
         self.set_logger()
 
     def set_logger(self):
@@ -161,6 +169,97 @@ class Task(StatusCls):
         """
         raise NotImplementedError
 
+    def summary_key(self):
+        """
+        Returns a value which changes whenever what the home page shows
+        about the task may change (see Job.summary_key)
+        """
+        return (len(self.status_history), self.progress)
+
+    def expected_duration(self, history):
+        """
+        Returns how long (in seconds) the task is expected to run, or None
+        if there is no telling (see Scheduler.schedule_tasks)
+
+        Arguments:
+        history -- how long the last successful tasks of the same class ran
+        """
+        if not history:
+            return None
+        return max(history)
+
+    def offer_host_resources(self, resources, pool, max_cpus=1, memory=0, memory_per_cpu=0, io=0):
+        """
+        Returns the resources requested by a task which runs on the host: a
+        slot of its task pool and the CPU cores, memory and disk IO it needs
+        Returns None if they are not all available
+
+        The task gets at least one CPU core and at most its share of the CPU
+        budget (the budget divided by the slots of its pool), fewer if the
+        memory for more is not available
+
+        Arguments:
+        resources -- a copy of scheduler.resources
+        pool -- the name of the task pool
+
+        Keyword arguments:
+        max_cpus -- how many CPU cores the task can use
+        memory -- megabytes of memory the task needs
+        memory_per_cpu -- additional megabytes of memory for each CPU core
+        io -- how many disk IO slots the task needs
+        """
+        if pool not in resources:
+            return None
+        slots = [r for r in resources[pool] if r.remaining() >= 1]
+        if not slots:
+            return None
+        requested = {pool: [(slots[0].identifier, 1)]}
+
+        # an empty budget is unlimited
+        cpus = max_cpus
+        if resources.get('cpus'):
+            budget = resources['cpus'][0]
+            share = max(1, budget.max_value // sum(r.max_value for r in resources[pool]))
+            cpus = min(max_cpus, share, budget.remaining())
+            if cpus < 1:
+                return None
+
+        if resources.get('memory'):
+            budget = resources['memory'][0]
+
+            def needed(cpus):
+                # a task needing more than the budget runs alone
+                return min(memory + cpus * memory_per_cpu, budget.max_value)
+            while cpus > 1 and needed(cpus) > budget.remaining():
+                cpus -= 1
+            if needed(cpus) > budget.remaining():
+                return None
+            if needed(cpus):
+                requested['memory'] = [(budget.identifier, needed(cpus))]
+
+        if resources.get('cpus'):
+            requested['cpus'] = [(resources['cpus'][0].identifier, cpus)]
+
+        if io and resources.get('io'):
+            budget = resources['io'][0]
+            if budget.remaining() < io:
+                return None
+            requested['io'] = [(budget.identifier, io)]
+        return requested
+
+    @staticmethod
+    def allocated_cpus(resources):
+        """
+        Returns the number of CPU cores reserved in resources (None if
+        the CPUs are not budgeted)
+
+        Arguments:
+        resources -- the resources assigned by the scheduler
+        """
+        if not resources or not resources.get('cpus'):
+            return None
+        return sum(value for _, value in resources['cpus'])
+
     def task_arguments(self, resources, env):
         """
         Returns args used by subprocess.Popen to execute the task
@@ -203,7 +302,13 @@ class Task(StatusCls):
         unrecognized_output = []
 
         import sys
-        env['PYTHONPATH'] = os.pathsep.join(['.', self.job_dir, env.get('PYTHONPATH', '')] + sys.path)
+        # the child runs in job_dir: the relative entries of sys.path (e.g. '' when
+        # the server is started from the repository) must be made absolute, and the
+        # DIGITS package must be importable by tools which do not add it themselves
+        # (e.g. for the result channel)
+        digits_root = os.path.dirname(os.path.dirname(os.path.abspath(digits.__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(['.', self.job_dir, digits_root, env.get('PYTHONPATH', '')] +
+                                            [os.path.abspath(path) for path in sys.path])
 
         # https://docs.python.org/2/library/subprocess.html#converting-argument-sequence
         if platform.system() == 'Windows':
@@ -212,6 +317,10 @@ class Task(StatusCls):
         else:
             self.logger.info('Task subprocess args: "%s"' % ' '.join(args))
 
+        self.result_channel = channel.MessageReader() if channel.is_supported() else None
+        if self.result_channel is not None:
+            env[channel.ENV_VAR] = self.result_channel.path
+
         self.p = subprocess.Popen(args,
                                   stdout=subprocess.PIPE,
                                   stderr=subprocess.STDOUT,
@@ -233,26 +342,33 @@ class Task(StatusCls):
                             self.status = Status.ABORT
                         break
 
+                    self.read_result_channel()
+
                     if line is not None:
                         # Remove whitespace
                         line = line.strip()
 
                     if line:
-                        if not self.process_output(line):
+                        if self.process_output(line):
+                            self.mark_dirty()
+                        else:
                             self.logger.warning('%s unrecognized output: %s' % (self.name(), line.strip()))
                             unrecognized_output.append(line)
                     else:
-                        time.sleep(0.05)
+                        self.wait_for_output()
                 if sigterm_time is not None and (time.time() - sigterm_time > sigterm_timeout):
                     self.p.send_signal(signal.SIGKILL)
                     self.logger.warning('Sent SIGKILL to task "%s"' % self.name())
                     time.sleep(0.1)
                 time.sleep(0.01)
+            self.read_result_channel()
         except:
             self.p.terminate()
+            self.close_result_channel()
             self.after_run()
             raise
 
+        self.close_result_channel()
         self.after_run()
 
         if self.status != Status.RUN:
@@ -274,6 +390,35 @@ class Task(StatusCls):
             self.status = Status.DONE
             return True
 
+    def wait_for_output(self, timeout=0.5):
+        """
+        Wait until the subprocess writes to stdout or to the result channel
+        """
+        if platform.system() == 'Windows':
+            time.sleep(0.05)
+            return
+        fds = [self.p.stdout]
+        if self.result_channel is not None:
+            fds.append(self.result_channel)
+        gevent.select.select(fds, [], [], timeout)
+
+    def read_result_channel(self):
+        """
+        Process the messages received on the result channel
+        """
+        if self.result_channel is None:
+            return
+        for message in self.result_channel.read_messages():
+            if self.process_message(message):
+                self.mark_dirty()
+            else:
+                self.logger.warning('%s unrecognized message: %s' % (self.name(), message.get('type')))
+
+    def close_result_channel(self):
+        if self.result_channel is not None:
+            self.result_channel.close()
+            self.result_channel = None
+
     def abort(self):
         """
         Abort the Task
@@ -318,6 +463,16 @@ class Task(StatusCls):
         """
         raise NotImplementedError
 
+    def process_message(self, message):
+        """
+        Process a message received on the result channel
+        Returns True if the message was able to be processed
+
+        Arguments:
+        message -- a dict with a "type" key
+        """
+        return False
+
     def est_done(self):
         """
         Returns the estimated time in seconds until the task is done
@@ -0,0 +1,154 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from . import catalog
+from . import scheduler
+from .config import config_value
+from .job import Job
+from .status import Status
+from digits import test_utils
+from digits.utils import subclass, override
+
+
+test_utils.skipIfNotFramework('none')
+
+
+@subclass
+class JobForTesting(Job):
+
+    @override
+    def job_type(self):
+        return 'Job For Testing'
+
+
+class TestJobCatalog():
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.catalog = catalog.JobCatalog(self.dir)
+        self.job = JobForTesting(name='testsuite-job', username='digits-testsuite')
+        self.job.status = Status.DONE
+        self.job.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        shutil.rmtree(self.job.dir())
+
+    def test_update(self):
+        assert self.catalog.get(self.job.id()) is None
+        self.catalog.update(self.job)
+        entry = self.catalog.get(self.job.id())
+        assert entry.id() == self.job.id()
+        assert entry.name() == 'testsuite-job'
+        assert entry.status == Status.DONE
+        assert entry.is_instance(Job)
+        assert not entry.is_instance(scheduler.ModelJob)
+        assert entry.json_dict() == self.job.json_dict()
+        fields = set()
+        assert entry.table_dict(fields)['submitted'] == self.job.status_history[0][1]
+
+    def test_mtimes(self):
+        self.catalog.update(self.job)
+        mtime, status = self.catalog.mtimes()[self.job.id()]
+        assert mtime == os.path.getmtime(self.job.path(Job.SAVE_FILE))
+        assert status == Status.DONE
+
+    def test_entries(self):
+        self.job.dataset_id = 'some-dataset'
+        self.catalog.update(self.job)
+        assert [e.id() for e in self.catalog.entries(JobForTesting)] == [self.job.id()]
+        assert [e.id() for e in self.catalog.entries(dataset_id='some-dataset')] == [self.job.id()]
+        assert self.catalog.entries(dataset_id='other-dataset') == []
+
+    def test_details(self):
+        self.job.extension_id = 'some-extension'
+        self.catalog.update(self.job)
+        assert self.catalog.get(self.job.id()).details == {'extension_id': 'some-extension'}
+        assert self.catalog.entry(self.job).details == {'extension_id': 'some-extension'}
+
+    def test_version(self):
+        self.catalog.update(self.job)
+        db = sqlite3.connect(self.catalog.path)
+        db.execute('PRAGMA user_version = %d' % (catalog.JobCatalog.VERSION - 1))
+        db.commit()
+        db.close()
+        # an older catalog is built again
+        assert catalog.JobCatalog(self.dir).entries() == []
+
+    def test_remove(self):
+        self.catalog.update(self.job)
+        self.catalog.remove(self.job.id())
+        assert self.catalog.get(self.job.id()) is None
+
+
+class TestJobSummary():
+
+    def setUp(self):
+        self.job = JobForTesting(name='testsuite-job', username='digits-testsuite')
+
+    def tearDown(self):
+        shutil.rmtree(self.job.dir())
+
+    def test_cached(self):
+        summary = catalog.job_summary(self.job, set())
+        assert catalog.job_summary(self.job, set()) == summary
+        cached = self.job._summary
+        catalog.job_summary(self.job, set())
+        assert self.job._summary is cached
+
+    def test_invalidated(self):
+        catalog.job_summary(self.job, set())
+        self.job.status = Status.DONE
+        assert catalog.job_summary(self.job, set())['status'] == Status(Status.DONE).name
+        self.job._name = 'renamed'
+        assert catalog.job_summary(self.job, set())['name'] == 'renamed'
+
+    def test_not_pickled(self):
+        catalog.job_summary(self.job, set())
+        assert '_summary' not in self.job.__getstate__()
+
+
+class TestLazyLoading():
+
+    def test_load_past_jobs(self):
+        job = JobForTesting(name='testsuite-job', username='digits-testsuite')
+        try:
+            job.status = Status.DONE
+            s = scheduler.Scheduler(config_value('gpu_list'))
+            s.save_job(job)
+            # a second server start finds the job in the catalog
+            s = scheduler.Scheduler(config_value('gpu_list'))
+            s.load_past_jobs()
+            assert job.id() not in s.jobs
+            assert [e.id() for e in s.catalog.entries(JobForTesting)] == [job.id()]
+            loaded = s.get_job(job.id())
+            assert loaded.name() == 'testsuite-job'
+            assert job.id() in s.jobs
+        finally:
+            s.catalog.remove(job.id())
+            shutil.rmtree(job.dir())
+
+    def test_job_entries(self):
+        saved = JobForTesting(name='saved-job', username='digits-testsuite')
+        unsaved = JobForTesting(name='unsaved-job', username='digits-testsuite')
+        try:
+            saved.status = Status.DONE
+            s = scheduler.Scheduler(config_value('gpu_list'))
+            s.save_job(saved)
+            s = scheduler.Scheduler(config_value('gpu_list'))
+            s.load_past_jobs()
+            s.jobs[unsaved.id()] = unsaved
+            entries = s.get_job_entries(JobForTesting)
+            assert [e.id() for e in entries] == [unsaved.id(), saved.id()]
+            assert [e.name() for e in entries] == ['unsaved-job', 'saved-job']
+            # the entries are listed without loading the jobs
+            assert saved.id() not in s.jobs
+        finally:
+            s.catalog.remove(saved.id())
+            shutil.rmtree(saved.dir())
+            shutil.rmtree(unsaved.dir())
@@ -0,0 +1,119 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import mock
+import numpy as np
+
+from . import channel
+from .status import Status
+from .task import Task
+import digits
+from digits import test_utils
+from digits.utils import subclass, override
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestMessageReader():
+
+    def setUp(self):
+        if not channel.is_supported():
+            raise unittest.SkipTest('Result channels are not supported on this platform')
+        self.reader = channel.MessageReader()
+        self.writer = open(self.reader.path, 'wb')
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+
+    def test_empty(self):
+        assert self.reader.read_messages() == []
+
+    def test_round_trip(self):
+        data = np.arange(6, dtype=np.float32).reshape((2, 3))
+        channel.write_message(self.writer, {'type': 'predictions', 'predictions': data})
+        channel.write_message(self.writer, {'type': 'snapshot', 'path': 'snapshot_1'})
+        messages = self.reader.read_messages()
+        assert [m['type'] for m in messages] == ['predictions', 'snapshot']
+        assert np.array_equal(messages[0]['predictions'], data)
+
+    def test_partial_message(self):
+        channel.write_message(self.writer, {'type': 'first'})
+        frame = channel.HEADER.pack(100) + 'x' * 10
+        self.writer.write(frame)
+        self.writer.flush()
+        assert [m['type'] for m in self.reader.read_messages()] == ['first']
+        assert self.reader.read_messages() == []
+
+
+@subclass
+class ChannelTask(Task):
+    """
+    Runs a script which sends a message and prints a line
+    """
+
+    SCRIPT = ("from digits import channel; "
+              "channel.send('metrics', epoch=1.0); "
+              "print('done')")
+
+    def __init__(self, *args, **kwargs):
+        super(ChannelTask, self).__init__(*args, **kwargs)
+        self.lines = []
+        self.messages = []
+
+    @override
+    def name(self):
+        return 'Channel Task'
+
+    @override
+    def task_arguments(self, resources, env):
+        return [sys.executable, '-c', self.SCRIPT]
+
+    @override
+    def process_output(self, line):
+        self.lines.append(line)
+        return True
+
+    @override
+    def process_message(self, message):
+        self.messages.append(message)
+        return True
+
+    @override
+    def on_status_update(self):
+        pass
+
+
+class TestTaskChannel():
+
+    def setUp(self):
+        if not channel.is_supported():
+            raise unittest.SkipTest('Result channels are not supported on this platform')
+        self.job_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.job_dir)
+
+    def test_run(self):
+        task = ChannelTask(self.job_dir)
+        assert task.run({}), 'task failed'
+        assert task.status == Status.DONE
+        assert task.lines == ['done']
+        assert task.messages == [{'type': 'metrics', 'epoch': 1.0}]
+        assert task.result_channel is None
+
+    def test_run_outside_repository(self):
+        # the child must import digits even if the repository is not on the path of the server
+        root = os.path.dirname(os.path.dirname(os.path.abspath(digits.__file__)))
+        path = [p for p in sys.path if p and os.path.abspath(p) != root]
+        with mock.patch.object(sys, 'path', path), mock.patch.dict(os.environ, {'PYTHONPATH': ''}):
+            task = ChannelTask(self.job_dir)
+            assert task.run({}), 'task failed'
+        assert task.messages == [{'type': 'metrics', 'epoch': 1.0}]
@@ -0,0 +1,83 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+from cStringIO import StringIO
+import os
+import shutil
+import tempfile
+
+import gevent
+import numpy as np
+import PIL.Image
+
+from .image_store import ImageStore
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestImageStore():
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = ImageStore(self.dir, 1 << 20)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        image = np.random.randint(0, 255, (10, 12, 3)).astype(np.uint8)
+        name = self.store.add(image)
+        assert name.endswith('.png')
+        # encoded when first requested
+        assert os.listdir(self.dir) == []
+        decoded = PIL.Image.open(StringIO(self.store.get(name)))
+        assert (np.array(decoded) == image).all()
+        assert os.listdir(self.dir) == [name]
+        # then read from disk
+        assert self.store.get(name) == open(os.path.join(self.dir, name), 'rb').read()
+
+    def test_content_addressed(self):
+        image = np.zeros((4, 4), dtype=np.uint8)
+        name = self.store.add(image)
+        image[0, 0] = 1
+        assert self.store.add(image) != name
+        assert self.store.add(image.copy()) == self.store.add(image)
+        assert self.store.add(PIL.Image.fromarray(image)) == self.store.add(image)
+
+    def test_lossy(self):
+        assert self.store.add(np.zeros((4, 4, 3), dtype=np.uint8), lossless=False).endswith('.jpeg')
+        # JPEG has no alpha channel
+        assert self.store.add(np.zeros((4, 4, 4), dtype=np.uint8), lossless=False).endswith('.png')
+
+    def test_palette(self):
+        image = PIL.Image.fromarray(np.arange(16, dtype=np.uint8).reshape(4, 4)).convert('P')
+        decoded = PIL.Image.open(StringIO(self.store.get(self.store.add(image))))
+        assert (np.array(decoded) == np.array(image.convert('RGB'))).all()
+
+    def test_unknown(self):
+        assert self.store.get('0' * 40 + '.png') is None
+        assert self.store.get('../etc/passwd') is None
+
+    def test_max_pending(self):
+        # two 4x4 grayscale images
+        self.store.max_pending_bytes = 32
+        names = [self.store.add(np.full((4, 4), i, dtype=np.uint8)) for i in xrange(5)]
+        gevent.get_hub().threadpool.join()
+        assert sorted(os.listdir(self.dir)) == sorted(names[:3])
+        for name in names:
+            assert self.store.get(name) is not None
+
+    def test_prune(self):
+        names = []
+        for i in xrange(10):
+            names.append(self.store.add(np.random.randint(0, 255, (64, 64, 3)).astype(np.uint8)))
+            self.store.get(names[-1])
+        size = sum(os.path.getsize(os.path.join(self.dir, name)) for name in names)
+        self.store.max_bytes = size // 2
+        self.store.get(self.store.add(np.zeros((4, 4), dtype=np.uint8)))
+        remaining = os.listdir(self.dir)
+        assert sum(os.path.getsize(os.path.join(self.dir, name)) for name in remaining) <= size * 3 // 8
+        assert names[-1] in remaining
+        assert names[0] not in remaining
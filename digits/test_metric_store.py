@@ -0,0 +1,95 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from . import metric_store
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestMetricStore():
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.location = os.path.join(self.dir, 'metrics')
+        self.store = metric_store.MetricStore(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def fill(self, count, name='loss'):
+        y = np.random.rand(count)
+        for i, value in enumerate(y):
+            self.store.append('train', name, 'SoftmaxWithLoss', i / 10.0, value)
+        return y
+
+    def test_round_trip(self):
+        self.store.append('train', 'loss', 'SoftmaxWithLoss', 1, 0.5)
+        self.store.append('val', 'accuracy', 'Accuracy', 1, None)
+        store = metric_store.MetricStore(self.location)
+        assert [(s.phase, s.name, s.kind) for s in store.series()] == [
+            ('train', 'loss', 'SoftmaxWithLoss'), ('val', 'accuracy', 'Accuracy')]
+        assert store.get('train', 'loss').read()['mean'].tolist() == [0.5]
+        assert np.isnan(store.get('val', 'accuracy').read()['mean'][0])
+        assert store.get('val', 'loss') is None
+
+    def test_summaries(self):
+        for count in 1, 7, 8, 9, 64, 100, 1000:
+            for max_points in 1, 10, 50:
+                yield self.check_summaries, count, max_points
+
+    def check_summaries(self, count, max_points):
+        y = self.fill(count)
+        series = self.store.get('train', 'loss')
+        points = series.read(max_points=max_points)
+        assert len(points['x']) <= max(max_points, metric_store.FACTOR) + 1, len(points['x'])
+        # each point summarizes the same number of values, but the last one
+        size = int(round(10 * (points['x'][1] - points['x'][0]))) if len(points['x']) > 1 else count
+        assert size == 1 or count > max_points
+        assert np.allclose(points['x'], np.arange(0, count, size) / 10.0)
+        for i in xrange(len(points['x'])):
+            values = y[i * size:(i + 1) * size]
+            assert np.isclose(points['min'][i], values.min())
+            assert np.isclose(points['max'][i], values.max())
+            assert np.isclose(points['mean'][i], values.mean())
+
+    def test_range(self):
+        y = self.fill(1000)
+        series = self.store.get('train', 'loss')
+        points = series.read(start=10, stop=20)
+        assert np.allclose(points['x'], np.arange(100, 201) / 10.0)
+        assert np.allclose(points['mean'], y[100:201])
+        points = series.read(start=10, stop=20, max_points=20)
+        assert 1 < len(points['x']) <= 21
+        assert points['min'].min() <= y[100:201].min()
+        assert series.read(start=200)['x'].size == 0
+
+    def test_nan(self):
+        self.store.append('train', 'loss', 'SoftmaxWithLoss', 0, 1)
+        for i in xrange(1, 64):
+            self.store.append('train', 'loss', 'SoftmaxWithLoss', i, None)
+        points = self.store.get('train', 'loss').read(max_points=8)
+        assert points['mean'][0] == 1
+        assert np.isnan(points['mean'][1:]).all()
+
+    def test_interrupted_write(self):
+        y = self.fill(100)
+        series = self.store.get('train', 'loss')
+        # a truncated point and a missing bucket
+        with open(series.path(0), 'ab') as f:
+            f.write('\0' * 5)
+        os.remove(series.path(2))
+        store = metric_store.MetricStore(self.location)
+        store.append('train', 'loss', 'SoftmaxWithLoss', 10, 0.5)
+        series = store.get('train', 'loss')
+        assert len(series) == 101
+        points = series.read(max_points=2)
+        assert np.isclose(points['mean'][0], y[:64].mean())
+        assert np.isclose(points['mean'][1], np.append(y[64:], 0.5).mean())
@@ -0,0 +1,64 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import nose.tools
+import numpy as np
+
+from . import rawdb
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestRawDb():
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.location = os.path.join(self.dir, 'db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        for shape in (4, 5), (4, 5, 3):
+            for dtype in rawdb.DTYPES:
+                yield self.check_round_trip, shape, dtype
+
+    def check_round_trip(self, shape, dtype):
+        images = (np.random.rand(7, *shape) * 255).astype(dtype)
+        labels = np.arange(7) % 3
+        writer = rawdb.RawDbWriter(self.location, shape, dtype)
+        writer.write_batch(images[:4], labels[:4])
+        writer.write_batch(list(images[4:]), labels[4:])
+        assert not rawdb.is_raw_db(self.location), 'the header is written on close'
+        writer.close()
+        assert rawdb.is_raw_db(self.location)
+
+        reader = rawdb.RawDbReader(self.location)
+        assert len(reader) == 7
+        assert reader.data.dtype == np.dtype(dtype)
+        assert reader.data.shape[-1] == (1 if len(shape) == 2 else 3)
+        assert (reader.labels == labels).all()
+        for i in xrange(7):
+            assert (reader.get_image(i) == images[i]).all()
+        shutil.rmtree(self.location)
+
+    def test_empty(self):
+        rawdb.RawDbWriter(self.location, (2, 2)).close()
+        reader = rawdb.RawDbReader(self.location)
+        assert len(reader) == 0
+        assert reader.data.shape == (0, 2, 2, 1)
+
+    @nose.tools.raises(ValueError)
+    def test_shape_mismatch(self):
+        writer = rawdb.RawDbWriter(self.location, (4, 5, 3))
+        writer.write_batch(np.zeros((1, 5, 4, 3), dtype=np.uint8), [0])
+
+    @nose.tools.raises(ValueError)
+    def test_bad_dtype(self):
+        rawdb.RawDbWriter(self.location, (4, 5), 'int32')
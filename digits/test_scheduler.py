@@ -1,9 +1,13 @@
 # Copyright (c) 2014-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+import time
+
 from . import scheduler
 from .config import config_value
 from .job import Job
+from .status import Status
+from .task import Task
 from .webapp import app
 from digits import test_utils
 from digits.utils import subclass, override
@@ -58,3 +62,226 @@ class TestSchedulerFlow():
             assert len(self.s.jobs) == 1, 'scheduler has %d jobs' % len(self.s.jobs)
             assert self.s.delete_job(job), 'failed to delete job'
             assert len(self.s.jobs) == 0, 'scheduler has %d jobs' % len(self.s.jobs)
+
+    def test_job_runs_without_polling(self):
+        with app.test_request_context():
+            job = JobForTesting(name='testsuite-job', username='digits-testsuite')
+            assert self.s.add_job(job), 'failed to add job'
+            try:
+                # the main loop is woken up by add_job
+                start = time.time()
+                while job.status != Status.DONE:
+                    assert time.time() - start < scheduler.WAKEUP_INTERVAL / 2.0, 'job is %s' % job.status.name
+                    time.sleep(0.01)
+                while job.id() in self.s.active_jobs:
+                    time.sleep(0.01)
+            finally:
+                assert self.s.delete_job(job), 'failed to delete job'
+
+
+class TestHostResources():
+
+    def get_resources(self, cpus=16, memory=4096, io=2):
+        return {
+            'create_db_task_pool': [scheduler.Resource(max_value=4)],
+            'cpus': [scheduler.Resource(identifier='cpus', max_value=cpus)],
+            'memory': [scheduler.Resource(identifier='memory', max_value=memory)],
+            'io': [scheduler.Resource(identifier='io', max_value=io)],
+        }
+
+    def offer(self, resources, **kwargs):
+        return Task('/tmp/job').offer_host_resources(resources, 'create_db_task_pool', **kwargs)
+
+    def reserve(self, resources, requested):
+        task = object()
+        for key, requests in requested.iteritems():
+            for identifier, value in requests:
+                [r for r in resources[key] if r.identifier == identifier][0].allocate(task, value)
+
+    def test_cpu_share(self):
+        resources = self.get_resources()
+        requested = self.offer(resources, max_cpus=64, io=1)
+        # a quarter of the cores for each slot of the pool
+        assert Task.allocated_cpus(requested) == 4
+        assert requested['io'] == [('io', 1)]
+        assert Task.allocated_cpus(self.offer(resources, max_cpus=2)) == 2
+
+    def test_io_slots(self):
+        resources = self.get_resources()
+        for _ in xrange(2):
+            self.reserve(resources, self.offer(resources, io=1))
+        assert self.offer(resources, io=1) is None
+        assert self.offer(resources) is not None
+
+    def test_memory(self):
+        resources = self.get_resources()
+        requested = self.offer(resources, max_cpus=4, memory=1024, memory_per_cpu=1024)
+        assert requested['memory'] == [('memory', 4096)]
+        # fewer cores when memory is short
+        self.reserve(resources, {'memory': [('memory', 1024)]})
+        requested = self.offer(resources, max_cpus=4, memory=1024, memory_per_cpu=1024)
+        assert Task.allocated_cpus(requested) == 2
+        self.reserve(resources, requested)
+        assert self.offer(resources, memory=1024) is None
+
+    def test_too_big(self):
+        # a task needing more than the budget runs alone
+        resources = self.get_resources()
+        requested = self.offer(resources, memory=10000)
+        assert requested['memory'] == [('memory', 4096)]
+        self.reserve(resources, requested)
+        assert self.offer(resources, memory=1) is None
+
+    def test_no_budget(self):
+        resources = self.get_resources()
+        resources['cpus'] = resources['memory'] = resources['io'] = []
+        requested = self.offer(resources, max_cpus=8, memory=1024, io=1)
+        assert requested.keys() == ['create_db_task_pool']
+        assert Task.allocated_cpus(requested) is None
+
+
+class JobForQueueing(object):
+    """
+    The attributes of a Job used to order the queue
+    """
+
+    def __init__(self, username='digits-testsuite', priority=0):
+        self.username = username
+        self.priority = priority
+
+
+@subclass
+class TaskForQueueing(Task):
+    """
+    Needs some GPUs for a known time
+    """
+
+    def __init__(self, gpus, duration=None):
+        super(TaskForQueueing, self).__init__('/tmp/job')
+        self.gpus = gpus
+        self.duration = duration
+
+    @override
+    def offer_resources(self, resources):
+        identifiers = [r.identifier for r in resources['gpus'] if r.remaining() >= 1][:self.gpus]
+        if len(identifiers) < self.gpus:
+            return None
+        return {'gpus': [(identifier, 1) for identifier in identifiers]}
+
+    @override
+    def expected_duration(self, history):
+        return self.duration
+
+    @override
+    def on_status_update(self):
+        pass
+
+    @override
+    def emit_progress_update(self):
+        pass
+
+
+class SchedulerForQueueing(scheduler.Scheduler):
+    """
+    Does not run the tasks it starts
+    """
+
+    def start_task(self, task, resources):
+        pass
+
+    def emit_gpus_available(self):
+        pass
+
+
+class TestQueue():
+
+    def get_scheduler(self, gpus=8):
+        # simulated GPUs
+        return SchedulerForQueueing(','.join(str(i) for i in xrange(gpus)))
+
+    def schedule(self, s, tasks, now):
+        return s.schedule_tasks([(JobForQueueing(), task) if isinstance(task, Task) else task
+                                 for task in tasks], now)
+
+    def finish(self, s, task, now):
+        task.status = Status.DONE
+        s.release_resources(task, task.current_resources)
+        s.task_finished(task, now)
+
+    def test_priority(self):
+        s = self.get_scheduler(4)
+        low = TaskForQueueing(4)
+        high = TaskForQueueing(4)
+        started = s.schedule_tasks([(JobForQueueing(priority=0), low), (JobForQueueing(priority=10), high)], 0)
+        assert started == [high]
+        assert low.status == Status.WAIT
+
+    def test_fair_share(self):
+        s = self.get_scheduler(4)
+        busy_user = TaskForQueueing(4)
+        other_user = TaskForQueueing(4)
+        s.fair_share.usage['busy'] = 3600
+        started = s.schedule_tasks([(JobForQueueing('busy'), busy_user), (JobForQueueing('other'), other_user)], 0)
+        assert started == [other_user]
+
+    def test_fair_share_decay(self):
+        fair_share = scheduler.FairShare(half_life=10)
+        fair_share.update(0, [])
+        fair_share.update(10, [('a', 2)])
+        assert fair_share.get('a') == 20
+        fair_share.update(20, [])
+        assert fair_share.get('a') == 10
+        assert fair_share.get('b') == 0
+
+    def test_backfill(self):
+        s = self.get_scheduler()
+        running = TaskForQueueing(6, duration=100)
+        assert self.schedule(s, [running], 0) == [running]
+        # the head of the queue waits for the running task until t=100
+        head = TaskForQueueing(8)
+        short = TaskForQueueing(2, duration=50)
+        long = TaskForQueueing(2, duration=500)
+        unknown = TaskForQueueing(2)
+        started = self.schedule(s, [head, long, unknown, short], 10)
+        assert started == [short], 'started %s' % started
+        assert head.status == Status.WAIT
+
+    def test_backfill_without_delay(self):
+        s = self.get_scheduler()
+        running = TaskForQueueing(6, duration=100)
+        self.schedule(s, [running], 0)
+        # the head only needs half of the GPUs at t=100
+        head = TaskForQueueing(4)
+        long = TaskForQueueing(2)
+        assert self.schedule(s, [head, long], 10) == [long]
+
+    def test_reservation_holds(self):
+        s = self.get_scheduler()
+        first = TaskForQueueing(4, duration=100)
+        second = TaskForQueueing(4)
+        self.schedule(s, [first, second], 0)
+        head = TaskForQueueing(8)
+        short = TaskForQueueing(1, duration=10)
+        # nothing is free, nothing starts
+        assert self.schedule(s, [head, short], 10) == []
+        self.finish(s, first, 50)
+        # the head waits for a task with no estimate, and only tasks
+        # which leave it enough GPUs could start ahead of it
+        assert self.schedule(s, [head, short], 60) == []
+        assert short.status == Status.WAIT
+
+    def test_metrics(self):
+        s = self.get_scheduler(2)
+        running = TaskForQueueing(2, duration=100)
+        head = TaskForQueueing(2)
+        self.schedule(s, [running], 0)
+        self.schedule(s, [head], 0)
+        self.finish(s, running, 100)
+        assert self.schedule(s, [head], 100) == [head]
+        assert list(s.metrics.waits) == [0, 100]
+        metrics = s.get_metrics()
+        assert metrics['queued_tasks'] == 0
+        assert metrics['running_tasks'] == 1
+        assert metrics['queue_wait']['max'] == 100
+        assert metrics['utilization']['gpus']['current'] == 1.0
+        assert s.durations[TaskForQueueing] == scheduler.deque([100])
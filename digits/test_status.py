@@ -33,6 +33,17 @@ class TestStatus():
         # should be Status.INIT.
         assert job.status == Status.INIT, 'status should be Status.INIT'
 
+    def test_dirty(self):
+        job = Job(name='testsuite-job', username='digits-testsuite')
+        assert job.is_dirty(), 'new jobs should be saved'
+        assert job.save()
+        assert not job.is_dirty(), 'job should be clean after save'
+
+        job.status = Status.ERROR
+        assert job.is_dirty(), 'status update should make the job dirty'
+        assert job.save()
+        assert not Job.load(job.id()).is_dirty(), 'loaded job should be clean'
+
     def test_set_dict(self):
         job = Job(name='testsuite-job', username='digits-testsuite')
 
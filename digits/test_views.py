@@ -7,8 +7,15 @@ import urllib
 
 from urlparse import urlparse
 
+import mock
+import numpy as np
+
+from . import image_store
 from . import test_utils
 from . import webapp
+from .config import config_value
+from .job import Job
+from .utils import subclass, override
 
 ################################################################################
 # Base classes (they don't start with "Test" so nose won't run them)
@@ -172,6 +179,14 @@ class BaseViewsTest(object):
 ################################################################################
 
 
+@subclass
+class JobForTesting(Job):
+
+    @override
+    def job_type(self):
+        return 'Job For Testing'
+
+
 class TestViews(BaseViewsTest):
 
     @classmethod
@@ -189,6 +204,60 @@ class TestViews(BaseViewsTest):
         rv = self.app.get('/foo')
         assert rv.status_code == 404, 'should return 404'
 
+    def test_image(self):
+        url = image_store.image_url(np.zeros((4, 5, 3), dtype=np.uint8))
+        rv = self.app.get(url)
+        assert rv.status_code == 200, 'image load failed with %s' % rv.status_code
+        assert rv.mimetype == 'image/png'
+        assert 'immutable' in rv.headers['Cache-Control']
+        rv = self.app.get(url, headers={'If-None-Match': rv.headers['ETag']})
+        assert rv.status_code == 304, 'should return 304'
+        rv = self.app.get('/images/%s.png' % ('0' * 40))
+        assert rv.status_code == 404, 'should return 404'
+
+    def test_completed_jobs(self):
+        rv = self.app.get('/completed_jobs/json?offset=0&limit=1')
+        assert rv.status_code == 200, 'page load failed with %s' % rv.status_code
+        data = json.loads(rv.data)
+        assert len(data['models']) <= 1
+        assert 'totals' in data
+        rv = self.app.get('/completed_jobs/json?offset=0&limit=1', headers={'If-None-Match': rv.headers['ETag']})
+        assert rv.status_code == 304, 'should return 304'
+        rv = self.app.get('/completed_jobs/json?limit=foo')
+        assert rv.status_code == 400, 'should return 400'
+
+    def test_scheduler_metrics(self):
+        rv = self.app.get('/scheduler/json')
+        assert rv.status_code == 200, 'page load failed with %s' % rv.status_code
+        assert 'queue_wait' in json.loads(rv.data)
+
+    def test_edit_priority(self):
+        job = JobForTesting(name='testsuite-job', username='digits-testsuite')
+        webapp.scheduler.jobs[job.id()] = job
+        try:
+            with mock.patch.dict(config_value('job_priority'), {'max': 10, 'admins': ['digits-admin']}):
+                for priority, status_code, expected in [
+                        ('-3', 200, -3),
+                        ('-1000', 200, -10),
+                        ('0', 200, 0),
+                        # only administrators can raise a job above the default priority
+                        ('1', 403, 0),
+                        ('foo', 400, 0),
+                ]:
+                    rv = self.app.put('/jobs/%s' % job.id(), data={'job_priority': priority})
+                    assert rv.status_code == status_code, 'got %s for %s' % (rv.status_code, priority)
+                    assert job.priority == expected, 'priority is %s for %s' % (job.priority, priority)
+                rv = self.app.put('/jobs/%s?username=digits-admin' % job.id(), data={'job_priority': '1000'})
+                assert rv.status_code == 403, 'only the owner can edit the job'
+                with mock.patch('digits.utils.auth.get_username', return_value='digits-testsuite'), \
+                        mock.patch.dict(config_value('job_priority'), {'admins': ['digits-testsuite']}):
+                    rv = self.app.put('/jobs/%s' % job.id(), data={'job_priority': '1000'})
+                assert rv.status_code == 200, 'page load failed with %s' % rv.status_code
+                assert job.priority == 10
+        finally:
+            webapp.scheduler.forget_job(job.id())
+            webapp.scheduler.delete_job(job)
+
     def test_autocomplete(self):
         for absolute_path in (True, False):
             yield self.check_autocomplete, absolute_path
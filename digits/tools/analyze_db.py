@@ -2,8 +2,9 @@
 # Copyright (c) 2015-2017, NVIDIA CORPORATION.  All rights reserved.
 
 import argparse
-from collections import Counter
+import itertools
 import logging
+import multiprocessing
 import operator
 import os.path
 import sys
@@ -22,7 +23,9 @@ import PIL.Image
 # Add path for DIGITS package
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import digits.config  # noqa
-from digits import log  # noqa
+from digits import log, utils  # noqa
+from digits.rawdb import RawDbReader, is_raw_db  # noqa
+from digits.utils.lmdbreader import DbIndex, DbReader, DbStats  # noqa
 
 # Import digits.config first to set path to Caffe
 import caffe.io  # noqa
@@ -32,33 +35,6 @@ logger = logging.getLogger('digits.tools.analyze_db')
 np.set_printoptions(suppress=True, precision=3)
 
 
-class DbReader(object):
-    """
-    Reads a database
-    """
-
-    def __init__(self, location):
-        """
-        Arguments:
-        location -- where is the database
-        """
-        self._db = lmdb.open(location,
-                             map_size=1024**3,  # 1MB
-                             readonly=True, lock=False)
-
-        with self._db.begin() as txn:
-            self.total_entries = txn.stat()['entries']
-
-    def entries(self):
-        """
-        Generator returning all entries in the DB
-        """
-        with self._db.begin() as txn:
-            cursor = txn.cursor()
-            for item in cursor:
-                yield item
-
-
 def validate_database_path(database):
     """
     Returns a valid database path
@@ -83,10 +59,124 @@ def print_datum(datum):
     logger.debug('\tEncoded: %s' % datum.encoded)
 
 
+def datum_shape(datum, decode=True):
+    """
+    Returns the shape of a datum as a 'WxHxC' string
+    Raises ValueError if the shape is unknown
+
+    Keyword arguments:
+    decode -- if False, the shape of encoded data without dimensions is '?x?x?'
+    """
+    if (not datum.HasField('height') or datum.height == 0 or
+            not datum.HasField('width') or datum.width == 0):
+        if not datum.encoded:
+            raise ValueError('Shape is not set and datum is not encoded')
+        if not decode:
+            return '?x?x?'
+        # Decode datum to learn the shape
+        s = StringIO()
+        s.write(datum.data)
+        s.seek(0)
+        img = PIL.Image.open(s)
+        width, height = img.size
+        channels = len(img.split())
+    else:
+        width, height, channels = datum.width, datum.height, datum.channels
+    return '%sx%sx%s' % (width, height, channels)
+
+
+def scan_entries(args):
+    """
+    Returns the DbStats of a range or a list of entries
+    Runs in a scan worker process
+
+    Arguments:
+    args -- (database, start_key, stop_key, keys, force_same_shape, print_data)
+        the entries are keys if it is not None, otherwise those from start_key
+        (None for the first one) to stop_key excluded (None for the last one)
+    """
+    database, start_key, stop_key, keys, force_same_shape, print_data = args
+    stats = DbStats()
+    db = lmdb.open(database, map_size=1024**3, readonly=True, lock=False)
+    try:
+        with db.begin() as txn:
+            if keys is not None:
+                entries = ((key, txn.get(key)) for key in keys)
+            else:
+                cursor = txn.cursor()
+                if start_key is None:
+                    cursor.first()
+                elif not cursor.set_range(start_key):
+                    return stats
+                entries = cursor.iternext()
+
+            for key, value in entries:
+                if stop_key is not None and key >= stop_key:
+                    break
+                datum = caffe_pb2.Datum()
+                datum.ParseFromString(value)
+
+                if print_data:
+                    array = caffe.io.datum_to_array(datum)
+                    print '>>> Datum %s (shape=%s)' % (key, array.shape)
+                    print array
+
+                # decode encoded data once per worker unless all shapes are checked
+                shape = datum_shape(datum, decode=force_same_shape or stats.count == 0)
+                stats.add(shape, datum.label if datum.HasField('label') else None)
+
+                if force_same_shape and len(stats.shapes) > 1:
+                    # no need to read further
+                    break
+    finally:
+        db.close()
+    return stats
+
+
+def partition_keys(database, total_entries, parts):
+    """
+    Returns the first key of parts ranges of about the same number of
+    entries
+
+    The keys come from the index saved with the DB (see
+    digits.utils.lmdbreader.DbIndex) or, without one, from a scan of the
+    keys, which does not read the values
+    """
+    count, key = _db_keys(database, total_entries)
+    if count == 0:
+        return []
+    positions = np.linspace(0, count, parts, endpoint=False).astype(np.int64)
+    return sorted(set(key(i) for i in positions))
+
+
+def sample_keys(database, total_entries, size):
+    """
+    Returns the sorted keys of a uniform random sample of size entries
+    """
+    count, key = _db_keys(database, total_entries)
+    positions = np.sort(np.random.choice(count, min(size, count), replace=False))
+    return [key(i) for i in positions]
+
+
+def _db_keys(database, total_entries):
+    """
+    Returns the number of keys of the DB and a function returning the key
+    at a position in DB order
+    """
+    index = DbIndex.load(database)
+    if index is not None and len(index.keys) == total_entries:
+        return len(index.keys), index.key
+    keys = list(DbReader(database).keys())
+    return len(keys), keys.__getitem__
+
+
 def analyze_db(database,
                only_count=False,
                force_same_shape=False,
                print_data=False,
+               workers=None,
+               sample=None,
+               use_writer_stats=False,
                ):
     """
     Looks at the data in a prebuilt database and verifies it
@@ -100,9 +190,20 @@ def analyze_db(database,
     only_count -- only count the entries, don't inspect them
     force_same_shape -- throw an error if not all images have the same shape
     print_data -- print the array for each datum
+    workers -- number of processes reading key ranges of the database
+        (defaults to the number of CPUs)
+    sample -- only read a uniform random sample of the entries and
+        extrapolate their distributions (a fraction of the entries if < 1,
+        otherwise a number of entries), can't be used with force_same_shape
+    use_writer_stats -- report the stats saved by create_db, if they are up
+        to date, instead of reading the database
     """
     start_time = time.time()
 
+    if sample and force_same_shape:
+        logger.error('A sample of the entries can\'t verify that all of them have the same shape')
+        return False
+
     # Open database
     try:
         database = validate_database_path(database)
@@ -110,74 +211,111 @@ def analyze_db(database,
         logger.error(e.message)
         return False
 
-    reader = DbReader(database)
-    logger.info('Total entries: %s' % reader.total_entries)
-
-    unique_shapes = Counter()
+    if is_raw_db(database):
+        return _analyze_raw_db(database, print_data, start_time)
 
-    count = 0
-    update_time = None
-    for key, value in reader.entries():
-        datum = caffe_pb2.Datum()
-        datum.ParseFromString(value)
+    reader = DbReader(database)
+    total_entries = reader.total_entries
+    logger.info('Total entries: %s' % total_entries)
+
+    stats = None
+    if use_writer_stats:
+        stats = DbStats.load(database)
+        if stats is not None and stats.count == total_entries:
+            logger.info('Using the stats saved when the database was created')
+        else:
+            stats = None
 
+    if stats is None:
+        if workers is None:
+            workers = multiprocessing.cpu_count()
         if print_data:
-            array = caffe.io.datum_to_array(datum)
-            print '>>> Datum #%d (shape=%s)' % (count, array.shape)
-            print array
-
-        if (not datum.HasField('height') or datum.height == 0 or
-                not datum.HasField('width') or datum.width == 0):
-            if datum.encoded:
-                if force_same_shape or not len(unique_shapes.keys()):
-                    # Decode datum to learn the shape
-                    s = StringIO()
-                    s.write(datum.data)
-                    s.seek(0)
-                    img = PIL.Image.open(s)
-                    width, height = img.size
-                    channels = len(img.split())
-                else:
-                    # We've already decoded one image, don't bother reading the rest
-                    width = '?'
-                    height = '?'
-                    channels = '?'
-            else:
-                errstr = 'Shape is not set and datum is not encoded'
-                logger.error(errstr)
-                raise ValueError(errstr)
-        else:
-            width, height, channels = datum.width, datum.height, datum.channels
+            # keep the output in order
+            workers = 1
 
-        shape = '%sx%sx%s' % (width, height, channels)
+        if only_count:
+            # read one entry
+            sampled = _scan([(database, None, None, list(itertools.islice(reader.keys(), 1)),
+                              force_same_shape, print_data)], 1, 1)
+            logger.info('Assuming all entries have same shape ...')
+            stats = DbStats(total_entries, dict((shape, total_entries) for shape in sampled.shapes))
+        elif sample:
+            size = int(round(sample * total_entries)) if sample < 1 else int(sample)
+            keys = sample_keys(database, total_entries, max(size, 1))
+            chunks = [(database, None, None, keys[i::workers], force_same_shape, print_data)
+                      for i in xrange(min(workers, len(keys)))]
+            sampled = _scan(chunks, workers, len(keys))
+            logger.info('Estimating the distributions from %s sampled entries ...' % sampled.count)
+            stats = sampled.extrapolate(total_entries)
+        else:
+            if workers > 1 and total_entries > workers:
+                # a few ranges per worker to balance the load
+                starts = partition_keys(database, total_entries, 4 * workers)
+                chunks = [(database, start, stop, None, force_same_shape, False)
+                          for start, stop in zip(starts, starts[1:] + [None])]
+            else:
+                chunks = [(database, None, None, None, force_same_shape, print_data)]
+            stats = _scan(chunks, workers, total_entries)
+            if stats.count != total_entries and not (force_same_shape and len(stats.shapes) > 1):
+                logger.warning('LMDB reported %s total entries, but only read %s' % (total_entries, stats.count))
 
-        unique_shapes[shape] += 1
+    if force_same_shape and len(stats.shapes) > 1:
+        logger.error("Images with different shapes found: %s and %s" % tuple(stats.shapes.keys()[:2]))
+        return False
 
-        if force_same_shape and len(unique_shapes.keys()) > 1:
-            logger.error("Images with different shapes found: %s and %s" % tuple(unique_shapes.keys()))
-            return False
+    _log_stats(stats)
+    logger.info('Completed in %s seconds.' % (time.time() - start_time,))
+    return True
 
-        count += 1
-        # Send update every 2 seconds
-        if update_time is None or (time.time() - update_time) > 2:
-            logger.debug('>>> Key %s' % key)
-            print_datum(datum)
-            logger.debug('Progress: %s/%s' % (count, reader.total_entries))
-            update_time = time.time()
 
-        if only_count:
-            # quit after reading one
-            count = reader.total_entries
-            logger.info('Assuming all entries have same shape ...')
-            unique_shapes[unique_shapes.keys()[0]] = count
-            break
+def _scan(chunks, workers, total):
+    """
+    Returns the merged DbStats of chunks of entries (see scan_entries())
+    read by a pool of workers (or serially in a process patched by gevent)
+    """
+    stats = DbStats()
+    if workers > 1 and len(chunks) > 1 and not utils.can_fork_pool():
+        logger.debug('Scanning serially in a process patched by gevent')
+        workers = 1
+    if workers > 1 and len(chunks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(chunks)))
+        try:
+            results = pool.imap_unordered(scan_entries, chunks)
+            for result in results:
+                stats.merge(result)
+                logger.debug('Progress: %s/%s' % (stats.count, total))
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for chunk in chunks:
+            stats.merge(scan_entries(chunk))
+            logger.debug('Progress: %s/%s' % (stats.count, total))
+    return stats
 
-    if count != reader.total_entries:
-        logger.warning('LMDB reported %s total entries, but only read %s' % (reader.total_entries, count))
 
-    for key, val in sorted(unique_shapes.items(), key=operator.itemgetter(1), reverse=True):
+def _log_stats(stats):
+    for key, val in sorted(stats.shapes.items(), key=operator.itemgetter(1), reverse=True):
         logger.info('%s entries found with shape %s (WxHxC)' % (val, key))
+    for key, val in sorted(stats.labels.items()):
+        logger.info('%s entries found with label %s' % (val, key))
+
 
+def _analyze_raw_db(database, print_data, start_time):
+    """
+    Analyze a raw database: every entry has the shape saved in its header
+    """
+    reader = RawDbReader(database)
+    logger.info('Total entries: %s' % reader.count)
+    if print_data:
+        for i in xrange(reader.count):
+            print '>>> Entry #%d (shape=%s, label=%s)' % (i, reader.data[i].shape, reader.labels[i])
+            print reader.data[i]
+    height, width, channels = reader.shape
+    labels, counts = np.unique(reader.labels, return_counts=True)
+    _log_stats(DbStats(reader.count, {'%sx%sx%s' % (width, height, channels): reader.count},
+                       dict(zip(labels, counts))))
     logger.info('Completed in %s seconds.' % (time.time() - start_time,))
     return True
 
@@ -201,6 +339,16 @@ if __name__ == '__main__':
     parser.add_argument('--print-data',
                         action="store_true",
                         help='Print the array for each datum (best used with --only-count)')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        help='Number of processes reading the database (defaults to the number of CPUs)')
+    parser.add_argument('--sample',
+                        type=float,
+                        help='Only read a random sample of the entries: a fraction (< 1) or a number of entries'
+                        ' (not with --force-same-shape)')
+    parser.add_argument('--use-writer-stats',
+                        action="store_true",
+                        help='Report the stats saved when the database was created, if they are up to date')
 
     args = vars(parser.parse_args())
 
@@ -208,6 +356,9 @@ if __name__ == '__main__':
                   only_count=args['only_count'],
                   force_same_shape=args['force_same_shape'],
                   print_data=args['print_data'],
+                  workers=args['workers'],
+                  sample=args['sample'],
+                  use_writer_stats=args['use_writer_stats'],
                   ):
         sys.exit(0)
     else:
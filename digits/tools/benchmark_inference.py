@@ -0,0 +1,80 @@
+#!/usr/bin/env python2
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+
+"""
+Measures the throughput of the batched inference of a model job
+(infer_many_images() of its train task) on random images
+
+Example:
+    python benchmark_inference.py /path/to/jobs 20170101-000000-abcd -n 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add path for DIGITS package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import digits.config  # noqa
+from digits.tools.inference import load_model  # noqa
+
+
+def random_images(dims, count, distinct=256):
+    """
+    Returns a list of count random images of shape dims (which share
+    the same distinct arrays, to keep large runs in memory)
+    """
+    height, width, channels = dims
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    pool = [np.random.randint(0, 256, shape).astype(np.uint8) for _ in xrange(min(count, distinct))]
+    return [pool[i % len(pool)] for i in xrange(count)]
+
+
+def benchmark(task, images, epoch, gpu):
+    """
+    Returns the number of images per second inferred by a train task
+    """
+    # warm up (loads the snapshot)
+    task.infer_many_images(images[:task.batch_size or 1], snapshot_epoch=epoch, gpu=gpu)
+    # silence the progress of infer_many_images()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        task.infer_many_images(images, snapshot_epoch=epoch, gpu=gpu)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return len(images) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inference benchmark')
+    parser.add_argument('jobs_dir', help='the DIGITS jobs directory')
+    parser.add_argument('model_id', help='a model job')
+    parser.add_argument('-n', '--images', type=int, nargs='+', default=[10000, 100000],
+                        help='images to infer in each run')
+    parser.add_argument('-b', '--batch_size', type=int, nargs='+', default=[None],
+                        help='inference batch sizes (default is the batch size of the job)')
+    parser.add_argument('-e', '--epoch', default='-1', help='which snapshot to use (default is the last one)')
+    parser.add_argument('-g', '--gpu', type=int, default=None, help='which GPU to use (default is the CPU)')
+    args = parser.parse_args()
+
+    model, epoch = load_model(args.jobs_dir, args.model_id, args.epoch)
+    task = model.train_task()
+    images = random_images(task.dataset.get_feature_dims(), max(args.images))
+
+    for batch_size in args.batch_size:
+        if batch_size is not None:
+            task.batch_size = batch_size
+        for count in args.images:
+            rate = benchmark(task, images[:count], epoch, args.gpu)
+            print 'batch_size=%-5s images=%-7d %10.1f images/s' % (task.batch_size, count, rate)
+
+
+if __name__ == '__main__':
+    main()
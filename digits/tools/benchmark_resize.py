@@ -0,0 +1,89 @@
+#!/usr/bin/env python2
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+
+"""
+Measures the throughput of utils.image.resize_images() against calling
+resize_image() on each image, on random images (the seed makes the runs
+reproducible)
+
+Example:
+    python benchmark_resize.py -n 1000 -s 256 256 -r 28 28 -m squash crop fill half_crop
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add path for DIGITS package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from digits.utils import image as image_utils  # noqa
+
+
+def random_images(count, height, width, channels, seed):
+    """
+    Returns a list of count random images of about height x width pixels
+    (the sizes vary by up to 10%, as in a folder of images)
+    """
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in xrange(count):
+        shape = (rng.randint(height * 9 // 10, height + 1), rng.randint(width * 9 // 10, width + 1))
+        if channels > 1:
+            shape += (channels,)
+        images.append(rng.randint(0, 256, shape).astype(np.uint8))
+    return images
+
+
+def per_image(images, height, width, channels, resize_mode):
+    return np.array([image_utils.resize_image(image, height, width, channels=channels, resize_mode=resize_mode)
+                     for image in images])
+
+
+def batched(images, height, width, channels, resize_mode):
+    return image_utils.resize_images(images, height, width, channels=channels, resize_mode=resize_mode)
+
+
+def benchmark(fn, images, height, width, channels, resize_mode, repeat):
+    """
+    Returns the best number of images per second resized by fn over repeat runs
+    """
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        fn(images, height, width, channels, resize_mode)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(images) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Image resize benchmark')
+    parser.add_argument('-n', '--images', type=int, default=1000, help='images to resize')
+    parser.add_argument('-s', '--size', type=int, nargs=2, default=[256, 256], metavar=('HEIGHT', 'WIDTH'),
+                        help='size of the original images')
+    parser.add_argument('-r', '--resize', type=int, nargs=2, default=[28, 28], metavar=('HEIGHT', 'WIDTH'),
+                        help='size of the resized images')
+    parser.add_argument('-c', '--channels', type=int, default=3, help='channels of the images')
+    parser.add_argument('-m', '--modes', nargs='+', default=['squash', 'crop', 'fill', 'half_crop'],
+                        help='resize modes')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark (the best one is kept)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random images')
+    args = parser.parse_args()
+
+    images = random_images(args.images, args.size[0], args.size[1], args.channels, args.seed)
+    height, width = args.resize
+    for resize_mode in args.modes:
+        # the noise of the padding differs, so compare the shapes only
+        assert per_image(images[:2], height, width, args.channels, resize_mode).shape == \
+            batched(images[:2], height, width, args.channels, resize_mode).shape
+        rates = [benchmark(fn, images, height, width, args.channels, resize_mode, args.repeat)
+                 for fn in (per_image, batched)]
+        print '%-10s resize_image: %10.1f images/s  resize_images: %10.1f images/s  (x%.2f)' % (
+            resize_mode, rates[0], rates[1], rates[1] / rates[0])
+
+
+if __name__ == '__main__':
+    main()
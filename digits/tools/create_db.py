@@ -1,10 +1,11 @@
 #!/usr/bin/env python2
 # Copyright (c) 2014-2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
 
 import argparse
 from collections import Counter
 import logging
-import math
+import multiprocessing
 import os
 import Queue
 import random
@@ -21,7 +22,6 @@ except ImportError:
     from StringIO import StringIO
 
 import h5py
-import lmdb
 import numpy as np
 import PIL.Image
 
@@ -29,6 +29,10 @@ import PIL.Image
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import digits.config  # noqa
 from digits import utils, log  # noqa
+from digits.rawdb import RawDbWriter  # noqa
+from digits.utils.lmdbreader import DbIndex, DbStats  # noqa
+from digits.utils import lmdbwriter  # noqa
+from digits.utils.stats import MeanAccumulator  # noqa
 
 # Import digits.config first to set the path to Caffe
 import caffe.io  # noqa
@@ -96,6 +100,132 @@ class LmdbWriter(DbWriter):
     pass
 
 
+class LoadPipeline(object):
+    """
+    Loads images in a pool of worker processes
+
+    Lines from load_queue are cut into sequence-numbered chunks. Finished
+    chunks are held in a reorder buffer until every chunk before them has
+    been handed over, so write_queue always receives the images in the
+    order of load_queue, whatever the number of workers.
+    Stores cumulative results in summary_queue
+    """
+
+    def __init__(self, load_queue, write_queue, summary_queue, num_workers, chunk_size,
+                 image_width, image_height, image_channels,
+                 resize_mode, image_folder, compute_mean,
+                 backend=None, encoding=None):
+        self.load_queue = load_queue
+        self.write_queue = write_queue
+        self.summary_queue = summary_queue
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.settings = {
+            'image_width': image_width,
+            'image_height': image_height,
+            'image_channels': image_channels,
+            'resize_mode': resize_mode,
+            'image_folder': image_folder,
+            'compute_mean': compute_mean,
+            'backend': backend,
+            'encoding': encoding,
+        }
+        self.images_added = 0
+        # Bounds the number of chunks that are loading or waiting to be reordered
+        self._in_flight = threading.Semaphore(4 * num_workers)
+        self._stop = threading.Event()
+        self._pool = None
+        self._thread = None
+
+    def start(self):
+        if self.num_workers > 1 and utils.can_fork_pool():
+            self._pool = multiprocessing.Pool(self.num_workers,
+                                              initializer=_init_load_worker,
+                                              initargs=(self.settings,))
+        else:
+            # Not worth the IPC (or unsafe to fork if gevent is patched) - load in this process
+            _init_load_worker(self.settings)
+        self._thread = threading.Thread(target=self._dispatch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """
+        Waits for the workers to finish
+        """
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+    def terminate(self):
+        """
+        Stops the workers without waiting for the remaining chunks
+        """
+        self._stop.set()
+        # wake up the chunk generator if it is waiting for a slot
+        self._in_flight.release()
+        if self._pool is not None:
+            self._pool.terminate()
+
+    def _chunks(self):
+        """
+        Generates (seqn, lines) chunks from load_queue
+        Blocks while too many chunks are in flight
+        """
+        seqn = 0
+        lines = []
+        while True:
+            try:
+                lines.append(self.load_queue.get_nowait())
+            except Queue.Empty:
+                break
+            if len(lines) == self.chunk_size:
+                self._in_flight.acquire()
+                if self._stop.is_set():
+                    return
+                yield seqn, lines
+                seqn += 1
+                lines = []
+        if lines:
+            self._in_flight.acquire()
+            if not self._stop.is_set():
+                yield seqn, lines
+
+    def _dispatch(self):
+        """
+        Collects the chunks from the workers and forwards them in order
+        """
+        image_stats = MeanAccumulator()
+        reorder_buffer = {}
+        next_seqn = 0
+        try:
+            if self._pool is not None:
+                results = self._pool.imap_unordered(_load_chunk, self._chunks())
+            else:
+                results = (_load_chunk(chunk) for chunk in self._chunks())
+
+            for result in results:
+                reorder_buffer[result[0]] = result[1:]
+                while next_seqn in reorder_buffer:
+                    items, errors, count, chunk_stats = reorder_buffer.pop(next_seqn)
+                    for error in errors:
+                        logger.warning(error)
+                    for item in items:
+                        self.write_queue.put(item)
+                    self.images_added += count
+                    image_stats.merge(chunk_stats)
+                    next_seqn += 1
+                    self._in_flight.release()
+        except Exception as e:
+            logger.error('%s: %s' % (type(e).__name__, e))
+            self._stop.set()
+            self._in_flight.release()
+        finally:
+            self.summary_queue.put((self.images_added, image_stats))
+
+
 class Hdf5Writer(DbWriter):
     """
     A class for writing to HDF5 files
@@ -217,6 +347,7 @@ def create_db(input_file, output_dir,
               shuffle=True,
               mean_files=None,
               delete_files=False,
+              workers=None,
               **kwargs):
     """
     Create a database of images from a list of image paths
@@ -228,13 +359,14 @@ def create_db(input_file, output_dir,
     image_width -- image resize width
     image_height -- image resize height
     image_channels -- image channels
-    backend -- the DB format (lmdb/hdf5)
+    backend -- the DB format (lmdb/hdf5/tfrecords/raw)
 
     Keyword arguments:
     resize_mode -- passed to utils.image.resize_image()
     shuffle -- if True, shuffle the images in the list before creating
     mean_files -- a list of mean files to save
     delete_files -- if True, delete raw images after creation of database
+    workers -- number of processes used to load images (defaults to the number of CPUs)
     """
     # Validate arguments
 
@@ -254,6 +386,8 @@ def create_db(input_file, output_dir,
         raise ValueError('invalid number of channels')
     if resize_mode not in [None, 'crop', 'squash', 'fill', 'half_crop']:
         raise ValueError('invalid resize_mode')
+    if backend == 'raw' and kwargs.get('encoding') not in [None, 'none']:
+        raise ValueError('raw databases cannot be encoded')
     if image_folder is not None and not os.path.exists(image_folder):
         raise ValueError('image_folder does not exist')
     if mean_files:
@@ -273,39 +407,59 @@ def create_db(input_file, output_dir,
     load_queue = Queue.Queue()
     image_count = _fill_load_queue(input_file, load_queue, shuffle)
 
-    # Start some load threads
+    # Start the load workers
 
     batch_size = _calculate_batch_size(image_count,
                                        bool(backend == 'hdf5'), kwargs.get('hdf5_dset_limit'),
                                        image_channels, image_height, image_width)
-    num_threads = _calculate_num_threads(batch_size, shuffle)
+    num_workers = _calculate_num_workers(image_count, workers)
+    chunk_size = _calculate_chunk_size(image_count, num_workers)
     write_queue = Queue.Queue(2 * batch_size)
     summary_queue = Queue.Queue()
 
-    for _ in xrange(num_threads):
-        p = threading.Thread(target=_load_thread,
-                             args=(load_queue, write_queue, summary_queue,
-                                   image_width, image_height, image_channels,
-                                   resize_mode, image_folder, compute_mean),
-                             kwargs={'backend': backend,
-                                     'encoding': kwargs.get('encoding', None)},
-                             )
-        p.daemon = True
-        p.start()
+    logger.info('Loading images with %d worker%s' % (num_workers, 's' if num_workers > 1 else ''))
+    pipeline = LoadPipeline(load_queue, write_queue, summary_queue, num_workers, chunk_size,
+                            image_width, image_height, image_channels,
+                            resize_mode, image_folder, compute_mean,
+                            backend=backend,
+                            encoding=kwargs.get('encoding', None),
+                            )
+    pipeline.start()
 
     start = time.time()
 
-    if backend == 'lmdb':
-        _create_lmdb(image_count, write_queue, batch_size, output_dir,
-                     summary_queue, num_threads,
-                     mean_files, **kwargs)
-    elif backend == 'hdf5':
-        _create_hdf5(image_count, write_queue, batch_size, output_dir,
-                     image_width, image_height, image_channels,
-                     summary_queue, num_threads,
-                     mean_files, **kwargs)
-    else:
-        raise ValueError('invalid backend')
+    # The pipeline hands everything over through a single producer
+    num_threads = 1
+    try:
+        if backend == 'lmdb':
+            _create_lmdb(image_count, write_queue, batch_size, output_dir,
+                         image_width, image_height, image_channels,
+                         summary_queue, num_threads,
+                         mean_files, **kwargs)
+        elif backend == 'hdf5':
+            _create_hdf5(image_count, write_queue, batch_size, output_dir,
+                         image_width, image_height, image_channels,
+                         summary_queue, num_threads,
+                         mean_files, **kwargs)
+        elif backend == 'tfrecords':
+            _create_tfrecords(image_count, write_queue, batch_size, output_dir,
+                              summary_queue, num_threads,
+                              mean_files, **kwargs)
+        elif backend == 'raw':
+            _create_raw(image_count, write_queue, batch_size, output_dir,
+                        image_width, image_height, image_channels,
+                        summary_queue, num_threads,
+                        mean_files, **kwargs)
+        else:
+            raise ValueError('invalid backend')
+    except:
+        pipeline.terminate()
+        raise
+    pipeline.close()
+
+    elapsed = time.time() - start
+    logger.info('%d images processed in %.1f seconds (%.1f images/sec)'
+                % (pipeline.images_added, elapsed, pipeline.images_added / max(elapsed, 1e-6)))
 
     if delete_files:
         # delete files
@@ -339,11 +493,11 @@ def _create_tfrecords(image_count, write_queue, batch_size, output_dir,
         raise ValueError("Can't create TFRecords as support for Tensorflow "
                          "is not enabled.")
 
-    wait_time = time.time()
+    start = wait_time = time.time()
     threads_done = 0
     images_loaded = 0
     images_written = 0
-    image_sum = None
+    image_stats = MeanAccumulator()
     compute_mean = bool(mean_files)
 
     os.makedirs(output_dir)
@@ -366,20 +520,17 @@ def _create_tfrecords(image_count, write_queue, batch_size, output_dir,
 
         # Send update every 2 seconds
         if time.time() - wait_time > 2:
-            logger.debug('Processed %d/%d' % (images_written, image_count))
+            _log_progress(images_written, image_count, start)
             wait_time = time.time()
 
         processed_something = False
 
         if not summary_queue.empty():
-            result_count, result_sum = summary_queue.get()
+            result_count, result_stats = summary_queue.get()
             images_loaded += result_count
-            # Update total_image_sum
-            if compute_mean and result_count > 0 and result_sum is not None:
-                if image_sum is None:
-                    image_sum = result_sum
-                else:
-                    image_sum += result_sum
+            # Update image_stats
+            if compute_mean:
+                image_stats.merge(result_stats)
             threads_done += 1
             processed_something = True
 
@@ -403,13 +554,14 @@ def _create_tfrecords(image_count, write_queue, batch_size, output_dir,
     logger.info('%s images written to database' % images_written)
 
     if compute_mean:
-        _save_means(image_sum, images_written, mean_files)
+        _save_means(image_stats, mean_files)
 
     for writer in writers:
         writer.close()
 
 
 def _create_lmdb(image_count, write_queue, batch_size, output_dir,
+                 image_width, image_height, image_channels,
                  summary_queue, num_threads,
                  mean_files=None,
                  encoding=None,
@@ -420,58 +572,50 @@ def _create_lmdb(image_count, write_queue, batch_size, output_dir,
 
     Keyword arguments:
     encoding -- image encoding format
-    lmdb_map_size -- the initial LMDB map size
+    lmdb_map_size -- the initial LMDB map size (estimated if not set)
     """
-    wait_time = time.time()
+    start = wait_time = time.time()
     threads_done = 0
     images_loaded = 0
     images_written = 0
-    image_sum = None
-    batch = []
+    image_stats = MeanAccumulator()
+    labels = []
     compute_mean = bool(mean_files)
 
-    db = lmdb.open(output_dir,
-                   map_size=lmdb_map_size,
-                   map_async=True,
-                   max_dbs=0)
+    writer = lmdbwriter.DbWriter(output_dir,
+                                 map_size=lmdb_map_size,
+                                 expected_entries=image_count)
 
     while (threads_done < num_threads) or not write_queue.empty():
 
         # Send update every 2 seconds
         if time.time() - wait_time > 2:
-            logger.debug('Processed %d/%d' % (images_written, image_count))
+            _log_progress(images_written, image_count, start)
             wait_time = time.time()
 
         processed_something = False
 
         if not summary_queue.empty():
-            result_count, result_sum = summary_queue.get()
+            result_count, result_stats = summary_queue.get()
             images_loaded += result_count
-            # Update total_image_sum
-            if compute_mean and result_count > 0 and result_sum is not None:
-                if image_sum is None:
-                    image_sum = result_sum
-                else:
-                    image_sum += result_sum
+            # Update image_stats
+            if compute_mean:
+                image_stats.merge(result_stats)
             threads_done += 1
             processed_something = True
 
         if not write_queue.empty():
-            datum = write_queue.get()
-            batch.append(datum)
-
-            if len(batch) == batch_size:
-                _write_batch_lmdb(db, batch, images_written)
-                images_written += len(batch)
-                batch = []
+            datum_string, label = write_queue.get()
+            writer.put('%08d_%d' % (images_written, label), datum_string)
+            labels.append(label)
+            images_written += 1
             processed_something = True
 
         if not processed_something:
             time.sleep(0.2)
 
-    if len(batch) > 0:
-        _write_batch_lmdb(db, batch, images_written)
-        images_written += len(batch)
+    writer.close()
+    logger.info(writer.summary())
 
     if images_loaded == 0:
         raise LoadError('no images loaded from input file')
@@ -482,9 +626,13 @@ def _create_lmdb(image_count, write_queue, batch_size, output_dir,
     logger.info('%s images written to database' % images_written)
 
     if compute_mean:
-        _save_means(image_sum, images_written, mean_files)
+        _save_means(image_stats, mean_files)
 
-    db.close()
+    # Lets the explore page open any page in constant time
+    DbIndex.from_labels(_lmdb_keys(labels), labels).save(output_dir)
+    # Lets analyze_db report the DB without reading it
+    shape = '%sx%sx%s' % (image_width, image_height, image_channels)
+    DbStats(images_written, {shape: images_written}, Counter(labels)).save(output_dir)
 
 
 def _create_hdf5(image_count, write_queue, batch_size, output_dir,
@@ -500,11 +648,11 @@ def _create_hdf5(image_count, write_queue, batch_size, output_dir,
     Keyword arguments:
     compression -- dataset compression format
     """
-    wait_time = time.time()
+    start = wait_time = time.time()
     threads_done = 0
     images_loaded = 0
     images_written = 0
-    image_sum = None
+    image_stats = MeanAccumulator()
     batch = []
     compute_mean = bool(mean_files)
 
@@ -521,20 +669,17 @@ def _create_hdf5(image_count, write_queue, batch_size, output_dir,
 
         # Send update every 2 seconds
         if time.time() - wait_time > 2:
-            logger.debug('Processed %d/%d' % (images_written, image_count))
+            _log_progress(images_written, image_count, start)
             wait_time = time.time()
 
         processed_something = False
 
         if not summary_queue.empty():
-            result_count, result_sum = summary_queue.get()
+            result_count, result_stats = summary_queue.get()
             images_loaded += result_count
-            # Update total_image_sum
-            if compute_mean and result_count > 0 and result_sum is not None:
-                if image_sum is None:
-                    image_sum = result_sum
-                else:
-                    image_sum += result_sum
+            # Update image_stats
+            if compute_mean:
+                image_stats.merge(result_stats)
             threads_done += 1
             processed_something = True
 
@@ -565,7 +710,74 @@ def _create_hdf5(image_count, write_queue, batch_size, output_dir,
     logger.info('%s images written to database' % images_written)
 
     if compute_mean:
-        _save_means(image_sum, images_written, mean_files)
+        _save_means(image_stats, mean_files)
+
+
+def _create_raw(image_count, write_queue, batch_size, output_dir,
+                image_width, image_height, image_channels,
+                summary_queue, num_threads,
+                mean_files=None,
+                **kwargs):
+    """
+    Create a raw database (see digits.rawdb)
+    """
+    start = wait_time = time.time()
+    threads_done = 0
+    images_loaded = 0
+    images_written = 0
+    image_stats = MeanAccumulator()
+    batch = []
+    compute_mean = bool(mean_files)
+
+    writer = RawDbWriter(output_dir, (image_height, image_width, image_channels))
+
+    while (threads_done < num_threads) or not write_queue.empty():
+
+        # Send update every 2 seconds
+        if time.time() - wait_time > 2:
+            _log_progress(images_written, image_count, start)
+            wait_time = time.time()
+
+        processed_something = False
+
+        if not summary_queue.empty():
+            result_count, result_stats = summary_queue.get()
+            images_loaded += result_count
+            # Update image_stats
+            if compute_mean:
+                image_stats.merge(result_stats)
+            threads_done += 1
+            processed_something = True
+
+        if not write_queue.empty():
+            batch.append(write_queue.get())
+
+            if len(batch) == batch_size:
+                writer.write_batch([i[0] for i in batch], [i[1] for i in batch])
+                images_written += len(batch)
+                batch = []
+            processed_something = True
+
+        if not processed_something:
+            time.sleep(0.2)
+
+    if len(batch) > 0:
+        writer.write_batch([i[0] for i in batch], [i[1] for i in batch])
+        images_written += len(batch)
+    writer.close()
+
+    assert images_written == writer.count
+
+    if images_loaded == 0:
+        raise LoadError('no images loaded from input file')
+    logger.debug('%s images loaded' % images_loaded)
+
+    if images_written == 0:
+        raise WriteError('no images written to database')
+    logger.info('%s images written to database' % images_written)
+
+    if compute_mean:
+        _save_means(image_stats, mean_files)
 
 
 def _fill_load_queue(filename, queue, shuffle):
@@ -646,80 +858,100 @@ def _calculate_batch_size(image_count, is_hdf5=False, hdf5_dset_limit=None,
         return min(100, image_count)
 
 
-def _calculate_num_threads(batch_size, shuffle):
+def _calculate_num_workers(image_count, workers=None):
     """
-    Calculates an appropriate number of threads for creating this database
+    Calculates an appropriate number of load workers for creating this database
     """
-    if shuffle:
-        return min(10, int(round(math.sqrt(batch_size))))
-    else:
-        # XXX This is the only way to preserve order for now
-        # This obviously hurts performance considerably
-        return 1
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    return max(1, min(workers, image_count))
 
 
-def _load_thread(load_queue, write_queue, summary_queue,
-                 image_width, image_height, image_channels,
-                 resize_mode, image_folder, compute_mean,
-                 backend=None, encoding=None):
+def _calculate_chunk_size(image_count, num_workers):
     """
-    Consumes items in load_queue
-    Produces items to write_queue
-    Stores cumulative results in summary_queue
+    Calculates how many images are sent to a load worker at once
+    Big enough to amortize IPC, small enough to keep all workers busy
     """
-    images_added = 0
-    if compute_mean:
-        image_sum = _initial_image_sum(image_width, image_height, image_channels)
-    else:
-        image_sum = None
+    return max(1, min(64, image_count // (4 * num_workers)))
 
-    while not load_queue.empty():
-        try:
-            path, label = load_queue.get(True, 0.05)
-        except Queue.Empty:
-            continue
 
+def _log_progress(images_written, image_count, start):
+    """
+    Log the progress and the throughput so far
+    """
+    elapsed = time.time() - start
+    logger.debug('Processed %d/%d (%.1f images/sec)'
+                 % (images_written, image_count, images_written / max(elapsed, 1e-6)))
+
+
+# Per-process settings for the load workers (see _init_load_worker)
+_load_settings = None
+
+
+def _init_load_worker(settings):
+    """
+    Store the settings shared by every chunk in the worker process
+    """
+    global _load_settings
+    _load_settings = settings
+
+
+def _load_chunk(chunk):
+    """
+    Loads, resizes and encodes a chunk of (path, label) lines
+    Runs in a load worker process
+
+    Returns (seqn, items, errors, images_added, image_stats)
+    """
+    seqn, lines = chunk
+    settings = _load_settings
+    image_width = settings['image_width']
+    image_height = settings['image_height']
+    image_channels = settings['image_channels']
+    image_folder = settings['image_folder']
+    backend = settings['backend']
+    encoding = settings['encoding']
+
+    items = []
+    errors = []
+    if settings['compute_mean']:
+        image_stats = MeanAccumulator()
+    else:
+        image_stats = None
+
+    images = []
+    labels = []
+    for path, label in lines:
         # prepend path with image_folder, if appropriate
         if not utils.is_url(path) and image_folder and not os.path.isabs(path):
             path = os.path.join(image_folder, path)
 
         try:
-            image = utils.image.load_image(path)
+            images.append(utils.image.load_image(path))
         except utils.errors.LoadImageError as e:
-            logger.warning('[%s %s] %s: %s' % (path, label, type(e).__name__, e))
+            errors.append('[%s %s] %s: %s' % (path, label, type(e).__name__, e))
             continue
-
-        image = utils.image.resize_image(image,
-                                         image_height, image_width,
-                                         channels=image_channels,
-                                         resize_mode=resize_mode,
-                                         )
-
-        if compute_mean:
-            image_sum += image
-
+        labels.append(label)
+
+    if images:
+        images = utils.image.resize_images(images,
+                                           image_height, image_width,
+                                           channels=image_channels,
+                                           resize_mode=settings['resize_mode'],
+                                           )
+        if image_stats is not None:
+            image_stats.add(images)
+
+    for image, label in zip(images, labels):
         if backend == 'lmdb':
             datum = _array_to_datum(image, label, encoding)
-            write_queue.put(datum)
+            items.append((datum.SerializeToString(), label))
         elif backend == 'tfrecords':
-            tf_example = _array_to_tf_feature(image, label, encoding)
-            write_queue.put(tf_example)
+            items.append(_array_to_tf_feature(image, label, encoding))
         else:
-            write_queue.put((image, label))
-
-        images_added += 1
+            items.append((image, label))
 
-    summary_queue.put((images_added, image_sum))
-
-
-def _initial_image_sum(width, height, channels):
-    """
-    Returns an array of zeros that will be used to store the accumulated sum of images
-    """
-    if channels == 1:
-        return np.zeros((height, width), np.float64)
-    else:
-        return np.zeros((height, width, channels), np.float64)
+    return seqn, items, errors, len(items), image_stats
 
 
 def _int64_feature(value):
@@ -807,37 +1039,26 @@ def _array_to_datum(image, label, encoding):
     return datum
 
 
-def _write_batch_lmdb(db, batch, image_count):
+def _lmdb_keys(labels):
     """
-    Write a batch to an LMDB database
+    Returns the keys written by _create_lmdb() for these labels
     """
-    try:
-        with db.begin(write=True) as lmdb_txn:
-            for i, datum in enumerate(batch):
-                key = '%08d_%d' % (image_count + i, datum.label)
-                lmdb_txn.put(key, datum.SerializeToString())
-
-    except lmdb.MapFullError:
-        # double the map_size
-        curr_limit = db.info()['map_size']
-        new_limit = curr_limit * 2
-        try:
-            db.set_mapsize(new_limit)  # double it
-        except AttributeError as e:
-            version = tuple(int(x) for x in lmdb.__version__.split('.'))
-            if version < (0, 87):
-                raise Error('py-lmdb is out of date (%s vs 0.87)' % lmdb.__version__)
-            else:
-                raise e
-        # try again
-        _write_batch_lmdb(db, batch, image_count)
+    labels = np.asarray(labels, dtype=np.int64)
+    return np.char.add(np.char.mod('%08d_', np.arange(len(labels))), np.char.mod('%d', labels))
 
 
-def _save_means(image_sum, image_count, mean_files):
+def _save_means(image_stats, mean_files):
     """
     Save mean[s] to file
+
+    Arguments:
+    image_stats -- a MeanAccumulator
+    mean_files -- a list of mean files to save
     """
-    mean = np.around(image_sum / image_count).astype(np.uint8)
+    logger.info('Per-channel mean: %s, standard deviation: %s' % (
+        ', '.join('%.2f' % m for m in image_stats.channel_mean()),
+        ', '.join('%.2f' % s for s in image_stats.channel_std())))
+    mean = np.around(image_stats.mean()).astype(np.uint8)
     for mean_file in mean_files:
         if mean_file.lower().endswith('.npy'):
             np.save(mean_file, mean)
@@ -916,7 +1137,7 @@ if __name__ == '__main__':
                         )
     parser.add_argument('-b', '--backend',
                         default='lmdb',
-                        help='The database backend - lmdb[default], hdf5 or tfrecords')
+                        help='The database backend - lmdb[default], hdf5, tfrecords or raw')
     parser.add_argument('--lmdb_map_size',
                         type=int,
                         help='The initial map size for LMDB (in MB)')
@@ -927,6 +1148,9 @@ if __name__ == '__main__':
     parser.add_argument('--delete_files',
                         action='store_true',
                         help='Specifies whether to keep files after creation of dataset')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        help='Number of processes used to load images (defaults to the number of CPUs)')
 
     args = vars(parser.parse_args())
 
@@ -946,7 +1170,8 @@ if __name__ == '__main__':
                   compression=args['compression'],
                   lmdb_map_size=args['lmdb_map_size'],
                   hdf5_dset_limit=args['hdf5_dset_limit'],
-                  delete_files=args['delete_files']
+                  delete_files=args['delete_files'],
+                  workers=args['workers'],
                   )
     except Exception as e:
         logger.error('%s: %s' % (type(e).__name__, e.message))
@@ -7,7 +7,6 @@ try:
     from cStringIO import StringIO
 except ImportError:
     from StringIO import StringIO
-import lmdb
 import logging
 import numpy as np
 import os
@@ -21,6 +20,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 import digits.config  # noqa
 from digits import extensions, log  # noqa
 from digits.job import Job  # noqa
+from digits.utils import lmdbwriter  # noqa
+from digits.utils.stats import MeanAccumulator  # noqa
 
 # Import digits.config first to set the path to Caffe
 import caffe.io  # noqa
@@ -81,8 +82,10 @@ class LmdbWriter(DbWriter):
                  stage,
                  feature_encoding,
                  label_encoding,
+                 expected_entries=None,
                  **kwargs):
         self.stage = stage
+        self.expected_entries = expected_entries
         db_dir = os.path.join(dataset_dir, stage)
         if not os.path.exists(db_dir):
             os.makedirs(db_dir)
@@ -99,10 +102,9 @@ class LmdbWriter(DbWriter):
     def create_lmdb(self, db_type):
         sub_dir = os.path.join(self.stage, db_type)
         db_dir = os.path.join(self._dir, sub_dir)
-        db = lmdb.open(
+        db = lmdbwriter.DbWriter(
             db_dir,
-            map_async=True,
-            max_dbs=0)
+            expected_entries=self.expected_entries)
         logger.info('Created %s db for stage %s in %s' % (db_type,
                                                           self.stage,
                                                           sub_dir))
@@ -193,24 +195,14 @@ class LmdbWriter(DbWriter):
         logger.info('Processed %d/%d' % (self.processed_batches, self.total_batches))
 
     def write_datums(self, db, batch):
-        try:
-            with db.begin(write=True) as lmdb_txn:
-                for key, datum in batch:
-                    lmdb_txn.put(key, datum)
-        except lmdb.MapFullError:
-            # double the map_size
-            curr_limit = db.info()['map_size']
-            new_limit = curr_limit * 2
-            try:
-                db.set_mapsize(new_limit)  # double it
-            except AttributeError as e:
-                version = tuple(int(x) for x in lmdb.__version__.split('.'))
-                if version < (0, 87):
-                    raise ValueError('py-lmdb is out of date (%s vs 0.87)' % lmdb.__version__)
-                else:
-                    raise e
-            # try again
-            self.write_datums(db, batch)
+        db.put_many(batch)
+
+    def run(self):
+        super(LmdbWriter, self).run()
+        for db_type, db in ('features', self.feature_db), ('labels', self.label_db):
+            if db is not None:
+                db.close()
+                logger.info('%s db for stage %s: %s' % (db_type.capitalize(), self.stage, db.summary()))
 
 
 class Encoder(threading.Thread):
@@ -221,7 +213,8 @@ class Encoder(threading.Thread):
         self.writer = writer
         self.label_shape = None
         self.feature_shape = None
-        self.feature_sum = None
+        # features are (channels, height, width)
+        self.feature_stats = MeanAccumulator(channel_axis=0)
         self.processed_count = 0
         self.sample_count = 0
         self.error_queue = error_queue
@@ -241,6 +234,7 @@ class Encoder(threading.Thread):
 
             try:
                 data = []
+                features = []
                 for entry_id in batch:
                     # call into extension to format entry into number arrays
                     entry_value = self.extension.encode_entry(entry_id)
@@ -262,10 +256,8 @@ class Encoder(threading.Thread):
                             if self.label_shape != label.shape:
                                 raise ValueError("Label shape mismatch (last:%s, previous:%s)"
                                                  % (repr(label.shape), repr(self.label_shape)))
-                            if self.feature_sum is None:
-                                self.feature_sum = np.zeros(self.feature_shape, dtype=np.float64)
-                            # accumulate sum for mean file calculation
-                            self.feature_sum += feature
+                            # accumulate statistics for mean file calculation
+                            features.append(feature)
 
                         # aggregate data
                         data.append((feature, label))
@@ -273,6 +265,8 @@ class Encoder(threading.Thread):
 
                     self.processed_count += 1
 
+                self.feature_stats.add(features)
+
                 if len(data) >= 0:
                     # write data
                     self.writer.write_batch(data)
@@ -312,6 +306,7 @@ class DbCreator(object):
                 dataset_dir,
                 stage,
                 total_batches=len(batch_indices),
+                expected_entries=entry_count,
                 feature_encoding=feature_encoding,
                 label_encoding=label_encoding)
             writer.daemon = True
@@ -326,7 +321,7 @@ class DbCreator(object):
                 encoders.append(encoder)
 
             # wait for all encoder threads to complete and aggregate data
-            feature_sum = None
+            feature_stats = MeanAccumulator(channel_axis=0)
             processed_count = 0
             sample_count = 0
             feature_shape = None
@@ -352,16 +347,13 @@ class DbCreator(object):
                     if encoder.label_shape and label_shape != encoder.label_shape:
                         raise ValueError("Label shape mismatch (last:%s, previous:%s)"
                                          % (repr(label_shape), repr(encoder.label_shape)))
-                    if feature_sum is None:
-                        feature_sum = encoder.feature_sum
-                    elif encoder.feature_sum is not None:
-                        feature_sum += encoder.feature_sum
+                    feature_stats.merge(encoder.feature_stats)
                 processed_count += encoder.processed_count
                 sample_count += encoder.sample_count
 
             # write mean file
-            if feature_sum is not None:
-                self.save_mean(feature_sum, sample_count, dataset_dir, stage)
+            if feature_stats.count > 0:
+                self.save_mean(feature_stats, dataset_dir, stage)
 
             # wait for writer thread to complete
             writer.set_done()
@@ -374,11 +366,18 @@ class DbCreator(object):
 
             logger.info('Found %d entries for stage %s' % (sample_count, stage))
 
-    def save_mean(self, feature_sum, entry_count, dataset_dir, stage):
+    def save_mean(self, feature_stats, dataset_dir, stage):
         """
         Save mean to file
+
+        Arguments:
+        feature_stats -- a MeanAccumulator
         """
-        data = np.around(feature_sum / entry_count).astype(np.uint8)
+        logger.info('Per-channel mean for stage %s: %s, standard deviation: %s' % (
+            stage,
+            ', '.join('%.2f' % m for m in feature_stats.channel_mean()),
+            ', '.join('%.2f' % s for s in feature_stats.channel_std())))
+        data = np.around(feature_stats.mean()).astype(np.uint8)
         mean_file = os.path.join(stage, 'mean.binaryproto')
         # Transform to caffe's format requirements
         if data.ndim == 3:
@@ -3,12 +3,16 @@
 
 import argparse
 import base64
+import collections
 import h5py
 import logging
+import multiprocessing
 import numpy as np
 import PIL.Image
 import os
+import Queue
 import sys
+import threading
 try:
     from cStringIO import StringIO
 except ImportError:
@@ -20,6 +24,8 @@ import digits.config  # noqa
 from digits import utils, log  # noqa
 from digits.inference.errors import InferenceError  # noqa
 from digits.job import Job  # noqa
+from digits.rawdb import RawDbReader, is_raw_db  # noqa
+from digits.utils import constants  # noqa
 from digits.utils.lmdbreader import DbReader  # noqa
 
 # Import digits.config before caffe to set the path
@@ -33,23 +39,13 @@ Perform inference on a list of images using the specified model
 """
 
 
-def infer(input_list,
-          output_dir,
-          jobs_dir,
-          model_id,
-          epoch,
-          batch_size,
-          layers,
-          gpu,
-          input_is_db,
-          resize):
-    """
-    Perform inference on a list of images using the specified model
+def load_model(jobs_dir, model_id, epoch):
     """
-    # job directory defaults to that defined in DIGITS config
-    if jobs_dir == 'none':
-        jobs_dir = digits.config.config_value('jobs_dir')
+    Load a model job and its dataset job
 
+    Returns (model, epoch) where epoch is the epoch of the snapshot to use
+    (the last one if epoch is -1)
+    """
     # load model job
     model_dir = os.path.join(jobs_dir, model_id)
     assert os.path.isdir(model_dir), "Model dir %s does not exist" % model_dir
@@ -77,79 +73,285 @@ def infer(input_list,
                 break
     if not snapshot_filename:
         raise InferenceError("Unable to find snapshot for epoch=%s" % repr(epoch))
+    return model, epoch
+
+
+def decode_datum(value):
+    """
+    Returns the image stored in a serialized Datum
+    """
+    datum = caffe_pb2.Datum()
+    datum.ParseFromString(value)
+    if datum.encoded:
+        s = StringIO()
+        s.write(datum.data)
+        s.seek(0)
+        img = PIL.Image.open(s)
+        img = np.array(img)
+    else:
+        import caffe.io
+        arr = caffe.io.datum_to_array(datum)
+        # CHW -> HWC
+        arr = arr.transpose((1, 2, 0))
+        if arr.shape[2] == 1:
+            # HWC -> HW
+            arr = arr[:, :, 0]
+        elif arr.shape[2] == 3:
+            # BGR -> RGB
+            # XXX see issue #59
+            arr = arr[:, :, [2, 1, 0]]
+        img = arr
+    return img
+
+
+def load_db_images(db_path):
+    """
+    Load all images from a database
+
+    Returns (input_ids, input_data)
+    """
+    if is_raw_db(db_path):
+        reader = RawDbReader(db_path)
+        return read_raw_chunk(reader, 0, reader.count)
+    return decode_db_chunk(list(DbReader(db_path).entries()))
+
+
+def read_raw_chunk(reader, start, stop):
+    """
+    Read entries start to stop of a raw database, as views of its memory map
+
+    Returns (input_ids, input_data)
+    """
+    input_data = reader.data[start:stop]
+    if reader.shape[2] == 1:
+        # grayscale images are loaded as (height, width)
+        input_data = input_data[..., 0]
+    return range(start, min(stop, reader.count)), input_data
+
+
+def decode_db_chunk(entries):
+    """
+    Decode a chunk of (key, value) database entries
+
+    Returns (input_ids, input_data)
+    """
+    input_ids = []
+    input_data = []
+    for key, value in entries:
+        input_ids.append(key)
+        input_data.append(decode_datum(value))
+    return input_ids, input_data
+
 
+def image_settings(dataset, resize):
+    """
+    Returns the settings of load_image_chunk() for a dataset
+    """
     # retrieve image dimensions and resize mode
     image_dims = dataset.get_feature_dims()
-    height = image_dims[0]
-    width = image_dims[1]
-    channels = image_dims[2]
-    resize_mode = dataset.resize_mode if hasattr(dataset, 'resize_mode') else 'squash'
+    return {
+        'height': image_dims[0],
+        'width': image_dims[1],
+        'channels': image_dims[2],
+        'resize_mode': dataset.resize_mode if hasattr(dataset, 'resize_mode') else 'squash',
+        'resize': resize,
+    }
 
-    n_input_samples = 0  # number of samples we were able to load
-    input_ids = []       # indices of samples within file list
-    input_data = []      # sample data
 
-    if input_is_db:
-        # load images from database
-        reader = DbReader(input_list)
-        for key, value in reader.entries():
-            datum = caffe_pb2.Datum()
-            datum.ParseFromString(value)
-            if datum.encoded:
-                s = StringIO()
-                s.write(datum.data)
-                s.seek(0)
-                img = PIL.Image.open(s)
-                img = np.array(img)
-            else:
-                import caffe.io
-                arr = caffe.io.datum_to_array(datum)
-                # CHW -> HWC
-                arr = arr.transpose((1, 2, 0))
-                if arr.shape[2] == 1:
-                    # HWC -> HW
-                    arr = arr[:, :, 0]
-                elif arr.shape[2] == 3:
-                    # BGR -> RGB
-                    # XXX see issue #59
-                    arr = arr[:, :, [2, 1, 0]]
-                img = arr
-            input_ids.append(key)
-            input_data.append(img)
-            n_input_samples = n_input_samples + 1
-    else:
-        # load paths from file
-        paths = None
-        with open(input_list) as infile:
-            paths = infile.readlines()
-        # load and resize images
-        for idx, path in enumerate(paths):
-            path = path.strip()
-            try:
-                image = utils.image.load_image(path.strip())
-                if resize:
-                    image = utils.image.resize_image(
-                        image,
-                        height,
-                        width,
-                        channels=channels,
-                        resize_mode=resize_mode)
-                else:
-                    image = utils.image.image_to_array(
-                        image,
-                        channels=channels)
-                input_ids.append(idx)
-                input_data.append(image)
-                n_input_samples = n_input_samples + 1
-            except utils.errors.LoadImageError as e:
-                print e
+def load_images(paths, dataset, resize):
+    """
+    Load images from a list of paths
+    Images which cannot be loaded are skipped
 
-    # perform inference
-    visualizations = None
+    Returns (input_ids, input_data) where input_ids are indices within paths
+    """
+    return load_image_chunk((0, paths, image_settings(dataset, resize)))
 
-    if n_input_samples == 0:
-        raise InferenceError("Unable to load any image from file '%s'" % repr(input_list))
-    elif n_input_samples == 1:
+
+def load_image_chunk(chunk):
+    """
+    Load a chunk of images from a list of paths
+    Images which cannot be loaded are skipped
+
+    Arguments:
+    chunk -- (offset, paths, settings) where offset is the index of the
+        first path in the whole list and settings come from image_settings()
+
+    Returns (input_ids, input_data) where input_ids are indices within the whole list
+    """
+    offset, paths, settings = chunk
+    input_ids = []
+    input_data = []
+    for idx, path in enumerate(paths):
+        path = path.strip()
+        try:
+            image = utils.image.load_image(path.strip())
+            if not settings['resize']:
+                image = utils.image.image_to_array(
+                    image,
+                    channels=settings['channels'])
+            input_ids.append(offset + idx)
+            input_data.append(image)
+        except utils.errors.LoadImageError as e:
+            print e
+    if settings['resize'] and input_data:
+        input_data = utils.image.resize_images(
+            input_data,
+            settings['height'],
+            settings['width'],
+            channels=settings['channels'],
+            resize_mode=settings['resize_mode'])
+    return input_ids, input_data
+
+
+def load_chunks(load_fn, chunks, num_workers, prefetch):
+    """
+    Generator applying load_fn to each chunk in a pool of worker processes
+    Results are returned in the order of the chunks and at most prefetch
+    chunks are loaded ahead of the consumer
+
+    Arguments:
+    load_fn -- a module-level function
+    chunks -- an iterable of arguments for load_fn
+    num_workers -- number of worker processes (0 to load in this process,
+        as in a process patched by gevent)
+    prefetch -- number of chunks to load ahead
+    """
+    if num_workers == 0 or not utils.can_fork_pool():
+        for chunk in chunks:
+            yield load_fn(chunk)
+        return
+
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(load_fn, (chunk,)))
+            if len(pending) >= prefetch:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def chunked(iterable, size):
+    """
+    Generator of lists of size items from an iterable (the last one may be shorter)
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Hdf5Appender(threading.Thread):
+    """
+    Appends batches of inference results to an HDF5 file
+    in the format written by write_results()
+
+    Runs in its own thread, fed by a bounded queue
+    """
+
+    def __init__(self, path, ids_dtype, queue_size=4):
+        """
+        Arguments:
+        path -- the HDF5 file to create
+        ids_dtype -- the type of the input ids
+        """
+        super(Hdf5Appender, self).__init__()
+        self.daemon = True
+        self.path = path
+        self.ids_dtype = ids_dtype
+        self.queue = Queue.Queue(queue_size)
+        self.error = None
+        self.count = 0
+
+    def append(self, input_ids, input_data, outputs):
+        """
+        Queue a batch of results for writing
+        Blocks while the queue is full
+        """
+        if self.ident is None:
+            # started on the first batch, after the loader processes are forked
+            self.start()
+        if self.error is not None:
+            raise self.error
+        self.queue.put((input_ids, input_data, outputs))
+
+    def close(self):
+        """
+        Wait for the queued batches to be written and close the file
+        """
+        if self.ident is None:
+            return
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        db = h5py.File(self.path, 'w')
+        try:
+            db_outputs = db.create_group("outputs")
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    break
+                if self.error is not None:
+                    # drain the queue
+                    continue
+                input_ids, input_data, outputs = batch
+                try:
+                    self.extend(db, "input_ids", np.asarray(input_ids, dtype=self.ids_dtype))
+                    self.extend(db, "input_data", np.asarray(input_data))
+                    for output_id, output_name in enumerate(outputs.keys()):
+                        output_data = outputs[output_name]
+                        output_key = base64.urlsafe_b64encode(str(output_name))
+                        if output_data.ndim > 0 and output_data.shape[0] == len(input_ids):
+                            dset = self.extend(db_outputs, output_key, output_data)
+                        elif output_key not in db_outputs:
+                            # not one row per image
+                            dset = db_outputs.create_dataset(output_key, data=output_data)
+                        else:
+                            continue
+                        # add ID attribute so outputs can be sorted in
+                        # the order they appear in here
+                        dset.attrs['id'] = output_id
+                    self.count += len(input_ids)
+                except Exception as e:
+                    self.error = e
+        finally:
+            db.close()
+
+    def extend(self, group, key, data):
+        """
+        Append data to a resizable dataset
+        """
+        if key not in group:
+            return group.create_dataset(key, data=data, maxshape=(None,) + data.shape[1:],
+                                        chunks=True)
+        dset = group[key]
+        start = dset.shape[0]
+        dset.resize(start + len(data), axis=0)
+        dset[start:] = data
+        return dset
+
+
+def run_inference(model, epoch, input_data, layers, gpu, resize):
+    """
+    Run the model on loaded images
+
+    Returns (outputs, visualizations)
+    """
+    visualizations = None
+    if len(input_data) == 1:
         # single image inference
         outputs, visualizations = model.train_task().infer_one(
             input_data[0],
@@ -165,9 +367,139 @@ def infer(input_list,
             snapshot_epoch=epoch,
             gpu=gpu,
             resize=resize)
+    return outputs, visualizations
+
+
+def supports_streaming(model):
+    """
+    Returns True if infer_many() can be called once per batch, i.e. if the
+    framework keeps the network loaded between calls (Caffe nets and
+    Tensorflow sessions)
+
+    Only those models are inferred with bounded memory, through
+    load_chunks() and Hdf5Appender. Torch starts a new process, which loads
+    the network again, for every call, so its inputs are all loaded into
+    memory and inferred at once
+    """
+    from digits import frameworks
+    fw = frameworks.get_framework_by_id(model.train_task().framework_id)
+    return fw is not None and fw.supports_model_server()
+
+
+def infer(input_list,
+          output_dir,
+          jobs_dir,
+          model_id,
+          epoch,
+          batch_size,
+          layers,
+          gpu,
+          input_is_db,
+          resize,
+          num_workers=None):
+    """
+    Perform inference on a list of images using the specified model
+    """
+    # job directory defaults to that defined in DIGITS config
+    if jobs_dir == 'none':
+        jobs_dir = digits.config.config_value('jobs_dir')
 
-    # write to hdf5 file
+    model, epoch = load_model(jobs_dir, model_id, epoch)
     db_path = os.path.join(output_dir, 'inference.hdf5')
+
+    raw_input = input_is_db and is_raw_db(input_list)
+    if raw_input:
+        reader = RawDbReader(input_list)
+        input_count = reader.count
+    elif input_is_db:
+        reader = DbReader(input_list)
+        input_count = reader.total_entries
+    else:
+        # load paths from file
+        paths = None
+        with open(input_list) as infile:
+            paths = infile.readlines()
+        input_count = len(paths)
+
+    if input_count > 1 and layers == 'none' and supports_streaming(model):
+        if not batch_size:
+            batch_size = model.train_task().batch_size or constants.DEFAULT_BATCH_SIZE
+        if num_workers is None:
+            num_workers = min(4, multiprocessing.cpu_count())
+        if raw_input:
+            # nothing to decode: batches are slices of the memory map
+            batches = (read_raw_chunk(reader, start, start + batch_size)
+                       for start in xrange(0, input_count, batch_size))
+            ids_dtype = np.int64
+        else:
+            if input_is_db:
+                chunks = chunked(reader.entries(), batch_size)
+                load_fn = decode_db_chunk
+                ids_dtype = h5py.special_dtype(vlen=str)
+            else:
+                settings = image_settings(model.train_task().dataset, resize)
+                chunks = ((start, paths[start:start + batch_size], settings)
+                          for start in xrange(0, len(paths), batch_size))
+                load_fn = load_image_chunk
+                ids_dtype = np.int64
+            batches = load_chunks(load_fn, chunks, num_workers, 2 * max(num_workers, 1))
+        count = infer_streaming(model, epoch, batches, input_count, db_path, ids_dtype, gpu, resize)
+        if count == 0:
+            raise InferenceError("Unable to load any image from file '%s'" % repr(input_list))
+        logger.info('Saved data to %s', db_path)
+        return
+
+    if raw_input:
+        input_ids, input_data = read_raw_chunk(reader, 0, input_count)
+    elif input_is_db:
+        # load images from database
+        input_ids, input_data = decode_db_chunk(reader.entries())
+    else:
+        # load and resize images
+        input_ids, input_data = load_images(paths, model.train_task().dataset, resize)
+
+    # perform inference
+    if len(input_data) == 0:
+        raise InferenceError("Unable to load any image from file '%s'" % repr(input_list))
+    outputs, visualizations = run_inference(model, epoch, input_data, layers, gpu, resize)
+
+    write_results(db_path, input_ids, input_data, outputs, visualizations)
+    logger.info('Saved data to %s', db_path)
+
+
+def infer_streaming(model, epoch, batches, input_count, db_path, ids_dtype, gpu, resize):
+    """
+    Run the model on batches of loaded images as they come
+    and append the results to an HDF5 file
+
+    Arguments:
+    batches -- an iterable of (input_ids, input_data) batches
+    input_count -- the number of inputs, for progress reports
+
+    Returns the number of images processed
+    """
+    appender = Hdf5Appender(db_path, ids_dtype)
+    processed = 0
+    try:
+        for input_ids, input_data in batches:
+            processed += len(input_ids)
+            if len(input_ids):
+                outputs = model.train_task().infer_many(
+                    input_data,
+                    snapshot_epoch=epoch,
+                    gpu=gpu,
+                    resize=resize)
+                appender.append(input_ids, input_data, outputs)
+            logger.info('Processed %d/%d' % (processed, input_count))
+    finally:
+        appender.close()
+    return appender.count
+
+
+def write_results(db_path, input_ids, input_data, outputs, visualizations):
+    """
+    Write inputs, outputs and layer visualizations to an HDF5 file
+    """
     db = h5py.File(db_path, 'w')
 
     # write input paths and images to database
@@ -203,7 +535,6 @@ def infer(input_list,
             dset.attrs['histogram_x'] = layer['data_stats']['histogram'][1]
             dset.attrs['histogram_ticks'] = layer['data_stats']['histogram'][2]
     db.close()
-    logger.info('Saved data to %s', db_path)
 
 if __name__ == '__main__':
 
@@ -247,8 +578,16 @@ if __name__ == '__main__':
         '-b',
         '--batch_size',
         type=int,
-        default=1,
-        help='Batch size',
+        default=None,
+        help='Batch size (default: from the model)',
+    )
+
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of image loading processes (default: up to 4, 0 to load in the main process)',
     )
 
     parser.add_argument(
@@ -290,7 +629,8 @@ if __name__ == '__main__':
             args['layers'],
             args['gpu'],
             args['db'],
-            args['resize']
+            args['resize'],
+            num_workers=args['workers'],
         )
     except Exception as e:
         logger.error('%s: %s' % (type(e).__name__, e.message))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python2
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+"""
+Resident inference process for the DIGITS model server
+
+Reads requests from stdin and writes responses to stdout
+(see digits.inference.server for the message format)
+"""
+
+import argparse
+from collections import OrderedDict
+import logging
+import os
+import sys
+import traceback
+
+if __name__ == '__main__':
+    # stdout is the message channel: send anything else printed
+    # (including while importing) to stderr instead
+    sys.stdout.flush()
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+# Add path for DIGITS package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import digits.config  # noqa
+from digits import log  # noqa
+from digits.channel import read_message, write_message  # noqa
+from digits.inference.errors import InferenceError  # noqa
+from digits.tools import inference  # noqa
+
+logger = logging.getLogger('digits.tools.inference_worker')
+
+
+class ModelCache(object):
+    """
+    Keeps the most recently used models loaded
+    """
+
+    def __init__(self, jobs_dir, capacity, load_fn=inference.load_model):
+        """
+        Arguments:
+        jobs_dir -- where the model jobs are
+        capacity -- how many models to keep
+
+        Keyword arguments:
+        load_fn -- loads a model: load_fn(jobs_dir, model_id, epoch) -> (model, epoch)
+        """
+        self.jobs_dir = jobs_dir
+        self.capacity = capacity
+        self.load_fn = load_fn
+        # least recently used first
+        self.models = OrderedDict()
+
+    def get(self, model_id, epoch):
+        """
+        Returns (model, epoch)
+        """
+        key = (model_id, float(epoch))
+        if key in self.models:
+            value = self.models.pop(key)
+        else:
+            value = self.load_fn(self.jobs_dir, model_id, epoch)
+            logger.info('Loaded model %s (epoch %s)' % (model_id, value[1]))
+            while len(self.models) >= self.capacity:
+                self.models.popitem(last=False)
+        self.models[key] = value
+        return value
+
+
+def handle_request(cache, request, gpu):
+    """
+    Perform inference as requested
+
+    Returns the response message
+    """
+    model, epoch = cache.get(request['model_id'], request['epoch'])
+    if 'db' in request:
+        input_ids, input_data = inference.load_db_images(request['db'])
+    else:
+        input_ids, input_data = inference.load_images(
+            request['paths'], model.train_task().dataset, request['resize'])
+    if len(input_data) == 0:
+        raise InferenceError('Unable to load any image')
+    outputs, visualizations = inference.run_inference(
+        model, epoch, input_data, request['layers'], gpu, request['resize'])
+    return {
+        'ids': input_ids,
+        'data': input_data,
+        'outputs': outputs,
+        'visualizations': visualizations,
+    }
+
+
+def serve(channel_in, channel_out, jobs_dir, capacity, gpu):
+    """
+    Serve requests until channel_in is closed
+    """
+    cache = ModelCache(jobs_dir, capacity)
+    while True:
+        try:
+            request = read_message(channel_in)
+        except EOFError:
+            break
+        try:
+            response = handle_request(cache, request, gpu)
+        except Exception as e:
+            logger.error('%s: %s' % (type(e).__name__, e))
+            response = {
+                'error': '%s: %s' % (type(e).__name__, e),
+                'traceback': traceback.format_exc(),
+            }
+        write_message(channel_out, response)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Inference worker - DIGITS')
+
+    # Optional arguments
+
+    parser.add_argument(
+        '-j',
+        '--jobs_dir',
+        default='none',
+        help='Jobs directory (default: from DIGITS config)',
+    )
+
+    parser.add_argument(
+        '-c',
+        '--capacity',
+        type=int,
+        default=2,
+        help='How many models to keep loaded',
+    )
+
+    parser.add_argument(
+        '-g',
+        '--gpu',
+        type=int,
+        default=None,
+        help='GPU to use (as in nvidia-smi output, default: None)',
+    )
+
+    args = vars(parser.parse_args())
+
+    jobs_dir = args['jobs_dir']
+    if jobs_dir == 'none':
+        jobs_dir = digits.config.config_value('jobs_dir')
+
+    serve(sys.stdin, channel_out, jobs_dir, args['capacity'], args['gpu'])
@@ -3,6 +3,7 @@
 
 import argparse
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 import random
 import requests
@@ -15,9 +16,25 @@ import urllib
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import digits.config  # noqa
 from digits import utils, log  # noqa
+from digits.utils.listing import ListingManifest  # noqa
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 logger = logging.getLogger('digits.tools.parse_folder')
 
+# directories listed at the same time (the threads mostly wait for the filesystem)
+DEFAULT_WORKERS = 16
+
+# directories modified less than this many seconds before they are listed can
+# still change without a new mtime, so their listing is not saved in the manifest
+MTIME_RESOLUTION = 2
+
 
 def unescape(s):
     return urllib.unquote(s)
@@ -238,6 +255,103 @@ def web_listing_all_files(url, count=0, max_count=None):
     return urls, count
 
 
+def list_directory(path):
+    """Utility for parse_folder()
+
+    Lists a directory (symbolic links to directories are followed)
+    Returns (dirs, files), sorted by name
+    """
+    dirs = []
+    files = []
+    if scandir is not None:
+        # the type of the entries comes with the listing on most filesystems
+        for entry in scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            (dirs if is_dir else files).append(entry.name)
+    else:
+        for name in os.listdir(path):
+            (dirs if os.path.isdir(os.path.join(path, name)) else files).append(name)
+    return (sorted(dirs), sorted(files))
+
+
+class FolderCrawler(object):
+    """Utility for parse_folder()
+
+    Lists the image files under directories with a pool of threads, reusing
+    the listing saved in a manifest for the directories whose mtime did not change
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, manifest=None):
+        """
+        Keyword arguments:
+        workers -- how many directories are listed at the same time
+        manifest -- a ListingManifest (or None)
+        """
+        self.workers = workers
+        self.manifest = manifest
+
+    def listing(self, path):
+        """
+        Returns (dirs, files) for a directory, or None if it cannot be listed
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+            if self.manifest is not None:
+                listing = self.manifest.get(path, stamp=mtime)
+                if listing is not None:
+                    return listing
+            listing = list_directory(path)
+        except OSError as e:
+            logger.warning('Could not list "%s": %s' % (path, e))
+            return None
+        if self.manifest is not None and time.time() - mtime >= MTIME_RESOLUTION:
+            self.manifest.set(path, listing, stamp=mtime)
+        return listing
+
+    def crawl(self, roots, max_files=None):
+        """
+        Returns for each root the paths of the image files under it,
+        breadth-first (the files of a directory before those of its subdirectories)
+
+        The directories of all roots are listed by the same pool, one depth
+        at a time, so that small roots do not leave threads idle
+
+        Arguments:
+        roots -- a list of directories
+
+        Keyword arguments:
+        max_files -- how many files to return for each root (None for no limit)
+        """
+        found = [[] for _ in roots]
+        # (index of the root, directory)
+        pending = list(enumerate(roots))
+        pool = ThreadPool(self.workers)
+        try:
+            while pending:
+                listings = pool.map(self.listing, [path for _, path in pending], chunksize=1)
+                next_pending = []
+                for (index, path), listing in zip(pending, listings):
+                    if listing is None:
+                        continue
+                    dirs, files = listing
+                    for filename in files:
+                        if max_files is not None and len(found[index]) >= max_files:
+                            break
+                        if filename.lower().endswith(utils.image.SUPPORTED_EXTENSIONS):
+                            found[index].append(os.path.join(path, filename))
+                    next_pending.extend((index, os.path.join(path, d)) for d in dirs)
+                # the roots which have enough files are not listed any deeper
+                pending = [(index, path) for index, path in next_pending
+                           if max_files is None or len(found[index]) < max_files]
+        finally:
+            pool.close()
+            pool.join()
+        return found
+
+
 def three_way_split_indices(size, pct_b, pct_c):
     """
     Utility for splitting an array
@@ -284,12 +398,31 @@ def three_way_split_indices(size, pct_b, pct_c):
         return a, a + b
 
 
+def category_label(subdir, folder_is_url):
+    """Utility for parse_folder()
+
+    Returns the label of a category: the name of its directory
+    """
+    label_name = subdir
+    if folder_is_url:
+        label_name = unescape(label_name)
+    else:
+        label_name = os.path.basename(label_name)
+    label_name = label_name.replace('_', ' ')
+    if label_name.endswith('/'):
+        # Remove trailing slash
+        label_name = label_name[0:-1]
+    return label_name
+
+
 def parse_folder(folder, labels_file,
                  train_file=None, percent_train=None,
                  val_file=None, percent_val=None,
                  test_file=None, percent_test=None,
                  min_per_category=2,
                  max_per_category=None,
+                 workers=DEFAULT_WORKERS,
+                 manifest_file=None,
                  ):
     """
     Parses a folder of images into three textfiles
@@ -308,6 +441,8 @@ def parse_folder(folder, labels_file,
     percent_test -- percentage of images to use in the test set
     min_per_category -- minimum number of images per category
     max_per_category -- maximum number of images per category
+    workers -- how many directories are listed at the same time
+    manifest_file -- where the listings of the directories are saved and reused
     """
     create_labels = (percent_train > 0)
     labels = []
@@ -330,11 +465,12 @@ def parse_folder(folder, labels_file,
         subdirs, _ = parse_web_listing(folder)
     else:
         if os.path.exists(folder) and os.path.isdir(folder):
-            subdirs = []
-            for filename in os.listdir(folder):
-                subdir = os.path.join(folder, filename)
-                if os.path.isdir(subdir):
-                    subdirs.append(subdir)
+            manifest = ListingManifest(manifest_file) if manifest_file else None
+            crawler = FolderCrawler(workers, manifest)
+            listing = crawler.listing(folder)
+            if listing is None:
+                return False
+            subdirs = [os.path.join(folder, d) for d in listing[0]]
         else:
             logger.error('folder does not exist')
             return False
@@ -345,6 +481,20 @@ def parse_folder(folder, labels_file,
         logger.error('folder must contain at least two subdirectories')
         return False
 
+    # List the images of all the categories
+
+    if not folder_is_url:
+        crawled = [subdir for subdir in subdirs
+                   if create_labels or category_label(subdir, folder_is_url) in labels]
+        images = dict(zip(crawled, crawler.crawl(crawled, max_files=max_per_category)))
+        if manifest is not None:
+            logger.debug('Reused %d of %d directory listings' % (
+                manifest.hits, manifest.hits + manifest.misses))
+            try:
+                manifest.save()
+            except (IOError, OSError) as e:
+                logger.warning('Could not save the manifest: %s' % e)
+
     # Parse the folder
 
     train_count = 0
@@ -361,16 +511,7 @@ def parse_folder(folder, labels_file,
     subdir_index = 0
     label_index = 0
     for subdir in subdirs:
-        # Use the directory name as the label
-        label_name = subdir
-        if folder_is_url:
-            label_name = unescape(label_name)
-        else:
-            label_name = os.path.basename(label_name)
-        label_name = label_name.replace('_', ' ')
-        if label_name.endswith('/'):
-            # Remove trailing slash
-            label_name = label_name[0:-1]
+        label_name = category_label(subdir, folder_is_url)
 
         if create_labels:
             labels.append(label_name)
@@ -397,15 +538,10 @@ def parse_folder(folder, labels_file,
             for url in urls:
                 lines.append('%s %d' % (url, label_index))
         else:
-            for dirpath, dirnames, filenames in os.walk(os.path.join(folder, subdir), followlinks=True):
-                for filename in filenames:
-                    if filename.lower().endswith(utils.image.SUPPORTED_EXTENSIONS):
-                        lines.append('%s %d' % (os.path.join(folder, subdir, dirpath, filename), label_index))
-                        if max_per_category is not None and len(lines) >= max_per_category:
-                            break
-                if max_per_category is not None and len(lines) >= max_per_category:
-                    logger.warning('Reached maximum limit for this category')
-                    break
+            for path in images[subdir]:
+                lines.append('%s %d' % (path, label_index))
+            if max_per_category is not None and len(lines) >= max_per_category:
+                logger.warning('Reached maximum limit for this category')
 
         # Split up the lines
 
@@ -517,6 +653,15 @@ if __name__ == '__main__':
         help=("What is the maximum limit of images per category? "
               "(categories which exceed this limit will be trimmed down) [default=None]")
     )
+    parser.add_argument(
+        '-w', '--workers', type=int, default=DEFAULT_WORKERS,
+        help='How many directories are listed at the same time [default=%d]' % DEFAULT_WORKERS
+    )
+    parser.add_argument(
+        '--manifest',
+        help=('A file where the listings of the directories are saved. The listings of the '
+              'directories which were not modified since they were saved are reused.')
+    )
 
     args = vars(parser.parse_args())
 
@@ -533,6 +678,7 @@ if __name__ == '__main__':
             validate_output_file(args['test_file']),
             validate_range(args['min'], min_value=1),
             validate_range(args['max'], min_value=1, allow_none=True),
+            validate_range(args['workers'], min_value=1),
     ]:
         if not valid:
             sys.exit(1)
@@ -554,6 +700,8 @@ if __name__ == '__main__':
                     percent_test=percent_test,
                     min_per_category=args['min'],
                     max_per_category=args['max'],
+                    workers=args['workers'],
+                    manifest_file=args['manifest'],
                     ):
         logger.info('Done after %d seconds.' % (time.time() - start_time))
         sys.exit(0)
@@ -15,11 +15,16 @@ from s3_walker import S3Walker
 # Add path for DIGITS package
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from digits import utils, log  # noqa
+from digits.utils.listing import ListingManifest  # noqa
 
 logger = logging.getLogger('digits.tools.parse_s3')
 
 local_prefix = 's3_tmp'
 
+# how many seconds the listings saved in a manifest are reused
+# (S3 prefixes have no modification time to check them against)
+DEFAULT_MANIFEST_MAX_AGE = 3600
+
 
 def unescape(s):
     return urllib.unquote(s)
@@ -278,12 +283,30 @@ def three_way_split_indices(size, pct_b, pct_c):
         return a, a + b
 
 
+def list_prefix(walker, bucket, prefix, manifest=None, max_age=None, **kwargs):
+    """Utility for parse_s3()
+
+    Lists the keys under a prefix with walker.listbucket(), reusing the
+    listing saved in a manifest if it is younger than max_age seconds
+    """
+    if manifest is None:
+        return walker.listbucket(bucket, prefix=prefix, **kwargs)
+    key = '%s/%s?%s' % (bucket, prefix, urllib.urlencode(sorted(kwargs.items())))
+    keys = manifest.get(key, max_age=max_age)
+    if keys is None:
+        keys = walker.listbucket(bucket, prefix=prefix, **kwargs)
+        manifest.set(key, keys)
+    return keys
+
+
 def parse_s3(walker, bucket, path, labels_file,
              train_file=None, percent_train=None,
              val_file=None, percent_val=None,
              test_file=None, percent_test=None,
              min_per_category=2,
-             max_per_category=None):
+             max_per_category=None,
+             manifest_file=None,
+             manifest_max_age=DEFAULT_MANIFEST_MAX_AGE):
     """
     Parses a folder of images into three textfiles
     Returns True on success
@@ -303,6 +326,8 @@ def parse_s3(walker, bucket, path, labels_file,
     percent_test -- percentage of images to use in the test set
     min_per_category -- minimum number of images per category
     max_per_category -- maximum number of images per category
+    manifest_file -- where the listings of the path are saved and reused
+    manifest_max_age -- how many seconds the saved listings are reused
     """
     create_labels = (percent_train > 0)
     labels = []
@@ -319,8 +344,9 @@ def parse_s3(walker, bucket, path, labels_file,
     walker.connect()
     if not path.endswith('/'):
         path = path + '/'
+    manifest = ListingManifest(manifest_file) if manifest_file else None
     subdirs = []
-    digits = walker.listbucket(bucket, prefix=path, with_prefix=True)
+    digits = list_prefix(walker, bucket, path, manifest, manifest_max_age, with_prefix=True)
     for digit in digits:
         subdirs.append(digit[len(path):])
 
@@ -370,7 +396,7 @@ def parse_s3(walker, bucket, path, labels_file,
         lines = []
         # Read all images under the path
         max_size = 100
-        files = walker.listbucket(bucket, prefix=path+subdir, max_size=max_size)
+        files = list_prefix(walker, bucket, path+subdir, manifest, manifest_max_age, max_size=max_size)
         for file in files:
             if file.lower().endswith(utils.image.SUPPORTED_EXTENSIONS):
                 parent_folder = os.path.join(local_prefix, path, subdir)
@@ -422,6 +448,13 @@ def parse_s3(walker, bucket, path, labels_file,
         subdir_index += 1
         logger.debug('Progress: %0.2f' % (float(subdir_index) / len(subdirs)))
 
+    if manifest is not None:
+        logger.debug('Reused %d of %d listings' % (manifest.hits, manifest.hits + manifest.misses))
+        try:
+            manifest.save()
+        except (IOError, OSError) as e:
+            logger.warning('Could not save the manifest: %s' % e)
+
     if percent_train:
         train_outfile.close()
     if percent_val:
@@ -511,6 +544,14 @@ if __name__ == '__main__':
         help=("What is the maximum limit of images per category? "
               "(categories which exceed this limit will be trimmed down) [default=None]")
     )
+    parser.add_argument(
+        '--manifest',
+        help='A file where the listings of the path are saved and reused'
+    )
+    parser.add_argument(
+        '--manifest_max_age', type=int, default=DEFAULT_MANIFEST_MAX_AGE,
+        help='How many seconds the listings saved in the manifest are reused [default=%d]' % DEFAULT_MANIFEST_MAX_AGE
+    )
 
     args = vars(parser.parse_args())
     walker = S3Walker(args['endpoint'], args['accesskey'], args['secretkey'])
@@ -527,6 +568,7 @@ if __name__ == '__main__':
             validate_output_file(args['test_file']),
             validate_range(args['min'], min_value=1),
             validate_range(args['max'], min_value=1, allow_none=True),
+            validate_range(args['manifest_max_age'], min_value=0),
     ]:
         if not valid:
             sys.exit(1)
@@ -547,7 +589,9 @@ if __name__ == '__main__':
                 test_file=args['test_file'],
                 percent_test=percent_test,
                 min_per_category=args['min'],
-                max_per_category=args['max']):
+                max_per_category=args['max'],
+                manifest_file=args['manifest'],
+                manifest_max_age=args['manifest_max_age']):
         logger.info('Done after %d seconds.' % (time.time() - start_time))
         sys.exit(0)
     else:
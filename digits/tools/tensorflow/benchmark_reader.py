@@ -0,0 +1,79 @@
+#!/usr/bin/env python2
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+#
+# This document should comply with PEP-8 Style Guide
+# Linter: pylint
+
+"""
+Measures the throughput of the Tensorflow data loader on a database, with
+entries read one by one and read in batches (see the --reader_batch_size
+flag of main.py)
+
+Example:
+    python benchmark_reader.py /path/to/train_db -b 64 -r 0 64 256
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+
+from six.moves import xrange  # noqa
+import tensorflow as tf
+
+# Local imports
+import tf_data
+import utils as digits
+
+
+def benchmark(db_path, batch_size, reader_batch_size, batches, shuffle):
+    """
+    Returns the number of samples per second loaded from a database
+    """
+    with tf.Graph().as_default():
+        loader = tf_data.LoaderFactory.set_source(db_path)
+        loader.stage = digits.STAGE_TRAIN
+        loader.croplen = 0
+        loader.nclasses = 0
+        loader.summaries = []
+        loader.setup(None, shuffle, 8, batch_size, None, 0, reader_batch_size)
+        loader.set_augmentation(None)
+        loader.create_input_pipeline()
+        fetches = [loader.batch_x, loader.batch_y]
+
+        with tf.Session(config=tf.ConfigProto(device_count={'GPU': 0})) as sess:
+            sess.run(tf.local_variables_initializer())
+            coord = tf.train.Coordinator()
+            threads = tf.train.start_queue_runners(sess=sess, coord=coord)
+            # let the queues fill up
+            for _ in xrange(10):
+                sess.run(fetches)
+            start = time.time()
+            for _ in xrange(batches):
+                sess.run(fetches)
+            elapsed = time.time() - start
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=5)
+    return batches * batch_size / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Data loader benchmark')
+    parser.add_argument('db_path', help='LMDB or HDF5 database')
+    parser.add_argument('-b', '--batch_size', type=int, default=64, help='samples per training batch')
+    parser.add_argument('-r', '--reader_batch_size', type=int, nargs='+', default=[0, 64, 256],
+                        help='entries read at a time (0 reads them one by one)')
+    parser.add_argument('-n', '--batches', type=int, default=200, help='batches to load')
+    parser.add_argument('--shuffle', action='store_true', help='shuffle the entries')
+    args = parser.parse_args()
+
+    for reader_batch_size in args.reader_batch_size:
+        rate = benchmark(args.db_path, args.batch_size, reader_batch_size, args.batches, args.shuffle)
+        print('reader_batch_size=%-5d %10.1f samples/s' % (reader_batch_size, rate))
+
+
+if __name__ == '__main__':
+    main()
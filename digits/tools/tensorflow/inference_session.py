@@ -0,0 +1,117 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+#
+# This document should comply with PEP-8 Style Guide
+# Linter: pylint
+
+"""
+Resident Tensorflow sessions for inference.
+
+A session holds the inference graph of a network with the weights of one
+snapshot, so that batches of images can be fed as numpy arrays without
+starting main.py for every request.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.contrib.slim as slim  # noqa
+
+# Local imports (this module is imported as digits.tools.tensorflow.inference_session)
+from . import tf_data
+from . import utils as digits
+from .model import Tower  # noqa
+from .utils import model_property  # noqa
+
+
+class InferenceSession(object):
+    """
+    A network restored from a snapshot, ready to run on batches of images
+    """
+
+    def __init__(self, network_path, weights_path, input_shape, nclasses=0,
+                 croplen=None, mean_file=None, subtract_mean='none', bitdepth=8, gpu=None):
+        """
+        Arguments:
+        network_path -- the network file (defines UserModel)
+        weights_path -- the snapshot (checkpoint prefix) to restore
+        input_shape -- [height, width, channels] of the images
+
+        Keyword arguments:
+        nclasses -- number of classes (0 if the network is not a classifier)
+        croplen -- size of the center crop
+        mean_file -- the mean file of the dataset
+        subtract_mean -- 'none', 'image' or 'pixel'
+        bitdepth -- bit depth of the images
+        gpu -- which GPU to run on (None for CPU)
+        """
+        self.input_shape = list(input_shape)
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            # Import the network file as main.py does
+            scope = dict(globals())
+            exec(open(network_path).read(), scope)
+            if 'UserModel' not in scope:
+                raise ValueError("The user model class 'UserModel' is not defined.")
+
+            device = '/cpu:0' if gpu is None else '/gpu:0'
+            with tf.device('/cpu:0'):
+                self.x = tf.placeholder(tf.float32, [None] + self.input_shape, name='input')
+                data = self.x
+                if subtract_mean != 'none':
+                    mean_loader = tf_data.MeanLoader(mean_file, subtract_mean, bitdepth)
+                    data = mean_loader.subtract_mean_op(data)
+                tower_shape = list(self.input_shape)
+                if croplen:
+                    data = tf.image.resize_image_with_crop_or_pad(data, croplen, croplen)
+                    tower_shape[0] = tower_shape[1] = croplen
+
+            with tf.device(device), tf.name_scope(digits.STAGE_INF):
+                tower = scope['UserModel'](data, None, tower_shape, nclasses, False, True)
+                with tf.variable_scope(digits.GraphKeys.MODEL):
+                    self.output = tower.inference
+            if nclasses:  # Classification -> assume softmax usage
+                self.output = tf.nn.softmax(self.output)
+
+            config = tf.ConfigProto(allow_soft_placement=True)
+            if gpu is None:
+                config.device_count['GPU'] = 0
+            else:
+                config.gpu_options.visible_device_list = str(gpu)
+                config.gpu_options.allow_growth = True
+            self.session = tf.Session(graph=self.graph, config=config)
+            self.nbytes = self.restore(weights_path)
+        self.graph.finalize()
+
+    def restore(self, weights_path):
+        """
+        Restore the variables which are both in the graph and the snapshot
+        (as load_snapshot() in main.py does)
+
+        Returns the size of the restored variables in bytes
+        """
+        reader = tf.train.NewCheckpointReader(weights_path)
+        var_map = reader.get_variable_to_shape_map()
+        vars_restore = [v for v in tf.global_variables()
+                        if v.name.split(':')[0] in var_map and 'global_step' not in v.name]
+        if not vars_restore:
+            raise ValueError('No variable of the network found in %s' % weights_path)
+        self.session.run(tf.variables_initializer(
+            [v for v in tf.global_variables() if v not in vars_restore]))
+        tf.train.Saver(vars_restore, max_to_keep=0).restore(self.session, weights_path)
+        return sum(int(np.prod(v.get_shape().as_list())) * v.dtype.base_dtype.size for v in vars_restore)
+
+    def run(self, images):
+        """
+        Returns the output of the network for a batch of images
+
+        Arguments:
+        images -- an np.array of shape (N, height, width, channels)
+        """
+        return self.session.run(self.output, feed_dict={self.x: images})
+
+    def close(self):
+        self.session.close()
@@ -26,6 +26,7 @@ import logging
 import math
 import numpy as np
 import os
+import sys
 from six.moves import xrange  # noqa
 import tensorflow as tf
 import tensorflow.contrib.slim as slim  # noqa
@@ -43,6 +44,10 @@ from utils import model_property  # noqa
 
 import tf_data
 
+# Add path for DIGITS package (after the local modules, which it must not shadow)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from digits import channel  # noqa
+
 # Constants
 TF_INTRA_OP_THREADS = 0
 TF_INTER_OP_THREADS = 0
@@ -59,6 +64,8 @@ tf.app.flags.DEFINE_integer('batch_size', 16, """Number of images to process in
 tf.app.flags.DEFINE_integer(
     'croplen', 0, """Crop (x and y). A zero value means no cropping will be applied""")
 tf.app.flags.DEFINE_integer('epoch', 1, """Number of epochs to train, -1 for unbounded""")
+tf.app.flags.DEFINE_integer(
+    'reader_batch_size', 0, """Number of LMDB/HDF5 entries read at a time by the data loader (0 reads one by one)""")
 tf.app.flags.DEFINE_string('inference_db', '', """Directory with inference file source""")
 tf.app.flags.DEFINE_integer(
     'validation_interval', 1, """Number of train epochs to complete, to perform one validation""")
@@ -151,6 +158,7 @@ def save_timeline_trace(run_metadata, save_dir, step):
     with open(tl_fn, 'w') as f:
         f.write(ctf)
     logging.info('Timeline trace written to %s', tl_fn)
+    channel.send('timeline', path=tl_fn)
 
 
 def strip_data_from_graph_def(graph_def):
@@ -280,6 +288,7 @@ def save_snapshot(sess, saver, save_dir, snapshot_prefix, epoch, for_serving=Fal
     logging.info('Snapshotting to %s', snapshot_file)
     checkpoint_path = saver.save(sess, snapshot_file)
     logging.info('Snapshot saved.')
+    channel.send('snapshot', path=checkpoint_path, epoch=epoch)
 
     if for_serving:
         # @TODO(tzaman) : we could further extend this by supporting tensorflow-serve
@@ -355,10 +364,13 @@ def Inference(sess, model):
                 save_weight_visualization(weight_vars, activation_ops, w, a)
 
             # @TODO(tzaman): error on no output?
+            indices = [model.dataloader.get_key_index(key) for key in keys]
+            if channel.send('predictions', indices=indices, predictions=preds):
+                continue
             for i in range(len(keys)):
                 #    for j in range(len(preds)):
                 # We're allowing multiple predictions per image here. DIGITS doesnt support that iirc
-                logging.info('Predictions for image ' + str(model.dataloader.get_key_index(keys[i])) +
+                logging.info('Predictions for image ' + str(indices[i]) +
                              ': ' + json.dumps(preds[i].tolist()))
     except tf.errors.OutOfRangeError:
         print('Done: tf.errors.OutOfRangeError')
@@ -384,6 +396,8 @@ def Validation(sess, model, current_epoch):
     print_list = print_summarylist(tags, print_vals_sum/steps)
 
     logging.info("Validation (epoch " + str(current_epoch) + "): " + print_list)
+    channel.send('metrics', stage='validation', epoch=current_epoch,
+                 values=list(zip(tags, (print_vals_sum/steps).tolist())))
 
 
 def loadLabels(filename):
@@ -489,7 +503,8 @@ def main(_):
                                              FLAGS.bitdepth,
                                              batch_size_train,
                                              FLAGS.epoch,
-                                             FLAGS.seed)
+                                             FLAGS.seed,
+                                             FLAGS.reader_batch_size)
                 train_model.dataloader.set_augmentation(mean_loader, aug_dict)
                 train_model.create_model(UserModel, stage_scope)  # noqa
 
@@ -502,7 +517,8 @@ def main(_):
                                            FLAGS.bitdepth,
                                            batch_size_val,
                                            1e9,
-                                           FLAGS.seed)  # @TODO(tzaman): set numepochs to 1
+                                           FLAGS.seed,  # @TODO(tzaman): set numepochs to 1
+                                           FLAGS.reader_batch_size)
                 val_model.dataloader.set_augmentation(mean_loader)
                 val_model.create_model(UserModel, stage_scope)  # noqa
 
@@ -510,7 +526,8 @@ def main(_):
             with tf.name_scope(digits.STAGE_INF) as stage_scope:
                 inf_model = Model(digits.STAGE_INF, FLAGS.croplen, nclasses)
                 inf_model.create_dataloader(FLAGS.inference_db)
-                inf_model.dataloader.setup(None, False, FLAGS.bitdepth, FLAGS.batch_size, 1, FLAGS.seed)
+                inf_model.dataloader.setup(None, False, FLAGS.bitdepth, FLAGS.batch_size, 1, FLAGS.seed,
+                                           FLAGS.reader_batch_size)
                 inf_model.dataloader.set_augmentation(mean_loader)
                 inf_model.create_model(UserModel, stage_scope)  # noqa
 
@@ -653,6 +670,8 @@ def main(_):
                         steps_since_log = step - step_last_log
                         print_list = print_summarylist(tags, print_vals_sum/steps_since_log)
                         logging.info("Training (epoch " + str(current_epoch) + "): " + print_list)
+                        channel.send('metrics', stage='training', epoch=current_epoch,
+                                     values=list(zip(tags, (print_vals_sum/steps_since_log).tolist())))
                         print_vals_sum = 0
                         step_last_log = step
 
@@ -17,9 +17,14 @@ import tensorflow as tf
 from tensorflow.python.framework import ops
 
 # Local imports
-import tf_data
-import utils as digits
-from utils import model_property
+if '.' in __name__:
+    from . import tf_data
+    from . import utils as digits
+    from .utils import model_property
+else:
+    import tf_data
+    import utils as digits
+    from utils import model_property
 
 logging.basicConfig(format='%(asctime)s [%(levelname)s] %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S',
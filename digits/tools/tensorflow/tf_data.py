@@ -15,16 +15,26 @@ from __future__ import division
 from __future__ import print_function
 
 from PIL import Image
+import bisect
 import logging
 import magic
 import math
 import numpy as np
 import os
+import sys
 import tensorflow as tf
 
-# Local imports
-import caffe_tf_pb2
-import utils as digits
+# Local imports (relative when this module is imported as digits.tools.tensorflow.tf_data)
+if '.' in __name__:
+    from . import caffe_tf_pb2
+    from . import utils as digits
+else:
+    import caffe_tf_pb2
+    import utils as digits
+
+# Add path for DIGITS package (after the local modules, which it must not shadow)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from digits import rawdb  # noqa
 
 # Constants
 MIN_FRACTION_OF_EXAMPLES_IN_QUEUE = 0.4
@@ -43,6 +53,7 @@ DB_EXTENSIONS = {
 }
 
 LIST_DELIMITER = ' '  # For the FILELIST format
+LMDB_INDEX_FOLDER = 'index'  # Index saved with LMDB databases (see digits.utils.lmdbreader.DbIndex)
 
 logging.basicConfig(format='%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S',
                     level=logging.INFO)
@@ -52,13 +63,17 @@ def get_backend_of_source(db_path):
     """
     Takes a path as argument and infers the format of the data.
     If a directory is provided, it looks for the existance of an extension
-    in the entire directory in an order of a priority of dbs (hdf5, lmdb, filelist, file)
+    in the entire directory in an order of a priority of dbs (raw, hdf5, lmdb, filelist, file)
     Args:
         db_path: path to a file or directory
     Returns:
         backend: the backend type
     """
 
+    # Raw databases are recognized by their header
+    if os.path.isdir(db_path) and rawdb.is_raw_db(db_path):
+        return 'raw'
+
     # If a directory is given, we include all its contents. Otherwise it's just the one file.
     if os.path.isdir(db_path):
         files_in_path = [fn for fn in os.listdir(db_path) if not fn.startswith('.')]
@@ -187,6 +202,8 @@ class LoaderFactory(object):
             loader = LmdbLoader()
         elif backend == 'hdf5':
             loader = Hdf5Loader()
+        elif backend == 'raw':
+            loader = RawLoader()
         elif backend == 'file' or backend == 'filelist':
             loader = FileListLoader()
         elif backend == 'tfrecords':
@@ -201,7 +218,8 @@ class LoaderFactory(object):
         loader.is_inference = is_inference
         return loader
 
-    def setup(self, labels_db_path, shuffle, bitdepth, batch_size, num_epochs=None, seed=None):
+    def setup(self, labels_db_path, shuffle, bitdepth, batch_size, num_epochs=None, seed=None,
+              reader_batch_size=0):
         with tf.device('/cpu:0'):
             self.labels_db_path = labels_db_path
 
@@ -210,6 +228,7 @@ class LoaderFactory(object):
             self.batch_size = batch_size
             self.num_epochs = num_epochs
             self._seed = seed
+            self.reader_batch_size = reader_batch_size
 
             if self.labels_db_path:
                 self.labels_db = LoaderFactory.set_source(self.labels_db_path)
@@ -300,11 +319,15 @@ class LoaderFactory(object):
 
         single_label = None
         single_label_shape = None
+        batch_op = self.generate_batch_op() if self.reader_batch_size else None
+        if batch_op is not None:
+            single_sample = self.get_batched_data(key_queue, batch_op)
+        else:
+            single_sample = self.get_single_data(key_queue)
         if self.stage == digits.STAGE_INF:
-            single_key, single_data, single_data_shape, _, _ = self.get_single_data(key_queue)
+            single_key, single_data, single_data_shape, _, _ = single_sample
         else:
-            single_key, single_data, single_data_shape, single_label, single_label_shape = \
-                self.get_single_data(key_queue)
+            single_key, single_data, single_data_shape, single_label, single_label_shape = single_sample
 
         single_data_shape = tf.reshape(single_data_shape, [3])  # Shape the shape to have three dimensions
         single_data = self.reshape_decode(single_data, single_data_shape)
@@ -415,6 +438,38 @@ class LoaderFactory(object):
             # There's a label (unlike during inferencing)
             self.batch_y = batch[2]  # Output (label)
 
+    def generate_batch_op(self):
+        """Generates and returns an op that fetches the samples of a batch of keys.
+
+        Returns:
+            A python function that is inserted as an op, or None if the backend only
+            reads samples one by one
+        """
+        return None
+
+    def get_batched_data(self, key_queue, batch_op):
+        """Reads reader_batch_size samples per call to the python op and queues them,
+           so that the rest of the pipeline still processes single samples.
+
+        Args:
+            key_queue: the queue of keys
+            batch_op: see generate_batch_op()
+        Returns:
+            key, single_data, single_data_shape, single_label, single_label_shape
+        """
+        keys = key_queue.dequeue_up_to(self.reader_batch_size)
+        py_func_return_type = [self.get_tf_data_type(), tf.int32, self.get_tf_label_type(), tf.int32]
+        d, ds, l, ls = tf.py_func(batch_op, [keys], py_func_return_type, name='batch_reader')
+        ds.set_shape([None, 3])
+        sample_queue = tf.FIFOQueue(
+            capacity=2 * self.reader_batch_size * NUM_THREADS_DATA_LOADER,
+            dtypes=[keys.dtype] + py_func_return_type,
+            name='sample_queue')
+        enqueue_op = sample_queue.enqueue_many([keys, d, ds, l, ls])
+        num_threads = NUM_THREADS_DATA_LOADER if not self.is_inference else 1
+        tf.train.add_queue_runner(tf.train.QueueRunner(sample_queue, [enqueue_op] * num_threads))
+        return sample_queue.dequeue()
+
 
 class LmdbLoader(LoaderFactory):
     """ Loads files from lmbd files as used in Caffe
@@ -436,10 +491,10 @@ class LmdbLoader(LoaderFactory):
         self.lmdb_env = lmdb.open(self.db_path, readonly=True, lock=False)
         self.lmdb_txn = self.lmdb_env.begin(buffers=False)
         self.total = self.lmdb_txn.stat()['entries']
-        self.keys = [key for key, _ in self.lmdb_txn.cursor()]
+        self.keys, self.key_lengths = self.load_keys()
 
         # Read the first entry to get some info
-        lmdb_val = self.lmdb_txn.get(self.keys[0])
+        lmdb_val = self.lmdb_txn.get(self.get_key(0))
         datum = caffe_tf_pb2.Datum()
         datum.ParseFromString(lmdb_val)
 
@@ -462,11 +517,55 @@ class LmdbLoader(LoaderFactory):
                     exit(-1)
                 self.image_dtype = tf.uint16
 
+    def load_keys(self):
+        """Returns the keys of the database, in database order.
+
+        The keys come from the memory-mapped index saved with the database
+        (see digits.utils.lmdbreader.DbIndex), so that nothing is read
+        up-front. Without an index, the keys (but not the values) are
+        read once and saved as an index for the next runs.
+
+        Returns:
+            An np.array of keys and an np.array of their lengths (np.string_
+            drops the trailing NUL bytes of the keys)
+        """
+        keys_path = os.path.join(self.db_path, LMDB_INDEX_FOLDER, 'keys.npy')
+        lengths_path = os.path.join(self.db_path, LMDB_INDEX_FOLDER, 'key_lengths.npy')
+        if os.path.exists(keys_path) and os.path.exists(lengths_path):
+            keys = np.load(keys_path, mmap_mode='r')
+            if len(keys) == self.total:
+                return keys, np.load(lengths_path, mmap_mode='r')
+            logging.warning('Ignoring out of date index %s' % keys_path)
+
+        cursor = self.lmdb_txn.cursor()
+        keys = list(cursor.iternext(keys=True, values=False))
+        lengths = np.fromiter((len(key) for key in keys), dtype=np.int64, count=len(keys))
+        keys = np.array(keys, dtype=np.string_)
+        try:
+            if not os.path.exists(os.path.dirname(keys_path)):
+                os.makedirs(os.path.dirname(keys_path))
+            np.save(keys_path, keys)
+            np.save(lengths_path, lengths)
+        except (IOError, OSError):
+            # read-only DB - keep the keys in memory
+            pass
+        return keys, lengths
+
+    def get_key(self, index):
+        key = bytes(self.keys[index])
+        return key + b'\0' * (int(self.key_lengths[index]) - len(key))
+
+    def get_key_index(self, key):
+        # keys of the batches are indices
+        return int(key)
+
     def get_queue(self):
-        return tf.train.string_input_producer(
-            self.keys,
+        # a permutation of the indices of the entries for every epoch,
+        # read by the data loader threads through a bounded queue
+        return tf.train.range_input_producer(
+            self.total,
             num_epochs=self.num_epochs,
-            capacity=self.total,
+            capacity=min(self.total, MAX_ABSOLUTE_EXAMPLES_IN_QUEUE),
             shuffle=self.shuffle,
             seed=self._seed,
             name='input_producer'
@@ -515,14 +614,14 @@ class LmdbLoader(LoaderFactory):
             label = np.asarray([datum.label], dtype=np.int64)  # scalar label
             return data, shape, label
 
-        def get_data_op(key):
+        def get_data_op(index):
             """Fetches a sample of data and its label from lmdb. If a seperate label database
                exists, it will also load it from the seperate db inside this function. This is
                done the data and its label are loaded at the same time, avoiding multiple queues
                and race conditions.
 
             Args:
-                self: the current lmdb instance
+                index: position of the entry in the database
 
             Returns:
                 single_data: One sample of training data
@@ -530,6 +629,7 @@ class LmdbLoader(LoaderFactory):
                 single_label: The label that is the reference value describing the data
                 single_label_shape: The shape of the preceeding label data
             """
+            key = self.get_key(index)
             single_data, single_data_shape, single_label = get_data_and_shape(self.lmdb_txn, key)
             single_label_shape = np.array([], dtype=np.int32)
             if self.labels_db_path:
@@ -537,12 +637,73 @@ class LmdbLoader(LoaderFactory):
             return single_data, [single_data_shape], single_label, [single_label_shape]
         return get_data_op
 
+    def read_batch(self, keys):
+        """Reads the samples of a batch of keys.
+
+        Args:
+            keys: a list of keys
+        Returns:
+            data: the stacked data (strings, or floats for float data)
+            shapes: the shape of each sample
+            labels: the label of each sample
+        """
+        cursor = self.lmdb_txn.cursor()
+        if hasattr(cursor, 'getmulti'):
+            values = [value for _, value in cursor.getmulti(keys)]
+        else:
+            # py-lmdb < 1.0
+            values = [cursor.get(key) for key in keys]
+        if len(values) != len(keys):
+            raise KeyError('%d keys not found in %s' % (len(keys) - len(values), self.db_path))
+        shapes = np.empty((len(keys), 3), dtype=np.int32)
+        labels = np.empty(len(keys), dtype=np.int64)
+        data = []
+        for i, value in enumerate(values):
+            datum = caffe_tf_pb2.Datum()
+            datum.ParseFromString(value)
+            shapes[i] = datum.channels, datum.height, datum.width
+            labels[i] = datum.label
+            if self.float_data:
+                data.append(np.asarray(datum.float_data, dtype='float32'))
+            else:
+                data.append(datum.data)
+        if self.float_data:
+            data = np.stack(data)
+        else:
+            data = np.array(data, dtype=object)
+        return data, shapes, labels
+
+    def generate_batch_op(self):
+        """Generates and returns an op that fetches the samples of a batch of keys.
+
+        Returns:
+            A python function that is inserted as an op
+        """
+        def get_batch_op(indices):
+            """Fetches the samples of a batch, and their labels from the seperate
+               label database if there is one.
+
+            Args:
+                indices: positions of the entries in the database
+
+            Returns:
+                The stacked single_data, single_data_shape, single_label and single_label_shape
+                of each sample
+            """
+            keys = [self.get_key(index) for index in indices]
+            data, shapes, labels = self.read_batch(keys)
+            label_shapes = np.zeros((len(keys), 0), dtype=np.int32)
+            if self.labels_db_path:
+                labels, label_shapes, _ = self.labels_db.read_batch(keys)
+            return data, shapes, labels, label_shapes
+        return get_batch_op
+
     def get_single_data(self, key_queue):
         """
         Returns:
             key, single_data, single_data_shape, single_label, single_label_shape
         """
-        key = key_queue.dequeue()  # Operation that dequeues one key and returns a string with the key
+        key = key_queue.dequeue()  # Operation that dequeues the index of an entry
         py_func_return_type = [self.get_tf_data_type(), tf.int32, self.get_tf_label_type(), tf.int32]
         d, ds, l, ls = tf.py_func(self.generate_data_op(), [key], py_func_return_type, name='data_reader')
         return key, d, ds, l, ls
@@ -794,18 +955,68 @@ class Hdf5Loader(LoaderFactory):
     def get_data_and_shape(self, sample_key):
         """ Gets a sample across multiple hdf5 databases
         """
-        prev_end_range = 0
-        for i, end_range in enumerate(self.h5dbs_endrange):
-            if sample_key < end_range:
-                key_within_db = sample_key-prev_end_range
-                data = self.h5dbs[i]['data'][key_within_db]
-                shape = np.asarray(data.shape, dtype=np.int32)
-                label = self.h5dbs[i]['label'][key_within_db].astype(np.int64)
-                return data, shape, label
-            prev_end_range = end_range
+        i = bisect.bisect_right(self.h5dbs_endrange, sample_key)
+        if i == len(self.h5dbs_endrange):
+            logging.error("Out of range")  # @TODO(tzaman) out of range error
+            exit(-1)
+        key_within_db = sample_key - (self.h5dbs_endrange[i - 1] if i else 0)
+        data = self.h5dbs[i]['data'][key_within_db]
+        shape = np.asarray(data.shape, dtype=np.int32)
+        label = self.h5dbs[i]['label'][key_within_db].astype(np.int64)
+        return data, shape, label
+
+    def read_batch(self, sample_keys):
+        """ Gets the samples of a batch across multiple hdf5 databases
 
-        logging.error("Out of range")  # @TODO(tzaman) out of range error
-        exit(-1)
+        The samples are read in order, with one slice of each database when the
+        keys are contiguous (as they are when not shuffling)
+
+        Returns:
+            The stacked data, shape and label of each sample
+        """
+        sample_keys = np.asarray(sample_keys, dtype=np.int64)
+        if len(sample_keys) and (sample_keys.min() < 0 or sample_keys.max() >= self.total):
+            logging.error("Out of range")
+            exit(-1)
+        # a batch can span two epochs, so keys might repeat
+        unique_keys, inverse = np.unique(sample_keys, return_inverse=True)
+        db_indices = np.searchsorted(self.h5dbs_endrange, unique_keys, side='right')
+        data = []
+        labels = []
+        for i in np.unique(db_indices):
+            keys_within_db = unique_keys[db_indices == i] - (self.h5dbs_endrange[i - 1] if i else 0)
+            if keys_within_db[-1] - keys_within_db[0] + 1 == len(keys_within_db):
+                selection = slice(keys_within_db[0], keys_within_db[-1] + 1)
+            else:
+                # h5py reads a list of increasing indices
+                selection = list(keys_within_db)
+            data.append(self.h5dbs[i]['data'][selection])
+            labels.append(self.h5dbs[i]['label'][selection])
+        data = np.concatenate(data)[inverse]
+        labels = np.concatenate(labels)[inverse].astype(np.int64)
+        shapes = np.tile(np.asarray(data.shape[1:], dtype=np.int32), (len(sample_keys), 1))
+        return data, shapes, labels
+
+    def generate_batch_op(self):
+        """Generates and returns an op that fetches the samples of a batch of keys.
+        Returns:
+            A python function that is inserted as an op
+        """
+        def get_batch_op(keys):
+            """Fetches the samples of a batch, and their labels from the seperate
+               label database if there is one.
+            Args:
+                keys: integer key ids
+            Returns:
+                The stacked single_data, single_data_shape, single_label and single_label_shape
+                of each sample
+            """
+            data, shapes, labels = self.read_batch(keys)
+            label_shapes = np.zeros((len(keys), 0), dtype=np.int32)
+            if self.labels_db_path:
+                labels, label_shapes, _ = self.labels_db.read_batch(keys)
+            return data, shapes, labels, label_shapes
+        return get_batch_op
 
     def generate_data_op(self):
         """Generates and returns an op that fetches a single sample of data.
@@ -847,6 +1058,140 @@ class Hdf5Loader(LoaderFactory):
             db.close()
 
 
+class RawLoader(LoaderFactory):
+    """ Loads fixed-shape samples from a raw database (see digits.rawdb)
+
+    The samples are stored as HWC and RGB, so that they are handed to Tensorflow
+    as slices of a memory map, without any decoding or transposing
+    """
+    def __init__(self):
+        pass
+
+    def initialize(self):
+        self.reader = rawdb.RawDbReader(self.db_path)
+        if self.reader.count == 0:
+            logging.error("Raw database contains no data.")
+            exit(-1)
+
+        self.data_encoded = False
+        self.float_data = False  # Samples are not stored as flat CHW floats
+        self.unencoded_data_format = 'hwc'
+        self.unencoded_channel_scheme = 'rgb'
+        self.image_dtype = tf.as_dtype(self.reader.dtype)
+        self.keys = None  # Not using keys
+
+        self.total = self.reader.count
+        self.height, self.width, self.channels = self.reader.shape
+        self.shape = np.asarray(self.reader.shape, dtype=np.int32)
+
+    def get_queue(self):
+        return tf.train.range_input_producer(
+            self.total,
+            num_epochs=self.num_epochs,
+            capacity=min(self.total, MAX_ABSOLUTE_EXAMPLES_IN_QUEUE),
+            shuffle=self.shuffle,
+            seed=self._seed,
+            name='input_producer'
+        )
+
+    def get_tf_data_type(self):
+        """Returns the type of the data, in tf format.
+        Returns:
+            The tensorflow-datatype of the data
+        """
+        return self.image_dtype
+
+    def get_tf_label_type(self):
+        """Returns the type of the label, in tf format.
+            It takes in account the possible seperate label db.
+        Returns:
+            The tensorflow-datatype of the label
+        """
+        if self.labels_db_path:
+            return self.labels_db.get_tf_data_type()
+        else:
+            # No seperate db, return scalar label
+            return tf.int64
+
+    def get_data_and_shape(self, sample_key):
+        """ Gets a sample: a view of the memory map
+        """
+        data = self.reader.data[sample_key]
+        label = np.int64(self.reader.labels[sample_key])
+        return data, self.shape, label
+
+    def read_batch(self, sample_keys):
+        """ Gets the samples of a batch, with one slice of the memory map when the
+        keys are contiguous (as they are when not shuffling)
+
+        Returns:
+            The stacked data, shape and label of each sample
+        """
+        sample_keys = np.asarray(sample_keys, dtype=np.int64)
+        if len(sample_keys) and np.all(np.diff(sample_keys) == 1):
+            selection = slice(sample_keys[0], sample_keys[-1] + 1)
+        else:
+            selection = sample_keys
+        data = self.reader.data[selection]
+        labels = np.asarray(self.reader.labels[selection], dtype=np.int64)
+        shapes = np.tile(self.shape, (len(sample_keys), 1))
+        return data, shapes, labels
+
+    def generate_batch_op(self):
+        """Generates and returns an op that fetches the samples of a batch of keys.
+        Returns:
+            A python function that is inserted as an op
+        """
+        def get_batch_op(keys):
+            """Fetches the samples of a batch, and their labels from the seperate
+               label database if there is one.
+            Args:
+                keys: integer key ids
+            Returns:
+                The stacked single_data, single_data_shape, single_label and single_label_shape
+                of each sample
+            """
+            data, shapes, labels = self.read_batch(keys)
+            label_shapes = np.zeros((len(keys), 0), dtype=np.int32)
+            if self.labels_db_path:
+                labels, label_shapes, _ = self.labels_db.read_batch(keys)
+            return data, shapes, labels, label_shapes
+        return get_batch_op
+
+    def generate_data_op(self):
+        """Generates and returns an op that fetches a single sample of data.
+        Returns:
+            A python function that is inserted as an op
+        """
+        def get_data_op(key):
+            """Fetches a sample of data and its label from db. If a seperate label database
+               exists, it will also load it from the seperate db inside this function.
+            Args:
+                key: integer key id
+            Returns:
+                single_data: One sample of training data
+                single_data_shape: The shape of the preceeding training data
+                single_label: The label that is the reference value describing the data
+                single_label_shape: The shape of the preceeding label data
+            """
+            single_data, single_data_shape, single_label = self.get_data_and_shape(key)
+            single_label_shape = np.array([], dtype=np.int32)
+            if self.labels_db_path:
+                single_label, single_label_shape, _ = self.labels_db.get_data_and_shape(key)
+            return single_data, [single_data_shape], single_label, [single_label_shape]
+        return get_data_op
+
+    def get_single_data(self, key_queue):
+        """
+        Returns:
+            key, single_data, single_data_shape, single_label, single_label_shape
+        """
+        key = key_queue.dequeue()  # Operation that dequeues the index of an entry
+        py_func_return_type = [self.get_tf_data_type(), tf.int32, self.get_tf_label_type(), tf.int32]
+        d, ds, l, ls = tf.py_func(self.generate_data_op(), [key], py_func_return_type, name='data_reader')
+        return key, d, ds, l, ls
+
+
 class GanGridLoader(LoaderFactory):
     """
     The GanGridLoader generates data for a GAN.
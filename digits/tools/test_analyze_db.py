@@ -2,13 +2,17 @@
 
 import os.path
 import shutil
+import subprocess
+import sys
 import tempfile
 
 import lmdb
+import mock
 import numpy as np
 
 from . import analyze_db
 from digits import test_utils
+from digits.utils.lmdbreader import DbStats
 
 # Must import after importing digits.config
 import caffe.io
@@ -63,3 +67,76 @@ class TestSameShape(BaseTestWithDB):
 class TestDifferentShape(BaseTestWithDB):
     SAME_SHAPE = False
     PASS_FORCE = False
+
+
+class TestScan(object):
+    """
+    Compares the parallel and sampled scans to a serial scan
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._data_dir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls._data_dir, 'db')
+        db = lmdb.open(cls.db_path)
+        with db.begin(write=True) as txn:
+            for i in xrange(60):
+                datum = BaseTestWithDB.create_datum(3, 4, 5 + i % 2)
+                datum.label = i % 3
+                txn.put('%08d_%d' % (i, datum.label), datum.SerializeToString())
+        db.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._data_dir)
+
+    def test_partition(self):
+        starts = analyze_db.partition_keys(self.db_path, 60, 8)
+        assert len(starts) == 8
+        chunks = [(self.db_path, start, stop, None, False, False)
+                  for start, stop in zip(starts, starts[1:] + [None])]
+        stats = DbStats()
+        for chunk in chunks:
+            stats.merge(analyze_db.scan_entries(chunk))
+        serial = analyze_db.scan_entries((self.db_path, None, None, None, False, False))
+        assert stats.count == serial.count == 60
+        assert stats.shapes == serial.shapes == {'5x4x3': 30, '6x4x3': 30}
+        assert stats.labels == serial.labels == {0: 20, 1: 20, 2: 20}
+
+    def run_tool(self, *args):
+        """
+        Returns the exit code of tools/analyze_db.py on the database
+
+        The pools of workers are started in a new process, as AnalyzeDbTask
+        does (the test process may already be patched by gevent)
+        """
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call([sys.executable, os.path.splitext(analyze_db.__file__)[0] + '.py',
+                                    self.db_path] + list(args),
+                                   stdout=devnull, stderr=subprocess.STDOUT)
+
+    def test_parallel(self):
+        assert self.run_tool('--workers=3') == 0
+        assert self.run_tool('--workers=3', '--force-same-shape') == 1
+
+    def test_gevent_patched(self):
+        monkey = mock.Mock()
+        monkey.is_module_patched.return_value = True
+        with mock.patch.dict(sys.modules, {'gevent.monkey': monkey}), \
+                mock.patch.object(analyze_db.multiprocessing, 'Pool') as pool:
+            assert analyze_db.analyze_db(self.db_path, workers=3)
+        assert not pool.called
+
+    def test_sample(self):
+        keys = analyze_db.sample_keys(self.db_path, 60, 10)
+        assert len(set(keys)) == 10 and keys == sorted(keys)
+        assert self.run_tool('--workers=2', '--sample=0.25') == 0
+        assert analyze_db.analyze_db(self.db_path, workers=1, sample=5)
+        assert not analyze_db.analyze_db(self.db_path, sample=5, force_same_shape=True)
+
+    def test_writer_stats(self):
+        # out of date stats are ignored
+        DbStats(59, {'5x4x3': 59}).save(self.db_path)
+        assert not analyze_db.analyze_db(self.db_path, force_same_shape=True, use_writer_stats=True)
+        DbStats(60, {'5x4x3': 60}).save(self.db_path)
+        assert analyze_db.analyze_db(self.db_path, force_same_shape=True, use_writer_stats=True)
@@ -3,15 +3,22 @@
 from collections import Counter
 import os.path
 import shutil
+import subprocess
+import sys
 import tempfile
 import Queue
 
+import lmdb
+import mock
 import nose.tools
 import numpy as np
 import PIL.Image
 
 from . import create_db
 from digits import test_utils
+from digits.rawdb import RawDbReader
+from digits.utils.lmdbreader import DbIndex, DbStats
+from digits.utils.stats import MeanAccumulator
 
 
 test_utils.skipIfNotFramework('none')
@@ -135,36 +142,40 @@ class TestCalculateBatchSize():
         assert create_db._calculate_batch_size(count) == batch_size
 
 
-class TestCalculateNumThreads():
+class TestCalculateNumWorkers():
 
     def test(self):
-        for batch_size, shuffle, num in [
-                (1000, True, 10),
-                (1000, False, 1),
-                (100, True, 10),
-                (100, False, 1),
-                (50, True, 7),
-                (4, True, 2),
-                (1, True, 1),
+        for image_count, workers, num in [
+                (1000, 8, 8),
+                (1000, 1, 1),
+                (1000, 0, 1),
+                (4, 8, 4),
+                (1, 8, 1),
         ]:
-            yield self.check, batch_size, shuffle, num
+            yield self.check, image_count, workers, num
 
-    def check(self, batch_size, shuffle, num):
-        assert create_db._calculate_num_threads(
-            batch_size, shuffle) == num
+    def check(self, image_count, workers, num):
+        assert create_db._calculate_num_workers(
+            image_count, workers) == num
 
+    def test_default(self):
+        assert create_db._calculate_num_workers(1000) >= 1
 
-class TestInitialImageSum():
 
-    def test_color(self):
-        s = create_db._initial_image_sum(10, 10, 3)
-        assert s.shape == (10, 10, 3)
-        assert s.dtype == 'float64'
+class TestCalculateChunkSize():
 
-    def test_grayscale(self):
-        s = create_db._initial_image_sum(10, 10, 1)
-        assert s.shape == (10, 10)
-        assert s.dtype == 'float64'
+    def test(self):
+        for image_count, num_workers, size in [
+                (100000, 8, 64),
+                (1000, 8, 31),
+                (10, 8, 1),
+                (1, 1, 1),
+        ]:
+            yield self.check, image_count, num_workers, size
+
+    def check(self, image_count, num_workers, size):
+        assert create_db._calculate_chunk_size(
+            image_count, num_workers) == size
 
 
 class TestImageToDatum(BaseTest):
@@ -201,11 +212,13 @@ class TestSaveMeans():
     def check(self, directory, filename, color):
         filename = os.path.join(directory, filename)
         if color:
-            s = np.ones((8, 10, 3), dtype='float64')
+            images = np.ones((2, 8, 10, 3), dtype='uint8')
         else:
-            s = np.ones((8, 10), dtype='float64')
+            images = np.ones((2, 8, 10), dtype='uint8')
+        s = MeanAccumulator()
+        s.add(images)
 
-        create_db._save_means(s, 2, [filename])
+        create_db._save_means(s, [filename])
         assert os.path.exists(filename)
 
 
@@ -224,6 +237,27 @@ class BaseCreationTest(BaseTest):
         create_db.create_db(self.good_file[1], os.path.join(self.empty_dir, 'db'),
                             10, 10, 1, self.BACKEND, shuffle=False)
 
+    def test_workers(self):
+        for workers in 1, 3:
+            yield self.check_workers, workers
+
+    def check_workers(self, workers):
+        # run the tool in its own process: forking the load workers from a
+        # test process patched by gevent (see test_views) would deadlock
+        with open(os.devnull, 'w') as devnull:
+            assert subprocess.call([sys.executable, os.path.splitext(create_db.__file__)[0] + '.py',
+                                    self.good_file[1], os.path.join(self.empty_dir, 'db'), '10', '10',
+                                    '-c', '1', '-b', self.BACKEND, '-w', str(workers)],
+                                   stdout=devnull, stderr=subprocess.STDOUT) == 0
+
+    def test_gevent_patched(self):
+        monkey = mock.Mock(**{'is_module_patched.return_value': True})
+        with mock.patch.dict('sys.modules', {'gevent.monkey': monkey}), \
+                mock.patch('multiprocessing.Pool') as pool:
+            create_db.create_db(self.good_file[1], os.path.join(self.empty_dir, 'db'),
+                                10, 10, 1, self.BACKEND, workers=3)
+        assert not pool.called
+
     def test_means(self):
         mean_files = []
         for suffix in 'jpg', 'npy', 'png', 'binaryproto':
@@ -235,6 +269,27 @@ class BaseCreationTest(BaseTest):
 class TestLmdbCreation(BaseCreationTest):
     BACKEND = 'lmdb'
 
+    def test_order_preserved(self):
+        # labels are written in the order of the input file
+        db_dir = os.path.join(self.empty_dir, 'db')
+        create_db.create_db(self.good_file[1], db_dir,
+                            10, 10, 1, self.BACKEND, shuffle=False, workers=4)
+        env = lmdb.open(db_dir, readonly=True)
+        with env.begin() as txn:
+            labels = [int(key.split('_')[1]) for key, _ in txn.cursor()]
+        env.close()
+        assert labels == sorted(labels), labels
+        assert len(labels) == self.image_count
+        # the explore index is saved with the DB
+        index = DbIndex.load(db_dir)
+        assert index.count() == self.image_count
+        assert index.count(0) == labels.count(0)
+        # and so are the stats reported by analyze_db
+        stats = DbStats.load(db_dir)
+        assert stats.count == self.image_count
+        assert stats.shapes == {'10x10x1': self.image_count}
+        assert stats.labels[0] == labels.count(0)
+
 
 class TestHdf5Creation(BaseCreationTest):
     BACKEND = 'hdf5'
@@ -246,3 +301,23 @@ class TestHdf5Creation(BaseCreationTest):
         with open(os.path.join(db_dir, 'list.txt')) as infile:
             lines = infile.readlines()
             assert len(lines) == self.image_count, '%d != %d' % (len(lines), self.image_count)
+
+
+class TestRawCreation(BaseCreationTest):
+    BACKEND = 'raw'
+
+    def test_contents(self):
+        db_dir = os.path.join(self.empty_dir, 'db')
+        create_db.create_db(self.good_file[1], db_dir,
+                            10, 8, 3, self.BACKEND, shuffle=False, workers=2)
+        reader = RawDbReader(db_dir)
+        assert reader.count == self.image_count
+        assert reader.data.shape == (self.image_count, 8, 10, 3)
+        assert sorted(reader.labels) == list(reader.labels)
+        # stored as RGB
+        assert (reader.get_image(0) == self.numpy_image_color).all()
+
+    @nose.tools.raises(ValueError)
+    def test_encoding(self):
+        create_db.create_db(self.good_file[1], os.path.join(self.empty_dir, 'db'),
+                            10, 10, 1, self.BACKEND, encoding='png')
@@ -0,0 +1,86 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+
+import h5py
+import mock
+import numpy as np
+
+from . import inference
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+def _square(chunk):
+    return [x * x for x in chunk]
+
+
+class TestLoadChunks():
+
+    def test_in_order(self):
+        chunks = inference.chunked(xrange(20), 3)
+        results = list(inference.load_chunks(_square, chunks, 2, 4))
+        assert [len(r) for r in results] == [3, 3, 3, 3, 3, 3, 2]
+        assert sum(results, []) == [x * x for x in xrange(20)]
+
+    def test_no_workers(self):
+        results = list(inference.load_chunks(_square, [[1, 2], [3]], 0, 4))
+        assert results == [[1, 4], [9]]
+
+    def test_gevent_patched(self):
+        monkey = mock.Mock(**{'is_module_patched.return_value': True})
+        with mock.patch.dict('sys.modules', {'gevent.monkey': monkey}), \
+                mock.patch('multiprocessing.Pool') as pool:
+            results = list(inference.load_chunks(_square, [[1, 2], [3]], 2, 4))
+        assert results == [[1, 4], [9]]
+        assert not pool.called
+
+
+class TestHdf5Appender():
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'inference.hdf5')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_append(self):
+        appender = inference.Hdf5Appender(self.path, np.int64)
+        for start in (0, 2):
+            ids = [start, start + 1]
+            data = np.full((2, 4, 4), start, dtype=np.uint8)
+            outputs = OrderedDict([
+                ('prob', np.full((2, 3), start, dtype=np.float32)),
+                ('global', np.arange(5)),
+            ])
+            appender.append(ids, data, outputs)
+        appender.close()
+        assert appender.count == 4
+
+        with h5py.File(self.path, 'r') as db:
+            assert list(db['input_ids'][...]) == [0, 1, 2, 3]
+            assert db['input_data'].shape == (4, 4, 4)
+            assert list(db['input_data'][:, 0, 0]) == [0, 0, 2, 2]
+            prob = db['outputs'][inference.base64.urlsafe_b64encode('prob')]
+            assert prob.shape == (4, 3)
+            assert prob.attrs['id'] == 0
+            # not one row per image: written once
+            assert db['outputs'][inference.base64.urlsafe_b64encode('global')].shape == (5,)
+
+    def test_error(self):
+        appender = inference.Hdf5Appender(self.path, np.int64)
+        appender.append([0], np.zeros((1, 4, 4)), OrderedDict())
+        # mismatched image shape
+        appender.append([1], np.zeros((1, 5, 5)), OrderedDict())
+        try:
+            appender.close()
+        except Exception:
+            pass
+        else:
+            assert False, 'the writer error was not raised'
@@ -0,0 +1,33 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+
+from . import inference_worker
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestModelCache():
+
+    def setUp(self):
+        self.loaded = []
+
+        def load_fn(jobs_dir, model_id, epoch):
+            self.loaded.append((model_id, epoch))
+            return object(), float(epoch)
+        self.cache = inference_worker.ModelCache('jobs', 2, load_fn=load_fn)
+
+    def test_hit(self):
+        first = self.cache.get('a', 1)
+        assert self.cache.get('a', 1.0) is first
+        assert self.loaded == [('a', 1)]
+
+    def test_lru(self):
+        self.cache.get('a', 1)
+        self.cache.get('b', 1)
+        self.cache.get('a', 1)
+        # "b" is least recently used
+        self.cache.get('c', 1)
+        assert self.cache.models.keys() == [('a', 1.0), ('c', 1.0)]
+        self.cache.get('b', 1)
+        assert self.loaded == [('a', 1), ('b', 1), ('c', 1), ('b', 1)]
@@ -324,3 +324,78 @@ class TestParseFolder():
             assert parsed_classes == classes, '%s != %s' % (parsed_classes, classes)
 
         shutil.rmtree(tmpdir)
+
+    def test_nested_folders(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            img = PIL.Image.fromarray(np.zeros((10, 10, 3), dtype='uint8'))
+            for path in ['A/image1.png', 'A/sub/image2.png', 'A/sub/deeper/image3.png', 'A/notes.txt',
+                         'B/image1.jpg', 'B/image2.jpg', 'B/image3.jpg']:
+                path = os.path.join(tmpdir, 'data', path)
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                if path.endswith('.txt'):
+                    open(path, 'w').close()
+                else:
+                    img.save(path)
+            labels_file = os.path.join(tmpdir, 'labels.txt')
+            train_file = os.path.join(tmpdir, 'train.txt')
+
+            for workers, max_per_category, expected in [
+                    (1, None, ['A/image1.png 0', 'A/sub/deeper/image3.png 0', 'A/sub/image2.png 0',
+                               'B/image1.jpg 1', 'B/image2.jpg 1', 'B/image3.jpg 1']),
+                    (4, 2, ['A/image1.png 0', 'A/sub/image2.png 0', 'B/image1.jpg 1', 'B/image2.jpg 1']),
+            ]:
+                assert parse_folder.parse_folder(os.path.join(tmpdir, 'data'), labels_file,
+                                                 train_file=train_file, percent_train=100, percent_val=0,
+                                                 percent_test=0, max_per_category=max_per_category,
+                                                 workers=workers)
+                with open(train_file) as infile:
+                    lines = sorted(os.path.relpath(line.strip(), os.path.join(tmpdir, 'data')) for line in infile)
+                assert lines == expected, '%s != %s' % (lines, expected)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_manifest(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            img = PIL.Image.fromarray(np.zeros((10, 10, 3), dtype='uint8'))
+            data = os.path.join(tmpdir, 'data')
+            for cls in ['A', 'B']:
+                os.makedirs(os.path.join(data, cls, 'sub'))
+                img.save(os.path.join(data, cls, 'image1.png'))
+                img.save(os.path.join(data, cls, 'sub', 'image2.png'))
+            labels_file = os.path.join(tmpdir, 'labels.txt')
+            train_file = os.path.join(tmpdir, 'train.txt')
+            manifest_file = os.path.join(tmpdir, 'manifest.json')
+
+            def set_mtimes(mtime):
+                # directories modified just before they are listed are not saved in the manifest
+                for dirpath, _, _ in os.walk(data):
+                    os.utime(dirpath, (mtime, mtime))
+
+            def parse():
+                assert parse_folder.parse_folder(data, labels_file, train_file=train_file,
+                                                 percent_train=100, percent_val=0, percent_test=0,
+                                                 manifest_file=manifest_file)
+                with open(train_file) as infile:
+                    return sorted(os.path.relpath(line.strip(), data) for line in infile)
+
+            set_mtimes(1000000000)
+            assert parse() == ['A/image1.png 0', 'A/sub/image2.png 0', 'B/image1.png 1', 'B/sub/image2.png 1']
+
+            # the unchanged directories are not listed again
+            with mock.patch('digits.tools.parse_folder.list_directory') as mock_list:
+                mock_list.side_effect = AssertionError('listed an unchanged directory')
+                assert len(parse()) == 4
+
+            # only the modified directory is listed again
+            img.save(os.path.join(data, 'B', 'sub', 'image3.png'))
+            os.utime(os.path.join(data, 'B', 'sub'), (1000000010, 1000000010))
+            with mock.patch('digits.tools.parse_folder.list_directory',
+                            side_effect=parse_folder.list_directory) as mock_list:
+                assert parse() == ['A/image1.png 0', 'A/sub/image2.png 0', 'B/image1.png 1',
+                                   'B/sub/image2.png 1', 'B/sub/image3.png 1']
+                assert [args[0] for args, _ in mock_list.call_args_list] == [os.path.join(data, 'B', 'sub')]
+        finally:
+            shutil.rmtree(tmpdir)
@@ -365,3 +365,39 @@ class TestParseS3():
                                          train_file=train_file[1], percent_val=0, percent_test=0)
         finally:
             shutil.rmtree(tmpdir)
+
+    def test_manifest(self):
+        class CountingS3Walker(MockS3Walker):
+            listings = 0
+
+            def listbucket(self, *args, **kwargs):
+                self.listings += 1
+                return super(CountingS3Walker, self).listbucket(*args, **kwargs)
+
+        try:
+            tmpdir = tempfile.mkdtemp()
+            labels_file = os.path.join(tmpdir, 'labels.txt')
+            train_file = os.path.join(tmpdir, 'train.txt')
+            manifest_file = os.path.join(tmpdir, 'manifest.json')
+
+            def parse(walker, max_age):
+                assert parse_s3.parse_s3(walker, 'validbucket', 'train/', labels_file, percent_train=100,
+                                         train_file=train_file, percent_val=0, percent_test=0,
+                                         manifest_file=manifest_file, manifest_max_age=max_age)
+                with open(train_file) as infile:
+                    return sorted(line.strip() for line in infile)
+
+            walker = CountingS3Walker(range(3))
+            lines = parse(walker, 3600)
+            # the path and its 3 categories
+            assert walker.listings == 4, walker.listings
+
+            # the listings are reused until they are older than max_age
+            walker = CountingS3Walker(range(3))
+            assert parse(walker, 3600) == lines
+            assert walker.listings == 0, walker.listings
+            with mock.patch('digits.utils.listing.time.time', return_value=parse_s3.time.time() + 10):
+                assert parse(walker, 5) == lines
+            assert walker.listings == 4, walker.listings
+        finally:
+            shutil.rmtree(tmpdir)
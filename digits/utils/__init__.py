@@ -9,6 +9,7 @@ import os
 import pkg_resources
 import platform
 from random import uniform
+import sys
 from urlparse import urlparse
 
 if not platform.system() == 'Windows':
@@ -162,6 +163,15 @@ def parse_version(*args):
         return pkg_resources.parse_version(v)
 
 
+def can_fork_pool():
+    """
+    Returns False in a process patched by gevent (e.g. the webapp), where
+    forking the workers of a multiprocessing.Pool can deadlock
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is None or not monkey.is_module_patched('threading')
+
+
 # Import the other utility functions
 
 from . import constants, image, time_filters, errors, forms, routing, auth  # noqa
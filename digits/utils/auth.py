@@ -26,6 +26,20 @@ def validate_username(username):
         raise ValueError('Only lowercase letters, numbers, periods, dashes and underscores allowed')
 
 
+def is_admin(username=None):
+    """
+    Returns True if username can raise the priority of jobs
+    above their default priority
+
+    Keyword arguments:
+    username -- the user in question (defaults to current user)
+    """
+    from digits.config import config_value
+    if username is None:
+        username = get_username()
+    return bool(username) and username in config_value('job_priority')['admins']
+
+
 def requires_login(f=None, redirect=True):
     """
     Decorator for views that require the user to be logged in
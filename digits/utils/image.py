@@ -13,7 +13,6 @@ except ImportError:
 
 import numpy as np
 import PIL.Image
-import scipy.misc
 
 from . import is_url, HTTP_TIMEOUT, errors
 
@@ -201,7 +200,6 @@ def resize_image(image, height, width,
     channels -- channels of new image (stays unchanged if not specified)
     resize_mode -- can be crop, squash, fill or half_crop
     """
-
     if resize_mode is None:
         resize_mode = 'squash'
     if resize_mode not in ['crop', 'squash', 'fill', 'half_crop']:
@@ -214,81 +212,163 @@ def resize_image(image, height, width,
     if image.shape[0] == height and image.shape[1] == width:
         return image
 
-    # Resize
-    interp = 'bilinear'
+    return resize_images([image], height, width, resize_mode=resize_mode)[0]
+
+
+def resize_geometry(image_height, image_width, height, width, resize_mode):
+    """
+    Returns how resize_image() turns an image of one size into another
+    as a tuple (resize_height, resize_width, crop, padding):
+        the image is resized to resize_height x resize_width,
+        then crop=(axis, start) or None chops off the ends of the dimension which is too long,
+        then padding=(axis, size) or None fills both ends of the dimension which is too short
 
-    width_ratio = float(image.shape[1]) / width
-    height_ratio = float(image.shape[0]) / height
+    Arguments:
+    image_height -- height of the original image
+    image_width -- width of the original image
+    height -- height of new image
+    width -- width of new image
+    resize_mode -- can be crop, squash, fill or half_crop
+    """
+    width_ratio = float(image_width) / width
+    height_ratio = float(image_height) / height
     if resize_mode == 'squash' or width_ratio == height_ratio:
-        return scipy.misc.imresize(image, (height, width), interp=interp)
+        return height, width, None, None
     elif resize_mode == 'crop':
         # resize to smallest of ratios (relatively larger image), keeping aspect ratio
         if width_ratio > height_ratio:
-            resize_height = height
-            resize_width = int(round(image.shape[1] / height_ratio))
+            resize_width = int(round(image_width / height_ratio))
+            return height, resize_width, (1, int(round((resize_width - width) / 2.0))), None
         else:
+            resize_height = int(round(image_height / width_ratio))
+            return resize_height, width, (0, int(round((resize_height - height) / 2.0))), None
+    elif resize_mode == 'fill':
+        # resize to biggest of ratios (relatively smaller image), keeping aspect ratio
+        if width_ratio > height_ratio:
             resize_width = width
-            resize_height = int(round(image.shape[0] / width_ratio))
-        image = scipy.misc.imresize(image, (resize_height, resize_width), interp=interp)
-
+            resize_height = int(round(image_height / width_ratio))
+            if (height - resize_height) % 2 == 1:
+                resize_height += 1
+        else:
+            resize_height = height
+            resize_width = int(round(image_width / height_ratio))
+            if (width - resize_width) % 2 == 1:
+                resize_width += 1
+        crop = None
+    elif resize_mode == 'half_crop':
+        # resize to average ratio keeping aspect ratio
+        new_ratio = (width_ratio + height_ratio) / 2.0
+        resize_width = int(round(image_width / new_ratio))
+        resize_height = int(round(image_height / new_ratio))
+        if width_ratio > height_ratio and (height - resize_height) % 2 == 1:
+            resize_height += 1
+        elif width_ratio < height_ratio and (width - resize_width) % 2 == 1:
+            resize_width += 1
         # chop off ends of dimension that is still too long
         if width_ratio > height_ratio:
-            start = int(round((resize_width - width) / 2.0))
-            return image[:, start:start + width]
+            crop = (1, int(round((resize_width - width) / 2.0)))
         else:
-            start = int(round((resize_height - height) / 2.0))
-            return image[start:start + height, :]
+            crop = (0, int(round((resize_height - height) / 2.0)))
     else:
-        if resize_mode == 'fill':
-            # resize to biggest of ratios (relatively smaller image), keeping aspect ratio
-            if width_ratio > height_ratio:
-                resize_width = width
-                resize_height = int(round(image.shape[0] / width_ratio))
-                if (height - resize_height) % 2 == 1:
-                    resize_height += 1
-            else:
-                resize_height = height
-                resize_width = int(round(image.shape[1] / height_ratio))
-                if (width - resize_width) % 2 == 1:
-                    resize_width += 1
-            image = scipy.misc.imresize(image, (resize_height, resize_width), interp=interp)
-        elif resize_mode == 'half_crop':
-            # resize to average ratio keeping aspect ratio
-            new_ratio = (width_ratio + height_ratio) / 2.0
-            resize_width = int(round(image.shape[1] / new_ratio))
-            resize_height = int(round(image.shape[0] / new_ratio))
-            if width_ratio > height_ratio and (height - resize_height) % 2 == 1:
-                resize_height += 1
-            elif width_ratio < height_ratio and (width - resize_width) % 2 == 1:
-                resize_width += 1
-            image = scipy.misc.imresize(image, (resize_height, resize_width), interp=interp)
-            # chop off ends of dimension that is still too long
-            if width_ratio > height_ratio:
-                start = int(round((resize_width - width) / 2.0))
-                image = image[:, start:start + width]
-            else:
-                start = int(round((resize_height - height) / 2.0))
-                image = image[start:start + height, :]
-        else:
-            raise Exception('unrecognized resize_mode "%s"' % resize_mode)
+        raise ValueError('resize_mode "%s" not supported' % resize_mode)
 
-        # fill ends of dimension that is too short with random noise
-        if width_ratio > height_ratio:
-            padding = (height - resize_height) / 2
-            noise_size = (padding, width)
-            if channels > 1:
-                noise_size += (channels,)
-            noise = np.random.randint(0, 255, noise_size).astype('uint8')
-            image = np.concatenate((noise, image, noise), axis=0)
-        else:
-            padding = (width - resize_width) / 2
-            noise_size = (height, padding)
-            if channels > 1:
-                noise_size += (channels,)
-            noise = np.random.randint(0, 255, noise_size).astype('uint8')
-            image = np.concatenate((noise, image, noise), axis=1)
+    # fill ends of dimension that is too short with random noise
+    if width_ratio > height_ratio:
+        padding = (0, (height - resize_height) / 2)
+    else:
+        padding = (1, (width - resize_width) / 2)
+    return resize_height, resize_width, crop, padding
 
-        return image
+
+def resize_images(images, height, width,
+                  channels=None,
+                  resize_mode=None,
+                  out=None,
+                  ):
+    """
+    Resizes a batch of images and returns them as one np.array
+    with shape (N, height, width) or (N, height, width, channels)
+
+    Gives the same results as calling resize_image() on each image, but the
+    geometry is computed once per distinct image size and the random noise
+    used for padding is generated once per batch
+
+    Arguments:
+    images -- a list of PIL.Images or numpy.ndarrays, or an np.array of same-shaped images
+    height -- height of new images
+    width -- width of new images
+
+    Keyword Arguments:
+    channels -- channels of new images (same as the first image if not specified)
+    resize_mode -- can be crop, squash, fill or half_crop
+    out -- an np.array of dtype uint8 to write the images into
+    """
+    if resize_mode is None:
+        resize_mode = 'squash'
+    if resize_mode not in ['crop', 'squash', 'fill', 'half_crop']:
+        raise ValueError('resize_mode "%s" not supported' % resize_mode)
+
+    arrays = []
+    for image in images:
+        image = image_to_array(image, channels)
+        if channels is None:
+            # all images get the channels of the first one
+            channels = 1 if image.ndim == 2 else image.shape[2]
+        arrays.append(image)
+
+    shape = (len(arrays), height, width)
+    if channels is not None and channels > 1:
+        shape += (channels,)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    elif out.shape != shape or out.dtype != np.uint8:
+        raise ValueError('out should be a uint8 array of shape %s, not %s %s' % (shape, out.dtype, out.shape))
+
+    # indices of the images by (height, width)
+    sizes = {}
+    for i, image in enumerate(arrays):
+        sizes.setdefault(image.shape[:2], []).append(i)
+
+    for (image_height, image_width), indices in sizes.iteritems():
+        if image_height == height and image_width == width:
+            # No need to resize
+            out[indices] = [arrays[i] for i in indices]
+            continue
+
+        resize_height, resize_width, crop, padding = resize_geometry(
+            image_height, image_width, height, width, resize_mode)
+
+        # where the resized images go
+        target = [slice(None), slice(None)]
+        if padding is not None:
+            axis, size = padding
+            target[axis] = slice(size, size + (resize_height, resize_width)[axis])
+        source = [slice(None), slice(None)]
+        if crop is not None:
+            axis, start = crop
+            source[axis] = slice(start, start + (height, width)[axis])
+        target = tuple(target)
+        source = tuple(source)
+
+        for i in indices:
+            # same as scipy.misc.imresize(interp='bilinear') for uint8 arrays, without the conversions
+            image = PIL.Image.fromarray(arrays[i]).resize((resize_width, resize_height), PIL.Image.BILINEAR)
+            out[i][target] = np.asarray(image)[source]
+
+        if padding is not None:
+            axis, size = padding
+            if size > 0:
+                ends = [slice(None)] * out.ndim
+                ends[0] = indices
+                noise_size = (len(indices),) + out.shape[1:]
+                noise_size = noise_size[:axis + 1] + (size,) + noise_size[axis + 2:]
+                noise = np.random.randint(0, 255, noise_size).astype('uint8')
+                ends[axis + 1] = slice(None, size)
+                out[tuple(ends)] = noise
+                ends[axis + 1] = slice(-size, None)
+                out[tuple(ends)] = noise
+
+    return out
 
 
 def embed_image_html(image):
@@ -0,0 +1,118 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+"""
+Persisted listings of the directories (or S3 paths) parsed into datasets
+
+A manifest is a JSON file which maps a key (e.g. the path of a directory)
+to the listing found the last time it was read, with a stamp (e.g. the
+mtime of the directory) and the time it was read. A listing is reused
+while its stamp does not change, or while it is younger than a maximum
+age for sources which have no stamp.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+VERSION = 1
+
+
+def manifest_path(directory, source):
+    """
+    Returns the path of the manifest of a source in a directory
+
+    Arguments:
+    directory -- where the manifests are saved
+    source -- what is listed (e.g. the path of a folder)
+    """
+    return os.path.join(directory, '%s.json' % hashlib.sha1(source.encode('utf-8')).hexdigest())
+
+
+class ListingManifest(object):
+    """
+    The listings of a source, shared by the threads which read it
+
+    Only the listings used since the manifest was loaded are saved, so
+    the entries of removed directories do not pile up
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+        path -- the JSON file (a missing or unreadable file is an empty manifest)
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._used = {}
+        self._changed = False
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == VERSION:
+                self._entries = manifest['entries']
+        except (IOError, ValueError, KeyError, AttributeError):
+            pass
+
+    def get(self, key, stamp=None, max_age=None):
+        """
+        Returns the listing of key or None if it is missing or stale
+
+        Arguments:
+        key -- what was listed
+
+        Keyword arguments:
+        stamp -- the current stamp of key (the listing is stale if it differs)
+        max_age -- how many seconds a listing can be reused (None for no limit)
+        """
+        with self._lock:
+            entry = self._used.get(key, self._entries.get(key))
+            if entry is None or entry['stamp'] != stamp or (
+                    max_age is not None and time.time() - entry['time'] > max_age):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._used[key] = entry
+            return entry['listing']
+
+    def set(self, key, listing, stamp=None):
+        """
+        Save the listing of key
+
+        Arguments:
+        key -- what was listed
+        listing -- a JSON-serializable value
+
+        Keyword arguments:
+        stamp -- the stamp of key when it was listed
+        """
+        with self._lock:
+            self._used[key] = {'stamp': stamp, 'time': time.time(), 'listing': listing}
+            self._changed = True
+
+    def save(self):
+        """
+        Write the listings used since the manifest was loaded
+        (atomically, concurrent parsers of a source keep one of their manifests)
+        """
+        with self._lock:
+            if not self._changed and len(self._used) == len(self._entries):
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            try:
+                # the listings are private to the user of the server
+                os.makedirs(directory, 0o700)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': VERSION, 'entries': self._used}, f)
+            os.rename(temp_path, self.path)
+            self._entries = dict(self._used)
+            self._changed = False
@@ -1,7 +1,13 @@
 # Copyright (c) 2016-2017, NVIDIA CORPORATION.  All rights reserved.
 from __future__ import absolute_import
 
+from collections import Counter
+import json
+import os
+import threading
+
 import lmdb
+import numpy as np
 
 
 class DbReader(object):
@@ -14,6 +20,7 @@ class DbReader(object):
         Arguments:
         location -- where is the database
         """
+        self.location = location
         self._db = lmdb.open(
             location,
             map_size=1024**3,  # 1MB
@@ -25,15 +32,281 @@ class DbReader(object):
 
         self.txn = self._db.begin()
 
-    def entries(self):
+    def entries(self, start_key=None):
         """
         Generator returning all entries in the DB
+
+        Keyword arguments:
+        start_key -- seek to the first entry with a key >= start_key
         """
         with self._db.begin() as txn:
             cursor = txn.cursor()
+            if start_key is not None and not cursor.set_range(start_key):
+                return
             for item in cursor:
                 yield item
 
+    def keys(self):
+        """
+        Generator returning all keys in the DB (values are not read)
+        """
+        with self._db.begin() as txn:
+            cursor = txn.cursor()
+            for key in cursor.iternext(keys=True, values=False):
+                yield key
+
     def entry(self, key):
         """Return single entry"""
         return self.txn.get(key)
+
+
+class DbIndex(object):
+    """
+    Position index of a database, used to open any page of the DB in
+    constant time instead of walking the cursor from the first record
+
+    Stored in the DB directory as memory-mapped numpy arrays:
+    keys -- the keys, in DB order
+    key_lengths -- the length of each key (np.string_ drops trailing NUL bytes)
+    positions -- the positions of the entries, grouped by label
+    bounds -- (label, start, stop) slice of positions for each label
+    """
+    FOLDER = 'index'
+
+    def __init__(self, keys, key_lengths, positions=None, bounds=None):
+        self.keys = keys
+        self.key_lengths = key_lengths
+        self.positions = positions
+        self._bounds = {}
+        if bounds is not None:
+            for label, start, stop in bounds:
+                self._bounds[int(label)] = (int(start), int(stop))
+
+    @classmethod
+    def from_labels(cls, keys, labels=None):
+        """
+        Returns a new index
+
+        Arguments:
+        keys -- the keys, in DB order
+
+        Keyword arguments:
+        labels -- the label of each entry, in DB order
+        """
+        key_lengths = np.fromiter((len(key) for key in keys), dtype=np.int64, count=len(keys))
+        keys = np.asarray(keys, dtype=np.string_)
+        if labels is None:
+            return cls(keys, key_lengths)
+        labels = np.asarray(labels, dtype=np.int64)
+        assert len(labels) == len(keys), 'need one label per key'
+        # a stable sort keeps the entries of each label in DB order
+        positions = np.argsort(labels, kind='mergesort')
+        values, starts, counts = np.unique(labels[positions], return_index=True, return_counts=True)
+        bounds = np.array([values, starts, starts + counts], dtype=np.int64).T
+        return cls(keys, key_lengths, positions, bounds)
+
+    @classmethod
+    def build(cls, reader, label_fn=None):
+        """
+        Returns a new index by scanning the DB
+
+        Arguments:
+        reader -- a DbReader
+
+        Keyword arguments:
+        label_fn -- returns the label of an entry: label_fn(key, reader)
+        """
+        keys = list(reader.keys())
+        labels = None
+        if label_fn is not None:
+            labels = np.fromiter((label_fn(key, reader) for key in keys), dtype=np.int64, count=len(keys))
+        return cls.from_labels(keys, labels)
+
+    @classmethod
+    def load(cls, location):
+        """
+        Returns the index saved with the DB at location or None
+        """
+        folder = os.path.join(location, cls.FOLDER)
+        # older indexes have no key lengths
+        if not (os.path.exists(os.path.join(folder, 'keys.npy')) and
+                os.path.exists(os.path.join(folder, 'key_lengths.npy'))):
+            return None
+        keys = np.load(os.path.join(folder, 'keys.npy'), mmap_mode='r')
+        key_lengths = np.load(os.path.join(folder, 'key_lengths.npy'), mmap_mode='r')
+        positions = None
+        bounds = None
+        if os.path.exists(os.path.join(folder, 'positions.npy')):
+            positions = np.load(os.path.join(folder, 'positions.npy'), mmap_mode='r')
+            bounds = np.load(os.path.join(folder, 'bounds.npy'))
+        return cls(keys, key_lengths, positions, bounds)
+
+    def save(self, location):
+        """
+        Save the index with the DB at location
+        """
+        folder = os.path.join(location, self.FOLDER)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        np.save(os.path.join(folder, 'keys.npy'), self.keys)
+        np.save(os.path.join(folder, 'key_lengths.npy'), self.key_lengths)
+        if self.positions is not None:
+            np.save(os.path.join(folder, 'positions.npy'), self.positions)
+            bounds = [(label, start, stop) for label, (start, stop) in sorted(self._bounds.items())]
+            np.save(os.path.join(folder, 'bounds.npy'), np.array(bounds, dtype=np.int64).reshape((-1, 3)))
+
+    def has_labels(self):
+        return self.positions is not None
+
+    def key(self, position):
+        """
+        Returns the key of the entry at a position in DB order
+        """
+        key = str(self.keys[position])
+        # restore the trailing NUL bytes dropped by np.string_
+        return key + '\0' * (int(self.key_lengths[position]) - len(key))
+
+    def count(self, label=None):
+        """
+        Returns the number of entries [with this label]
+        """
+        if label is None:
+            return len(self.keys)
+        start, stop = self._bounds.get(label, (0, 0))
+        return stop - start
+
+    def page_keys(self, page, size, label=None):
+        """
+        Returns the keys on a page of entries [with this label]
+        """
+        first = page * size
+        if label is None:
+            return [self.key(position) for position in xrange(first, min(first + size, len(self.keys)))]
+        start, stop = self._bounds.get(label, (0, 0))
+        positions = self.positions[min(start + first, stop):min(start + first + size, stop)]
+        return [self.key(position) for position in positions]
+
+
+class DbStats(object):
+    """
+    Shape and label distributions of the entries of a database
+
+    Saved by create_db in the index folder of the DB, so that analyze_db
+    can report them without reading the DB again
+    """
+    FILENAME = 'stats.json'
+
+    def __init__(self, count=0, shapes=None, labels=None):
+        """
+        Keyword arguments:
+        count -- number of entries
+        shapes -- number of entries of each shape ('WxHxC' strings)
+        labels -- number of entries of each label
+        """
+        self.count = count
+        self.shapes = Counter(shapes or {})
+        self.labels = Counter(labels or {})
+
+    def add(self, shape, label=None):
+        """
+        Count an entry
+        """
+        self.count += 1
+        self.shapes[shape] += 1
+        if label is not None:
+            self.labels[label] += 1
+
+    def merge(self, other):
+        """
+        Add the entries counted by another DbStats
+        """
+        self.count += other.count
+        self.shapes.update(other.shapes)
+        self.labels.update(other.labels)
+
+    def extrapolate(self, total):
+        """
+        Returns the estimated stats of total entries, of which these are a
+        uniform sample
+        """
+        if self.count == 0:
+            return DbStats(total)
+        factor = float(total) / self.count
+
+        def scale(counter):
+            return dict((key, int(round(n * factor))) for key, n in counter.items())
+        return DbStats(total, scale(self.shapes), scale(self.labels))
+
+    @classmethod
+    def exists(cls, location):
+        """
+        Returns True if stats were saved with the DB at location
+        """
+        return os.path.exists(os.path.join(location, DbIndex.FOLDER, cls.FILENAME))
+
+    @classmethod
+    def load(cls, location):
+        """
+        Returns the stats saved with the DB at location or None
+        """
+        if not cls.exists(location):
+            return None
+        with open(os.path.join(location, DbIndex.FOLDER, cls.FILENAME)) as f:
+            stats = json.load(f)
+        return cls(stats['count'], stats['shapes'],
+                   dict((int(label), n) for label, n in stats['labels'].items()))
+
+    def save(self, location):
+        """
+        Save the stats with the DB at location
+        """
+        folder = os.path.join(location, DbIndex.FOLDER)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, self.FILENAME), 'w') as f:
+            json.dump({
+                'count': self.count,
+                'shapes': dict(self.shapes),
+                'labels': dict((str(label), n) for label, n in self.labels.items()),
+            }, f)
+
+
+_index_cache = {}
+# one lock per DB location, so that building the index of a large DB
+# does not block the pages of the other DBs
+_index_locks = {}
+_index_locks_lock = threading.Lock()
+
+
+def get_index(reader, label_fn=None):
+    """
+    Returns the DbIndex for a DB
+    Loads it from the DB folder or builds and saves it on first use
+
+    Arguments:
+    reader -- a DbReader
+
+    Keyword arguments:
+    label_fn -- see DbIndex.build(). If set, the index has label positions
+    """
+    location = reader.location
+
+    def usable(index):
+        return (index is not None and len(index.keys) == reader.total_entries and
+                (label_fn is None or index.has_labels()))
+
+    with _index_locks_lock:
+        lock = _index_locks.setdefault(location, threading.Lock())
+    with lock:
+        index = _index_cache.get(location)
+        if not usable(index):
+            index = DbIndex.load(location)
+            if not usable(index):
+                index = DbIndex.build(reader, label_fn)
+                try:
+                    index.save(location)
+                except (IOError, OSError):
+                    # read-only DB - keep the index in memory
+                    pass
+            _index_cache[location] = index
+        return index
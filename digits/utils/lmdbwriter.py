@@ -0,0 +1,202 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import math
+import time
+
+import lmdb
+
+from . import sizeof_fmt
+
+
+class DbWriter(object):
+    """
+    Writes entries to a new database in large transactions
+
+    The map is sized from the average size of the first entries and the
+    expected number of entries, and only grows (by doubling) if that
+    estimate was too small. Transactions are committed when they hold
+    commit_bytes of data or are commit_seconds old.
+
+    Unless sync is set, commits are not synced to disk and the database is
+    synced once when the writer is closed: an interrupted write leaves a
+    database which must be recreated anyway
+    """
+    # how many entries are used to estimate the map size
+    SAMPLE_ENTRIES = 100
+    # margin over the estimated map size
+    MAP_SIZE_MARGIN = 1.25
+
+    def __init__(self, location,
+                 map_size=None,
+                 expected_entries=None,
+                 commit_bytes=64 << 20,
+                 commit_seconds=10,
+                 sync=False,
+                 writemap=False,
+                 ):
+        """
+        Arguments:
+        location -- where to create the database
+
+        Keyword arguments:
+        map_size -- the initial map size (estimated if not set)
+        expected_entries -- how many entries will be written
+        commit_bytes -- commit after writing this much data
+        commit_seconds -- commit after this much time
+        sync -- if True, sync to disk on every commit
+        writemap -- if True, write through a writeable memory map
+            (faster, but the file is as large as the map - sparse where supported)
+        """
+        self.location = location
+        self.expected_entries = expected_entries
+        self.commit_bytes = commit_bytes
+        self.commit_seconds = commit_seconds
+        self.sync = sync
+        self._sized = map_size is not None
+        self._db = lmdb.open(
+            location,
+            map_size=map_size or 10 << 20,
+            writemap=writemap,
+            map_async=writemap and not sync,
+            sync=sync,
+            max_dbs=0)
+        self._page_size = self._db.stat()['psize']
+        self._txn = None
+        self._txn_start = None
+        # entries of the current transaction, to replay them if the map is full
+        self._pending = []
+        self._pending_bytes = 0
+        self._start = time.time()
+        self._end = None
+        self.entries = 0
+        self.bytes = 0
+        self.commits = 0
+
+    def map_size(self):
+        return self._db.info()['map_size']
+
+    def estimate_map_size(self, entry_bytes, entries):
+        """
+        Returns the map size needed for entries of entry_bytes on average
+        """
+        if entry_bytes > self._page_size / 2:
+            # values this big go to their own overflow pages
+            entry_bytes = math.ceil(float(entry_bytes) / self._page_size) * self._page_size
+        else:
+            # leaves of a B-tree are at least half full
+            entry_bytes *= 2
+        return int(entry_bytes * entries * self.MAP_SIZE_MARGIN) + 64 * self._page_size
+
+    def put(self, key, value):
+        """
+        Write an entry
+        """
+        self._pending.append((key, value))
+        self._pending_bytes += len(key) + len(value)
+        self.entries += 1
+        self.bytes += len(key) + len(value)
+
+        if not self._sized:
+            if self.entries < self.SAMPLE_ENTRIES and self.entries != self.expected_entries:
+                # keep sampling
+                return
+            self._resize()
+
+        if self._txn is None:
+            self._txn = self._db.begin(write=True)
+            self._txn_start = time.time()
+            self._put_pending()
+        else:
+            try:
+                self._txn.put(key, value)
+            except lmdb.MapFullError:
+                self._grow()
+
+        if (self._pending_bytes >= self.commit_bytes or
+                time.time() - self._txn_start >= self.commit_seconds):
+            self.commit()
+
+    def put_many(self, entries):
+        """
+        Write (key, value) entries
+        """
+        for key, value in entries:
+            self.put(key, value)
+
+    def commit(self):
+        """
+        Commit the current transaction
+        """
+        if self._txn is None:
+            if self._pending:
+                # still sampling
+                self._resize()
+                self._txn = self._db.begin(write=True)
+                self._put_pending()
+            else:
+                return
+        while True:
+            try:
+                self._txn.commit()
+                break
+            except lmdb.MapFullError:
+                self._grow()
+        self._txn = None
+        self._pending = []
+        self._pending_bytes = 0
+        self.commits += 1
+
+    def close(self):
+        """
+        Commit, sync and close the database
+        """
+        self.commit()
+        if not self.sync:
+            self._db.sync(True)
+        self._db.close()
+        self._end = time.time()
+
+    def summary(self):
+        """
+        Returns a string with the write throughput
+        """
+        elapsed = max((self._end or time.time()) - self._start, 1e-6)
+        return 'Wrote %d entries (%s) in %d transactions and %.1f seconds (%s/s)' % (
+            self.entries, sizeof_fmt(self.bytes), self.commits, elapsed, sizeof_fmt(self.bytes / elapsed))
+
+    def _resize(self):
+        """
+        Size the map from the entries written so far
+        """
+        self._sized = True
+        entries = max(self.expected_entries or 0, self.entries)
+        map_size = self.estimate_map_size(float(self.bytes) / self.entries, entries)
+        if map_size > self.map_size():
+            self._set_map_size(map_size)
+
+    def _grow(self):
+        """
+        Double the map and write the current transaction again
+        """
+        self._txn.abort()
+        self._set_map_size(self.map_size() * 2)
+        self._txn = self._db.begin(write=True)
+        self._put_pending()
+
+    def _put_pending(self):
+        while True:
+            try:
+                for key, value in self._pending:
+                    self._txn.put(key, value)
+                return
+            except lmdb.MapFullError:
+                self._txn.abort()
+                self._set_map_size(self.map_size() * 2)
+                self._txn = self._db.begin(write=True)
+
+    def _set_map_size(self, map_size):
+        try:
+            self._db.set_mapsize(map_size)
+        except AttributeError:
+            raise ValueError('py-lmdb is out of date (%s vs 0.87)' % lmdb.__version__)
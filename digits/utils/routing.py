@@ -48,3 +48,43 @@ def get_request_arg(key):
     elif key in flask.request.form:
         value = flask.request.form[key]
     return value
+
+
+def get_page_args():
+    """
+    Returns (offset, limit) from the request arguments of the same names,
+    limit is None when not given (see paginate)
+    Raises werkzeug.exceptions
+    """
+    try:
+        offset = int(get_request_arg('offset') or 0)
+        limit = get_request_arg('limit')
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        raise werkzeug.exceptions.BadRequest('offset and limit must be integers')
+    if offset < 0 or (limit is not None and limit < 0):
+        raise werkzeug.exceptions.BadRequest('offset and limit cannot be negative')
+    return offset, limit
+
+
+def paginate(items):
+    """
+    Returns the items of the page requested with the offset and limit
+    request arguments (all of them by default)
+    """
+    offset, limit = get_page_args()
+    if limit is None:
+        return items[offset:]
+    return items[offset:offset + limit]
+
+
+def json_response(data):
+    """
+    Returns a JSON response with an ETag,
+    or 304 Not Modified if the client already has this version
+    """
+    response = flask.jsonify(data)
+    response.add_etag()
+    # always revalidate
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
@@ -0,0 +1,94 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import contextlib
+import logging
+import threading
+
+logger = logging.getLogger('digits.utils.session_cache')
+
+
+class SessionCache(object):
+    """
+    Keeps the most recently used inference sessions open, as long as the
+    size of their weights fits within a memory budget
+
+    A session is any object with an nbytes attribute and a close() method
+    (e.g. tools/tensorflow/inference_session.py). The most recently used
+    session is always kept, even if it alone is over the budget. A session
+    which is evicted while it is in use is closed when its last user is done
+    """
+
+    def __init__(self, memory_budget):
+        """
+        Arguments:
+        memory_budget -- how many bytes of weights to keep loaded
+        """
+        self.memory_budget = memory_budget
+        # least recently used first
+        self.sessions = OrderedDict()
+        # how many users each session in use has
+        self.users = {}
+        # the sessions which are closed when they are not in use anymore
+        self.evicted = set()
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def use(self, key, create_fn):
+        """
+        Context manager which returns the session for key, calling
+        create_fn() to create it if needed
+        """
+        session = self.acquire(key, create_fn)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def acquire(self, key, create_fn):
+        """
+        Returns the session for key, which stays open until release() is called
+        """
+        with self.lock:
+            if key in self.sessions:
+                session = self.sessions.pop(key)
+            else:
+                session = create_fn()
+                logger.info('Loaded session for %s (%d bytes)', key, session.nbytes)
+            self.sessions[key] = session
+            self.users[session] = self.users.get(session, 0) + 1
+            while len(self.sessions) > 1 and self.memory_used() > self.memory_budget:
+                _, evicted = self.sessions.popitem(last=False)
+                self._close(evicted)
+            return session
+
+    def release(self, session):
+        """
+        Tell the cache that a session returned by acquire() is not used anymore
+        """
+        with self.lock:
+            self.users[session] -= 1
+            if not self.users[session]:
+                del self.users[session]
+                if session in self.evicted:
+                    self.evicted.remove(session)
+                    session.close()
+
+    def memory_used(self):
+        return sum(s.nbytes for s in self.sessions.values())
+
+    def clear(self):
+        """
+        Close all the sessions (the sessions in use are closed when they are released)
+        """
+        with self.lock:
+            for session in self.sessions.values():
+                self._close(session)
+            self.sessions.clear()
+
+    def _close(self, session):
+        if session in self.users:
+            self.evicted.add(session)
+        else:
+            session.close()
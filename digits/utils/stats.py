@@ -0,0 +1,191 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import numpy as np
+
+
+class MeanAccumulator(object):
+    """
+    Accumulates the mean image and the per-channel mean and standard
+    deviation of a stream of same-shaped images
+
+    Integer images are summed in 64-bit integers, which cannot overflow for
+    any realistic number of 8-bit or 16-bit images, other images in float64.
+    Accumulators filled by different workers can be merged and are
+    picklable so they can be sent between processes
+    """
+
+    def __init__(self, channel_axis=-1):
+        """
+        Keyword arguments:
+        channel_axis -- the channels axis of an image (ignored for 2D images)
+        """
+        self.channel_axis = channel_axis
+        self.count = 0
+        # per-pixel sum
+        self.sum = None
+        # per-channel sum of squares
+        self.sum_squares = None
+
+    def _sum_dtype(self, dtype):
+        if np.issubdtype(dtype, np.unsignedinteger) or dtype == np.bool_:
+            return np.uint64
+        elif np.issubdtype(dtype, np.integer):
+            return np.int64
+        return np.float64
+
+    def _channels_last(self, images):
+        """
+        Returns the batch with the channels on the last axis
+        """
+        if images.ndim == 3:
+            # 2D images
+            return images[..., np.newaxis]
+        axis = self.channel_axis % (images.ndim - 1) + 1
+        return np.rollaxis(images, axis, images.ndim)
+
+    def _channel_totals(self, image):
+        """
+        Returns the sum of each channel of an image
+        """
+        image = self._channels_last(image[np.newaxis, ...])
+        return image.reshape(-1, image.shape[-1]).sum(axis=0)
+
+    def add(self, images):
+        """
+        Add a batch of images
+
+        Arguments:
+        images -- an np.array of shape (N,) + image shape, or a list of same-shaped images
+        """
+        images = np.asarray(images)
+        if len(images) == 0:
+            return
+        dtype = self._sum_dtype(images.dtype)
+        batch_sum = images.sum(axis=0, dtype=dtype)
+        # the squares of uint8 values fit in uint16
+        squares = images.astype(np.uint16 if images.dtype == np.uint8 else dtype)
+        np.multiply(squares, squares, out=squares)
+        batch_squares = self._channel_totals(squares.sum(axis=0, dtype=dtype))
+        if self.sum is None:
+            self.sum = batch_sum
+            self.sum_squares = batch_squares
+        else:
+            if batch_sum.shape != self.sum.shape:
+                raise ValueError('Image shape mismatch (last:%s, previous:%s)'
+                                 % (repr(batch_sum.shape), repr(self.sum.shape)))
+            self.sum += batch_sum.astype(self.sum.dtype)
+            self.sum_squares += batch_squares.astype(self.sum_squares.dtype)
+        self.count += len(images)
+
+    def merge(self, other):
+        """
+        Add the images accumulated by another MeanAccumulator
+        """
+        if other is None or other.count == 0:
+            return
+        if self.sum is None:
+            self.sum = other.sum.copy()
+            self.sum_squares = other.sum_squares.copy()
+        else:
+            if other.sum.shape != self.sum.shape:
+                raise ValueError('Image shape mismatch (last:%s, previous:%s)'
+                                 % (repr(other.sum.shape), repr(self.sum.shape)))
+            if other.sum.dtype != self.sum.dtype:
+                # mixed integer and float images
+                self.sum = self.sum.astype(np.float64)
+                self.sum_squares = self.sum_squares.astype(np.float64)
+            self.sum += other.sum
+            self.sum_squares += other.sum_squares
+        self.count += other.count
+
+    def mean(self):
+        """
+        Returns the mean image (float64)
+        """
+        return self.sum / float(self.count)
+
+    def channel_mean(self):
+        """
+        Returns the mean of each channel
+        """
+        return self._channel_totals(self.sum) / float(self.values_per_channel())
+
+    def channel_std(self):
+        """
+        Returns the standard deviation of each channel
+        """
+        mean = self.channel_mean()
+        variance = self.sum_squares / float(self.values_per_channel()) - mean ** 2
+        return np.sqrt(np.maximum(variance, 0))
+
+    def values_per_channel(self):
+        return self.count * self.sum.size // len(self.sum_squares)
+
+
+def layer_statistics(data, bins=20, block_size=1 << 16):
+    """
+    Returns statistics for the given layer data:
+        (mean, standard deviation, histogram)
+            histogram -- [y, x, ticks]
+
+    Same as np.mean(), np.std() and np.histogram(data, bins), but the data
+    is read once for its range and once, in cache-sized blocks, for the
+    moments and the fixed-width histogram. The mean and the sum of squared
+    deviations of each block are computed in float64 and merged with Chan's
+    parallel algorithm, so the standard deviation is accurate even when the
+    mean is large compared with the spread. Float data is binned in its own
+    precision, so values within rounding of a bin edge may be counted in
+    the neighbouring bin
+
+    Arguments:
+    data -- a np.ndarray
+
+    Keyword arguments:
+    bins -- number of bins of the histogram
+    block_size -- number of values processed at a time
+    """
+    flat = np.asarray(data).ravel()
+    if not np.issubdtype(flat.dtype, np.floating):
+        flat = flat.astype(np.float64)
+    low, high = flat.min(), flat.max()
+    if low == high:
+        # as np.histogram() does
+        low, high = low - 0.5, high + 0.5
+    scale = flat.dtype.type(bins / (float(high) - float(low)))
+    low = flat.dtype.type(low)
+
+    count = 0
+    mean = 0.0
+    # sum of the squared deviations from the mean
+    m2 = 0.0
+    y = np.zeros(bins, dtype=np.intp)
+    buf = np.empty(min(block_size, flat.size), dtype=flat.dtype)
+    deviations = np.empty(len(buf), dtype=np.float64)
+    indices = np.empty(len(buf), dtype=np.intp)
+    for start in xrange(0, flat.size, block_size):
+        block = flat[start:start + block_size]
+        block_mean = float(block.mean(dtype=np.float64))
+        block_deviations = deviations[:len(block)]
+        np.subtract(block, block_mean, out=block_deviations)
+        block_m2 = float(np.dot(block_deviations, block_deviations))
+        delta = block_mean - mean
+        total = count + len(block)
+        mean += delta * len(block) / total
+        m2 += block_m2 + delta ** 2 * count * len(block) / total
+        count = total
+
+        values = buf[:len(block)]
+        np.subtract(block, low, out=values)
+        np.multiply(values, scale, out=values)
+        block_indices = indices[:len(block)]
+        block_indices[...] = values
+        # the maximum goes into the last bin
+        np.minimum(block_indices, bins - 1, out=block_indices)
+        y += np.bincount(block_indices, minlength=bins)
+
+    std = np.sqrt(m2 / flat.size)
+    edges = np.linspace(float(low), float(high), bins + 1)
+    ticks = edges[[0, bins // 2, -1]]
+    x = (edges[:-1] + edges[1:]) / 2.0
+    return (mean, std, [list(y), list(x), list(ticks)])
@@ -194,3 +194,49 @@ class TestResizeImage():
         resize_mode=%s
         image_type=%s
         shape=%s""" % args
+
+
+class TestResizeImages():
+
+    @classmethod
+    def setup_class(cls):
+        cls.images = [np.random.randint(0, 255, shape).astype('uint8')
+                      for shape in [(10, 10, 3), (20, 10, 3), (10, 20), (20, 10, 3), (16, 12, 3)]]
+
+    def test_same_as_resize_image(self):
+        for c in [None, 1, 3]:
+            for m in ['squash', 'crop', 'fill', 'half_crop']:
+                yield self.check_same_as_resize_image, c, m
+
+    def check_same_as_resize_image(self, channels, resize_mode):
+        if channels is None:
+            # channels of the first image
+            images = [i for i in self.images if i.ndim == 3]
+        else:
+            images = self.images
+        r = image_utils.resize_images(images, 12, 16, channels, resize_mode)
+        assert r.dtype == np.uint8, 'images.dtype should be uint8, not %s' % r.dtype
+        assert len(r) == len(images)
+        for i, image in enumerate(images):
+            np.random.seed(i)
+            expected = image_utils.resize_image(image, 12, 16, channels, resize_mode)
+            assert r[i].shape == expected.shape
+            if resize_mode in ['squash', 'crop']:
+                assert (r[i] == expected).all()
+            else:
+                # all but the random noise padding
+                _, _, _, padding = image_utils.resize_geometry(
+                    image.shape[0], image.shape[1], 12, 16, resize_mode)
+                if padding is None or padding[1] == 0:
+                    assert (r[i] == expected).all()
+                elif padding[0] == 0:
+                    assert (r[i][padding[1]:-padding[1]] == expected[padding[1]:-padding[1]]).all()
+                else:
+                    assert (r[i][:, padding[1]:-padding[1]] == expected[:, padding[1]:-padding[1]]).all()
+
+    def test_out(self):
+        out = np.zeros((len(self.images), 8, 8, 3), dtype=np.uint8)
+        r = image_utils.resize_images(self.images, 8, 8, 3, 'crop', out=out)
+        assert r is out
+        assert (out[2] == image_utils.resize_image(self.images[2], 8, 8, 3, 'crop')).all()
+        assert_raises(ValueError, image_utils.resize_images, self.images, 8, 8, 1, out=out)
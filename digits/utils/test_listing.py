@@ -0,0 +1,75 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from . import listing
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestListingManifest():
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'manifests', 'listing.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_stamp(self):
+        manifest = listing.ListingManifest(self.path)
+        assert manifest.get('/data', stamp=1) is None
+        manifest.set('/data', [['A'], ['image.png']], stamp=1)
+        manifest.save()
+
+        manifest = listing.ListingManifest(self.path)
+        assert manifest.get('/data', stamp=1) == [['A'], ['image.png']]
+        assert manifest.get('/data', stamp=2) is None
+        assert (manifest.hits, manifest.misses) == (1, 1)
+
+    def test_max_age(self):
+        manifest = listing.ListingManifest(self.path)
+        manifest.set('bucket/path/', ['path/A'])
+        now = listing.time.time()
+        with mock.patch('digits.utils.listing.time.time', return_value=now + 10):
+            assert manifest.get('bucket/path/', max_age=60) == ['path/A']
+            assert manifest.get('bucket/path/', max_age=5) is None
+
+    def test_unused_entries(self):
+        manifest = listing.ListingManifest(self.path)
+        manifest.set('/data/A', [[], []], stamp=1)
+        manifest.set('/data/B', [[], []], stamp=1)
+        manifest.save()
+
+        # only the listings used since the manifest was loaded are saved
+        manifest = listing.ListingManifest(self.path)
+        assert manifest.get('/data/A', stamp=1) is not None
+        manifest.save()
+        manifest = listing.ListingManifest(self.path)
+        assert manifest.get('/data/A', stamp=1) is not None
+        assert manifest.get('/data/B', stamp=1) is None
+
+    def test_private_directory(self):
+        manifest = listing.ListingManifest(self.path)
+        manifest.set('/data', [[], []], stamp=1)
+        manifest.save()
+        assert os.stat(os.path.dirname(self.path)).st_mode & 0o777 == 0o700
+
+    def test_invalid_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"version": 1, "entr')
+        manifest = listing.ListingManifest(self.path)
+        assert manifest.get('/data', stamp=1) is None
+
+    def test_manifest_path(self):
+        assert listing.manifest_path('/manifests', '/data/a') == listing.manifest_path('/manifests', '/data/a')
+        assert listing.manifest_path('/manifests', '/data/a') != listing.manifest_path('/manifests', '/data/b')
+        assert os.path.dirname(listing.manifest_path('/manifests', '/data/a')) == '/manifests'
@@ -0,0 +1,149 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import lmdb
+
+from . import lmdbreader
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class BaseTest(object):
+    """
+    Creates a DB with keys like the ones written by tools/create_db.py
+    """
+    # labels of the entries, in DB order
+    LABELS = [0, 1, 2, 0, 0, 1, 2, 2, 2, 0, 1]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.db_dir = tempfile.mkdtemp()
+        db = lmdb.open(cls.db_dir, map_size=2**20)
+        with db.begin(write=True) as txn:
+            for i, label in enumerate(cls.LABELS):
+                txn.put('%08d_%d' % (i, label), 'value-%d' % i)
+        db.close()
+        cls.keys = ['%08d_%d' % (i, label) for i, label in enumerate(cls.LABELS)]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.db_dir)
+
+    @staticmethod
+    def label_fn(key, reader):
+        return int(key.split('_')[1])
+
+
+class TestDbReader(BaseTest):
+
+    def test_entries(self):
+        reader = lmdbreader.DbReader(self.db_dir)
+        assert reader.total_entries == len(self.LABELS)
+        assert [key for key, _ in reader.entries()] == self.keys
+
+    def test_start_key(self):
+        reader = lmdbreader.DbReader(self.db_dir)
+        assert [key for key, _ in reader.entries(start_key='00000004')] == self.keys[4:]
+        assert list(reader.entries(start_key='99999999')) == []
+
+    def test_keys(self):
+        reader = lmdbreader.DbReader(self.db_dir)
+        assert list(reader.keys()) == self.keys
+
+
+class TestDbIndex(BaseTest):
+
+    def test_pages(self):
+        index = lmdbreader.DbIndex.from_labels(self.keys)
+        assert index.count() == len(self.keys)
+        assert not index.has_labels()
+        for page, size in (0, 4), (2, 4), (3, 4), (1, 11):
+            assert index.page_keys(page, size) == self.keys[page * size:(page + 1) * size]
+
+    def test_label_pages(self):
+        index = lmdbreader.DbIndex.from_labels(self.keys, self.LABELS)
+        for label in 0, 1, 2, 3:
+            label_keys = [key for key, l in zip(self.keys, self.LABELS) if l == label]
+            assert index.count(label) == len(label_keys)
+            for page, size in (0, 2), (1, 2), (5, 2), (0, 10):
+                yield self.check_label_page, index, label, page, size, label_keys
+
+    def check_label_page(self, index, label, page, size, label_keys):
+        assert index.page_keys(page, size, label) == label_keys[page * size:(page + 1) * size]
+
+    def test_save_load(self):
+        location = tempfile.mkdtemp()
+        try:
+            assert lmdbreader.DbIndex.load(location) is None
+            lmdbreader.DbIndex.from_labels(self.keys, self.LABELS).save(location)
+            index = lmdbreader.DbIndex.load(location)
+            assert index.has_labels()
+            assert index.page_keys(1, 2, 2) == ['00000007_2', '00000008_2']
+        finally:
+            shutil.rmtree(location)
+
+    def test_trailing_nul(self):
+        keys = ['a\0', 'a', 'b\0\0', 'c\0d']
+        location = tempfile.mkdtemp()
+        try:
+            lmdbreader.DbIndex.from_labels(keys).save(location)
+            index = lmdbreader.DbIndex.load(location)
+            assert index.page_keys(0, 4) == keys
+            assert [index.key(i) for i in xrange(4)] == keys
+        finally:
+            shutil.rmtree(location)
+
+
+class TestDbStats():
+
+    def test_save_load(self):
+        stats = lmdbreader.DbStats()
+        for label in BaseTest.LABELS:
+            stats.add('10x10x3', label)
+        location = tempfile.mkdtemp()
+        try:
+            assert lmdbreader.DbStats.load(location) is None
+            assert not lmdbreader.DbStats.exists(location)
+            stats.save(location)
+            assert lmdbreader.DbStats.exists(location)
+            loaded = lmdbreader.DbStats.load(location)
+            assert loaded.count == len(BaseTest.LABELS)
+            assert loaded.shapes == {'10x10x3': len(BaseTest.LABELS)}
+            assert loaded.labels == {0: 4, 1: 3, 2: 4}
+        finally:
+            shutil.rmtree(location)
+
+    def test_merge_extrapolate(self):
+        stats = lmdbreader.DbStats(2, {'4x4x1': 2}, {0: 1, 1: 1})
+        stats.merge(lmdbreader.DbStats(2, {'4x4x1': 1, '4x4x3': 1}, {1: 2}))
+        assert stats.count == 4
+        assert stats.shapes == {'4x4x1': 3, '4x4x3': 1}
+        estimated = stats.extrapolate(100)
+        assert estimated.count == 100
+        assert estimated.shapes == {'4x4x1': 75, '4x4x3': 25}
+        assert estimated.labels == {0: 25, 1: 75}
+
+
+class TestGetIndex(BaseTest):
+
+    def test_build_and_save(self):
+        reader = lmdbreader.DbReader(self.db_dir)
+        index = lmdbreader.get_index(reader, label_fn=self.label_fn)
+        assert index.has_labels()
+        assert index.count(0) == self.LABELS.count(0)
+        assert os.path.exists(os.path.join(self.db_dir, lmdbreader.DbIndex.FOLDER, 'positions.npy'))
+        # served from the cache afterwards
+        assert lmdbreader.get_index(reader) is index
+
+    def test_lock_per_db(self):
+        other = lmdbreader.DbReader(self.db_dir)
+        # an index being built for another DB does not block this one
+        lock = lmdbreader._index_locks.setdefault('/another/db', lmdbreader.threading.Lock())
+        with lock:
+            assert lmdbreader.get_index(other) is not None
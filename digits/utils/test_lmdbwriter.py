@@ -0,0 +1,84 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import shutil
+import tempfile
+
+import lmdb
+
+from . import lmdbwriter
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestDbWriter(object):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+    def entries(self, count, size):
+        return [('%08d' % i, chr(i % 256) * size) for i in xrange(count)]
+
+    def read(self):
+        db = lmdb.open(self.db_dir, readonly=True, lock=False)
+        with db.begin() as txn:
+            entries = list(txn.cursor())
+        db.close()
+        return entries
+
+    def test_options(self):
+        for sync in False, True:
+            for writemap in False, True:
+                yield self.check_write, dict(sync=sync, writemap=writemap)
+
+    def check_write(self, options):
+        entries = self.entries(500, 3000)
+        writer = lmdbwriter.DbWriter(self.db_dir, expected_entries=len(entries), **options)
+        writer.put_many(entries)
+        writer.close()
+        assert self.read() == entries
+        assert writer.entries == len(entries)
+        assert 'Wrote 500 entries' in writer.summary()
+
+    def test_map_sized_up_front(self):
+        entries = self.entries(1000, 5000)
+        writer = lmdbwriter.DbWriter(self.db_dir, expected_entries=len(entries))
+        writer.put_many(entries[:writer.SAMPLE_ENTRIES])
+        map_size = writer.map_size()
+        assert map_size >= len(entries) * 5000
+        writer.put_many(entries[writer.SAMPLE_ENTRIES:])
+        # no need to grow the map
+        assert writer.map_size() == map_size
+        writer.close()
+        assert self.read() == entries
+
+    def test_grow(self):
+        # the map is too small for the data
+        entries = self.entries(300, 10000)
+        writer = lmdbwriter.DbWriter(self.db_dir, map_size=1 << 20)
+        writer.put_many(entries)
+        assert writer.map_size() > 1 << 20
+        writer.close()
+        assert self.read() == entries
+
+    def test_commit_budget(self):
+        entries = self.entries(100, 1000)
+        writer = lmdbwriter.DbWriter(self.db_dir, map_size=1 << 20, commit_bytes=10000)
+        writer.put_many(entries)
+        writer.close()
+        # one transaction per 10 entries
+        assert writer.commits == 10, writer.commits
+        assert self.read() == entries
+
+    def test_few_entries(self):
+        entries = self.entries(3, 10)
+        writer = lmdbwriter.DbWriter(self.db_dir)
+        writer.put_many(entries)
+        writer.close()
+        assert writer.commits == 1
+        assert self.read() == entries
@@ -0,0 +1,91 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import mock
+
+from . import session_cache
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+def mock_session(nbytes):
+    return mock.Mock(nbytes=nbytes)
+
+
+class TestSessionCache():
+
+    def setUp(self):
+        self.cache = session_cache.SessionCache(100)
+
+    def test_reuse(self):
+        create_fn = mock.Mock(return_value=mock_session(10))
+        with self.cache.use('a', create_fn) as first:
+            pass
+        with self.cache.use('a', create_fn) as second:
+            pass
+        assert first is second
+        assert create_fn.call_count == 1
+        assert not first.close.called
+
+    def test_evict_lru(self):
+        a, b, c = mock_session(40), mock_session(40), mock_session(40)
+        for key, session in ('a', a), ('b', b), ('a', a), ('c', c):
+            with self.cache.use(key, lambda: session):
+                pass
+        assert b.close.called
+        assert not a.close.called and not c.close.called
+        assert self.cache.memory_used() == 80
+
+    def test_keep_over_budget(self):
+        a = mock_session(1000)
+        with self.cache.use('a', lambda: a):
+            pass
+        assert not a.close.called
+        assert self.cache.memory_used() == 1000
+
+    def test_evict_in_use(self):
+        a, b = mock_session(60), mock_session(60)
+        with self.cache.use('a', lambda: a):
+            with self.cache.use('b', lambda: b):
+                # a is evicted but still running
+                assert not a.close.called
+                assert 'a' not in self.cache.sessions
+            assert not a.close.called
+        assert a.close.call_count == 1
+        assert not b.close.called
+
+    def test_shared_use(self):
+        a, b = mock_session(60), mock_session(60)
+        first = self.cache.acquire('a', lambda: a)
+        second = self.cache.acquire('a', lambda: a)
+        assert first is second
+        with self.cache.use('b', lambda: b):
+            pass
+        self.cache.release(first)
+        assert not a.close.called
+        self.cache.release(second)
+        assert a.close.call_count == 1
+
+    def test_release_on_error(self):
+        a, b = mock_session(60), mock_session(60)
+        try:
+            with self.cache.use('a', lambda: a):
+                with self.cache.use('b', lambda: b):
+                    raise RuntimeError()
+        except RuntimeError:
+            pass
+        assert a.close.call_count == 1
+        assert not self.cache.users
+
+    def test_clear(self):
+        a, b = mock_session(10), mock_session(10)
+        with self.cache.use('a', lambda: a):
+            pass
+        with self.cache.use('b', lambda: b):
+            self.cache.clear()
+            assert a.close.called
+            assert not b.close.called
+        assert b.close.call_count == 1
+        assert self.cache.memory_used() == 0
@@ -0,0 +1,114 @@
+# Copyright (c) 2017, NVIDIA CORPORATION.  All rights reserved.
+from __future__ import absolute_import
+
+import cPickle as pickle
+
+from nose.tools import assert_raises
+import numpy as np
+
+from .stats import MeanAccumulator, layer_statistics
+from digits import test_utils
+
+
+test_utils.skipIfNotFramework('none')
+
+
+class TestMeanAccumulator():
+
+    def test_shapes(self):
+        for shape, channel_axis in (
+                ((6, 5), -1),
+                ((6, 5, 3), -1),
+                ((3, 6, 5), 0),
+        ):
+            for dtype in np.uint8, np.int16, np.float32:
+                yield self.check_stats, shape, channel_axis, dtype
+
+    def check_stats(self, shape, channel_axis, dtype):
+        images = (np.random.rand(*((20,) + shape)) * 255).astype(dtype)
+        s = MeanAccumulator(channel_axis)
+        for start in xrange(0, len(images), 7):
+            s.add(images[start:start + 7])
+        assert s.count == len(images)
+
+        expected = images.astype(np.float64)
+        assert np.allclose(s.mean(), expected.mean(axis=0))
+        if len(shape) == 2:
+            channels = expected.reshape(-1, 1)
+        else:
+            channels = np.rollaxis(expected, channel_axis % len(shape) + 1, expected.ndim)
+            channels = channels.reshape(-1, channels.shape[-1])
+        assert np.allclose(s.channel_mean(), channels.mean(axis=0))
+        assert np.allclose(s.channel_std(), channels.std(axis=0))
+
+    def test_no_overflow(self):
+        s = MeanAccumulator()
+        images = np.full((1000, 2, 2, 3), 255, dtype=np.uint8)
+        for _ in xrange(20):
+            s.add(images)
+        assert s.sum.dtype == np.uint64
+        assert (s.mean() == 255).all()
+        assert np.allclose(s.channel_std(), 0)
+
+    def test_merge(self):
+        images = np.random.randint(0, 255, (30, 4, 4, 3)).astype(np.uint8)
+        total = MeanAccumulator()
+        total.add(images)
+        merged = MeanAccumulator()
+        for start in 0, 10, 20:
+            worker = MeanAccumulator()
+            worker.add(images[start:start + 10])
+            # sent back by a worker process
+            merged.merge(pickle.loads(pickle.dumps(worker, pickle.HIGHEST_PROTOCOL)))
+        merged.merge(None)
+        merged.merge(MeanAccumulator())
+        assert merged.count == total.count
+        assert (merged.sum == total.sum).all()
+        assert (merged.sum_squares == total.sum_squares).all()
+
+    def test_shape_mismatch(self):
+        s = MeanAccumulator()
+        s.add(np.zeros((1, 4, 4, 3), dtype=np.uint8))
+        assert_raises(ValueError, s.add, np.zeros((1, 4, 5, 3), dtype=np.uint8))
+
+
+class TestLayerStatistics():
+
+    def test_matches_numpy(self):
+        for shape, dtype in (
+                ((1,), np.float32),
+                ((64, 13, 13), np.float32),
+                ((20, 3, 5, 5), np.float64),
+                ((10, 10), np.uint8),
+        ):
+            yield self.check_statistics, shape, dtype
+
+    def check_statistics(self, shape, dtype):
+        data = (np.random.RandomState(0).randn(*shape) * 50 + 100).astype(dtype)
+        # blocks smaller than the data
+        mean, std, (y, x, ticks) = layer_statistics(data, block_size=100)
+
+        expected = data.astype(np.float64)
+        assert np.allclose(mean, expected.mean())
+        assert np.allclose(std, expected.std(), atol=1e-6)
+        expected_y, edges = np.histogram(expected, bins=20)
+        assert sum(y) == data.size
+        # values on the edge of a bin may fall on either side
+        assert np.abs(np.array(y) - expected_y).max() <= 1
+        assert np.allclose(x, (edges[:-1] + edges[1:]) / 2)
+        assert np.allclose(ticks, edges[[0, 10, -1]])
+
+    def test_large_mean(self):
+        data = (np.random.RandomState(0).randn(64, 32, 32) + 1000).astype(np.float32)
+        mean, std, _ = layer_statistics(data, block_size=1000)
+        expected = data.astype(np.float64)
+        assert np.isclose(mean, expected.mean())
+        assert np.isclose(std, expected.std(), rtol=1e-5), std
+
+    def test_constant(self):
+        data = np.full((4, 4), 3, dtype=np.float32)
+        mean, std, (y, x, ticks) = layer_statistics(data)
+        assert mean == 3
+        assert std == 0
+        assert y == list(np.histogram(data, bins=20)[0])
+        assert np.allclose(ticks, [2.5, 3, 3.5])
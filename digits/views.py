@@ -14,9 +14,10 @@ import werkzeug.exceptions
 from .config import config_value
 from .webapp import app, socketio, scheduler
 import digits
-from digits import dataset, extensions, model, utils, pretrained_model
+from digits import dataset, extensions, image_store, model, utils, pretrained_model
+from digits.catalog import CatalogEntry, job_summary
 from digits.log import logger
-from digits.utils.routing import request_wants_json
+from digits.utils.routing import json_response, paginate, request_wants_json
 
 blueprint = flask.Blueprint(__name__, __name__)
 
@@ -31,26 +32,33 @@ def home(tab=2):
     Returns JSON when requested:
         {
             datasets: [{id, name, status},...],
-            models: [{id, name, status},...]
+            models: [{id, name, status},...],
+            totals: {datasets, models}
         }
+    The job lists can be paged with the offset and limit arguments
     """
-    running_datasets = get_job_list(dataset.DatasetJob, True)
-    completed_datasets = get_job_list(dataset.DatasetJob, False)
-    running_models = get_job_list(model.ModelJob, True)
-    completed_models = get_job_list(model.ModelJob, False)
+    job_lists = get_job_lists([dataset.DatasetJob, model.ModelJob])
+    running_datasets = job_lists[(dataset.DatasetJob, True)]
+    completed_datasets = job_lists[(dataset.DatasetJob, False)]
+    running_models = job_lists[(model.ModelJob, True)]
+    completed_models = job_lists[(model.ModelJob, False)]
 
     if request_wants_json():
+        datasets = running_datasets + completed_datasets
+        models = running_models + completed_models
         data = {
             'version': digits.__version__,
             'jobs_dir': config_value('jobs_dir'),
-            'datasets': [j.json_dict()
-                         for j in running_datasets + completed_datasets],
-            'models': [j.json_dict()
-                       for j in running_models + completed_models],
+            'datasets': [j.json_dict() for j in paginate(datasets)],
+            'models': [j.json_dict() for j in paginate(models)],
+            'totals': {
+                'datasets': len(datasets),
+                'models': len(models),
+            },
         }
         if config_value('server_name'):
             data['server_name'] = config_value('server_name')
-        return flask.jsonify(data)
+        return json_response(data)
     else:
         new_dataset_options = {
             'Images': {
@@ -139,83 +147,12 @@ def home(tab=2):
 
 
 def json_dict(job, model_output_fields):
-    d = {
-        'id': job.id(),
-        'name': job.name(),
-        'group': job.group,
-        'status': job.status_of_tasks().name,
-        'status_css': job.status_of_tasks().css,
-        'submitted': job.status_history[0][1],
-        'elapsed': job.runtime_of_tasks(),
-    }
-
-    if 'train_db_task' in dir(job):
-        d.update({
-            'backend': job.train_db_task().backend,
-        })
-
-    if 'train_task' in dir(job):
-        d.update({
-            'framework': job.train_task().get_framework_id(),
-        })
-
-        for prefix, outputs in (('train', job.train_task().train_outputs),
-                                ('val', job.train_task().val_outputs)):
-            for key in outputs.keys():
-                data = outputs[key].data
-                if len(data) > 0:
-                    key = '%s (%s) ' % (key, prefix)
-                    model_output_fields.add(key + 'last')
-                    model_output_fields.add(key + 'min')
-                    model_output_fields.add(key + 'max')
-                    d.update({key + 'last': data[-1]})
-                    d.update({key + 'min': min(data)})
-                    d.update({key + 'max': max(data)})
-
-        if (job.train_task().combined_graph_data() and
-                'columns' in job.train_task().combined_graph_data()):
-            d.update({
-                'sparkline': job.train_task().combined_graph_data()['columns'][0][1:],
-            })
-
-    if 'get_progress' in dir(job):
-        d.update({
-            'progress': int(round(100 * job.get_progress())),
-        })
-
-    if hasattr(job, 'dataset_id'):
-        d.update({
-            'dataset_id': job.dataset_id,
-        })
-
-    if hasattr(job, 'extension_id'):
-        d.update({
-            'extension': job.extension_id,
-        })
-    else:
-        if hasattr(job, 'dataset_id'):
-            ds = scheduler.get_job(job.dataset_id)
-            if ds and hasattr(ds, 'extension_id'):
-                d.update({
-                    'extension': ds.extension_id,
-                })
-
-    if isinstance(job, dataset.DatasetJob):
-        d.update({'type': 'dataset'})
-
-    if isinstance(job, model.ModelJob):
-        d.update({'type': 'model'})
-
-    if isinstance(job, pretrained_model.PretrainedModelJob):
-        model_output_fields.add("has_labels")
-        model_output_fields.add("username")
-        d.update({
-            'type': 'pretrained_model',
-            'framework': job.framework,
-            'username': job.username,
-            'has_labels': job.has_labels_file()
-        })
-    return d
+    """
+    Returns the dict shown for a job (or CatalogEntry) in the home page tables
+    """
+    if isinstance(job, CatalogEntry):
+        return job.table_dict(model_output_fields)
+    return job_summary(job, model_output_fields)
 
 
 @blueprint.route('/completed_jobs/json', methods=['GET'])
@@ -225,24 +162,46 @@ def completed_jobs():
         {
             datasets: [{id, name, group, status, status_css, submitted, elapsed, badge}],
             models:   [{id, name, group, status, status_css, submitted, elapsed, badge}],
+            totals: {datasets, models, pretrained_models},
         }
+    The lists of completed jobs can be paged with the offset and limit arguments
     """
-    completed_datasets = get_job_list(dataset.DatasetJob, False)
-    completed_models = get_job_list(model.ModelJob, False)
-    running_datasets = get_job_list(dataset.DatasetJob, True)
-    running_models = get_job_list(model.ModelJob, True)
-    pretrained_models = get_job_list(pretrained_model.PretrainedModelJob, False)
+    job_lists = get_job_lists([dataset.DatasetJob, model.ModelJob, pretrained_model.PretrainedModelJob])
+    completed_datasets = job_lists[(dataset.DatasetJob, False)]
+    completed_models = job_lists[(model.ModelJob, False)]
+    running_datasets = job_lists[(dataset.DatasetJob, True)]
+    running_models = job_lists[(model.ModelJob, True)]
+    pretrained_models = job_lists[(pretrained_model.PretrainedModelJob, False)]
 
     model_output_fields = set()
     data = {
         'running': [json_dict(j, model_output_fields) for j in running_datasets + running_models],
-        'datasets': [json_dict(j, model_output_fields) for j in completed_datasets],
-        'models': [json_dict(j, model_output_fields) for j in completed_models],
-        'pretrained_models': [json_dict(j, model_output_fields) for j in pretrained_models],
-        'model_output_fields': sorted(list(model_output_fields)),
+        'datasets': [json_dict(j, model_output_fields) for j in paginate(completed_datasets)],
+        'models': [json_dict(j, model_output_fields) for j in paginate(completed_models)],
+        'pretrained_models': [json_dict(j, model_output_fields) for j in paginate(pretrained_models)],
+        'totals': {
+            'datasets': len(completed_datasets),
+            'models': len(completed_models),
+            'pretrained_models': len(pretrained_models),
+        },
     }
+    data['model_output_fields'] = sorted(list(model_output_fields))
 
-    return flask.jsonify(data)
+    return json_response(data)
+
+
+@blueprint.route('/scheduler/json', methods=['GET'])
+def scheduler_metrics():
+    """
+    Returns JSON
+        {
+            queued_tasks, longest_queued, running_tasks, since,
+            queue_wait: {count, mean, p95, max},
+            utilization: {resource_type: {current, average}},
+            fair_share: {username: usage},
+        }
+    """
+    return flask.jsonify(scheduler.get_metrics())
 
 
 @blueprint.route('/jobs/<job_id>/table_data/json', methods=['GET'])
@@ -258,12 +217,29 @@ def job_table_data(job_id):
     return flask.jsonify({'job': json_dict(job, model_output_fields)})
 
 
-def get_job_list(cls, running):
-    return sorted(
-        [j for j in scheduler.jobs.values() if isinstance(j, cls) and j.status.is_running() == running],
-        key=lambda j: j.status_history[0][1],
+def get_job_lists(classes):
+    """
+    Returns a dict mapping (cls, running) to the loaded Jobs of class cls
+    and the CatalogEntries of the other ones, most recently submitted first
+
+    Arguments:
+    classes -- the job classes to list
+    """
+    jobs = scheduler.jobs.values()
+    jobs += [e for e in scheduler.catalog.entries() if e.id() not in scheduler.jobs]
+    jobs.sort(
+        key=lambda j: j.submitted if isinstance(j, CatalogEntry) else j.status_history[0][1],
         reverse=True,
     )
+    job_lists = dict(((cls, running), []) for cls in classes for running in (True, False))
+    for job in jobs:
+        job_class = job.job_class() if isinstance(job, CatalogEntry) else type(job)
+        if job_class is None:
+            continue
+        for cls in classes:
+            if issubclass(job_class, cls):
+                job_lists[(cls, job.status.is_running())].append(job)
+    return job_lists
 
 
 @blueprint.route('/group', methods=['GET', 'POST'])
@@ -290,6 +266,7 @@ def group():
                 continue
 
             job.group = group_name
+            scheduler.job_changed(job)
 
             # update form data so updated name gets used when cloning job
             if hasattr(job, 'form_data'):
@@ -386,7 +363,7 @@ def show_job(job_id):
 @utils.auth.requires_login(redirect=False)
 def edit_job(job_id):
     """
-    Edit a job's name and/or notes
+    Edit a job's name, notes and/or priority
     """
     job = scheduler.get_job(job_id)
     if job is None:
@@ -401,6 +378,7 @@ def edit_job(job_id):
         if not name:
             raise werkzeug.exceptions.BadRequest('name cannot be blank')
         job._name = name
+        scheduler.job_changed(job)
         job.emit_attribute_changed('name', job.name())
         # update form data so updated name gets used when cloning job
         if 'form.dataset_name.data' in job.form_data:
@@ -418,8 +396,25 @@ def edit_job(job_id):
         if not notes:
             notes = None
         job._notes = notes
+        scheduler.job_changed(job)
         logger.info('Updated notes.', job_id=job.id())
 
+    # Edit priority
+    if 'job_priority' in flask.request.form:
+        try:
+            priority = int(flask.request.form['job_priority'])
+        except ValueError:
+            raise werkzeug.exceptions.BadRequest('priority must be an integer')
+        max_priority = config_value('job_priority')['max']
+        priority = max(-max_priority, min(priority, max_priority))
+        if priority > max(job.priority, type(job).DEFAULT_PRIORITY) and not utils.auth.is_admin():
+            raise werkzeug.exceptions.Forbidden(
+                'Only administrators can raise a job above priority %d' % type(job).DEFAULT_PRIORITY)
+        job.priority = priority
+        scheduler.job_changed(job)
+        scheduler.wake()
+        logger.info('Set priority to %d.' % priority, job_id=job.id())
+
     return '%s updated.' % job.job_type()
 
 
@@ -665,6 +660,26 @@ def serve_file(path):
     jobs_dir = config_value('jobs_dir')
     return flask.send_from_directory(jobs_dir, path)
 
+
+@blueprint.route('/images/<name>', methods=['GET'])
+def serve_image(name):
+    """
+    Return an image of the image store
+
+    Images are named by the hash of their content, so they never change
+    """
+    etag = name.split('.')[0]
+    if etag in flask.request.if_none_match:
+        response = flask.Response(status=304)
+    else:
+        data = image_store.get_store().get(name)
+        if data is None:
+            raise werkzeug.exceptions.NotFound('Image not found')
+        response = flask.Response(data, mimetype=image_store.MIMETYPES[name.split('.')[1]])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 # Path Completion
 
 